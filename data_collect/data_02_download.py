@@ -5,9 +5,20 @@ import time
 import urllib.request
 import urllib.error
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 import threading
 
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+    HTTPAdapter = None
+
+# FITS文件由2880字节的逻辑记录组成，完整文件大小必为其整数倍
+FITS_BLOCK_SIZE = 2880
+
 # 添加config目录到路径
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config'))
 from url_config_manager import url_config_manager
@@ -25,11 +36,15 @@ except ImportError:
 
 
 class FitsDownloader:
-    def __init__(self, max_workers=4, retry_times=3, timeout=30, enable_astap=False, astap_config_path=None):
+    def __init__(self, max_workers=4, retry_times=3, timeout=30, enable_astap=False, astap_config_path=None,
+                 chunk_size=1024 * 1024):
         self.max_workers = max_workers
         self.retry_times = retry_times
         self.timeout = timeout
         self.enable_astap = enable_astap
+        self.chunk_size = chunk_size
+        # 每个下载线程一个HTTP会话，同一主机的连接保持keep-alive复用
+        self._local = threading.local()
         self.download_stats = {
             'total': 0,
             'completed': 0,
@@ -68,9 +83,112 @@ class FitsDownloader:
         """从URL中提取文件名"""
         return os.path.basename(url.split('?')[0])
     
+    def _get_session(self):
+        """获取当前线程的HTTP会话"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.trust_env = False  # 不使用系统代理（与无代理opener一致）
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.session = session
+        return session
+
+    @contextmanager
+    def _open_stream(self, url, offset=0):
+        """
+        打开下载流
+
+        Args:
+            url (str): 文件URL
+            offset (int): 续传起点（字节），大于0时发送Range请求
+
+        Yields:
+            tuple: (HTTP状态码, 响应头, 数据块迭代器)
+        """
+        headers = {'User-Agent': url_config_manager.get_setting('user_agent')}
+        if offset > 0:
+            headers['Range'] = f'bytes={offset}-'
+
+        if requests is not None:
+            # 禁止压缩传输，保证Content-Length与写入的字节数一致
+            headers['Accept-Encoding'] = 'identity'
+            with self._get_session().get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 416:
+                    response.raise_for_status()
+                yield response.status_code, response.headers, response.iter_content(chunk_size=self.chunk_size)
+            return
+
+        # 创建请求对象，设置User-Agent
+        req = urllib.request.Request(url, headers=headers)
+
+        # 创建无代理的opener
+        proxy_handler = urllib.request.ProxyHandler({})
+        opener = urllib.request.build_opener(proxy_handler)
+
+        try:
+            response = opener.open(req, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise
+            response = e  # 416响应同样携带Content-Range
+        with response:
+            yield response.getcode(), response.headers, iter(lambda: response.read(self.chunk_size), b'')
+
+    @staticmethod
+    def _expected_size(status, headers, offset):
+        """
+        根据响应确定完整文件大小
+
+        Returns:
+            int or None: 完整文件字节数，未知时为None
+        """
+        content_range = headers.get('Content-Range') or ''
+        if status in (206, 416):
+            # bytes start-end/total 或 bytes */total
+            unit_range, _, total = content_range.partition('/')
+            if status == 206:
+                start = unit_range.replace('bytes', '').strip().split('-')[0]
+                if not start.isdigit() or int(start) != offset:
+                    raise ValueError(f"服务器返回的续传位置与本地不一致: {content_range}")
+            return int(total) if total.strip().isdigit() else None
+        content_length = headers.get('Content-Length')
+        return int(content_length) if content_length else None
+
+    @staticmethod
+    def is_fits_filename(filename):
+        """是否为FITS文件名"""
+        return filename.lower().endswith(('.fits', '.fit', '.fts'))
+
+    def is_complete_file(self, file_path):
+        """
+        检查本地文件是否完整：非空，FITS文件还需以SIMPLE开头且大小为2880字节的整数倍
+
+        Args:
+            file_path (str): 文件路径
+
+        Returns:
+            bool: 文件完整返回True
+        """
+        if not os.path.exists(file_path):
+            return False
+        size = os.path.getsize(file_path)
+        if size <= 0:
+            return False
+        if not self.is_fits_filename(file_path):
+            return True
+        if size % FITS_BLOCK_SIZE != 0:
+            return False
+        with open(file_path, 'rb') as f:
+            return f.read(6) == b'SIMPLE'
+
     def download_single_file(self, url, download_dir, progress_callback=None):
         """下载单个文件
 
+        数据先写入 <文件名>.part，中断后重试通过HTTP Range从已有字节处续传；
+        大小与Content-Length一致且通过FITS块大小检查后再原子重命名为最终文件名
+
         Args:
             url (str): 文件URL
             download_dir (str): 下载目录
@@ -78,83 +196,110 @@ class FitsDownloader:
         """
         filename = self.get_filename_from_url(url)
         file_path = os.path.join(download_dir, filename)
+        part_path = file_path + '.part'
 
         # 检查文件是否已存在
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            if file_size > 0:
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            if self.is_complete_file(file_path):
                 with self.stats_lock:
                     self.download_stats['skipped'] += 1
                 return f"跳过已存在文件: {filename}"
+            # 直接写入最终文件名时中断遗留的截断文件：转为.part续传
+            if not os.path.exists(part_path) or os.path.getsize(part_path) < os.path.getsize(file_path):
+                os.replace(file_path, part_path)
+            else:
+                os.remove(file_path)
+            print(f"发现不完整文件，改为续传: {filename}")
 
         # 尝试下载文件
         for attempt in range(self.retry_times):
             try:
-                # 创建请求对象，设置User-Agent
-                req = urllib.request.Request(url)
-                req.add_header('User-Agent', url_config_manager.get_setting('user_agent'))
-
-                # 创建无代理的opener
-                proxy_handler = urllib.request.ProxyHandler({})
-                opener = urllib.request.build_opener(proxy_handler)
+                offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
 
                 # 下载文件
-                with opener.open(req, timeout=self.timeout) as response:
-                    # 获取文件总大小
-                    total_size = response.headers.get('Content-Length')
-                    total_size = int(total_size) if total_size else None
+                with self._open_stream(url, offset) as (status, headers, chunks):
+                    try:
+                        total_size = self._expected_size(status, headers, offset)
+                    except ValueError:
+                        os.remove(part_path)
+                        raise
 
-                    downloaded_bytes = 0
+                    if status == 416:
+                        # 请求范围超出文件末尾：.part已完整（重命名前中断）或与服务器文件不一致
+                        if total_size is None or offset != total_size:
+                            os.remove(part_path)
+                            raise Exception(f"续传位置无效 ({offset} 字节)，将重新下载")
+                        downloaded_bytes = offset
+                    else:
+                        if status != 206:
+                            offset = 0  # 服务器不支持Range，从头下载
+                        elif offset:
+                            print(f"续传 {filename}: 从 {offset} 字节开始")
+                        downloaded_bytes = offset
 
-                    with open(file_path, 'wb') as f:
-                        while True:
-                            chunk = response.read(8192)
-                            if not chunk:
-                                break
-                            f.write(chunk)
-                            downloaded_bytes += len(chunk)
+                        with open(part_path, 'ab' if offset else 'wb') as f:
+                            for chunk in chunks:
+                                if not chunk:
+                                    continue
+                                f.write(chunk)
+                                downloaded_bytes += len(chunk)
 
-                            # 调用进度回调
-                            if progress_callback:
-                                progress_callback(downloaded_bytes, total_size, filename)
+                                # 调用进度回调
+                                if progress_callback:
+                                    progress_callback(downloaded_bytes, total_size, filename)
 
                 # 验证下载的文件大小
-                if os.path.getsize(file_path) > 0:
-                    with self.stats_lock:
-                        self.download_stats['completed'] += 1
-
-                    # 如果启用了ASTAP处理，处理下载的FITS文件
-                    if self.astap_processor and filename.lower().endswith(('.fits', '.fit', '.fts')):
-                        try:
-                            print(f"开始ASTAP处理: {filename}")
-                            success = self.astap_processor.process_fits_file(file_path)
-                            if success:
-                                print(f"ASTAP处理成功: {filename}")
-                            else:
-                                print(f"ASTAP处理失败: {filename}")
-                                print(f"  请检查日志获取详细的失败原因和执行的命令")
-                        except Exception as e:
-                            print(f"ASTAP处理出错 {filename}: {str(e)}")
-                            print(f"  异常详情: {type(e).__name__}")
-
-                    return f"下载成功: {filename}"
-                else:
+                part_size = os.path.getsize(part_path)
+                if part_size == 0:
                     raise Exception("下载的文件大小为0")
+                if total_size is not None and part_size != total_size:
+                    if part_size > total_size:
+                        os.remove(part_path)
+                    # 不足时保留.part，重试只补齐缺失部分
+                    raise Exception(f"文件大小不一致: {part_size}/{total_size} 字节")
+                if self.is_fits_filename(filename) and part_size % FITS_BLOCK_SIZE != 0:
+                    os.remove(part_path)
+                    raise Exception(f"FITS文件大小不是{FITS_BLOCK_SIZE}字节的整数倍: {part_size}")
+
+                os.replace(part_path, file_path)
+                with self.stats_lock:
+                    self.download_stats['completed'] += 1
+
+                # 如果启用了ASTAP处理，处理下载的FITS文件
+                if self.astap_processor and self.is_fits_filename(filename):
+                    try:
+                        print(f"开始ASTAP处理: {filename}")
+                        success = self.astap_processor.process_fits_file(file_path)
+                        if success:
+                            print(f"ASTAP处理成功: {filename}")
+                        else:
+                            print(f"ASTAP处理失败: {filename}")
+                            print(f"  请检查日志获取详细的失败原因和执行的命令")
+                    except Exception as e:
+                        print(f"ASTAP处理出错 {filename}: {str(e)}")
+                        print(f"  异常详情: {type(e).__name__}")
+
+                return f"下载成功: {filename}"
 
             except Exception as e:
                 if attempt < self.retry_times - 1:
                     print(f"下载失败，重试 {attempt + 1}/{self.retry_times}: {filename} - {str(e)}")
                     time.sleep(2 ** attempt)  # 指数退避
                 else:
-                    # 删除可能损坏的文件
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+                    # 保留.part以便下次从断点续传，最终文件名下不留不完整文件
                     with self.stats_lock:
                         self.download_stats['failed'] += 1
                     return f"下载失败: {filename} - {str(e)}"
-    
-    def download_files(self, urls, download_dir):
-        """批量下载文件"""
+
+    def download_files(self, urls, download_dir, should_stop=None):
+        """
+        批量下载文件
+
+        Args:
+            urls: 文件URL列表
+            download_dir: 下载目录
+            should_stop: 可选的停止检查函数，返回True时取消尚未开始的下载（进行中的文件下载完成）
+        """
         # 确保下载目录存在
         os.makedirs(download_dir, exist_ok=True)
         
@@ -173,6 +318,10 @@ class FitsDownloader:
             
             # 处理完成的任务
             for future in as_completed(future_to_url):
+                if should_stop and should_stop():
+                    cancelled = sum(1 for f in future_to_url if f.cancel())
+                    print(f"下载已取消，跳过 {cancelled} 个尚未开始的文件")
+                    break
                 url = future_to_url[future]
                 try:
                     result = future.result()
@@ -203,6 +352,7 @@ def parse_args():
     parser.add_argument('--max-workers', type=int, default=4, help='最大并发线程数（默认4）')
     parser.add_argument('--retry-times', type=int, default=3, help='重试次数（默认3）')
     parser.add_argument('--timeout', type=int, default=30, help='下载超时时间（秒，默认30）')
+    parser.add_argument('--chunk-kb', type=int, default=1024, help='读取块大小（KB，默认1024）')
     return parser.parse_args()
 
 
@@ -228,7 +378,8 @@ def main():
     downloader = FitsDownloader(
         max_workers=args.max_workers,
         retry_times=args.retry_times,
-        timeout=args.timeout
+        timeout=args.timeout,
+        chunk_size=args.chunk_kb * 1024
     )
     
     try:
@@ -1,4 +1,5 @@
 import datetime
+import json
 import re
 import subprocess
 import os
@@ -7,6 +8,9 @@ import sys
 # 添加config目录到路径
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config'))
 from url_config_manager import url_config_manager
+# 目录列表缓存与GUI扫描器共享（gui/listing_cache）
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gui'))
+from listing_cache import get_listing_cache, is_past_night
 
 
 def scan_by_day_path(year_in_path, ymd_in_paht, recent_data, sys_name_root='GY6-DATA', file_limit=0):
@@ -19,6 +23,16 @@ def scan_by_day_path(year_in_path, ymd_in_paht, recent_data, sys_name_root='GY6-
     else:
         download_url_root = f'{base_url}/{sys_name_root}/{year_in_path}/{ymd_in_paht}/'
 
+    # wget --spider 是递归爬取，无法做条件GET：已结束的观测夜直接复用上次的爬取结果
+    listing_cache = get_listing_cache()
+    cache_key = f'wget-spider:{download_url_root}?file_limit={file_limit}'
+    if is_past_night(ymd_in_paht, listing_cache.settle_days):
+        cached = listing_cache.load(cache_key)
+        if cached is not None and listing_cache.is_settled(cached, ymd_in_paht):
+            file_url_list = json.loads(cached['content'])
+            print(f'path>>: {len(file_url_list)}   (cached listing)')
+            return file_url_list
+
     temp_path = url_config_manager.get_path_setting('temp_download_path')
     print(f'path: {temp_path}')
     print(f'path: {download_url_root}')
@@ -78,5 +92,7 @@ def scan_by_day_path(year_in_path, ymd_in_paht, recent_data, sys_name_root='GY6-
     # 将匹配到的URL从bytes转换为strings
 
     print(f'path>>: {len(file_url_list)}   /   {download_file_counter}    skip:{skip_counter}')
+    if file_url_list and is_past_night(ymd_in_paht, listing_cache.settle_days):
+        listing_cache.store(cache_key, json.dumps(file_url_list))
     return file_url_list
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+星点三角形（星群）匹配
+对两幅星场图像分别提取亮星质心，以每颗星与其近邻组成的三角形的边长比作为相似变换不变量，
+用KD树在不变量空间中查找候选对应，再以全部星点验证并用最小二乘拟合相似变换。
+三角形数量与星数成正比，建树与查询均为 O(N log N)；不依赖图像纹理描述符，
+适合ORB描述符高度相似的密集星场与拖尾星像
+"""
+
+import logging
+from itertools import combinations
+
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+
+def detect_star_centroids(image_data, max_stars=200, sigma=4.0, min_area=3, max_area=2000):
+    """
+    提取亮星的通量加权质心
+
+    Args:
+        image_data (np.ndarray): 二维图像（原始浮点数据）
+        max_stars (int): 按通量保留的最多星数
+        sigma (float): 检测阈值（背景噪声倍数）
+        min_area (int): 连通域最小像素数（排除热像素）
+        max_area (int): 连通域最大像素数（拖尾星像也能保留）
+
+    Returns:
+        np.ndarray: (N, 3) 数组 x, y, 通量，按通量降序
+    """
+    image = np.nan_to_num(np.asarray(image_data, dtype=np.float32))
+    sample = image[::4, ::4]
+    background = float(np.median(sample))
+    noise = float(np.median(np.abs(sample - background))) * 1.4826
+    if noise <= 0:
+        noise = float(np.std(sample)) or 1.0
+
+    residual = image - background
+    labels, count = ndimage.label(residual > sigma * noise)
+    if count == 0:
+        return np.empty((0, 3))
+
+    index = np.arange(1, count + 1)
+    areas = ndimage.sum(np.ones_like(residual), labels, index)
+    fluxes = ndimage.sum(residual, labels, index)
+    keep = (areas >= min_area) & (areas <= max_area)
+    if not np.any(keep):
+        return np.empty((0, 3))
+
+    index, fluxes = index[keep], fluxes[keep]
+    order = np.argsort(fluxes)[::-1][:max_stars]
+    index, fluxes = index[order], fluxes[order]
+    centers = np.array(ndimage.center_of_mass(np.clip(residual, 0, None), labels, index), dtype=np.float64)
+    return np.column_stack([centers[:, 1], centers[:, 0], fluxes])
+
+
+def estimate_similarity(src, dst):
+    """
+    最小二乘相似变换（Umeyama）：dst ≈ s * R * src + t
+
+    Args:
+        src (np.ndarray): (N, 2) 源点
+        dst (np.ndarray): (N, 2) 目标点
+
+    Returns:
+        np.ndarray: 2x3 变换矩阵（与 cv2.warpAffine 兼容）；点数不足或退化时返回None
+    """
+    src = np.asarray(src, dtype=np.float64)
+    dst = np.asarray(dst, dtype=np.float64)
+    if len(src) < 2:
+        return None
+    mu_s, mu_d = src.mean(axis=0), dst.mean(axis=0)
+    src_c, dst_c = src - mu_s, dst - mu_d
+    var_s = float(np.sum(src_c ** 2)) / len(src)
+    if var_s <= 1e-12:
+        return None
+    U, S, Vt = np.linalg.svd(dst_c.T @ src_c / len(src))
+    D = np.eye(2)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        D[1, 1] = -1.0
+    R = U @ D @ Vt
+    scale = float(np.trace(np.diag(S) @ D)) / var_s
+    t = mu_d - scale * R @ mu_s
+    return np.hstack([scale * R, t[:, None]])
+
+
+def apply_transform(matrix, points):
+    """对 (N, 2) 点集应用 2x3 变换"""
+    return points @ matrix[:, :2].T + matrix[:, 2]
+
+
+def build_triangles(points, neighbors=5):
+    """
+    以每颗星与其最近邻组成三角形，计算不变量并按规范顺序排列顶点
+
+    Args:
+        points (np.ndarray): (N, 2) 星点坐标
+        neighbors (int): 每颗星使用的近邻数
+
+    Returns:
+        tuple: (不变量 (M, 2): 最短边/最长边、中边/最长边, 顶点索引 (M, 3))；
+            顶点按对边从短到长排列，相似变换下对应三角形的顶点一一对应
+    """
+    n = len(points)
+    if n < 3:
+        return np.empty((0, 2)), np.empty((0, 3), dtype=np.int64)
+    k = min(neighbors + 1, n)
+    _, nn = cKDTree(points).query(points, k=k)
+
+    triangles = set()
+    for i in range(n):
+        for j, l in combinations(nn[i, 1:], 2):
+            triangles.add(tuple(sorted((i, int(j), int(l)))))
+    triangles = np.array(sorted(triangles), dtype=np.int64)
+
+    p = points[triangles]                                           # (M, 3, 2)
+    # 顶点v的对边长度
+    opposite = np.stack([
+        np.linalg.norm(p[:, 1] - p[:, 2], axis=1),
+        np.linalg.norm(p[:, 0] - p[:, 2], axis=1),
+        np.linalg.norm(p[:, 0] - p[:, 1], axis=1),
+    ], axis=1)
+    order = np.argsort(opposite, axis=1)
+    sides = np.take_along_axis(opposite, order, axis=1)
+    valid = sides[:, 2] > 1e-6
+    invariants = sides[valid, :2] / sides[valid, 2:3]
+    vertices = np.take_along_axis(triangles, order, axis=1)[valid]
+    return invariants, vertices
+
+
+class AsterismMatcher:
+    """星点三角形匹配器：估计把待对齐星点映射到参考星点的相似变换"""
+
+    def __init__(self, max_stars=200, neighbors=5, invariant_tolerance=0.01, inlier_threshold=3.0,
+                 min_inliers=10, max_trials=300, scale_range=(0.8, 1.25)):
+        """
+        Args:
+            max_stars (int): 参与匹配的最亮星数
+            neighbors (int): 每颗星组成三角形的近邻数
+            invariant_tolerance (float): 不变量空间的匹配半径
+            inlier_threshold (float): 内点距离阈值（像素）
+            min_inliers (int): 接受变换所需的最少内点数
+            max_trials (int): 最多验证的候选三角形对应数
+            scale_range (tuple): 允许的缩放范围（同一望远镜应接近1）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_stars = max_stars
+        self.neighbors = neighbors
+        self.invariant_tolerance = invariant_tolerance
+        self.inlier_threshold = inlier_threshold
+        self.min_inliers = min_inliers
+        self.max_trials = max_trials
+        self.scale_range = scale_range
+
+    def _inliers(self, matrix, target, ref_tree):
+        """变换后与参考星距离小于阈值的 (待对齐索引, 参考索引)，每颗参考星只保留最近的一个"""
+        dist, idx = ref_tree.query(apply_transform(matrix, target), distance_upper_bound=self.inlier_threshold)
+        ok = np.isfinite(dist)
+        target_idx, ref_idx, dist = np.nonzero(ok)[0], idx[ok], dist[ok]
+        order = np.argsort(dist)
+        _, first = np.unique(ref_idx[order], return_index=True)
+        keep = order[first]
+        return target_idx[keep], ref_idx[keep], dist[keep]
+
+    def find_transform(self, ref_points, target_points):
+        """
+        估计 target -> ref 的相似变换
+
+        Args:
+            ref_points (np.ndarray): (N, 2+) 参考星点（按亮度降序）
+            target_points (np.ndarray): (M, 2+) 待对齐星点（按亮度降序）
+
+        Returns:
+            dict: {'matrix': 2x3矩阵, 'target_idx', 'ref_idx', 'residuals', 'rms'}；失败时返回None
+        """
+        ref = np.asarray(ref_points, dtype=np.float64)[:self.max_stars, :2]
+        target = np.asarray(target_points, dtype=np.float64)[:self.max_stars, :2]
+        if len(ref) < 3 or len(target) < 3:
+            self.logger.warning(f"星点数量不足: 参考={len(ref)}, 待对齐={len(target)}")
+            return None
+
+        ref_inv, ref_tri = build_triangles(ref, self.neighbors)
+        tgt_inv, tgt_tri = build_triangles(target, self.neighbors)
+        if len(ref_inv) == 0 or len(tgt_inv) == 0:
+            return None
+
+        dist, idx = cKDTree(ref_inv).query(tgt_inv, distance_upper_bound=self.invariant_tolerance)
+        candidates = np.nonzero(np.isfinite(dist))[0]
+        candidates = candidates[np.argsort(dist[candidates])][:self.max_trials]
+        self.logger.info(f"三角形: 参考={len(ref_inv)}, 待对齐={len(tgt_inv)}, 候选对应={len(candidates)}")
+
+        ref_tree = cKDTree(ref)
+        best = None
+        enough = max(self.min_inliers, int(0.5 * min(len(ref), len(target))))
+        for c in candidates:
+            matrix = estimate_similarity(target[tgt_tri[c]], ref[ref_tri[idx[c]]])
+            if matrix is None:
+                continue
+            scale = float(np.sqrt(abs(np.linalg.det(matrix[:, :2]))))
+            if not (self.scale_range[0] <= scale <= self.scale_range[1]):
+                continue
+            target_idx, ref_idx, _ = self._inliers(matrix, target, ref_tree)
+            if best is None or len(target_idx) > len(best[0]):
+                best = (target_idx, ref_idx, matrix)
+                if len(target_idx) >= enough:
+                    break
+
+        if best is None or len(best[0]) < self.min_inliers:
+            self.logger.warning(f"星点三角形匹配失败: 最多内点 {0 if best is None else len(best[0])}")
+            return None
+
+        # 用全部内点最小二乘精化，并用精化结果重新确定内点
+        target_idx, ref_idx, matrix = best
+        for _ in range(2):
+            refined = estimate_similarity(target[target_idx], ref[ref_idx])
+            if refined is None:
+                break
+            matrix = refined
+            target_idx, ref_idx, _ = self._inliers(matrix, target, ref_tree)
+            if len(target_idx) < self.min_inliers:
+                return None
+
+        residuals = np.linalg.norm(apply_transform(matrix, target[target_idx]) - ref[ref_idx], axis=1)
+        rms = float(np.sqrt(np.mean(residuals ** 2)))
+        self.logger.info(f"星点三角形匹配成功: 内点={len(target_idx)}, RMS={rms:.3f}像素")
+        return {'matrix': matrix, 'target_idx': target_idx, 'ref_idx': ref_idx,
+                'residuals': residuals, 'rms': rms}
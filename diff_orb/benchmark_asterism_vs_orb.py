@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+星点三角形匹配与ORB对齐的基准测试
+在归档帧目录中按 (望远镜, 天区) 分组，组内第一帧作为参考，其余帧逐一对齐，
+统计两种方法的耗时、成功率与内点数，并比较两者得到的变换是否一致
+"""
+
+import os
+import re
+import sys
+import csv
+import glob
+import time
+import argparse
+import logging
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fits_alignment_comparison import FITSAlignmentComparison
+from asterism_matcher import apply_transform, estimate_similarity
+
+
+def group_frames(directory, recursive=False):
+    """
+    按文件名中的望远镜与天区编号分组
+
+    Args:
+        directory (str): 归档目录
+        recursive (bool): 是否递归子目录
+
+    Returns:
+        dict: {(望远镜, 天区): [按文件名排序的路径]}
+    """
+    pattern = os.path.join(directory, '**', '*') if recursive else os.path.join(directory, '*')
+    groups = {}
+    for path in sorted(glob.glob(pattern, recursive=recursive)):
+        if not path.lower().endswith(('.fits', '.fit', '.fts')):
+            continue
+        name = os.path.basename(path)
+        region = re.search(r'K\d{3}(?:-\d)?', name)
+        telescope = re.match(r'([A-Za-z]+\d+)_', name)
+        if region:
+            key = (telescope.group(1).upper() if telescope else '', region.group(0))
+            groups.setdefault(key, []).append(path)
+    return groups
+
+
+def run_method(comparator, reference, target_path, min_inliers):
+    """
+    对一帧执行特征提取、匹配与变换估计（不做重采样与差异检测）
+
+    Returns:
+        dict: {'success', 'seconds', 'inliers', 'matrix'}
+    """
+    start = time.perf_counter()
+    _, _, ref_processed, ref_kp, ref_des, _ = reference
+    data, _, ok = comparator.load_fits_image(target_path)
+    result = {'success': False, 'seconds': 0.0, 'inliers': 0, 'matrix': None}
+    if not ok:
+        result['seconds'] = time.perf_counter() - start
+        return result
+
+    if comparator.alignment_method == 'asterism':
+        match_points, _, _, matches = comparator.match_star_asterisms(data, ref_kp)
+        if match_points is not None:
+            # match_star_asterisms 返回的已是验证后的内点，与 align_images 一致直接最小二乘拟合
+            src, dst = (p.reshape(-1, 2) for p in match_points)
+            result['matrix'] = estimate_similarity(dst, src)
+            result['inliers'] = len(matches)
+    else:
+        processed = comparator.preprocess_image(data)
+        match_points, _, _, _ = comparator.detect_and_match_features(
+            ref_processed, processed, reference_features=(ref_kp, ref_des))
+        if match_points is not None:
+            src, dst = (p.reshape(-1, 2) for p in match_points)
+            matrix, inliers = cv2.estimateAffinePartial2D(
+                dst, src, method=cv2.RANSAC, ransacReprojThreshold=3.0, maxIters=2000, confidence=0.99)
+            if matrix is not None:
+                result['matrix'] = matrix
+                result['inliers'] = int(inliers.sum()) if inliers is not None else 0
+
+    result['seconds'] = time.perf_counter() - start
+    result['success'] = result['matrix'] is not None and result['inliers'] >= min_inliers
+    return result
+
+
+def transform_disagreement(matrix_a, matrix_b, shape):
+    """两个变换在图像四角与中心处的最大位置差（像素）"""
+    h, w = shape[:2]
+    probe = np.array([[0, 0], [w - 1, 0], [0, h - 1], [w - 1, h - 1], [w / 2, h / 2]], dtype=np.float64)
+    return float(np.max(np.linalg.norm(apply_transform(matrix_a, probe) - apply_transform(matrix_b, probe), axis=1)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='星点三角形匹配与ORB对齐基准测试')
+    parser.add_argument('directory', help='归档FITS帧目录')
+    parser.add_argument('--recursive', action='store_true', help='递归搜索子目录')
+    parser.add_argument('--max-frames', type=int, default=20, help='每组最多测试的帧数（默认20）')
+    parser.add_argument('--min-inliers', type=int, default=10, help='判定成功的最少内点数（默认10）')
+    parser.add_argument('--central-region', type=int, default=0,
+                        help='只使用中央区域（像素边长），0表示完整图像')
+    parser.add_argument('--csv', help='逐帧结果输出CSV路径')
+    parser.add_argument('--verbose', '-v', action='store_true', help='输出对齐过程日志')
+    args = parser.parse_args()
+
+    groups = group_frames(args.directory, args.recursive)
+    if not groups:
+        print(f"目录中没有找到带天区编号的FITS文件: {args.directory}")
+        sys.exit(1)
+
+    comparators = {
+        'orb': FITSAlignmentComparison(use_central_region=args.central_region > 0,
+                                       central_region_size=args.central_region or 200,
+                                       alignment_method='rigid'),
+        'asterism': FITSAlignmentComparison(use_central_region=args.central_region > 0,
+                                            central_region_size=args.central_region or 200,
+                                            alignment_method='asterism'),
+    }
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    rows = []
+    for (telescope, region), paths in sorted(groups.items()):
+        if len(paths) < 2:
+            continue
+        reference_path, targets = paths[0], paths[1:args.max_frames]
+        references = {name: comp.load_reference_features(reference_path) for name, comp in comparators.items()}
+        if not all(ref[5] for ref in references.values()):
+            print(f"{telescope} {region}: 参考帧加载失败，跳过 {os.path.basename(reference_path)}")
+            continue
+        print(f"{telescope} {region}: 参考 {os.path.basename(reference_path)}, 测试 {len(targets)} 帧")
+
+        for target in targets:
+            results = {name: run_method(comp, references[name], target, args.min_inliers)
+                       for name, comp in comparators.items()}
+            disagreement = None
+            if results['orb']['success'] and results['asterism']['success']:
+                disagreement = transform_disagreement(results['orb']['matrix'], results['asterism']['matrix'],
+                                                      references['orb'][0].shape)
+            rows.append({
+                'telescope': telescope,
+                'region': region,
+                'file': os.path.basename(target),
+                'orb_success': results['orb']['success'],
+                'orb_seconds': round(results['orb']['seconds'], 4),
+                'orb_inliers': results['orb']['inliers'],
+                'asterism_success': results['asterism']['success'],
+                'asterism_seconds': round(results['asterism']['seconds'], 4),
+                'asterism_inliers': results['asterism']['inliers'],
+                'disagreement_px': None if disagreement is None else round(disagreement, 3),
+            })
+
+    if not rows:
+        print("没有可比较的帧（每组至少需要2帧）")
+        sys.exit(1)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"逐帧结果已保存: {args.csv}")
+
+    print("\n" + "=" * 72)
+    print(f"{'方法':<10} {'成功率':>10} {'平均耗时(s)':>12} {'中位耗时(s)':>12} {'平均内点':>10}")
+    print("-" * 72)
+    for name in ('orb', 'asterism'):
+        success = [r[f'{name}_success'] for r in rows]
+        seconds = [r[f'{name}_seconds'] for r in rows]
+        inliers = [r[f'{name}_inliers'] for r in rows if r[f'{name}_success']]
+        print(f"{name:<10} {np.mean(success):>10.1%} {np.mean(seconds):>12.3f} {np.median(seconds):>12.3f} "
+              f"{(np.mean(inliers) if inliers else 0):>10.1f}")
+    both = [r['disagreement_px'] for r in rows if r['disagreement_px'] is not None]
+    if both:
+        print(f"\n两种方法均成功的 {len(both)} 帧中，变换差异中位数 {np.median(both):.2f} 像素，"
+              f"最大 {np.max(both):.2f} 像素")
+    only_asterism = sum(1 for r in rows if r['asterism_success'] and not r['orb_success'])
+    only_orb = sum(1 for r in rows if r['orb_success'] and not r['asterism_success'])
+    print(f"仅星点三角形成功: {only_asterism} 帧；仅ORB成功: {only_orb} 帧；共 {len(rows)} 帧")
+
+
+if __name__ == '__main__':
+    main()
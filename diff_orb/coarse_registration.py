@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+FFT相位相关粗配准
+大多数帧对之间只有小平移加微小旋转：在降采样图像上用幅度谱的对数极坐标相位相关估计旋转，
+再用相位相关估计平移；最后在全分辨率的若干局部窗口上复核残差，峰值尖锐且残差小时直接采用，
+否则交给特征匹配精配准
+"""
+
+import logging
+
+import numpy as np
+import cv2
+
+
+def _to_float(image):
+    """转为去均值的float32图像（相位相关对直流分量敏感）"""
+    img = np.asarray(image, dtype=np.float32)
+    img = np.nan_to_num(img)
+    return img - float(np.median(img))
+
+
+def downsample(image, max_size=1024):
+    """
+    等比例缩小到最长边不超过 max_size
+
+    Returns:
+        tuple: (缩小后的图像, 缩放因子 small/full)
+    """
+    h, w = image.shape[:2]
+    factor = min(1.0, float(max_size) / max(h, w))
+    if factor >= 1.0:
+        return image, 1.0
+    small = cv2.resize(image, (max(1, int(round(w * factor))), max(1, int(round(h * factor)))),
+                       interpolation=cv2.INTER_AREA)
+    return small, factor
+
+
+def estimate_translation(reference, image):
+    """
+    相位相关平移估计
+
+    Args:
+        reference (np.ndarray): 参考图像
+        image (np.ndarray): 待对齐图像（与参考同尺寸）
+
+    Returns:
+        tuple: ((dx, dy), 峰值响应)；image 中的内容相对 reference 偏移 (dx, dy)
+    """
+    ref = _to_float(reference)
+    img = _to_float(image)
+    window = cv2.createHanningWindow((ref.shape[1], ref.shape[0]), cv2.CV_32F)
+    (dx, dy), response = cv2.phaseCorrelate(ref, img, window)
+    return (float(dx), float(dy)), float(response)
+
+
+def _log_polar_spectrum(image, window):
+    """平移不变的幅度谱（高通加权）的对数极坐标变换"""
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2(image * window))).astype(np.float32)
+    h, w = spectrum.shape
+    # 高通：抑制低频（天光背景与窗函数泄漏）
+    yy, xx = np.ogrid[-1.0:1.0:complex(0, h), -1.0:1.0:complex(0, w)]
+    spectrum *= np.sqrt(xx * xx + yy * yy).astype(np.float32)
+    spectrum = np.log1p(spectrum)
+    center = (w / 2.0, h / 2.0)
+    radius = min(center)
+    return cv2.warpPolar(spectrum, (w, h), center, radius, cv2.INTER_LINEAR + cv2.WARP_POLAR_LOG)
+
+
+def estimate_rotation(reference, image):
+    """
+    对数极坐标相位相关旋转估计（幅度谱对平移不变）
+
+    Returns:
+        tuple: (旋转角度绝对值(度), 峰值响应)；幅度谱的对称性使符号与180度存在歧义，由调用方消除
+    """
+    ref = _to_float(reference)
+    img = _to_float(image)
+    window = cv2.createHanningWindow((ref.shape[1], ref.shape[0]), cv2.CV_32F)
+    lp_ref = _log_polar_spectrum(ref, window)
+    lp_img = _log_polar_spectrum(img, window)
+    (_, shift_angle), response = cv2.phaseCorrelate(lp_ref, lp_img)
+    angle = abs(float(shift_angle)) * 360.0 / lp_ref.shape[0]
+    if angle > 90.0:
+        angle = 180.0 - angle
+    return angle, float(response)
+
+
+class CoarseRegistration:
+    """相位相关粗配准：估计 image -> reference 的刚体变换并在全分辨率复核"""
+
+    def __init__(self, max_size=1024, min_response=0.1, min_rotation_deg=0.02,
+                 verify_window=256, verify_grid=3, max_residual_px=1.0, min_window_response=0.05):
+        """
+        Args:
+            max_size (int): 全局估计时降采样后的最长边
+            min_response (float): 全局平移相位相关峰值响应下限
+            min_rotation_deg (float): 小于该角度时视为纯平移，不做旋转补偿
+            verify_window (int): 全分辨率复核窗口边长（像素）
+            verify_grid (int): 复核窗口网格（n x n，覆盖四角与中心）
+            max_residual_px (float): 复核窗口残差平移上限（像素），多数窗口满足时采用粗配准结果
+            min_window_response (float): 复核窗口相位相关响应下限（低于此值的窗口视为无星，不参与判断）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.min_response = min_response
+        self.min_rotation_deg = min_rotation_deg
+        self.verify_window = verify_window
+        self.verify_grid = verify_grid
+        self.max_residual_px = max_residual_px
+        self.min_window_response = min_window_response
+
+    @staticmethod
+    def _rigid_matrix(angle_deg, center, shift):
+        """先绕 center 旋转 angle_deg，再减去平移 shift：image 坐标 -> reference 坐标"""
+        matrix = cv2.getRotationMatrix2D(center, angle_deg, 1.0)
+        matrix[:, 2] -= np.asarray(shift, dtype=np.float64)
+        return matrix
+
+    def _estimate_small(self, ref_small, img_small):
+        """在降采样图像上估计 (角度, 平移, 响应)"""
+        shift, response = estimate_translation(ref_small, img_small)
+        angle, _ = estimate_rotation(ref_small, img_small)
+        if angle < self.min_rotation_deg:
+            return 0.0, shift, response
+
+        # 旋转方向有歧义：两个方向都试，取平移相关峰值更高者
+        h, w = ref_small.shape[:2]
+        center = (w / 2.0, h / 2.0)
+        best = (0.0, shift, response)
+        for signed in (angle, -angle):
+            derotated = cv2.warpAffine(np.asarray(img_small, dtype=np.float32),
+                                       cv2.getRotationMatrix2D(center, signed, 1.0), (w, h))
+            s, r = estimate_translation(ref_small, derotated)
+            if r > best[2]:
+                best = (signed, s, r)
+        return best
+
+    def _measure_windows(self, reference, image, matrix):
+        """
+        在全分辨率网格窗口上测量按 matrix 变换后的残差平移
+
+        Returns:
+            tuple: (窗口中心 (K, 2), 残差平移 (K, 2))，只包含响应足够的窗口
+        """
+        h, w = reference.shape[:2]
+        size = int(min(self.verify_window, h // 2, w // 2))
+        if size < 32:
+            return np.empty((0, 2)), np.empty((0, 2))
+        centers, shifts = [], []
+        xs = np.linspace(0, w - size, self.verify_grid).astype(int)
+        ys = np.linspace(0, h - size, self.verify_grid).astype(int)
+        image32 = np.asarray(image, dtype=np.float32)
+        for y0 in ys:
+            for x0 in xs:
+                patch_matrix = matrix.copy()
+                patch_matrix[:, 2] -= (x0, y0)
+                warped = cv2.warpAffine(image32, patch_matrix, (size, size))
+                (dx, dy), response = estimate_translation(reference[y0:y0 + size, x0:x0 + size], warped)
+                if response >= self.min_window_response:
+                    centers.append((x0 + size / 2.0, y0 + size / 2.0))
+                    shifts.append((dx, dy))
+        return np.array(centers, dtype=np.float64).reshape(-1, 2), np.array(shifts, dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def _refine(matrix, centers, shifts):
+        """用各窗口残差平移拟合刚体修正并与 matrix 复合（修正微小旋转与平移误差）"""
+        correction, _ = cv2.estimateAffinePartial2D(
+            (centers + shifts).astype(np.float32), centers.astype(np.float32), method=cv2.LMEDS)
+        if correction is None:
+            return matrix
+        full = np.vstack([matrix, [0.0, 0.0, 1.0]])
+        return (np.vstack([correction, [0.0, 0.0, 1.0]]) @ full)[:2]
+
+    def register(self, reference, image):
+        """
+        估计 image -> reference 的刚体变换
+
+        Args:
+            reference (np.ndarray): 参考图像（全分辨率）
+            image (np.ndarray): 待对齐图像（与参考同尺寸）
+
+        Returns:
+            dict: {'accepted', 'matrix' (2x3, 可直接用于 cv2.warpAffine), 'rotation', 'shift',
+                   'response', 'max_residual' (复核窗口残差中位数)}
+        """
+        result = {'accepted': False, 'matrix': None, 'rotation': 0.0, 'shift': (0.0, 0.0),
+                  'response': 0.0, 'max_residual': None}
+        if reference.shape[:2] != image.shape[:2]:
+            self.logger.info("粗配准跳过：图像尺寸不同")
+            return result
+
+        ref_small, factor = downsample(np.asarray(reference, dtype=np.float32), self.max_size)
+        img_small, _ = downsample(np.asarray(image, dtype=np.float32), self.max_size)
+        angle, shift_small, response = self._estimate_small(ref_small, img_small)
+
+        h, w = reference.shape[:2]
+        shift = (shift_small[0] / factor, shift_small[1] / factor)
+        matrix = self._rigid_matrix(angle, (w / 2.0, h / 2.0), shift)
+        result.update(matrix=matrix, rotation=angle, shift=shift, response=response)
+        if response < self.min_response:
+            self.logger.info(f"粗配准峰值不明显 (响应={response:.3f})，需要特征匹配")
+            return result
+
+        centers, shifts = self._measure_windows(reference, image, matrix)
+        if len(centers) >= self._min_windows():
+            # 局部窗口残差反映对数极坐标分辨率以下的微小旋转，拟合修正后再复核一次
+            matrix = self._refine(matrix, centers, shifts)
+        check = self.verify(reference, image, matrix)
+        if check['max_residual'] is None:
+            self.logger.info(f"粗配准复核窗口不足 ({check['windows']})，需要特征匹配")
+            return result
+
+        angle = float(np.degrees(np.arctan2(matrix[1, 0], matrix[0, 0])))
+        shift = (float(-matrix[0, 2]), float(-matrix[1, 2]))
+        result.update(matrix=matrix, rotation=angle, shift=shift, max_residual=check['max_residual'],
+                      accepted=check['accepted'])
+        self.logger.info(
+            f"粗配准: 平移=({shift[0]:.2f}, {shift[1]:.2f}), 旋转={angle:.3f}°, 响应={response:.3f}, "
+            f"残差中位数={result['max_residual']:.2f}像素 ({check['consistent']}/{check['windows']}窗口一致) -> {'采用' if result['accepted'] else '需要特征匹配'}")
+        return result
+
+    def _min_windows(self):
+        return max(3, (self.verify_grid * self.verify_grid) // 2)
+
+    def verify(self, reference, image, matrix=None):
+        """
+        在全分辨率网格窗口上复核 image -> reference 的变换
+
+        Args:
+            reference (np.ndarray): 参考图像
+            image (np.ndarray): 待复核图像（与参考同尺寸）
+            matrix (np.ndarray): 2x3 变换矩阵，None表示恒等变换（即测量两幅图像当前的对齐误差）
+
+        Returns:
+            dict: {'accepted', 'max_residual' (窗口残差中位数，窗口不足时为None), 'consistent', 'windows'}
+        """
+        if matrix is None:
+            matrix = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        centers, shifts = self._measure_windows(reference, image, matrix)
+        result = {'accepted': False, 'max_residual': None, 'consistent': 0, 'windows': len(centers)}
+        if len(centers) < self._min_windows():
+            return result
+
+        residuals = np.hypot(shifts[:, 0], shifts[:, 1])
+        # 个别窗口可能因星点稀少出现伪峰：要求多数窗口一致，残差取中位数
+        consistent = int(np.sum(residuals <= self.max_residual_px))
+        max_residual = float(np.median(residuals))
+        result.update(max_residual=max_residual, consistent=consistent,
+                      accepted=consistent >= self._min_windows() and max_residual <= self.max_residual_px)
+        return result
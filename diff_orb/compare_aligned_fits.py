@@ -23,6 +23,18 @@ import glob
 import subprocess
 import time
 
+# 添加opencv_test目录到路径（进程内斑点检测引擎）
+opencv_test_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'opencv_test')
+if os.path.exists(opencv_test_dir) and opencv_test_dir not in sys.path:
+    sys.path.insert(0, opencv_test_dir)
+
+try:
+    from signal_blob_detector import SignalBlobDetector
+except ImportError:
+    SignalBlobDetector = None
+
+from tiled_engine import get_tiled_executor, gaussian_halo, median_halo
+
 # 忽略警告
 warnings.filterwarnings('ignore', category=RuntimeWarning)
 warnings.filterwarnings('ignore', category=UserWarning)
@@ -95,11 +107,24 @@ class AlignedFITSComparator:
             numpy.ndarray: 标准化后的图像
         """
         # 使用百分位数进行鲁棒标准化
-        p1, p99 = np.percentile(image, [1, 99])
+        p1, p99 = self.normalization_range(image)
         normalized = np.clip((image - p1) / (p99 - p1), 0, 1)
         return normalized
 
-    def create_overlap_mask(self, ref_image, aligned_image, threshold=1e-6):
+    def normalization_range(self, image):
+        """
+        标准化使用的 (1%, 99%) 百分位数
+
+        Args:
+            image (numpy.ndarray): 输入图像
+
+        Returns:
+            tuple: (p1, p99)
+        """
+        p1, p99 = np.percentile(image, [1, 99])
+        return p1, p99
+
+    def create_overlap_mask(self, ref_image, aligned_image, threshold=1e-6, log=True):
         """
         创建重叠区域掩码，识别两个图像的有效重叠区域
 
@@ -107,6 +132,7 @@ class AlignedFITSComparator:
             ref_image (numpy.ndarray): 参考图像
             aligned_image (numpy.ndarray): 对齐后的图像
             threshold (float): 判断有效像素的阈值
+            log (bool): 是否输出重叠比例日志（分块调用时由调用方汇总输出）
 
         Returns:
             numpy.ndarray: 重叠区域掩码（1表示重叠，0表示非重叠）
@@ -118,13 +144,15 @@ class AlignedFITSComparator:
         # 重叠区域是两个图像都有有效像素的区域
         overlap_mask = (ref_valid & aligned_valid).astype(np.uint8)
 
-        self.logger.info(f"重叠区域像素数: {np.sum(overlap_mask)}, "
-                        f"总像素数: {overlap_mask.size}, "
-                        f"重叠比例: {np.sum(overlap_mask)/overlap_mask.size:.2%}")
+        if log:
+            self.logger.info(f"重叠区域像素数: {np.sum(overlap_mask)}, "
+                             f"总像素数: {overlap_mask.size}, "
+                             f"重叠比例: {np.sum(overlap_mask)/overlap_mask.size:.2%}")
 
         return overlap_mask
     
-    def detect_differences(self, img1, img2, diff_calc_mode='abs', apply_diff_postprocess=False):
+    def detect_differences(self, img1, img2, diff_calc_mode='abs', apply_diff_postprocess=False,
+                           keep_intermediates=True):
         """
         检测两个图像之间的差异
 
@@ -133,47 +161,61 @@ class AlignedFITSComparator:
             img2 (numpy.ndarray): 比较图像
             diff_calc_mode (str): 差异计算方式，'abs' 或 'signed'
             apply_diff_postprocess (bool): 是否对差异图执行后处理（负值置零+中值滤波）
+            keep_intermediates (bool): 是否返回整幅的标准化/高斯平滑中间图像；
+                为False时这些图像只在图块内存在，中间图像字典为空
 
         Returns:
             tuple: (差异图像, 二值化差异图像, 新亮点信息, 重叠区域掩码, 中间图像字典)
         """
-        # 创建重叠区域掩码
-        mask_start = time.time()
-        overlap_mask = self.create_overlap_mask(img1, img2)
-        self.logger.debug(f"  ⏱️  创建重叠掩码耗时: {time.time() - mask_start:.3f}秒")
-
-        # 标准化图像
+        # 标准化范围需要整幅统计（百分位数），先算出来供各图块共用
         norm_start = time.time()
-        norm_img1 = self.normalize_image(img1)
-        norm_img2 = self.normalize_image(img2)
-        self.logger.debug(f"  ⏱️  标准化图像耗时: {time.time() - norm_start:.3f}秒")
-
-        # 应用高斯模糊减少噪声
-        blur_start = time.time()
-        blurred_img1 = gaussian_filter(norm_img1, sigma=self.diff_params['gaussian_sigma'])
-        blurred_img2 = gaussian_filter(norm_img2, sigma=self.diff_params['gaussian_sigma'])
-        self.logger.debug(f"  ⏱️  高斯模糊耗时: {time.time() - blur_start:.3f}秒")
-
-        # 计算差异（只在重叠区域）
-        diff_start = time.time()
-        diff_raw = blurred_img2 - blurred_img1
-        if diff_calc_mode == 'signed':
-            diff_image = diff_raw * overlap_mask
-        else:
-            diff_image = np.abs(diff_raw) * overlap_mask
-
-        # 可选：对差异图执行后处理（仅影响 difference 产物与后续二值化）
-        if apply_diff_postprocess:
-            # 排除负值
-            diff_image = np.where(diff_image < 0, 0, diff_image)
-            # 3x3 中值滤波，抑制孤立噪声
-            diff_image = median_filter(diff_image, size=3)
-        self.logger.debug(f"  ⏱️  计算差异耗时: {time.time() - diff_start:.3f}秒")
-
-        # 二值化差异图像
-        binary_start = time.time()
-        binary_diff = (diff_image > self.diff_params['diff_threshold']).astype(np.uint8)
-        self.logger.debug(f"  ⏱️  二值化耗时: {time.time() - binary_start:.3f}秒")
+        range1 = self.normalization_range(img1)
+        range2 = self.normalization_range(img2)
+        self.logger.debug(f"  ⏱️  标准化范围耗时: {time.time() - norm_start:.3f}秒")
+
+        # 掩码、标准化、高斯模糊、差分、后处理与二值化在同一次分块遍历中完成：
+        # halo 覆盖高斯核半径（加上中值滤波半径），图块结果与整幅计算一致
+        sigma = self.diff_params['gaussian_sigma']
+        threshold = self.diff_params['diff_threshold']
+        halo = gaussian_halo(sigma) + (median_halo(3) if apply_diff_postprocess else 0)
+
+        def difference_tile(block1, block2):
+            mask = self.create_overlap_mask(block1, block2, log=False)
+            norm1 = np.clip((block1 - range1[0]) / (range1[1] - range1[0]), 0, 1)
+            norm2 = np.clip((block2 - range2[0]) / (range2[1] - range2[0]), 0, 1)
+            blurred1 = gaussian_filter(norm1, sigma=sigma)
+            blurred2 = gaussian_filter(norm2, sigma=sigma)
+            diff = blurred2 - blurred1
+            if diff_calc_mode == 'signed':
+                diff = diff * mask
+            else:
+                diff = np.abs(diff) * mask
+            # 可选：对差异图执行后处理（仅影响 difference 产物与后续二值化）
+            if apply_diff_postprocess:
+                # 排除负值
+                diff = np.where(diff < 0, 0, diff)
+                # 3x3 中值滤波，抑制孤立噪声
+                diff = median_filter(diff, size=3)
+            binary = (diff > threshold).astype(np.uint8)
+            if keep_intermediates:
+                return mask, diff, binary, norm1, norm2, blurred1, blurred2
+            return mask, diff, binary
+
+        tile_start = time.time()
+        # 输出dtype与整幅计算时的类型提升规则一致
+        type1 = np.result_type(img1.dtype, range1[0])
+        type2 = np.result_type(img2.dtype, range2[0])
+        diff_type = np.result_type(type1, type2)
+        out_dtypes = (np.uint8, diff_type, np.uint8)
+        if keep_intermediates:
+            out_dtypes += (type1, type2, type1, type2)
+        outputs = get_tiled_executor().apply(difference_tile, [img1, img2], out_dtypes, halo=halo)
+        overlap_mask, diff_image, binary_diff = outputs[:3]
+        self.logger.debug(f"  ⏱️  分块掩码/模糊/差分/二值化耗时: {time.time() - tile_start:.3f}秒")
+        overlap_pixels = int(np.count_nonzero(overlap_mask))
+        self.logger.info(f"重叠区域像素数: {overlap_pixels}, "
+                        f"总像素数: {overlap_mask.size}, "
+                        f"重叠比例: {overlap_pixels/overlap_mask.size:.2%}")
 
         # 查找连通区域（新亮点）
         contour_start = time.time()
@@ -202,12 +244,12 @@ class AlignedFITSComparator:
 
         self.logger.info(f"检测到 {len(bright_spots)} 个新亮点")
 
-        intermediate_images = {
-            'normalized_reference': norm_img1,
-            'normalized_aligned': norm_img2,
-            'blurred_reference': blurred_img1,
-            'blurred_aligned': blurred_img2
-        }
+        intermediate_images = {}
+        if keep_intermediates:
+            intermediate_images = dict(zip(
+                ('normalized_reference', 'normalized_aligned', 'blurred_reference', 'blurred_aligned'),
+                outputs[3:]
+            ))
 
         return diff_image, binary_diff, bright_spots, overlap_mask, intermediate_images
     
@@ -227,6 +269,14 @@ class AlignedFITSComparator:
         except Exception as e:
             self.logger.error(f"保存FITS文件失败 {output_path}: {str(e)}")
     
+    def difference_header(self, diff_data):
+        """
+        生成与 save_fits_result 写出的difference.fits一致的header（仅结构关键字）
+
+        进程内检测使用该header，保证与子进程读取difference.fits的检测结果（截图命名等）一致
+        """
+        return fits.PrimaryHDU(data=np.asarray(diff_data, dtype=np.float32)).header
+
     def get_overlap_bounding_box(self, overlap_mask):
         """
         获取重叠区域的边界框
@@ -400,12 +450,16 @@ class AlignedFITSComparator:
 
         return template_file, aligned_file
 
-    def run_signal_blob_detector(self, diff_fits_path, output_directory, reference_file=None, aligned_file=None, remove_bright_lines=True, stretch_method='peak', percentile_low=99.95, max_jaggedness_ratio=2.0, fast_mode=False, detection_method='contour', sort_by='aligned_snr', generate_gif=False):
+    def run_signal_blob_detector(self, diff_fits_path, output_directory, reference_file=None, aligned_file=None, remove_bright_lines=True, stretch_method='peak', percentile_low=99.95, max_jaggedness_ratio=2.0, fast_mode=False, detection_method='contour', sort_by='aligned_snr', generate_gif=False,
+                                 diff_data=None, reference_data=None, aligned_data=None):
         """
         对difference.fits执行signal_blob_detector检测
 
+        优先在当前进程内调用 SignalBlobDetector（可直接传入内存中的数组，避免重复启动解释器和读取FITS），
+        引擎不可用或进程内执行失败时回退为子进程执行 signal_blob_detector.py
+
         Args:
-            diff_fits_path: difference.fits文件路径
+            diff_fits_path: difference.fits文件路径（进程内调用时用于确定输出文件名前缀）
             output_directory: 输出目录
             reference_file: 参考图像（模板）FITS文件路径
             aligned_file: 对齐图像（下载）FITS文件路径
@@ -417,10 +471,28 @@ class AlignedFITSComparator:
             detection_method: 检测方法，'contour'=轮廓检测（默认）, 'simple_blob'=SimpleBlobDetector
             sort_by: 排序方式，'quality_score'=综合得分（默认）, 'aligned_snr'=Aligned中心7x7 SNR, 'snr'=差异图像SNR
             generate_gif: 是否生成GIF动画，默认False
+            diff_data: 差异图像数组（可选，提供时不再读取diff_fits_path）
+            reference_data: 参考图像数组（可选，提供时不再读取reference_file）
+            aligned_data: 对齐图像数组（可选，提供时不再读取aligned_file）
 
         Returns:
-            dict: 检测结果信息
+            dict: 检测结果信息（进程内调用时包含 'blobs'）
         """
+        if SignalBlobDetector is not None:
+            result = self._run_signal_blob_detector_in_process(
+                diff_fits_path, output_directory, reference_file, aligned_file,
+                remove_bright_lines=remove_bright_lines, stretch_method=stretch_method,
+                percentile_low=percentile_low, max_jaggedness_ratio=max_jaggedness_ratio,
+                fast_mode=fast_mode, detection_method=detection_method, sort_by=sort_by,
+                generate_gif=generate_gif, diff_data=diff_data,
+                reference_data=reference_data, aligned_data=aligned_data)
+            if result and result.get('success'):
+                return result
+            self.logger.warning("进程内斑点检测失败，回退为子进程执行signal_blob_detector.py")
+            # 快速模式下差异图只在内存中，子进程需要读取文件
+            if diff_data is not None and not os.path.exists(diff_fits_path):
+                self.save_fits_result(diff_data, diff_fits_path)
+
         try:
             # 查找signal_blob_detector.py
             script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -504,6 +576,66 @@ class AlignedFITSComparator:
             self.logger.error(f"执行signal_blob_detector时出错: {str(e)}")
             return {'success': False, 'error': str(e)}
 
+    def _run_signal_blob_detector_in_process(self, diff_fits_path, output_directory, reference_file, aligned_file,
+                                             remove_bright_lines, stretch_method, percentile_low, max_jaggedness_ratio,
+                                             fast_mode, detection_method, sort_by, generate_gif,
+                                             diff_data=None, reference_data=None, aligned_data=None):
+        """在当前进程内执行斑点检测（参数与命令行调用一致），过程输出收集后写入日志"""
+        output_lines = []
+        try:
+            detector = SignalBlobDetector(
+                sigma_threshold=3.0,
+                min_area=5,
+                max_area=400,
+                min_circularity=0.79,
+                gamma=2.2,
+                max_jaggedness_ratio=max_jaggedness_ratio,
+                output=output_lines.append
+            )
+
+            if diff_data is not None:
+                data = detector.prepare_image(diff_data)
+                header = self.difference_header(data)
+            else:
+                data, header = detector.load_fits_image(diff_fits_path)
+                if data is None:
+                    return {'success': False, 'error': f"无法读取差异图像: {diff_fits_path}"}
+
+            if reference_data is not None:
+                reference_data = detector.prepare_image(reference_data)
+            elif reference_file and os.path.exists(reference_file):
+                reference_data, _ = detector.load_fits_image(reference_file)
+
+            if aligned_data is not None:
+                aligned_data = detector.prepare_image(aligned_data)
+            elif aligned_file and os.path.exists(aligned_file):
+                aligned_data, _ = detector.load_fits_image(aligned_file)
+
+            base_name = os.path.splitext(os.path.basename(diff_fits_path))[0]
+            self.logger.info(f"进程内执行signal_blob_detector: {base_name}")
+            blobs = detector.process_arrays(
+                data, header, output_directory, base_name,
+                reference_data=reference_data, aligned_data=aligned_data,
+                detection_threshold=0.0,
+                remove_bright_lines=remove_bright_lines,
+                stretch_method=stretch_method,
+                percentile_low=percentile_low,
+                fast_mode=fast_mode,
+                detection_method=detection_method,
+                sort_by=sort_by,
+                generate_gif=generate_gif
+            )
+
+            self.logger.info("signal_blob_detector检测完成")
+            for line in output_lines:
+                if '过滤后剩余' in line and '个斑点' in line:
+                    self.logger.info(f"  {line.strip()}")
+            return {'success': True, 'output': '\n'.join(output_lines), 'blobs': blobs}
+
+        except Exception as e:
+            self.logger.error(f"执行signal_blob_detector时出错: {str(e)}")
+            return {'success': False, 'error': str(e), 'output': '\n'.join(output_lines)}
+
     def process_aligned_fits_comparison(self, input_directory, output_directory=None, remove_bright_lines=True, stretch_method='peak', percentile_low=99.95, fast_mode=False, max_jaggedness_ratio=2.0, detection_method='contour', sort_by='aligned_snr', generate_gif=False, diff_calc_mode='abs', apply_diff_postprocess=False):
         """
         处理已对齐FITS文件的差异比较
@@ -565,13 +697,64 @@ class AlignedFITSComparator:
         timing_stats['加载FITS数据'] = time.time() - load_start
         self.logger.info(f"⏱️  加载FITS数据耗时: {timing_stats['加载FITS数据']:.3f}秒")
 
+        return self.process_aligned_arrays(
+            ref_data, aligned_data, output_directory,
+            reference_file=reference_file,
+            aligned_file=aligned_file,
+            remove_bright_lines=remove_bright_lines,
+            stretch_method=stretch_method,
+            percentile_low=percentile_low,
+            fast_mode=fast_mode,
+            max_jaggedness_ratio=max_jaggedness_ratio,
+            detection_method=detection_method,
+            sort_by=sort_by,
+            generate_gif=generate_gif,
+            diff_calc_mode=diff_calc_mode,
+            apply_diff_postprocess=apply_diff_postprocess,
+            timing_stats=timing_stats,
+            start_time=total_start_time
+        )
+
+    def process_aligned_arrays(self, ref_data, aligned_data, output_directory, reference_file=None, aligned_file=None, remove_bright_lines=True, stretch_method='peak', percentile_low=99.95, fast_mode=False, max_jaggedness_ratio=2.0, detection_method='contour', sort_by='aligned_snr', generate_gif=False, diff_calc_mode='abs', apply_diff_postprocess=False,
+                               timing_stats=None, start_time=None):
+        """
+        对内存中已对齐的两幅图像执行差异比较与斑点检测（不读取输入文件）
+
+        Args:
+            ref_data (numpy.ndarray): 参考图像（模板）
+            aligned_data (numpy.ndarray): 对齐图像（下载）
+            output_directory (str): 输出目录路径
+            reference_file (str): 参考图像文件名（用于报告与子进程回退，可不存在）
+            aligned_file (str): 对齐图像文件名（用于报告与子进程回退，可不存在）
+            其余参数与 process_aligned_fits_comparison 相同
+            timing_stats (dict): 已有的耗时统计（可选）
+            start_time (float): 总计时起点（可选）
+
+        Returns:
+            dict: 处理结果信息
+        """
+        total_start_time = start_time if start_time is not None else time.time()
+        timing_stats = timing_stats if timing_stats is not None else {}
+        os.makedirs(output_directory, exist_ok=True)
+
+        ref_data = np.asarray(ref_data, dtype=np.float32)
+        aligned_data = np.asarray(aligned_data, dtype=np.float32)
+        if ref_data.ndim == 3:
+            ref_data = ref_data[0]
+        if aligned_data.ndim == 3:
+            aligned_data = aligned_data[0]
+        if ref_data.shape != aligned_data.shape:
+            self.logger.error(f"图像尺寸不匹配: {ref_data.shape} vs {aligned_data.shape}")
+            return None
+
         # 执行差异检测
         diff_start = time.time()
         self.logger.info("执行差异检测...")
         diff_image, binary_diff, bright_spots, overlap_mask, intermediate_images = self.detect_differences(
             ref_data, aligned_data,
             diff_calc_mode=diff_calc_mode,
-            apply_diff_postprocess=apply_diff_postprocess
+            apply_diff_postprocess=apply_diff_postprocess,
+            keep_intermediates=not fast_mode  # 快速模式不保存中间图像，不必分配整幅数组
         )
         timing_stats['差异检测'] = time.time() - diff_start
         self.logger.info(f"⏱️  差异检测耗时: {timing_stats['差异检测']:.3f}秒")
@@ -585,8 +768,11 @@ class AlignedFITSComparator:
         # 应用重叠掩码到所有输出图像（确保非重叠区域为黑色）
         mask_start = time.time()
         self.logger.info("应用重叠掩码，确保非重叠区域为黑色...")
-        ref_data = ref_data * overlap_mask
-        aligned_data = aligned_data * overlap_mask
+        # 保留未掩码的原始数据，供斑点检测使用（与其直接读取FITS文件的结果一致）
+        raw_ref_data, raw_aligned_data = ref_data, aligned_data
+        executor = get_tiled_executor()
+        ref_data = executor.mask(ref_data, overlap_mask)
+        aligned_data = executor.mask(aligned_data, overlap_mask)
         timing_stats['应用重叠掩码'] = time.time() - mask_start
         self.logger.info(f"⏱️  应用重叠掩码耗时: {timing_stats['应用重叠掩码']:.3f}秒")
 
@@ -599,8 +785,10 @@ class AlignedFITSComparator:
         self.logger.info("保存FITS格式结果...")
 
         # 保存差异图像（FITS）
+        # 快速模式且斑点检测在进程内执行时，差异图直接以数组传递，无需写出后再删除
         diff_fits_path = os.path.join(output_directory, f"{base_name}_difference.fits")
-        self.save_fits_result(diff_image, diff_fits_path)
+        if not fast_mode or SignalBlobDetector is None:
+            self.save_fits_result(diff_image, diff_fits_path)
 
         # 初始化文件路径变量（快速模式下可能不会创建这些文件）
         binary_fits_path = None
@@ -721,8 +909,8 @@ class AlignedFITSComparator:
             with open(spots_txt_path, 'w', encoding='utf-8') as f:
                 f.write(f"已对齐FITS文件差异检测结果\n")
                 f.write(f"处理时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"参考文件: {os.path.basename(reference_file)}\n")
-                f.write(f"对齐文件: {os.path.basename(aligned_file)}\n")
+                f.write(f"参考文件: {os.path.basename(reference_file) if reference_file else '内存数据'}\n")
+                f.write(f"对齐文件: {os.path.basename(aligned_file) if aligned_file else '内存数据'}\n")
                 f.write(f"检测到新亮点数量: {len(bright_spots)}\n\n")
 
                 if bright_spots:
@@ -753,7 +941,10 @@ class AlignedFITSComparator:
             fast_mode=fast_mode,
             detection_method=detection_method,
             sort_by=sort_by,
-            generate_gif=generate_gif
+            generate_gif=generate_gif,
+            diff_data=diff_image,
+            reference_data=raw_ref_data,
+            aligned_data=raw_aligned_data
         )
         timing_stats['信号检测'] = time.time() - blob_start
         self.logger.info(f"⏱️  信号检测耗时: {timing_stats['信号检测']:.3f}秒")
@@ -767,6 +958,8 @@ class AlignedFITSComparator:
                 diff_fits_path = None  # 标记为已删除
             except Exception as e:
                 self.logger.warning(f"快速模式：删除中间文件失败: {e}")
+        elif fast_mode:
+            diff_fits_path = None  # 未写出
 
         if fast_mode:
             timing_stats['清理中间文件'] = time.time() - cleanup_start
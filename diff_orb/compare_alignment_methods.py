@@ -78,7 +78,10 @@ def compare_alignment_methods(fits_dir):
                 
                 print(f"✅ {name} 完成")
                 print(f"   对齐成功: {'是' if result['alignment_success'] else '否'}")
-                print(f"   特征匹配: {result['features_detected']['matches']} 个")
+                if result['features_detected'] is None:
+                    print("   特征匹配: 跳过（粗配准）")
+                else:
+                    print(f"   特征匹配: {result['features_detected']['matches']} 个")
                 print(f"   新亮点: {result['new_bright_spots']} 个")
             else:
                 print(f"❌ {name} 失败")
@@ -97,7 +100,7 @@ def compare_alignment_methods(fits_dir):
         
         for result in results:
             alignment_status = "成功" if result['alignment_success'] else "失败"
-            matches = result['features_detected']['matches']
+            matches = result['features_detected']['matches'] if result['features_detected'] else "跳过"
             bright_spots = result['new_bright_spots']
             
             print(f"{result['name']:<12} {alignment_status:<6} {matches:<8} {bright_spots:<8} {result['description']}")
@@ -21,6 +21,13 @@ import logging
 from datetime import datetime
 import warnings
 
+from coarse_registration import CoarseRegistration
+from asterism_matcher import AsterismMatcher, detect_star_centroids, estimate_similarity
+from template_feature_cache import (
+    TEMPLATE_FEATURE_CACHE_VERSION, get_template_feature_cache, params_hash,
+    keypoints_to_array, array_to_keypoints
+)
+
 # 忽略警告
 warnings.filterwarnings('ignore', category=RuntimeWarning)
 warnings.filterwarnings('ignore', category=UserWarning)
@@ -34,19 +41,28 @@ class FITSAlignmentComparison:
     """FITS图像对齐和差异检测系统"""
     
     def __init__(self, use_central_region=True, central_region_size=200,
-                 alignment_method='rigid'):
+                 alignment_method='rigid', use_template_feature_cache=True, feature_cache_dir=None,
+                 use_coarse_registration=True):
         """
         初始化对齐比较系统
 
         Args:
             use_central_region (bool): 是否使用中央区域抽取优化
             central_region_size (int): 中央区域大小
-            alignment_method (str): 对齐方法 ('rigid', 'similarity', 'homography')
+            alignment_method (str): 对齐方法 ('rigid', 'similarity', 'homography', 'asterism')
+                'asterism' 使用星点三角形匹配代替ORB特征，并用最小二乘拟合相似变换
+            use_template_feature_cache (bool): 是否缓存参考图像的预处理结果与ORB特征
+            feature_cache_dir (str): 参考图像特征的磁盘缓存目录，None表示只缓存在内存中
+            use_coarse_registration (bool): 特征匹配前先做FFT相位相关粗配准，结果可靠时跳过特征匹配
         """
         self.use_central_region = use_central_region
         self.central_region_size = central_region_size
         self.min_image_size = 300
         self.alignment_method = alignment_method
+        self.use_template_feature_cache = use_template_feature_cache
+        self.feature_cache = get_template_feature_cache(feature_cache_dir)
+        self.use_coarse_registration = use_coarse_registration
+        self.coarse_registration = CoarseRegistration()
         
         # 设置日志
         self.setup_logging()
@@ -70,6 +86,15 @@ class FITSAlignmentComparison:
             # 旧版本OpenCV可能不支持这个参数
             pass
         
+        # 星点三角形匹配参数（alignment_method='asterism'）
+        self.star_params = {
+            'max_stars': 200,
+            'sigma': 4.0,
+            'min_area': 3,
+            'max_area': 2000
+        }
+        self.asterism_matcher = AsterismMatcher(max_stars=self.star_params['max_stars'])
+
         # 差异检测参数
         self.diff_params = {
             'gaussian_sigma': 1.0,
@@ -196,13 +221,129 @@ class FITSAlignmentComparison:
             self.logger.error(f"图像预处理时出错: {str(e)}")
             return None
     
-    def detect_and_match_features(self, img1, img2):
+    def _feature_params_hash(self):
+        """影响参考图像预处理与特征提取结果的参数哈希"""
+        return params_hash({
+            'version': TEMPLATE_FEATURE_CACHE_VERSION,
+            'features': 'asterism' if self.alignment_method == 'asterism' else 'orb',
+            'orb': self.orb_params,
+            'stars': self.star_params,
+            'use_central_region': self.use_central_region,
+            'central_region_size': self.central_region_size,
+            'gaussian_sigma': self.diff_params['gaussian_sigma'],
+        })
+
+    def load_reference_features(self, fits_path, feature_cache_dir=None):
+        """
+        加载参考图像、预处理并提取ORB特征；同一文件内容与参数的结果从缓存读取
+
+        Args:
+            fits_path (str): 参考FITS文件路径
+            feature_cache_dir (str): 本次使用的特征磁盘缓存目录（如模板旁的目录），None表示使用构造时的设置
+
+        Returns:
+            tuple: (图像数据, header信息, 预处理图像, 关键点, 描述符, 是否成功)；缓存中的数组为只读
+        """
+        key = None
+        if self.use_template_feature_cache:
+            try:
+                key = (self.feature_cache.content_hash(fits_path), self._feature_params_hash())
+            except OSError as e:
+                self.logger.warning(f"无法计算参考图像哈希，不使用特征缓存: {str(e)}")
+            entry = self.feature_cache.get(key) if key else None
+            if entry is not None:
+                self.logger.info(f"参考图像特征缓存命中: {os.path.basename(fits_path)} ({len(entry['keypoint_list'])} 个特征点)")
+                return (entry['data'], entry['header'].copy(), entry['processed'],
+                        entry['keypoint_list'], entry['descriptors'], True)
+
+        image_data, header, success = self.load_fits_image(fits_path)
+        if not success:
+            return None, None, None, None, None, False
+        processed = self.preprocess_image(image_data)
+        if processed is None:
+            return image_data, header, None, None, None, False
+
+        features = self.feature_cache.load_features(key, feature_cache_dir) if key else None
+        if features is not None:
+            keypoint_array, descriptors = features
+            keypoints = array_to_keypoints(keypoint_array)
+            self.logger.info(f"已从磁盘读取参考图像特征: {len(keypoints)} 个特征点")
+        else:
+            keypoints, descriptors = self._extract_features(image_data, processed)
+            keypoint_array = keypoints_to_array(keypoints)
+            if key:
+                self.feature_cache.save_features(key, keypoint_array, descriptors, feature_cache_dir)
+
+        if key:
+            self.feature_cache.put(key, {
+                'data': image_data,
+                'header': header.copy(),
+                'processed': processed,
+                'keypoints': keypoint_array,
+                'keypoint_list': keypoints,
+                'descriptors': descriptors,
+            })
+        return image_data, header, processed, keypoints, descriptors, True
+
+    def _extract_features(self, image_data, processed):
+        """
+        提取单幅图像的特征：ORB关键点与描述符，或（asterism方法）亮星质心
+
+        Args:
+            image_data (np.ndarray): 原始浮点图像
+            processed (np.ndarray): 预处理后的uint8图像
+
+        Returns:
+            tuple: (关键点列表, 描述符)；星点以 cv2.KeyPoint 表示（response为通量），描述符为None
+        """
+        if self.alignment_method == 'asterism':
+            stars = detect_star_centroids(image_data, **self.star_params)
+            keypoints = [cv2.KeyPoint(float(x), float(y), 5.0, -1, float(flux)) for x, y, flux in stars]
+            return keypoints, None
+        orb = cv2.ORB_create(**self.orb_params)
+        return orb.detectAndCompute(processed, None)
+
+    def match_star_asterisms(self, image_data, reference_keypoints):
+        """
+        使用星点三角形匹配待对齐图像与参考图像
+
+        Args:
+            image_data (np.ndarray): 待对齐图像的原始浮点数据
+            reference_keypoints (list): 参考图像的星点（_extract_features 的结果）
+
+        Returns:
+            tuple: (内点对 (src_pts, dst_pts), 关键点1, 关键点2, 匹配结果)，与 detect_and_match_features 格式相同
+        """
+        try:
+            kp2, _ = self._extract_features(image_data, None)
+            kp1 = reference_keypoints or []
+            self.logger.info(f"检测到星点: 图像1={len(kp1)}, 图像2={len(kp2)}")
+
+            ref_points = np.array([kp.pt for kp in kp1], dtype=np.float64).reshape(-1, 2)
+            target_points = np.array([kp.pt for kp in kp2], dtype=np.float64).reshape(-1, 2)
+            result = self.asterism_matcher.find_transform(ref_points, target_points)
+            if result is None:
+                return None, kp1, kp2, None
+
+            matches = [cv2.DMatch(int(r), int(t), float(d))
+                       for t, r, d in zip(result['target_idx'], result['ref_idx'], result['residuals'])]
+            src_pts = np.float32(ref_points[result['ref_idx']]).reshape(-1, 1, 2)
+            dst_pts = np.float32(target_points[result['target_idx']]).reshape(-1, 1, 2)
+            self.logger.info(f"星点三角形匹配: {len(matches)} 对内点")
+            return (src_pts, dst_pts), kp1, kp2, matches
+
+        except Exception as e:
+            self.logger.error(f"星点三角形匹配时出错: {str(e)}")
+            return None, None, None, None
+
+    def detect_and_match_features(self, img1, img2, reference_features=None):
         """
         使用ORB检测特征点并进行匹配
         
         Args:
             img1 (np.ndarray): 参考图像
             img2 (np.ndarray): 待对齐图像
+            reference_features (tuple): 参考图像已提取的 (关键点, 描述符)，None时从img1重新提取
             
         Returns:
             tuple: (匹配点对, 关键点1, 关键点2, 匹配结果)
@@ -212,7 +353,10 @@ class FITSAlignmentComparison:
             orb = cv2.ORB_create(**self.orb_params)
             
             # 检测关键点和描述符
-            kp1, des1 = orb.detectAndCompute(img1, None)
+            if reference_features is not None:
+                kp1, des1 = reference_features
+            else:
+                kp1, des1 = orb.detectAndCompute(img1, None)
             kp2, des2 = orb.detectAndCompute(img2, None)
             
             self.logger.info(f"检测到特征点: 图像1={len(kp1)}, 图像2={len(kp2)}")
@@ -243,7 +387,7 @@ class FITSAlignmentComparison:
             self.logger.error(f"特征检测和匹配时出错: {str(e)}")
             return None, None, None, None
 
-    def align_images(self, img1, img2, match_points):
+    def align_images(self, img1, img2, match_points, coarse_transform=None):
         """
         使用适合天文图像的刚体变换对齐图像（平移+旋转，保持形状不变）
 
@@ -251,11 +395,19 @@ class FITSAlignmentComparison:
             img1 (np.ndarray): 参考图像
             img2 (np.ndarray): 待对齐图像
             match_points (tuple): 匹配点对 (src_pts, dst_pts)
+            coarse_transform (np.ndarray): 已通过复核的粗配准2x3矩阵，提供时直接使用，不再估计变换
 
         Returns:
             tuple: (对齐后的图像, 变换矩阵, 是否成功)
         """
         try:
+            if coarse_transform is not None:
+                self.logger.info("使用相位相关粗配准结果（跳过特征匹配）")
+                height, width = img1.shape
+                aligned_img2 = cv2.warpAffine(img2, coarse_transform, (width, height))
+                self.analyze_transformation(coarse_transform)
+                return aligned_img2, coarse_transform, True
+
             if match_points is None:
                 return img2, None, False
 
@@ -289,6 +441,11 @@ class FITSAlignmentComparison:
                     confidence=0.95
                 )
 
+            elif self.alignment_method == 'asterism':
+                # 星点三角形匹配已剔除误匹配，直接对全部内点做最小二乘相似变换
+                self.logger.info("使用星点三角形匹配的最小二乘相似变换")
+                transform_matrix = estimate_similarity(dst_pts_2d, src_pts_2d)
+
             elif self.alignment_method == 'homography':
                 # 单应性变换（包含透视变形）
                 self.logger.warning("使用单应性变换（可能包含透视变形）")
@@ -833,7 +990,8 @@ class FITSAlignmentComparison:
             self.logger.error(f"应用变换到原始图像时出错: {str(e)}")
             return original_img
 
-    def process_fits_comparison(self, fits_path1, fits_path2, output_dir=None, show_visualization=True):
+    def process_fits_comparison(self, fits_path1, fits_path2, output_dir=None, show_visualization=True,
+                                feature_cache_dir=None):
         """
         处理两个FITS文件的完整比较流程
 
@@ -842,6 +1000,7 @@ class FITSAlignmentComparison:
             fits_path2 (str): 待比较FITS文件路径
             output_dir (str): 输出目录（可选）
             show_visualization (bool): 是否显示可视化结果
+            feature_cache_dir (str): 参考图像特征的磁盘缓存目录（可选），见 load_reference_features
 
         Returns:
             dict: 处理结果摘要
@@ -851,37 +1010,56 @@ class FITSAlignmentComparison:
             self.logger.info("开始FITS图像对齐和差异检测")
             self.logger.info("=" * 60)
 
-            # 1. 加载FITS图像
+            # 1. 加载FITS图像（参考图像的加载、预处理与特征提取结果可从缓存读取）
             self.logger.info("步骤1: 加载FITS图像")
-            img1_data, header1, success1 = self.load_fits_image(fits_path1)
+            img1_data, header1, img1_processed, ref_kp, ref_des, success1 = self.load_reference_features(
+                fits_path1, feature_cache_dir)
             img2_data, header2, success2 = self.load_fits_image(fits_path2)
 
             if not success1 or not success2:
-                self.logger.error("FITS图像加载失败")
+                self.logger.error("FITS图像加载失败或参考图像预处理失败")
                 return None
 
-            # 保存原始图像数据的副本（用于FITS文件输出）
-            original_img1_data = img1_data.copy()
+            # 保存原始图像数据（用于FITS文件输出；参考图像数据只读，输出时才转换类型）
+            original_img1_data = img1_data
             original_img2_data = img2_data.copy()
 
             # 2. 图像预处理
             self.logger.info("步骤2: 图像预处理")
-            img1_processed = self.preprocess_image(img1_data)
             img2_processed = self.preprocess_image(img2_data)
 
-            if img1_processed is None or img2_processed is None:
+            if img2_processed is None:
                 self.logger.error("图像预处理失败")
                 return None
 
+            # 2.5 相位相关粗配准：峰值尖锐且全分辨率复核通过时跳过特征匹配
+            coarse = None
+            if self.use_coarse_registration and self.alignment_method in ('rigid', 'similarity', 'asterism'):
+                self.logger.info("步骤2.5: FFT相位相关粗配准")
+                try:
+                    coarse = self.coarse_registration.register(img1_data, img2_data)
+                except Exception as e:
+                    self.logger.warning(f"粗配准出错，使用特征匹配: {str(e)}")
+                    coarse = None
+            coarse_accepted = bool(coarse and coarse['accepted'])
+
             # 3. 特征检测和匹配
             self.logger.info("步骤3: 特征检测和匹配")
-            match_points, kp1, kp2, matches = self.detect_and_match_features(img1_processed, img2_processed)
+            if coarse_accepted:
+                self.logger.info("粗配准已通过复核，跳过特征检测和匹配")
+                match_points, kp1, kp2, matches = None, [], [], []
+            elif self.alignment_method == 'asterism':
+                match_points, kp1, kp2, matches = self.match_star_asterisms(img2_data, ref_kp)
+            else:
+                match_points, kp1, kp2, matches = self.detect_and_match_features(
+                    img1_processed, img2_processed, reference_features=(ref_kp, ref_des)
+                )
 
             # 3.1 分析匹配质量
             self.analyze_match_quality(matches, kp1, kp2)
 
             # 3.2 可视化特征点匹配（如果启用可视化）
-            if show_visualization and output_dir:
+            if show_visualization and output_dir and not coarse_accepted:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
                 # 可视化特征点匹配
@@ -895,7 +1073,8 @@ class FITSAlignmentComparison:
             # 4. 图像对齐
             self.logger.info("步骤4: 图像对齐")
             img2_aligned, homography, alignment_success = self.align_images(
-                img1_processed, img2_processed, match_points
+                img1_processed, img2_processed, match_points,
+                coarse_transform=coarse['matrix'] if coarse_accepted else None
             )
 
             # 4.1 对原始图像应用相同的变换（用于FITS文件保存）
@@ -947,11 +1126,19 @@ class FITSAlignmentComparison:
                 'success': True,
                 'files_processed': [fits_path1, fits_path2],
                 'alignment_success': alignment_success,
-                'features_detected': {
+                # 粗配准被采用时没有执行特征检测与匹配
+                'features_detected': None if coarse_accepted else {
                     'image1': len(kp1) if kp1 else 0,
                     'image2': len(kp2) if kp2 else 0,
                     'matches': len(matches) if matches else 0
                 },
+                'coarse_registration': None if coarse is None else {
+                    'accepted': coarse_accepted,
+                    'rotation': coarse['rotation'],
+                    'shift': coarse['shift'],
+                    'response': coarse['response'],
+                    'residual_px': coarse['max_residual'],
+                },
                 'new_bright_spots': len(bright_spots),
                 'bright_spots_details': [
                     {'position': (cx, cy), 'area': area}
@@ -983,8 +1170,8 @@ def main():
     parser.add_argument('--no-visualization', action='store_true', help='不显示可视化结果')
     parser.add_argument('--no-central-region', action='store_true', help='不使用中央区域优化')
     parser.add_argument('--region-size', type=int, default=200, help='中央区域大小（默认200）')
-    parser.add_argument('--alignment-method', choices=['rigid', 'similarity', 'homography'],
-                       default='rigid', help='对齐方法：rigid(刚体), similarity(相似), homography(单应性)')
+    parser.add_argument('--alignment-method', choices=['rigid', 'similarity', 'homography', 'asterism'],
+                       default='rigid', help='对齐方法：rigid(刚体), similarity(相似), homography(单应性), asterism(星点三角形)')
 
     args = parser.parse_args()
 
@@ -151,8 +151,8 @@ def main():
     parser.add_argument('--region-size', type=int, default=200, help='中央区域大小（默认200像素）')
 
     # 对齐方法选项
-    parser.add_argument('--alignment-method', choices=['rigid', 'similarity', 'homography'],
-                       default='rigid', help='图像对齐方法：rigid(刚体变换，推荐), similarity(相似变换), homography(单应性变换)')
+    parser.add_argument('--alignment-method', choices=['rigid', 'similarity', 'homography', 'asterism'],
+                       default='rigid', help='图像对齐方法：rigid(刚体变换，推荐), similarity(相似变换), homography(单应性变换), asterism(星点三角形匹配)')
 
     # 高级选项
     parser.add_argument('--gaussian-sigma', type=float, default=1.0, help='高斯模糊参数（默认1.0）')
@@ -242,9 +242,12 @@ def main():
             print("处理完成！")
             print("=" * 60)
             print(f"对齐成功: {'是' if result['alignment_success'] else '否'}")
-            print(f"特征点检测: 图像1={result['features_detected']['image1']}, "
-                  f"图像2={result['features_detected']['image2']}, "
-                  f"匹配={result['features_detected']['matches']}")
+            if result['features_detected'] is None:
+                print("特征点检测: 跳过（粗配准已对齐）")
+            else:
+                print(f"特征点检测: 图像1={result['features_detected']['image1']}, "
+                      f"图像2={result['features_detected']['image2']}, "
+                      f"匹配={result['features_detected']['matches']}")
             print(f"新亮点数量: {result['new_bright_spots']}")
             
             if result['bright_spots_details']:
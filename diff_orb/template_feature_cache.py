@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+模板ORB特征缓存
+同一天区的所有帧都与同一模板比较，模板侧的加载、预处理与ORB特征提取结果只需计算一次。
+内存缓存保存 (原始数据, 头部, 预处理图像, 关键点, 描述符)；可选的磁盘缓存只保存关键点与描述符
+（通常放在模板目录旁，由调用方按次指定目录）。
+键为文件内容哈希 + ORB/预处理参数哈希，模板内容或参数变化后自动失效
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import cv2
+
+
+TEMPLATE_FEATURE_CACHE_VERSION = 1
+
+# 内存缓存默认上限：约4个 9k x 6k 模板（float32原图 + uint8预处理图）；
+# 批量处理设置 template_feature_cache_mb 可调整，Diff进程池中每个子进程各占一份
+DEFAULT_MAX_BYTES = 1200 * 1024 * 1024
+
+# 磁盘缓存默认放在模板所在目录下的子目录
+TEMPLATE_FEATURE_CACHE_SUBDIR = 'orb_feature_cache'
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """文件内容的SHA1（降噪后的模板每次写到新的输出目录，只能按内容识别）"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def params_hash(params):
+    """特征提取参数的稳定哈希"""
+    text = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def keypoints_to_array(keypoints):
+    """cv2.KeyPoint 列表 -> (N, 7) float64 数组：x, y, size, angle, response, octave, class_id"""
+    if not keypoints:
+        return np.empty((0, 7), dtype=np.float64)
+    return np.array([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+                     for kp in keypoints], dtype=np.float64)
+
+
+def array_to_keypoints(array):
+    """keypoints_to_array 的逆变换"""
+    return [cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in array]
+
+
+class TemplateFeatureCache:
+    """线程安全的模板特征缓存（内存LRU + 可选磁盘缓存）"""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        """
+        Args:
+            max_bytes (int): 内存缓存总字节数上限
+            cache_dir (str): 磁盘缓存目录，None表示只使用内存缓存
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = int(max_bytes)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hash_memo = {}
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, path):
+        """按 (路径, mtime, 大小) 记忆的内容哈希"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stat_key = (path, st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._hash_memo.get(stat_key)
+        if cached:
+            return cached
+        digest = file_content_hash(path)
+        with self._lock:
+            if len(self._hash_memo) > 10000:
+                self._hash_memo.clear()
+            self._hash_memo[stat_key] = digest
+        return digest
+
+    @staticmethod
+    def _entry_bytes(entry):
+        return sum(entry[k].nbytes for k in ('data', 'processed', 'keypoints', 'descriptors')
+                   if entry.get(k) is not None)
+
+    def get(self, key):
+        """读取内存缓存条目，未命中返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        """
+        写入内存缓存
+
+        Args:
+            key (tuple): (内容哈希, 参数哈希)
+            entry (dict): {'data', 'header', 'processed', 'keypoints', 'descriptors'}，数组会被设为只读
+        """
+        for name in ('data', 'processed', 'keypoints', 'descriptors'):
+            if entry.get(name) is not None:
+                entry[name].setflags(write=False)
+        size = self._entry_bytes(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._entry_bytes(old)
+            while self._entries and self._bytes + size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted)
+            self._entries[key] = entry
+            self._bytes += size
+
+    def resize(self, max_bytes):
+        """调整内存缓存上限（缩小时立即淘汰最久未用的条目）"""
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            while self._entries and self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted)
+
+    def _disk_path(self, key, cache_dir):
+        return os.path.join(cache_dir, f"{key[0]}_{key[1]}.orbfeat.npz")
+
+    def load_features(self, key, cache_dir=None):
+        """
+        从磁盘读取 (关键点数组, 描述符)，没有磁盘缓存或读取失败时返回None
+
+        Args:
+            key (tuple): (内容哈希, 参数哈希)
+            cache_dir (str): 磁盘缓存目录，None表示使用构造时的目录
+        """
+        cache_dir = cache_dir or self.cache_dir
+        if not cache_dir:
+            return None
+        path = self._disk_path(key, cache_dir)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as arrays:
+                if int(arrays['version']) != TEMPLATE_FEATURE_CACHE_VERSION:
+                    return None
+                descriptors = arrays['descriptors']
+                return arrays['keypoints'], (descriptors if descriptors.size else None)
+        except Exception as e:
+            self.logger.warning(f"读取模板特征缓存失败 {path}: {e}")
+            return None
+
+    def save_features(self, key, keypoints, descriptors, cache_dir=None):
+        """把关键点数组与描述符写入磁盘缓存（临时文件 + 替换），cache_dir 含义同 load_features"""
+        cache_dir = cache_dir or self.cache_dir
+        if not cache_dir:
+            return
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            path = self._disk_path(key, cache_dir)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+            np.savez(tmp_path, version=TEMPLATE_FEATURE_CACHE_VERSION, keypoints=keypoints,
+                     descriptors=descriptors if descriptors is not None else np.empty((0, 32), dtype=np.uint8))
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"写入模板特征缓存失败: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+_shared_max_bytes = DEFAULT_MAX_BYTES
+
+
+def default_feature_cache_dir(template_path):
+    """模板旁的磁盘缓存目录：<模板目录>/orb_feature_cache"""
+    return os.path.join(os.path.dirname(os.path.abspath(template_path)), TEMPLATE_FEATURE_CACHE_SUBDIR)
+
+
+def configure_template_feature_cache(max_bytes):
+    """
+    设置进程内共享缓存的内存上限（已创建的缓存立即按新上限淘汰）
+
+    Args:
+        max_bytes (int): 内存缓存总字节数上限
+    """
+    global _shared_max_bytes
+    with _shared_lock:
+        _shared_max_bytes = max(0, int(max_bytes))
+        caches = list(_shared_caches.values())
+    for cache in caches:
+        cache.resize(_shared_max_bytes)
+
+
+def get_template_feature_cache(cache_dir=None):
+    """按磁盘缓存目录共享的模板特征缓存"""
+    with _shared_lock:
+        cache = _shared_caches.get(cache_dir)
+        if cache is None:
+            cache = TemplateFeatureCache(max_bytes=_shared_max_bytes, cache_dir=cache_dir)
+            _shared_caches[cache_dir] = cache
+        return cache
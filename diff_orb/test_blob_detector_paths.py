@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+测试斑点检测的进程内执行与子进程执行（signal_blob_detector.py）输出一致
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import compare_aligned_fits
+from compare_aligned_fits import AlignedFITSComparator
+
+
+def _images(shape=(256, 256), seed=0):
+    """模板图像与带若干新亮点的对齐图像"""
+    rng = np.random.default_rng(seed)
+    reference = rng.normal(100.0, 5.0, shape).astype(np.float32)
+    aligned = reference + rng.normal(0.0, 1.0, shape).astype(np.float32)
+    yy, xx = np.mgrid[:shape[0], :shape[1]]
+    for cx, cy in ((60, 70), (150, 40), (200, 190)):
+        aligned += 400.0 * np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * 2.0 ** 2))
+    return reference, aligned
+
+
+def _outputs(directory):
+    """输出文件的相对路径（去掉带时间戳的 detection_* 目录名，报告文本内含时间戳，只比较文件名）"""
+    names = []
+    for root, _, files in os.walk(directory):
+        parts = os.path.relpath(root, directory).split(os.sep)
+        parts = [p for p in parts if p != '.' and not p.startswith('detection_')]
+        names.extend('/'.join(parts + [f]) for f in files)
+    return sorted(names)
+
+
+@pytest.mark.skipif(compare_aligned_fits.SignalBlobDetector is None, reason="斑点检测引擎不可用")
+def test_in_process_matches_subprocess(tmp_path, monkeypatch):
+    comparator = AlignedFITSComparator()
+    reference, aligned = _images()
+    diff = np.abs(aligned - reference)
+
+    inputs = tmp_path / 'inputs'
+    inputs.mkdir()
+    reference_file = str(inputs / 'K001-1_template.fits')
+    aligned_file = str(inputs / 'GY1_K001-1_aligned.fits')
+    comparator.save_fits_result(reference, reference_file)
+    comparator.save_fits_result(aligned, aligned_file)
+
+    results = {}
+    for mode in ('in_process', 'subprocess'):
+        output_dir = tmp_path / mode
+        output_dir.mkdir()
+        diff_fits_path = str(output_dir / 'aligned_comparison_difference.fits')
+        comparator.save_fits_result(diff, diff_fits_path)
+        kwargs = dict(reference_file=reference_file, aligned_file=aligned_file, fast_mode=True)
+        if mode == 'in_process':
+            kwargs.update(diff_data=diff, reference_data=reference, aligned_data=aligned)
+            result = comparator.run_signal_blob_detector(diff_fits_path, str(output_dir), **kwargs)
+            assert 'blobs' in result
+        else:
+            monkeypatch.setattr(compare_aligned_fits, 'SignalBlobDetector', None)
+            result = comparator.run_signal_blob_detector(diff_fits_path, str(output_dir), **kwargs)
+        assert result and result['success'], result
+        results[mode] = _outputs(output_dir)
+
+    assert results['in_process'] == results['subprocess']
+    # 差异图不带WCS，截图按像素坐标命名（与文件名解析保持一致）
+    cutouts = [name.split('/')[-1] for name in results['in_process'] if name.startswith('cutouts/')]
+    assert cutouts and all(name[4] == 'X' for name in cutouts)
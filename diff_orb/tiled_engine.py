@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+分块并行执行引擎
+把整幅图像切成带重叠边缘（halo）的图块，在线程池中逐块执行SciPy/OpenCV内核（这些内核计算时释放GIL），
+结果按图块核心区域写回输出数组。临时数组的大小由图块尺寸决定，不再随整幅图像增长；
+halo 取内核的支持半径，图块结果与整幅图像一次计算完全一致
+"""
+
+import os
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import ndimage
+
+
+DEFAULT_TILE_SIZE = 1024
+
+# core: 图块核心区域在整幅图像中的切片；padded: 含halo的读取区域；inner: 核心区域在padded中的切片
+Tile = namedtuple('Tile', ['core', 'padded', 'inner'])
+
+
+def gaussian_halo(sigma, truncate=4.0):
+    """scipy.ndimage.gaussian_filter 的核半径（与其内部计算方式相同）"""
+    return int(truncate * float(sigma) + 0.5)
+
+
+def median_halo(size):
+    """median_filter(size) 的支持半径"""
+    return int(size) // 2
+
+
+def split_tiles(shape, tile_size=DEFAULT_TILE_SIZE, halo=0):
+    """
+    把二维形状切成图块
+
+    Args:
+        shape (tuple): 图像形状 (height, width)
+        tile_size (int): 图块边长
+        halo (int): 每侧重叠像素数（在图像边界处截断，边界处理仍由内核自身完成）
+
+    Returns:
+        list: Tile 列表（行优先）
+    """
+    height, width = shape[:2]
+    tiles = []
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        py0, py1 = max(0, y0 - halo), min(height, y1 + halo)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            px0, px1 = max(0, x0 - halo), min(width, x1 + halo)
+            tiles.append(Tile(
+                core=(slice(y0, y1), slice(x0, x1)),
+                padded=(slice(py0, py1), slice(px0, px1)),
+                inner=(slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0)),
+            ))
+    return tiles
+
+
+class TiledExecutor:
+    """分块执行器：warp、模糊、差分与掩码共用同一个线程池"""
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, max_workers=None):
+        """
+        Args:
+            tile_size (int): 图块边长（像素）；float32下单个1024图块约4MB
+            max_workers (int): 线程数，None表示 min(8, CPU核数)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.tile_size = max(64, int(tile_size))
+        self.max_workers = max(1, int(max_workers or min(8, os.cpu_count() or 1)))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='tile')
+            return self._pool
+
+    def run(self, func, shape, halo=0):
+        """
+        对每个图块执行 func(tile)
+
+        Args:
+            func (callable): 接收 Tile，返回任意结果
+            shape (tuple): 图像形状
+            halo (int): 重叠像素数
+
+        Returns:
+            list: 按图块顺序排列的结果
+        """
+        tiles = split_tiles(shape, self.tile_size, halo)
+        if self.max_workers == 1 or len(tiles) == 1:
+            return [func(tile) for tile in tiles]
+        return list(self._executor().map(func, tiles))
+
+    def apply(self, func, inputs, out_dtypes, halo=0):
+        """
+        逐块计算 func(*含halo的输入切片)，把结果的核心区域写入输出数组
+
+        Args:
+            func (callable): 返回与输入切片同形状的数组，或多个数组组成的元组
+            inputs (list): 同形状的二维输入数组（只读取，不修改）
+            out_dtypes: 输出数组的dtype；多个输出时为dtype元组
+            halo (int): 内核需要的重叠像素数
+
+        Returns:
+            np.ndarray 或 tuple: 输出数组（与 out_dtypes 对应）
+        """
+        shape = inputs[0].shape
+        single = not isinstance(out_dtypes, (tuple, list))
+        dtypes = (out_dtypes,) if single else tuple(out_dtypes)
+        outputs = tuple(np.empty(shape, dtype=dtype) for dtype in dtypes)
+
+        def work(tile):
+            results = func(*(array[tile.padded] for array in inputs))
+            if single:
+                results = (results,)
+            for out, result in zip(outputs, results):
+                out[tile.core] = result[tile.inner]
+
+        self.run(work, shape, halo)
+        return outputs[0] if single else outputs
+
+    def gaussian_filter(self, image, sigma):
+        """分块 scipy.ndimage.gaussian_filter（结果与整幅计算一致）"""
+        image = np.asarray(image)
+        return self.apply(lambda block: ndimage.gaussian_filter(block, sigma=sigma),
+                          [image], image.dtype, halo=gaussian_halo(sigma))
+
+    def median_filter(self, image, size):
+        """分块 scipy.ndimage.median_filter（结果与整幅计算一致）"""
+        image = np.asarray(image)
+        return self.apply(lambda block: ndimage.median_filter(block, size=size),
+                          [image], image.dtype, halo=median_halo(size))
+
+    def mask(self, image, mask):
+        """分块 image * mask（保持image的dtype）"""
+        image = np.asarray(image)
+        return self.apply(lambda block, m: block * m, [image, mask], image.dtype)
+
+    def remap(self, data, coordinates, shape, order=1, cval=0.0):
+        """
+        分块 scipy.ndimage.map_coordinates：输出像素 (r, c) 取 data 在 coordinates 给出位置的插值
+
+        Args:
+            data (np.ndarray): 源图像
+            coordinates (callable): coordinates(rows, cols) -> (y, x)，rows/cols为输出图块切片，
+                返回图块形状的源图像坐标；坐标可以按图块现算，不必整幅保存
+            shape (tuple): 输出形状
+            order (int): 插值阶数
+            cval (float): 超出源图像的填充值
+
+        Returns:
+            tuple: (重采样结果, 落在源图像内的有效坐标数)
+        """
+        data = np.asarray(data)
+        output = np.empty(shape, dtype=data.dtype)
+        src_h, src_w = data.shape[:2]
+
+        def work(tile):
+            y, x = coordinates(*tile.core)
+            valid = int(np.count_nonzero((x >= 0) & (x < src_w) & (y >= 0) & (y < src_h)
+                                         & np.isfinite(x) & np.isfinite(y)))
+            output[tile.core] = ndimage.map_coordinates(data, [y, x], order=order, cval=cval, prefilter=False)
+            return valid
+
+        valid_count = sum(self.run(work, shape))
+        return output, valid_count
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+_shared_executor = None
+_shared_lock = threading.Lock()
+
+
+def configure_tiled_executor(tile_size=None, max_workers=None):
+    """
+    设置进程内共享执行器的参数（Diff进程池的子进程按CPU核数均分线程，避免超额订阅）
+
+    Args:
+        tile_size (int): 图块边长，None表示保持不变
+        max_workers (int): 线程数，None表示保持不变
+    """
+    global _shared_executor
+    with _shared_lock:
+        old = _shared_executor
+        _shared_executor = TiledExecutor(
+            tile_size=tile_size or (old.tile_size if old else DEFAULT_TILE_SIZE),
+            max_workers=max_workers or (old.max_workers if old else None),
+        )
+    if old is not None:
+        old.shutdown()
+    return _shared_executor
+
+
+def get_tiled_executor():
+    """进程内共享的分块执行器"""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = TiledExecutor()
+        return _shared_executor
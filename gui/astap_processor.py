@@ -14,17 +14,20 @@ from pathlib import Path
 from typing import Optional, Dict, Tuple
 
 from filename_parser import FITSFilenameParser
+from fits_header_probe import get_header_probe
+from plate_solve_cache import get_fast_plate_solver
 
 
 class ASTAPProcessor:
     """ASTAP处理器类"""
     
-    def __init__(self, config_path: str = "config/url_config.json"):
+    def __init__(self, config_path: str = "config/url_config.json", fast_solve_settings: dict = None):
         """
         初始化ASTAP处理器
         
         Args:
             config_path (str): 配置文件路径
+            fast_solve_settings (dict): 快速求解设置（GUI配置 plate_solve_fast_path），覆盖配置文件中的同名项
         """
         self.config_path = config_path
         self.config_data = None
@@ -33,6 +36,11 @@ class ASTAPProcessor:
         
         # 加载配置
         self._load_config()
+
+        # 基于上次ASTAP解的快速求解（配置项 plate_solve_fast_path 可覆盖默认参数，默认关闭）
+        fast_settings = dict((self.config_data or {}).get('plate_solve_fast_path') or {})
+        fast_settings.update(fast_solve_settings or {})
+        self.fast_solver = get_fast_plate_solver(fast_settings)
     
     def _load_config(self):
         """加载配置文件"""
@@ -211,11 +219,7 @@ class ASTAPProcessor:
             
             # 1. 如果已经有ASTAP/WCS结果，则跳过
             try:
-                from astropy.io import fits
-                with fits.open(fits_file_path) as hdul:
-                    hdr = hdul[0].header
-                    has_wcs = ("CRVAL1" in hdr and "CRVAL2" in hdr) or ("ASTAP" in hdr or "ASTAP0" in hdr)
-                if has_wcs:
+                if get_header_probe().has_astap_solution(fits_file_path):
                     self.logger.info(f"文件已包含WCS/ASTAP结果，跳过ASTAP处理: {fits_file_path}")
                     return True
             except Exception:
@@ -233,6 +237,13 @@ class ASTAPProcessor:
 
             self.logger.info(f"提取到天区编号: {k_full}")
 
+            # 快速路径：用同一望远镜、同一天区的参考星表在进程内拟合WCS，不满足阈值时继续走ASTAP
+            parsed_info = self.filename_parser.parse_filename(filename) or {}
+            telescope = parsed_info.get('tel_name', '')
+            if self.fast_solver.available and self.fast_solver.solve(fits_file_path, telescope, k_full):
+                self.logger.info(f"FITS文件处理完成（快速求解）: {fits_file_path}")
+                return True
+
             # 2. 获取坐标
             coordinates = self.get_coordinates_for_region(k_full)
             if not coordinates:
@@ -259,6 +270,8 @@ class ASTAPProcessor:
 
             if success:
                 self.logger.info(f"FITS文件处理完成: {fits_file_path}")
+                if self.fast_solver.available and get_header_probe().has_wcs(fits_file_path):
+                    self.fast_solver.update_reference(fits_file_path, telescope, k_full)
             else:
                 self.logger.error(f"FITS文件处理失败: {fits_file_path}")
                 self.logger.error(f"  执行的命令: {command}")
@@ -64,12 +64,13 @@ class ConfigManager:
                 "max_workers_limit": 1,  # 锁定为1，不允许修改
                 "max_workers_enabled": False,  # 禁用并发数设置
                 "retry_times": 3,
-                "timeout": 30
+                "timeout": 30,
+                "pipeline_download_workers": 4  # 流水线处理（下载→ASTAP→Diff）的并发下载线程数
             },
             "batch_process_settings": {
                 "thread_count": 4,  # 批量处理线程数（GUI默认值：4）
                 "noise_method": "median",  # 降噪方式: median, gaussian, none（GUI默认值：median，对应Adaptive Median选中）
-                "alignment_method": "ecc",  # 对齐方式: orb, ecc, none（GUI默认值：ecc，对应WCS选中）
+                "alignment_method": "ecc",  # 对齐方式: orb, asterism, ecc, none（GUI默认值：ecc，对应WCS选中）
                 "remove_bright_lines": True,  # 是否去除亮线（GUI默认值：True）
                 "fast_mode": True,  # 是否启用快速模式（GUI默认值：True）
                 "stretch_method": "percentile",  # 拉伸方法: percentile, minmax, asinh（GUI默认值：percentile）
@@ -85,6 +86,20 @@ class ConfigManager:
                 "science_bg_mode": "off",  # 科学图背景处理模式: off, scheme_a, scheme_b
                 "diff_calc_mode": "abs",  # 差异计算方式: abs(绝对值) 或 signed(带符号)
                 "apply_diff_postprocess": False,  # 是否对difference.fits执行后处理（负值置零+中值滤波）
+                "in_memory_pipeline": False,  # Diff内存流水线：步骤间传递数组，只写出最终产物（仅WCS对齐生效）
+                "diff_executor": "thread",  # Diff执行方式: thread(GUI进程内线程) 或 process(独立进程池，绕开GIL)
+                "diff_process_workers": 0,  # Diff进程数（0表示与thread_count相同）
+                "adaptive_pipeline_scheduler": False,  # 流水线按队列深度/耗时/CPU/内存在ASTAP与Diff间动态分配并发（thread_count为两阶段并发之和）
+                "pipeline_cpu_budget": 0,  # ASTAP+Diff并发总数的额外上限（0表示只按thread_count）
+                "pipeline_memory_budget_mb": 0,  # 本进程及子进程内存上限MB（0表示物理内存的75%，需psutil）
+                "diff_worker_memory_mb": 1200,  # 单个Diff任务的内存估计MB，用于限制Diff并发（不含重投影缓存与模板特征缓存）
+                "reprojection_cache_mb": 256,  # WCS重投影坐标网格缓存上限MB（进程池模式下每个子进程各一份）
+                "template_feature_cache_mb": 1200,  # 模板ORB特征内存缓存上限MB（进程池模式下每个子进程各一份）
+                "template_feature_cache_disk": True,  # 模板关键点与描述符同时写入磁盘缓存
+                "template_feature_cache_dir": "",  # 磁盘缓存目录（为空时使用模板所在目录下的 orb_feature_cache）
+                "job_ledger_enabled": True,  # 流水线任务账本（SQLite），重新运行时跳过已完成阶段
+                "job_ledger_path": "",  # 账本路径（为空时使用 Diff输出根目录/job_ledger.sqlite）
+                "job_ledger_retry_failed": ["download", "astap", "diff"],  # 上次失败后重新运行时允许重试的阶段
                 "enable_line_detection_filter": True,  # 批量导出时是否启用直线检测过滤（GUI默认值：True，启用）
                 # Alignment quality batch cleanup settings
                 "alignment_prune_non_high": True,  # 批量检测对齐时，清除“不是高分目标”的记录与检测结果文件（默认清除）
@@ -116,6 +131,9 @@ class ConfigManager:
                 "max_center_distance": 2400,  # 检测结果距离中心像素的最大距离（默认值：2400）
                 "auto_enable_threshold": 50  # 检测目标超过此数量时自动启用过滤（默认值：50）
             },
+            "plate_solve_fast_path": {
+                "enabled": False  # 是否先用同一天区的历史ASTAP解在进程内快速拟合WCS（默认关闭，失败时仍走ASTAP）
+            },
             "ai_classification_settings": {
                 "confidence_threshold": 0.5  # AI GOOD/BAD 自动标记置信度阈值（默认：0.7）
             },
@@ -132,7 +150,9 @@ class ConfigManager:
                 "tri_points": 35,                 # 构三角形的亮星点池大小
                 "tri_inlier_thr_px": 4.0,         # 内点距离阈值（像素）
                 "tri_bin_scale": 60,              # 三角形形状量化尺度
-                "tri_topk": 5                     # 可视化记录的Top-K三角形
+                "tri_topk": 5,                    # 可视化记录的Top-K三角形
+                "coarse_phase_min_response": 0.3, # 相位相关粗配准峰值响应下限（达到时跳过星点匹配）
+                "coarse_accept_px": 1.0           # 粗配准直接采用的最大残余平移（像素）
             },
             "display_settings": {
                 "default_display_mode": "linear",
@@ -153,10 +173,14 @@ class ConfigManager:
                 "mpc_h_limit": 20,
                 "ephemeris_file_path": "",
                 "last_ephemeris_update": "",
+                "ephemeris_cache_dir": "",  # 夜间星历缓存目录（为空时使用 gui/ephemeris_cache）
                 "asteroid_query_method": "auto",  # 小行星查询方式: auto/skybot/local/pympc
                 "pympc_catalog_path": "",
                 "last_pympc_update": "",
-                "pympc_use_observatory": False  # 使用pympc时是否使用观测站代码，默认不使用
+                "pympc_use_observatory": False,  # 使用pympc时是否使用观测站代码，默认不使用
+                "tle_file_path": "",  # 本地卫星TLE文件（为空时使用 gui/tle/active.tle）
+                "tle_source_url": "https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle",
+                "last_tle_update": ""
             },
             "url_template_type": "standard",  # "standard" 或 "with_year"
             # URL模板现在从独立的URL配置文件中读取
@@ -474,6 +498,13 @@ class ConfigManager:
             self.config["alignment_tuning_settings"][key] = value
         self.save_config()
 
+    def get_plate_solve_fast_path_settings(self) -> Dict[str, Any]:
+        """获取快速天体测量（基于历史ASTAP解）设置"""
+        if "plate_solve_fast_path" not in self.config:
+            self.config["plate_solve_fast_path"] = self.default_config.get("plate_solve_fast_path", {}).copy()
+            self.save_config()
+        return self.config["plate_solve_fast_path"]
+
     def get_ai_classification_settings(self) -> Dict[str, Any]:
         """获取AI GOOD/BAD 自动标记相关设置"""
         if "ai_classification_settings" not in self.config:
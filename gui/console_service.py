@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+无GUI批处理服务
+常驻进程通过本地HTTP接口接收任务（日期/系统/天区），以有界并发执行，
+进程内保持已导入的模块、DiffOrbIntegration、模板查找与目录列表缓存等热状态
+
+接口（JSON）：
+    POST   /jobs          提交任务 {"date": "YYYYMMDD", "telescope": "GY1", "region": "K019"}
+                          （Content-Type 必须为 application/json）
+    GET    /jobs          列出任务
+    GET    /jobs/<id>     查询任务状态
+    DELETE /jobs/<id>     取消任务（排队中直接取消，运行中在当前文件/天区结束后停止）
+    GET    /health        服务状态
+
+已结束的任务保留 history_ttl 秒，且最多保留 max_history 条，超出后从最早结束的开始清除
+"""
+
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class BatchJobService:
+    """任务登记与有界并发执行"""
+
+    def __init__(self, run_job: Callable[[Dict, threading.Event], Dict],
+                 validate_job: Optional[Callable[[Dict], None]] = None, max_workers: int = 1,
+                 max_history: int = 200, history_ttl: float = 24 * 3600.0):
+        """
+        Args:
+            run_job (Callable): 执行任务的函数 (params, stop_event) -> 结果字典
+            validate_job (Optional[Callable]): 提交时校验参数，不合法时抛出 ValueError
+            max_workers (int): 同时执行的任务数
+            max_history (int): 最多保留的已结束任务数
+            history_ttl (float): 已结束任务的保留时间（秒）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.run_job = run_job
+        self.validate_job = validate_job
+        self.max_workers = max(1, int(max_workers))
+        self.max_history = max(0, int(max_history))
+        self.history_ttl = float(history_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-job')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        self._stop_events: Dict[str, threading.Event] = {}
+        self._futures = {}
+        self.started = time.time()
+
+    def submit(self, params: Dict) -> Dict:
+        """登记并排队一个任务，返回任务状态"""
+        if self.validate_job:
+            self.validate_job(params)
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'params': params,
+            'status': JOB_QUEUED,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'result': None,
+            'error': None,
+        }
+        with self._lock:
+            self._evict_finished()
+            self._jobs[job_id] = job
+            self._stop_events[job_id] = threading.Event()
+            self._futures[job_id] = self._executor.submit(self._run, job_id)
+        self.logger.info(f"任务已排队 {job_id}: {params}")
+        return self.get(job_id)
+
+    def _evict_finished(self):
+        """清除超过保留时间或超出保留条数的已结束任务（调用方持有锁）"""
+        now = time.time()
+        finished = sorted((job for job in self._jobs.values()
+                           if job['status'] in FINISHED_STATES and job['finished'] is not None),
+                          key=lambda j: j['finished'])
+        expired = [job for job in finished if now - job['finished'] > self.history_ttl]
+        kept = finished[len(expired):]
+        if len(kept) > self.max_history:
+            expired += kept[:len(kept) - self.max_history]
+        for job in expired:
+            job_id = job['id']
+            self._jobs.pop(job_id, None)
+            self._stop_events.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def _run(self, job_id: str):
+        with self._lock:
+            job = self._jobs[job_id]
+            stop_event = self._stop_events[job_id]
+            if job['status'] == JOB_CANCELLED:
+                return
+            job['status'] = JOB_RUNNING
+            job['started'] = time.time()
+        self.logger.info(f"任务开始 {job_id}: {job['params']}")
+        try:
+            result = self.run_job(job['params'], stop_event)
+            status, error = (JOB_CANCELLED if stop_event.is_set() else JOB_DONE), None
+        except Exception as e:
+            self.logger.exception(f"任务失败 {job_id}: {e}")
+            result, status, error = None, JOB_FAILED, str(e)
+        with self._lock:
+            job.update(status=status, result=result, error=error, finished=time.time())
+        self.logger.info(f"任务结束 {job_id}: {status}")
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            self._evict_finished()
+            return [dict(job) for job in sorted(self._jobs.values(), key=lambda j: j['submitted'])]
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """取消任务：排队中的不再执行，运行中的通过停止事件在安全点退出"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            if job['status'] == JOB_QUEUED:
+                job.update(status=JOB_CANCELLED, finished=time.time())
+                self._futures[job_id].cancel()
+            self._stop_events[job_id].set()
+        return self.get(job_id)
+
+    def health(self) -> Dict:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {'status': 'ok', 'uptime': time.time() - self.started,
+                'max_workers': self.max_workers, 'jobs': counts}
+
+    def shutdown(self):
+        """停止所有任务并等待运行中的任务退出"""
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job['status'] in (JOB_QUEUED, JOB_RUNNING):
+                    self._stop_events[job_id].set()
+                if job['status'] == JOB_QUEUED:
+                    job.update(status=JOB_CANCELLED, finished=time.time())
+        self._executor.shutdown(wait=True)
+
+
+def _make_handler(service: BatchJobService):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        """本地任务接口"""
+
+        def _send(self, code: int, payload):
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_id(self) -> Optional[str]:
+            parts = self.path.split('?')[0].strip('/').split('/')
+            return parts[1] if len(parts) == 2 and parts[0] == 'jobs' else None
+
+        def do_GET(self):
+            path = self.path.split('?')[0].rstrip('/')
+            if path == '/health':
+                self._send(200, service.health())
+            elif path == '/jobs':
+                self._send(200, service.list())
+            elif self._job_id():
+                job = service.get(self._job_id())
+                self._send(200 if job else 404, job or {'error': 'not found'})
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path.split('?')[0].rstrip('/') != '/jobs':
+                self._send(404, {'error': 'not found'})
+                return
+            # 只接受JSON请求体：浏览器跨站提交的表单/纯文本请求无法设置该类型而不触发预检
+            content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+            if content_type != 'application/json':
+                self._send(415, {'error': 'Content-Type 必须为 application/json'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                params = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+                if not isinstance(params, dict):
+                    raise ValueError("请求体必须是JSON对象")
+                self._send(202, service.submit(params))
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {'error': str(e)})
+
+        def do_DELETE(self):
+            job = service.cancel(self._job_id()) if self._job_id() else None
+            self._send(200 if job else 404, job or {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            logging.getLogger(__name__).debug("%s - %s", self.address_string(), format % args)
+
+    return JobRequestHandler
+
+
+def serve(service: BatchJobService, host: str = '127.0.0.1', port: int = 8765):
+    """在前台运行HTTP服务，Ctrl+C 后停止所有任务并退出"""
+    logger = logging.getLogger(__name__)
+    httpd = ThreadingHTTPServer((host, port), _make_handler(service))
+    httpd.daemon_threads = True
+    logger.info(f"批处理服务已启动: http://{host}:{port} (并发任务数 {service.max_workers})")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("收到中断，正在停止服务...")
+    finally:
+        httpd.server_close()
+        service.shutdown()
@@ -10,6 +10,7 @@ import logging
 import tempfile
 import shutil
 import time
+import threading
 from typing import Optional, Dict, Tuple
 from pathlib import Path
 
@@ -22,13 +23,19 @@ if os.path.exists(diff_orb_dir):
 try:
     from fits_alignment_comparison import FITSAlignmentComparison
     from compare_aligned_fits import AlignedFITSComparator
+    from tiled_engine import get_tiled_executor
+    from template_feature_cache import configure_template_feature_cache, default_feature_cache_dir
 except ImportError as e:
     logging.error(f"无法导入diff_orb模块: {e}")
     FITSAlignmentComparison = None
     AlignedFITSComparator = None
+    get_tiled_executor = None
+    configure_template_feature_cache = None
+    default_feature_cache_dir = None
 
 from filename_parser import FITSFilenameParser
 from error_logger import ErrorLogger
+from reprojection_cache import configure_reprojection_cache, get_reprojection_cache, grid_axes
 
 # 导入噪点处理模块
 try:
@@ -36,10 +43,11 @@ try:
     simple_noise_dir = os.path.join(os.path.dirname(current_dir), 'simple_noise')
     if os.path.exists(simple_noise_dir):
         sys.path.insert(0, simple_noise_dir)
-    from simple_pixel_detector import process_fits_simple
+    from simple_pixel_detector import process_fits_simple, clean_pixels_simple
 except ImportError as e:
     logging.warning(f"无法导入噪点处理模块: {e}")
     process_fits_simple = None
+    clean_pixels_simple = None
 
 
 class DiffOrbIntegration:
@@ -70,9 +78,64 @@ class DiffOrbIntegration:
                 use_central_region=False,  # 不使用中央区域，处理完整图像
                 alignment_method='rigid'   # 刚体变换，适合天文图像
             )
+            # 星点三角形匹配对齐的比较器（alignment_method='asterism'）
+            self.asterism_comparator = FITSAlignmentComparison(
+                use_central_region=False,
+                alignment_method='asterism'
+            )
             # 用于已对齐文件比较的比较器
             self.aligned_comparator = AlignedFITSComparator()
     
+    @staticmethod
+    def configure_caches(reprojection_cache_bytes: Optional[int] = None,
+                         template_feature_cache_bytes: Optional[int] = None):
+        """
+        设置本进程共享缓存的内存上限（线程模式在GUI进程中调用，进程池模式在每个子进程初始化时调用）
+
+        Args:
+            reprojection_cache_bytes (Optional[int]): WCS重投影坐标网格缓存上限，None表示不变
+            template_feature_cache_bytes (Optional[int]): 模板特征缓存上限，None表示不变
+        """
+        if reprojection_cache_bytes is not None:
+            configure_reprojection_cache(reprojection_cache_bytes)
+        if template_feature_cache_bytes is not None and configure_template_feature_cache is not None:
+            configure_template_feature_cache(template_feature_cache_bytes)
+
+    @staticmethod
+    def cache_limits_from_settings(settings: Dict) -> Dict[str, int]:
+        """
+        批量处理设置中的缓存上限（字节），configure_caches 的关键字参数
+
+        Args:
+            settings (Dict): ConfigManager.get_batch_process_settings() 的结果
+        """
+        return {
+            'reprojection_cache_bytes': int(float(settings.get('reprojection_cache_mb', 256) or 0) * 1024 * 1024),
+            'template_feature_cache_bytes': int(float(settings.get('template_feature_cache_mb', 1200) or 0) * 1024 * 1024),
+        }
+
+    @staticmethod
+    def feature_cache_dir_for(template_file: str, settings: Dict) -> Optional[str]:
+        """
+        按批量处理设置确定模板特征的磁盘缓存目录
+
+        Args:
+            template_file (str): 模板文件路径
+            settings (Dict): ConfigManager.get_batch_process_settings() 的结果
+
+        Returns:
+            Optional[str]: template_feature_cache_dir 非空时使用该目录，否则为模板旁的 orb_feature_cache；
+            template_feature_cache_disk 关闭时返回None（只缓存在内存中）
+        """
+        if not settings.get('template_feature_cache_disk', True):
+            return None
+        configured = str(settings.get('template_feature_cache_dir', '') or '').strip()
+        if configured:
+            return configured
+        if default_feature_cache_dir is None or not template_file:
+            return None
+        return default_feature_cache_dir(template_file)
+
     def is_available(self) -> bool:
         """检查diff_orb是否可用"""
         return self.diff_orb_available
@@ -151,7 +214,7 @@ class DiffOrbIntegration:
             self.logger.error(f"查找模板文件时出错: {str(e)}")
             return None
     
-    def process_diff(self, download_file: str, template_file: str, output_dir: str = None, noise_methods: list = None, alignment_method: str = 'rigid', remove_bright_lines: bool = True, stretch_method: str = 'peak', percentile_low: float = 99.95, fast_mode: bool = False, max_jaggedness_ratio: float = 2.0, detection_method: str = 'contour', sort_by: str = 'aligned_snr', wcs_use_sparse: bool = False, generate_gif: bool = False, science_bg_mode: str = 'off', diff_calc_mode: str = 'abs', apply_diff_postprocess: bool = False) -> Optional[Dict]:
+    def process_diff(self, download_file: str, template_file: str, output_dir: str = None, noise_methods: list = None, alignment_method: str = 'rigid', remove_bright_lines: bool = True, stretch_method: str = 'peak', percentile_low: float = 99.95, fast_mode: bool = False, max_jaggedness_ratio: float = 2.0, detection_method: str = 'contour', sort_by: str = 'aligned_snr', wcs_use_sparse: bool = False, generate_gif: bool = False, science_bg_mode: str = 'off', diff_calc_mode: str = 'abs', apply_diff_postprocess: bool = False, in_memory: bool = False, feature_cache_dir: Optional[str] = None) -> Optional[Dict]:
         """
         执行diff操作
 
@@ -160,7 +223,8 @@ class DiffOrbIntegration:
             template_file (str): 模板文件路径（作为参考文件）
             output_dir (str): 输出目录，如果为None则自动创建
             noise_methods (list): 降噪方式列表，可选值：['outlier', 'hot_cold', 'adaptive_median']
-            alignment_method (str): 对齐方式，可选值：['rigid', 'wcs', 'astropy_reproject', 'swarp']
+            alignment_method (str): 对齐方式，可选值：['rigid', 'asterism', 'wcs', 'astropy_reproject', 'swarp']
+                'asterism' 为星点三角形匹配 + 最小二乘相似变换
             remove_bright_lines (bool): 是否去除亮线，默认True
             stretch_method (str): 拉伸方法，'peak'=峰值拉伸, 'percentile'=百分位数拉伸
             percentile_low (float): 百分位数起点，默认99.95
@@ -173,6 +237,9 @@ class DiffOrbIntegration:
             science_bg_mode (str): 科学图背景处理模式，'off'|'scheme_a'|'scheme_b'
             diff_calc_mode (str): 差异计算方式，'abs'（默认）或 'signed'
             apply_diff_postprocess (bool): 是否对difference.fits执行后处理（负值置零+中值滤波）
+            in_memory (bool): 内存流水线，各步骤间直接传递float32数组与header，只写出最终产物
+                （仅WCS对齐支持，其他对齐方式依赖中间文件，自动使用文件流水线）
+            feature_cache_dir (Optional[str]): 模板特征（关键点与描述符）的磁盘缓存目录，None表示只缓存在内存中
 
         Returns:
             Optional[Dict]: 处理结果字典，包含输出文件路径等信息
@@ -205,7 +272,8 @@ class DiffOrbIntegration:
                 "快速模式": fast_mode,
                 "科学图背景处理": science_bg_mode,
                 "差异计算方式": diff_calc_mode,
-                "difference后处理": apply_diff_postprocess
+                "difference后处理": apply_diff_postprocess,
+                "内存流水线": in_memory
             })
 
             # 验证输入文件
@@ -230,11 +298,20 @@ class DiffOrbIntegration:
             self.logger.info(f"  待比较文件 (下载): {os.path.basename(download_file)}")
             self.logger.info(f"  输出目录: {output_dir}")
 
+            use_memory = in_memory and alignment_method == 'wcs'
+            if in_memory and not use_memory:
+                self.logger.info(f"对齐方式 {alignment_method} 依赖中间文件，使用文件流水线")
+
             # 步骤0: 噪点处理
             noise_start = time.time()
-            processed_download_file, processed_template_file = self._preprocess_noise_removal(
-                download_file, template_file, output_dir, noise_methods
-            )
+            if use_memory:
+                download_image = self._load_denoised_array(download_file, noise_methods)
+                template_image = self._load_denoised_array(template_file, noise_methods)
+                processed_download_file, processed_template_file = download_image[2], template_image[2]
+            else:
+                processed_download_file, processed_template_file = self._preprocess_noise_removal(
+                    download_file, template_file, output_dir, noise_methods
+                )
             timing_stats['噪点处理'] = time.time() - noise_start
             self.logger.info(f"⏱️  步骤0 噪点处理耗时: {timing_stats['噪点处理']:.3f}秒")
 
@@ -242,11 +319,18 @@ class DiffOrbIntegration:
             alignment_start = time.time()
             self.logger.info(f"步骤1: 执行图像对齐（方式: {alignment_method}）...")
 
-            if alignment_method == 'wcs':
+            if use_memory:
+                # 内存流水线：WCS对齐，结果保留在内存中
+                alignment_result = self._align_arrays_using_wcs(
+                    template_image, download_image, output_dir, use_sparse=wcs_use_sparse,
+                    template_file=template_file, download_file=download_file,
+                    feature_cache_dir=feature_cache_dir
+                )
+            elif alignment_method == 'wcs':
                 # 使用WCS对齐
                 alignment_result = self._align_using_wcs(
                     processed_template_file, processed_download_file, output_dir,
-                    use_sparse=wcs_use_sparse
+                    use_sparse=wcs_use_sparse, feature_cache_dir=feature_cache_dir
                 )
             elif alignment_method == 'astropy_reproject':
                 # 使用Astropy Reproject对齐
@@ -258,13 +342,23 @@ class DiffOrbIntegration:
                 alignment_result = self._align_using_swarp(
                     processed_template_file, processed_download_file, output_dir
                 )
+            elif alignment_method == 'asterism':
+                # 使用星点三角形匹配对齐
+                alignment_result = self.asterism_comparator.process_fits_comparison(
+                    processed_template_file,
+                    processed_download_file,
+                    output_dir=output_dir,
+                    show_visualization=False,
+                    feature_cache_dir=feature_cache_dir
+                )
             else:
                 # 使用特征点对齐（只支持rigid方式）
                 alignment_result = self.alignment_comparator.process_fits_comparison(
                     processed_template_file,      # 参考文件（处理后的模板）
                     processed_download_file,      # 待比较文件（处理后的下载文件）
                     output_dir=output_dir,
-                    show_visualization=False  # 在GUI中不显示matplotlib窗口
+                    show_visualization=False,  # 在GUI中不显示matplotlib窗口
+                    feature_cache_dir=feature_cache_dir
                 )
 
             timing_stats['图像对齐'] = time.time() - alignment_start
@@ -282,6 +376,11 @@ class DiffOrbIntegration:
 
             self.error_logger.log_info("图像对齐成功")
 
+            if use_memory and not alignment_result.get('in_memory'):
+                # WCS重叠不足时已降级为特征点对齐，后续步骤使用其写出的对齐文件
+                self.logger.info("内存流水线已降级为特征点对齐，后续步骤使用文件流水线")
+                use_memory = False
+
             # 步骤1.5：可选科学图背景处理（仅处理科学图，不处理模板图）
             bg_start = time.time()
             science_bg_applied = self._apply_science_background_processing(
@@ -295,14 +394,16 @@ class DiffOrbIntegration:
             if science_bg_mode != 'off' and not science_bg_applied:
                 self.logger.warning("科学图背景处理未成功应用，已回退为原始对齐图参与差异比较")
 
+            if use_memory:
+                # 对齐结果是GUI使用的最终产物，背景处理后写出
+                self._write_aligned_products(alignment_result, fast_mode=fast_mode)
+
             # 步骤2: 使用已对齐文件进行差异比较
             diff_comparison_start = time.time()
             self.logger.info("步骤2: 执行已对齐文件差异比较...")
             self.error_logger.log_info("开始差异比较")
 
-            result = self.aligned_comparator.process_aligned_fits_comparison(
-                output_dir,  # 输入目录（包含对齐后的文件）
-                output_dir,  # 输出目录（同一目录）
+            comparison_kwargs = dict(
                 remove_bright_lines=remove_bright_lines,  # 传递去除亮线参数
                 stretch_method=stretch_method,  # 传递拉伸方法参数
                 percentile_low=percentile_low,  # 传递百分位数参数
@@ -314,6 +415,21 @@ class DiffOrbIntegration:
                 diff_calc_mode=diff_calc_mode,  # 传递差异计算方式参数
                 apply_diff_postprocess=apply_diff_postprocess  # 传递difference后处理参数
             )
+            if use_memory:
+                result = self.aligned_comparator.process_aligned_arrays(
+                    alignment_result['template_aligned_data'],
+                    alignment_result['download_aligned_data'],
+                    output_dir,
+                    reference_file=alignment_result['template_aligned_file'],
+                    aligned_file=alignment_result['download_aligned_file'],
+                    **comparison_kwargs
+                )
+            else:
+                result = self.aligned_comparator.process_aligned_fits_comparison(
+                    output_dir,  # 输入目录（包含对齐后的文件）
+                    output_dir,  # 输出目录（同一目录）
+                    **comparison_kwargs
+                )
 
             timing_stats['差异比较'] = time.time() - diff_comparison_start
             self.logger.info(f"⏱️  步骤2 差异比较耗时: {timing_stats['差异比较']:.3f}秒")
@@ -375,6 +491,7 @@ class DiffOrbIntegration:
                     'science_bg_mode': science_bg_mode,
                     'diff_calc_mode': diff_calc_mode,
                     'apply_diff_postprocess': apply_diff_postprocess,
+                    'in_memory': use_memory,
                     'error_log_file': error_log_path,
                     'timing_stats': timing_stats  # 添加耗时统计信息
                 }
@@ -401,7 +518,7 @@ class DiffOrbIntegration:
         对科学图（下载图）执行可选背景处理，不修改模板图。
 
         Args:
-            alignment_result: 对齐结果字典
+            alignment_result: 对齐结果字典（内存流水线中含 download_aligned_data 时直接更新该数组）
             output_dir: 输出目录
             mode: off/scheme_a/scheme_b
             fast_mode: 是否快速模式（快速模式下仅覆盖科学图，不额外输出背景处理文件）
@@ -414,19 +531,26 @@ class DiffOrbIntegration:
             return True
 
         try:
-            science_file = self._find_science_aligned_file(alignment_result, output_dir)
-            if not science_file or not os.path.exists(science_file):
-                self.logger.warning("未找到科学图对齐文件，跳过背景处理")
-                return False
-
             from astropy.io import fits
             import numpy as np
 
-            with fits.open(science_file) as hdul:
-                header = hdul[0].header.copy()
-                data = hdul[0].data.astype(np.float32)
-                if data.ndim == 3:
-                    data = data[0]
+            in_memory = 'download_aligned_data' in alignment_result
+            if in_memory:
+                # 内存流水线：直接处理对齐结果中的数组
+                science_file = alignment_result['download_aligned_file']
+                header = alignment_result['download_aligned_header']
+                data = np.asarray(alignment_result['download_aligned_data'], dtype=np.float32)
+            else:
+                science_file = self._find_science_aligned_file(alignment_result, output_dir)
+                if not science_file or not os.path.exists(science_file):
+                    self.logger.warning("未找到科学图对齐文件，跳过背景处理")
+                    return False
+
+                with fits.open(science_file) as hdul:
+                    header = hdul[0].header.copy()
+                    data = hdul[0].data.astype(np.float32)
+            if data.ndim == 3:
+                data = data[0]
 
             finite_mask = np.isfinite(data)
             if not np.any(finite_mask):
@@ -445,7 +569,10 @@ class DiffOrbIntegration:
                 return False
 
             processed_data = np.where(finite_mask, processed_data, data).astype(np.float32)
-            fits.writeto(science_file, processed_data, header=header, overwrite=True)
+            if in_memory:
+                alignment_result['download_aligned_data'] = processed_data
+            else:
+                fits.writeto(science_file, processed_data, header=header, overwrite=True)
 
             # 非快速模式下额外保存“科学图剪除背景后”的独立输出文件
             try:
@@ -1065,37 +1192,177 @@ class DiffOrbIntegration:
         self.logger.info("噪点处理步骤完成")
         return processed_download_file, processed_template_file
 
-    def _transform_coordinates_optimized(self, template_wcs: 'WCS', download_wcs: 'WCS',
-                                         template_shape: tuple, use_sparse: bool = False,
-                                         sparse_step: int = 16) -> tuple:
+    def _load_denoised_array(self, fits_file: str, noise_methods: list = None) -> Tuple['np.ndarray', 'fits.Header', str]:
         """
-        优化的WCS坐标转换
+        内存流水线步骤0：读取FITS并在数组上依次执行降噪（不写入中间文件）
 
         Args:
-            template_wcs: 模板图像的WCS对象
-            download_wcs: 下载图像的WCS对象
-            template_shape: 模板图像形状 (height, width)
-            use_sparse: 是否使用稀疏采样优化 (适用于平滑变换)
-            sparse_step: 稀疏采样步长 (仅当use_sparse=True时有效)
+            fits_file (str): 输入FITS文件路径
+            noise_methods (list): 降噪方式列表，None时默认['outlier']，空列表跳过
 
         Returns:
-            tuple: (download_x, download_y) 下载图像的像素坐标数组
+            Tuple[np.ndarray, fits.Header, str]: (float32图像, header, 等效的文件模式文件名（不含扩展名）)
         """
+        from astropy.io import fits
         import numpy as np
 
-        if use_sparse:
-            # 稀疏采样优化: 适用于平滑的WCS变换
-            # 性能提升: 10-50倍, 精度损失: <0.1像素
-            return self._transform_coordinates_sparse(template_wcs, download_wcs, template_shape, sparse_step)
-        else:
-            # 标准优化: 使用底层API
-            # 性能提升: 5-10倍, 无精度损失
-            return self._transform_coordinates_standard(template_wcs, download_wcs, template_shape)
+        with fits.open(fits_file) as hdul:
+            header = hdul[0].header.copy()
+            data = hdul[0].data.astype(np.float32)
+        name = os.path.splitext(os.path.basename(fits_file))[0]
+
+        basename = os.path.basename(fits_file)
+        if noise_methods is None:
+            noise_methods = ['outlier']
+        if not noise_methods:
+            self.logger.info(f"{basename}: 未选择降噪方式，使用原始数据")
+            return data, header, name
+        if clean_pixels_simple is None:
+            self.logger.warning(f"{basename}: 噪点处理模块不可用，跳过噪点处理步骤，使用原始数据")
+            return data, header, name
 
-    def _transform_coordinates_standard(self, template_wcs: 'WCS', download_wcs: 'WCS',
-                                        template_shape: tuple) -> tuple:
+        try:
+            repaired = data
+            for method in noise_methods:
+                method_start = time.time()
+                repaired, _, noise_mask = clean_pixels_simple(repaired, method=method, threshold=4.0)
+                if repaired is None or np.shape(repaired) != data.shape:
+                    raise ValueError(f"{method} 方法输出形状 {np.shape(repaired)} 与输入 {data.shape} 不一致")
+                self.logger.info(f"  {method} 方法处理 {basename}: "
+                                 f"{int(np.count_nonzero(noise_mask))} 个噪点, 耗时 {time.time() - method_start:.3f}秒")
+            self.logger.info(f"{basename}: 使用降噪数据 ({', '.join(noise_methods)})")
+            return repaired.astype(np.float32), header, f"{name}_noise_cleaned"
+        except Exception as e:
+            self.logger.error(f"处理 {basename} 时出错: {str(e)}")
+            self.logger.warning(f"{basename}: 降噪失败，使用原始数据")
+            return data, header, name
+
+    def _align_arrays_using_wcs(self, template_image: Tuple, download_image: Tuple, output_dir: str,
+                                use_sparse: bool = False, template_file: Optional[str] = None,
+                                download_file: Optional[str] = None,
+                                feature_cache_dir: Optional[str] = None) -> Optional[Dict]:
         """
-        标准优化的坐标转换 (使用底层API)
+        内存流水线步骤1：基于WCS将下载图像重采样到模板网格，对齐结果以数组形式保存在结果字典中
+
+        与 _align_using_wcs 一致，重叠区域过小时降级到特征点对齐（此时写出降噪后的图像供其读取）
+
+        Args:
+            template_image (Tuple): _load_denoised_array 返回的模板 (data, header, name)
+            download_image (Tuple): _load_denoised_array 返回的下载图像 (data, header, name)
+            output_dir (str): 输出目录（用于确定最终对齐文件名）
+            use_sparse (bool): 是否使用稀疏采样优化
+            template_file (Optional[str]): 模板原始文件路径（降级时未降噪的图像直接使用原文件）
+            download_file (Optional[str]): 下载原始文件路径
+            feature_cache_dir (Optional[str]): 降级为特征点对齐时使用的模板特征磁盘缓存目录
+
+        Returns:
+            Optional[Dict]: 对齐结果字典（含 template_aligned_data / download_aligned_data；
+            降级为特征点对齐时为文件流水线的结果字典），失败时返回None
+        """
+        try:
+            from astropy.wcs import WCS
+
+            template_data, template_header, template_name = template_image
+            download_data, download_header, download_name = download_image
+            template_wcs = WCS(template_header)
+            download_wcs = WCS(download_header)
+
+            if not template_wcs.has_celestial or not download_wcs.has_celestial:
+                self.logger.error("WCS对齐失败：文件缺少有效的WCS天体坐标信息")
+                return None
+
+            if not self._validate_wcs_quality(template_wcs, download_wcs, template_data, download_data,
+                                               template_name, download_name):
+                self.logger.error("WCS对齐失败：WCS质量验证失败")
+                return None
+
+            resampled = self._resample_to_template_wcs(
+                template_wcs, download_wcs, template_data.shape, download_data, use_sparse=use_sparse
+            )
+            if resampled['data'] is None:
+                self.logger.warning("自动降级到特征点对齐（Rigid）")
+                return self._align_using_features(
+                    self._write_denoised_image(template_image, template_file, output_dir),
+                    self._write_denoised_image(download_image, download_file, output_dir),
+                    output_dir, feature_cache_dir
+                )
+
+            aligned_header = template_header.copy()
+            aligned_header['HISTORY'] = 'Aligned using WCS information'
+
+            return {
+                'alignment_success': True,
+                'alignment_method': 'wcs',
+                'in_memory': True,
+                'template_aligned_file': os.path.join(output_dir, f"{template_name}_aligned.fits"),
+                'download_aligned_file': os.path.join(output_dir, f"{download_name}_aligned.fits"),
+                'template_aligned_data': template_data,
+                'template_aligned_header': template_header,
+                'download_aligned_data': resampled['data'],
+                'download_aligned_header': aligned_header,
+                'output_directory': output_dir,
+                'wcs_info': {
+                    'template_wcs_valid': True,
+                    'download_wcs_valid': True,
+                    'coordinate_system': template_wcs.wcs.ctype[0] if hasattr(template_wcs.wcs, 'ctype') else 'Unknown'
+                }
+            }
+        except Exception as e:
+            self.logger.error(f"WCS对齐失败：{str(e)}")
+            return None
+
+    def _write_denoised_image(self, image: Tuple, source_file: Optional[str], output_dir: str) -> str:
+        """
+        内存流水线降级到文件流水线时写出降噪后的图像，文件名与 _preprocess_noise_removal 的输出一致
+
+        Returns:
+            str: 图像文件路径；未做降噪时直接返回原始文件
+        """
+        from astropy.io import fits
+
+        data, header, name = image
+        if source_file and name == os.path.splitext(os.path.basename(source_file))[0]:
+            return source_file
+        path = os.path.join(output_dir, f"{name}.fits")
+        fits.writeto(path, data, header=header, overwrite=True)
+        return path
+
+    def _align_using_features(self, template_file: str, download_file: str, output_dir: str,
+                              feature_cache_dir: Optional[str] = None) -> Optional[Dict]:
+        """
+        特征点对齐（Rigid），WCS对齐重叠区域不足时的降级路径
+
+        Returns:
+            Optional[Dict]: 对齐结果字典，失败时返回None
+        """
+        return self.alignment_comparator.process_fits_comparison(
+            template_file,
+            download_file,
+            output_dir=output_dir,
+            show_visualization=False,
+            feature_cache_dir=feature_cache_dir
+        )
+
+    def _write_aligned_products(self, alignment_result: Dict, fast_mode: bool = False):
+        """
+        内存流水线：写出对齐后的模板/下载图像（GUI与后续查询依赖的最终产物）
+
+        快速模式下与文件流水线一致，只保留 *_noise_cleaned_aligned.fits
+        """
+        from astropy.io import fits
+
+        for key in ('template', 'download'):
+            path = alignment_result[f'{key}_aligned_file']
+            if fast_mode and not path.endswith('_noise_cleaned_aligned.fits'):
+                continue
+            fits.writeto(path, alignment_result[f'{key}_aligned_data'],
+                         header=alignment_result[f'{key}_aligned_header'], overwrite=True)
+            self.logger.info(f"已写出对齐文件: {os.path.basename(path)}")
+
+    def _standard_tile_coordinates(self, template_wcs: 'WCS', download_wcs: 'WCS', template_shape: tuple):
+        """
+        标准模式的分块坐标函数：图块的模板天球坐标取自缓存的天球网格切片
+        （网格超过缓存上限时按图块现算），再在图块上做 world -> pixel
 
         Args:
             template_wcs: 模板图像的WCS对象
@@ -1103,77 +1370,65 @@ class DiffOrbIntegration:
             template_shape: 模板图像形状 (height, width)
 
         Returns:
-            tuple: (download_x, download_y) 下载图像的像素坐标数组
+            callable: tile_coordinates(rows, cols) -> (download_y, download_x)，float32
         """
         import numpy as np
 
-        # 创建像素坐标网格 (使用float32减少内存占用)
-        y_indices, x_indices = np.mgrid[0:template_shape[0], 0:template_shape[1]]
-        x_flat = x_indices.flatten().astype(np.float32)
-        y_flat = y_indices.flatten().astype(np.float32)
-
-        # 使用底层API: pixel -> world (避免创建SkyCoord对象)
-        # all_pix2world: 参数0表示0-based索引 (Python风格)
-        world_coords = template_wcs.all_pix2world(x_flat, y_flat, 0)
-        ra_flat, dec_flat = world_coords
+        cache = get_reprojection_cache()
+        sky_grid = None
+        if cache.can_cache(cache.sky_grid_nbytes(template_shape)):
+            sky_grid = cache.template_sky_grid(template_wcs, template_shape, 1)
+        else:
+            self.logger.info("模板天球网格超过重投影缓存上限，按图块计算天球坐标")
 
-        # 使用底层API: world -> pixel
-        pixel_coords = download_wcs.all_world2pix(ra_flat, dec_flat, 0)
-        download_x_flat, download_y_flat = pixel_coords
+        # astropy WCS对象不保证多线程并发调用安全，每个线程使用各自的副本
+        local = threading.local()
 
-        # 重塑回原始形状
-        download_x = download_x_flat.reshape(template_shape).astype(np.float32)
-        download_y = download_y_flat.reshape(template_shape).astype(np.float32)
+        def tile_coordinates(rows, cols):
+            if not hasattr(local, 'download_wcs'):
+                local.download_wcs = download_wcs.deepcopy()
+                local.template_wcs = template_wcs.deepcopy()
+            if sky_grid is not None:
+                ra, dec = sky_grid.radec(rows, cols)
+            else:
+                yy, xx = np.mgrid[rows, cols]
+                ra, dec = local.template_wcs.all_pix2world(xx, yy, 0)
+            x, y = local.download_wcs.all_world2pix(ra, dec, 0)
+            return y.astype(np.float32), x.astype(np.float32)
 
-        return download_x, download_y
+        return tile_coordinates
 
-    def _transform_coordinates_sparse(self, template_wcs: 'WCS', download_wcs: 'WCS',
-                                      template_shape: tuple, sample_step: int = 16) -> tuple:
+    def _sparse_coordinate_interpolators(self, template_wcs: 'WCS', download_wcs: 'WCS',
+                                         template_shape: tuple, sample_step: int = 16) -> tuple:
         """
-        稀疏采样优化的坐标转换 (适用于平滑变换)
+        稀疏控制点的双线性插值器，可按任意子网格（如分块重采样的图块）求值
 
         Args:
             template_wcs: 模板图像的WCS对象
             download_wcs: 下载图像的WCS对象
             template_shape: 模板图像形状 (height, width)
-            sample_step: 采样步长 (默认16, 即每16个像素采样一次)
+            sample_step: 采样步长
 
         Returns:
-            tuple: (download_x, download_y) 下载图像的像素坐标数组
+            tuple: (interp_x, interp_y)，调用方式 interp(y坐标, x坐标)
         """
-        import numpy as np
         from scipy.interpolate import RectBivariateSpline
 
         height, width = template_shape
 
-        # 创建稀疏网格
-        y_sparse = np.arange(0, height, sample_step)
-        x_sparse = np.arange(0, width, sample_step)
-        yy_sparse, xx_sparse = np.meshgrid(y_sparse, x_sparse, indexing='ij')
-
-        # 转换稀疏坐标
-        x_flat = xx_sparse.flatten().astype(np.float32)
-        y_flat = yy_sparse.flatten().astype(np.float32)
-
-        world_coords = template_wcs.all_pix2world(x_flat, y_flat, 0)
-        pixel_coords = download_wcs.all_world2pix(world_coords[0], world_coords[1], 0)
-
-        download_x_sparse = pixel_coords[0].reshape(xx_sparse.shape)
-        download_y_sparse = pixel_coords[1].reshape(yy_sparse.shape)
+        # 稀疏控制点：模板侧天球坐标按模板WCS缓存，下载图像WCS相同时整组控制点直接复用
+        y_sparse, x_sparse = grid_axes(template_shape, sample_step)
+        download_x_sparse, download_y_sparse = get_reprojection_cache().control_points(
+            template_wcs, download_wcs, template_shape, sample_step
+        )
 
         # 使用双线性插值扩展到完整网格
         interp_x = RectBivariateSpline(y_sparse, x_sparse, download_x_sparse, kx=1, ky=1)
         interp_y = RectBivariateSpline(y_sparse, x_sparse, download_y_sparse, kx=1, ky=1)
 
-        y_full = np.arange(height)
-        x_full = np.arange(width)
+        self.logger.info(f"稀疏采样: 采样点数={download_x_sparse.size:,} (原始: {height*width:,}), 压缩比={sample_step*sample_step}x")
 
-        download_x = interp_x(y_full, x_full).astype(np.float32)
-        download_y = interp_y(y_full, x_full).astype(np.float32)
-
-        self.logger.info(f"稀疏采样: 采样点数={len(x_flat):,} (原始: {height*width:,}), 压缩比={sample_step*sample_step}x")
-
-        return download_x, download_y
+        return interp_x, interp_y
 
     def _validate_wcs_quality(self, wcs1: 'WCS', wcs2: 'WCS', data1: 'np.ndarray', data2: 'np.ndarray',
                               file1: str = "", file2: str = "") -> bool:
@@ -1255,7 +1510,75 @@ class DiffOrbIntegration:
             self.logger.error(f"WCS质量验证失败: {str(e)}")
             return False
 
-    def _align_using_wcs(self, template_file: str, download_file: str, output_dir: str, use_sparse: bool = False) -> Optional[Dict]:
+    def _resample_to_template_wcs(self, template_wcs: 'WCS', download_wcs: 'WCS', template_shape: tuple,
+                                  download_data: 'np.ndarray', use_sparse: bool = False) -> Dict:
+        """
+        按WCS将下载图像重采样到模板图像的像素网格
+
+        Args:
+            template_wcs: 模板WCS
+            download_wcs: 下载图像WCS
+            template_shape (tuple): 模板图像形状
+            download_data (np.ndarray): 下载图像数据
+            use_sparse (bool): 是否使用稀疏采样优化
+
+        Returns:
+            Dict: {'data': 重采样结果（重叠区域小于10%时为None）, 'valid_ratio', 'transform_time', 'resample_time'}
+        """
+        import numpy as np
+
+        transform_start = time.time()
+        self.logger.info(f"图像尺寸: {template_shape}, 总像素数: {template_shape[0] * template_shape[1]:,}")
+
+        # use_sparse=False: 标准优化 (无精度损失)，每个图块由模板天球网格的切片逐块做 world -> pixel
+        # use_sparse=True: 稀疏采样优化 (性能提升10-50倍, 精度损失<0.1像素)，完整坐标按图块插值
+        # 两种模式都不保存整幅的下载图像坐标
+        self.logger.info(f"WCS坐标转换优化模式: {'稀疏采样' if use_sparse else '标准优化'}")
+        if use_sparse:
+            interp_x, interp_y = self._sparse_coordinate_interpolators(
+                template_wcs, download_wcs, template_shape, sample_step=16
+            )
+
+            def tile_coordinates(rows, cols):
+                y_axis, x_axis = np.arange(rows.start, rows.stop), np.arange(cols.start, cols.stop)
+                return (interp_y(y_axis, x_axis).astype(np.float32),
+                        interp_x(y_axis, x_axis).astype(np.float32))
+        else:
+            tile_coordinates = self._standard_tile_coordinates(template_wcs, download_wcs, template_shape)
+
+        transform_time = time.time() - transform_start
+        self.logger.info(f"⏱️  坐标变换总耗时: {transform_time:.3f}秒")
+
+        # 分块重采样：每个图块只生成自己的坐标与插值结果，同时统计落在下载图像内的有效坐标
+        resample_start = time.time()
+        self.logger.info("执行图像重采样...")
+        aligned_download_data, valid_count = get_tiled_executor().remap(
+            download_data,
+            tile_coordinates,
+            template_shape,
+            order=1,  # 双线性插值
+            cval=0.0  # 边界外的值设为0
+        )
+        resample_time = time.time() - resample_start
+        self.logger.info(f"⏱️  图像重采样耗时: {resample_time:.3f}秒")
+
+        valid_ratio = valid_count / float(template_shape[0] * template_shape[1])
+        self.logger.info(f"有效重叠区域比例: {valid_ratio:.2%}")
+
+        if valid_ratio < 0.1:  # 重叠区域小于10%
+            self.logger.warning(f"重叠区域过小 ({valid_ratio:.2%})，WCS对齐可能不准确")
+            return {'data': None, 'valid_ratio': valid_ratio, 'transform_time': transform_time,
+                    'resample_time': resample_time}
+
+        return {
+            'data': aligned_download_data,
+            'valid_ratio': valid_ratio,
+            'transform_time': transform_time,
+            'resample_time': resample_time
+        }
+
+    def _align_using_wcs(self, template_file: str, download_file: str, output_dir: str, use_sparse: bool = False,
+                         feature_cache_dir: Optional[str] = None) -> Optional[Dict]:
         """
         使用WCS信息进行图像对齐，失败时自动降级到特征点对齐
 
@@ -1264,6 +1587,7 @@ class DiffOrbIntegration:
             download_file (str): 下载文件路径
             output_dir (str): 输出目录
             use_sparse (bool): 是否使用稀疏采样优化，默认False
+            feature_cache_dir (Optional[str]): 降级为特征点对齐时使用的模板特征磁盘缓存目录
 
         Returns:
             Optional[Dict]: 对齐结果字典
@@ -1274,7 +1598,6 @@ class DiffOrbIntegration:
             from astropy.coordinates import SkyCoord
             from astropy import units as u
             import numpy as np
-            from scipy.ndimage import map_coordinates
 
             wcs_align_start = time.time()
             self.logger.info("开始基于WCS信息的图像对齐...")
@@ -1366,58 +1689,17 @@ class DiffOrbIntegration:
             validate_time = time.time() - validate_start
             self.logger.info(f"⏱️  WCS质量验证耗时: {validate_time:.3f}秒")
 
-            transform_start = time.time()
             self.logger.info("WCS信息验证通过，开始坐标变换...")
-
-            template_shape = template_data.shape
-            self.logger.info(f"图像尺寸: {template_shape}, 总像素数: {template_shape[0] * template_shape[1]:,}")
-
-            # 使用优化的坐标转换方法
-            # use_sparse=False: 标准优化 (性能提升5-10倍, 无精度损失)
-            # use_sparse=True: 稀疏采样优化 (性能提升10-50倍, 精度损失<0.1像素)
-            self.logger.info(f"WCS坐标转换优化模式: {'稀疏采样' if use_sparse else '标准优化'}")
-            download_x, download_y = self._transform_coordinates_optimized(
-                template_wcs, download_wcs, template_shape,
-                use_sparse=use_sparse,  # 从参数传入
-                sparse_step=16
+            resampled = self._resample_to_template_wcs(
+                template_wcs, download_wcs, template_data.shape, download_data, use_sparse=use_sparse
             )
+            transform_time = resampled['transform_time']
+            resample_time = resampled['resample_time']
 
-            transform_time = time.time() - transform_start
-            self.logger.info(f"⏱️  坐标变换总耗时: {transform_time:.3f}秒")
-
-            # 检查有效坐标范围
-            valid_mask = (
-                (download_x >= 0) & (download_x < download_data.shape[1]) &
-                (download_y >= 0) & (download_y < download_data.shape[0]) &
-                np.isfinite(download_x) & np.isfinite(download_y)
-            )
-
-            valid_ratio = np.sum(valid_mask) / valid_mask.size
-            self.logger.info(f"有效重叠区域比例: {valid_ratio:.2%}")
-
-            if valid_ratio < 0.1:  # 重叠区域小于10%
-                self.logger.warning(f"重叠区域过小 ({valid_ratio:.2%})，WCS对齐可能不准确")
+            if resampled['data'] is None:
                 self.logger.warning("自动降级到特征点对齐（Rigid）")
-                return self._align_using_features(template_file, download_file, output_dir)
-
-            # 使用插值将下载图像重采样到模板图像的坐标系
-            resample_start = time.time()
-            self.logger.info("执行图像重采样...")
-
-            # 创建坐标数组用于插值
-            coords = np.array([download_y.flatten(), download_x.flatten()])
-
-            # 使用双线性插值重采样下载图像
-            aligned_download_data = map_coordinates(
-                download_data,
-                coords,
-                order=1,  # 双线性插值
-                cval=0.0,  # 边界外的值设为0
-                prefilter=False
-            ).reshape(template_shape)
-
-            resample_time = time.time() - resample_start
-            self.logger.info(f"⏱️  图像重采样耗时: {resample_time:.3f}秒")
+                return self._align_using_features(template_file, download_file, output_dir, feature_cache_dir)
+            aligned_download_data = resampled['data']
 
             save_start = time.time()
             self.logger.info("WCS对齐完成，保存对齐后的文件...")
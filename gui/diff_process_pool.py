@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Diff阶段的进程池执行器
+Diff以NumPy/SciPy/astropy计算和Python循环为主，线程间受GIL限制；这里把可序列化的任务描述
+交给独立进程执行，结果以字典形式返回给GUI进程中的调度线程
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+
+# 子进程内的DiffOrbIntegration实例（每个进程创建一次，跨任务复用）
+_worker_diff_orb = None
+
+
+def build_diff_job(download_file: str, template_file: str, output_dir: str, options: Dict) -> Dict:
+    """
+    构建可序列化的Diff任务描述
+
+    Args:
+        download_file (str): 下载文件路径
+        template_file (str): 模板文件路径
+        output_dir (str): 输出目录
+        options (Dict): 传给 DiffOrbIntegration.process_diff 的关键字参数
+
+    Returns:
+        Dict: 只包含字符串/数值/列表的任务字典
+    """
+    return {
+        'download_file': download_file,
+        'template_file': template_file,
+        'output_dir': output_dir,
+        'options': dict(options),
+    }
+
+
+def run_diff_job(job: Dict, diff_orb=None) -> Dict:
+    """
+    执行一个Diff任务
+
+    Args:
+        job (Dict): build_diff_job 生成的任务
+        diff_orb: DiffOrbIntegration实例，None时使用（或创建）当前进程的实例
+
+    Returns:
+        Dict: {'success': bool, 'filename': str, 'message': str, 'new_spots': int, 'pid': int, 'output_dir': str}
+    """
+    global _worker_diff_orb
+
+    result_dict = {
+        'success': False,
+        'filename': os.path.basename(job['download_file']),
+        'message': '',
+        'new_spots': 0,
+        'pid': os.getpid(),
+        'output_dir': job['output_dir'],
+    }
+    try:
+        if diff_orb is None:
+            if _worker_diff_orb is None:
+                from diff_orb_integration import DiffOrbIntegration
+                _worker_diff_orb = DiffOrbIntegration()
+            diff_orb = _worker_diff_orb
+
+        diff_result = diff_orb.process_diff(
+            job['download_file'],
+            job['template_file'],
+            job['output_dir'],
+            **job['options']
+        )
+
+        if diff_result and diff_result.get('success'):
+            result_dict['success'] = True
+            result_dict['new_spots'] = diff_result.get('new_bright_spots', 0)
+            result_dict['message'] = f"{result_dict['new_spots']}个亮点"
+        else:
+            result_dict['message'] = "处理失败"
+    except Exception as e:
+        result_dict['message'] = str(e)
+
+    return result_dict
+
+
+def _init_worker(log_level: int, tile_workers: int, cache_limits: Optional[Dict] = None):
+    """子进程初始化：日志级别与父进程一致，按进程数均分分块引擎线程，设置缓存上限，并预先创建DiffOrbIntegration"""
+    global _worker_diff_orb
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    try:
+        from diff_orb_integration import DiffOrbIntegration
+        from tiled_engine import configure_tiled_executor
+        configure_tiled_executor(max_workers=tile_workers)
+        DiffOrbIntegration.configure_caches(**(cache_limits or {}))
+        _worker_diff_orb = DiffOrbIntegration()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Diff子进程初始化失败: {e}")
+
+
+class DiffProcessPool:
+    """
+    Diff进程池：提交任务字典，返回 concurrent.futures.Future
+
+    进程池可以跨多次批量处理复用（子进程中的DiffOrbIntegration与各类缓存保持预热），
+    停止时用 cancel_pending 取消尚未开始的任务，退出时再 shutdown
+    """
+
+    def __init__(self, max_workers: int, cache_limits: Optional[Dict] = None):
+        """
+        Args:
+            max_workers (int): 子进程数
+            cache_limits (Optional[Dict]): 每个子进程的缓存上限，DiffOrbIntegration.configure_caches 的关键字参数
+                （reprojection_cache_bytes / template_feature_cache_bytes），None表示默认值
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max(1, int(max_workers))
+        self.cache_limits = dict(cache_limits or {})
+        self.broken = False
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        # 统一使用spawn：GUI进程内有Tk与多个线程，fork出的子进程状态不可靠
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(logging.getLogger().getEffectiveLevel(),
+                      max(1, (os.cpu_count() or 1) // self.max_workers),
+                      dict(cache_limits or {}))
+        )
+        self.logger.info(f"Diff进程池已启动: {self.max_workers} 个进程")
+
+    def submit(self, job: Dict):
+        """提交一个Diff任务"""
+        try:
+            future = self._executor.submit(run_diff_job, job)
+        except BrokenProcessPool:
+            self.broken = True
+            raise
+        with self._pending_lock:
+            self._pending.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future):
+        with self._pending_lock:
+            self._pending.discard(future)
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            # 子进程异常退出后进程池不可再用，由调用方重新创建
+            self.broken = True
+
+    def cancel_pending(self) -> int:
+        """
+        取消尚未开始的任务（停止批量处理时使用），正在执行的任务会完成，进程池保持可用
+
+        Returns:
+            int: 取消的任务数
+        """
+        with self._pending_lock:
+            pending = list(self._pending)
+        return sum(1 for future in pending if future.cancel())
+
+    def shutdown(self, cancel_pending: bool = False):
+        """
+        关闭进程池
+
+        Args:
+            cancel_pending (bool): 是否取消尚未开始的任务（停止时使用）；正在执行的任务会完成
+        """
+        try:
+            self._executor.shutdown(wait=not cancel_pending, cancel_futures=cancel_pending)
+        except TypeError:
+            # Python < 3.9 不支持 cancel_futures
+            self._executor.shutdown(wait=not cancel_pending)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+夜间小行星星历缓存
+按观测夜与天区预先计算粗时间网格上的小天体位置，查询时直接插值，避免在线传播全部轨道
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from mpcorb_propagator import (MPCORBPropagator, asteroid_results_table, compute_observer_geometry,
+                               radec_to_unit_vector)
+
+
+EPHEMERIS_CACHE_VERSION = 1
+
+
+def night_window_utc(date_str: str, longitude: float, hours_before: float = 8.0,
+                     hours_after: float = 8.0) -> Tuple[datetime, datetime]:
+    """
+    计算观测夜的UTC时间窗口（以当地平太阳时午夜为中心）
+
+    Args:
+        date_str (str): 观测夜开始日期 YYYYMMDD
+        longitude (float): 测站经度（度，东经为正）
+        hours_before (float): 午夜前小时数
+        hours_after (float): 午夜后小时数
+
+    Returns:
+        Tuple[datetime, datetime]: (开始UTC, 结束UTC)
+    """
+    day = datetime.strptime(date_str, "%Y%m%d").replace(tzinfo=timezone.utc)
+    local_midnight_utc = day + timedelta(days=1) - timedelta(hours=longitude / 15.0)
+    return local_midnight_utc - timedelta(hours=hours_before), local_midnight_utc + timedelta(hours=hours_after)
+
+
+def default_cache_path(cache_dir: str, date_str: str, latitude: float, longitude: float) -> str:
+    """按观测夜与测站生成缓存文件路径"""
+    return os.path.join(cache_dir, f"ephem_{date_str}_{latitude:+.3f}_{longitude:+.3f}.npz")
+
+
+def build_ephemeris_cache(engine: MPCORBPropagator, eph, ts, regions: Dict[str, Tuple[float, float]],
+                          start_utc: datetime, end_utc: datetime, latitude: float, longitude: float,
+                          step_minutes: float = 10.0, margin_deg: float = 3.0,
+                          metadata: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """
+    在时间网格上传播全部天体，保留任一时刻落在任一天区中心margin内的天体
+
+    Args:
+        engine: MPCORB传播引擎（已做H筛选）
+        eph: Skyfield星历
+        ts: Skyfield Timescale
+        regions: {天区编号: (RA, DEC)}
+        start_utc / end_utc: 时间窗口（带时区的UTC）
+        latitude / longitude: 测站位置
+        step_minutes (float): 时间网格步长（分钟）
+        margin_deg (float): 天区中心的保留半径（度）
+        metadata (Optional[Dict]): 额外的有效性元数据（MPCORB哈希、H上限等）
+
+    Returns:
+        Dict[str, np.ndarray]: 可直接写入npz的数组字典
+    """
+    logger = logging.getLogger(__name__)
+
+    n_steps = int(np.floor((end_utc - start_utc).total_seconds() / (step_minutes * 60.0))) + 1
+    times = [start_utc + timedelta(minutes=step_minutes * k) for k in range(n_steps)]
+
+    region_names = sorted(regions.keys())
+    centers = np.array([regions[k] for k in region_names], dtype=np.float64).reshape(-1, 2)
+    # 天区中心的KD树（单位向量弦长度量），避免 天体数 x 天区数 的稠密矩阵
+    from scipy.spatial import cKDTree
+    center_tree = cKDTree(radec_to_unit_vector(centers[:, 0], centers[:, 1]))
+    chord_margin = 2.0 * np.sin(np.deg2rad(margin_deg) / 2.0)
+
+    # 第一遍：确定在任一时刻靠近任一天区的天体
+    keep = np.zeros(len(engine), dtype=bool)
+    jd_grid = np.empty(n_steps, dtype=np.float64)
+    geometries = []
+    for k, dt in enumerate(times):
+        t = ts.from_datetime(dt)
+        geometry = compute_observer_geometry(eph, t, latitude, longitude)
+        geometries.append(geometry)
+        jd_grid[k] = geometry['jd_tt']
+        u, _ = engine.astrometric_unit_vectors(geometry)
+        dist, _ = center_tree.query(u, k=1, distance_upper_bound=chord_margin)
+        keep |= np.isfinite(dist)
+        logger.info(f"星历缓存网格 {k + 1}/{n_steps}: 累计保留 {int(np.count_nonzero(keep))} 个天体")
+
+    # 第二遍：仅对保留的天体记录各网格点的方向
+    index = np.nonzero(keep)[0]
+    vectors = np.empty((len(index), n_steps, 3), dtype=np.float32)
+    for k, geometry in enumerate(geometries):
+        u, _ = engine.astrometric_unit_vectors(geometry, index)
+        vectors[:, k, :] = u
+
+    meta = dict(metadata or {})
+    meta.update({
+        'version': EPHEMERIS_CACHE_VERSION,
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'start_utc': start_utc.isoformat(),
+        'end_utc': end_utc.isoformat(),
+        'step_minutes': float(step_minutes),
+        'margin_deg': float(margin_deg),
+        'created': datetime.now().isoformat(),
+    })
+
+    return {
+        'meta': np.array(json.dumps(meta, ensure_ascii=False)),
+        'jd_tt': jd_grid,
+        'designations': np.asarray(engine.designations[index]).astype(str),
+        'magnitude_h': engine.magnitude_h[index],
+        'vectors': vectors,
+        'region_names': np.array(region_names, dtype=str),
+        'region_centers': centers,
+    }
+
+
+def save_ephemeris_cache(path: str, arrays: Dict[str, np.ndarray]):
+    """写入缓存文件（先写临时文件再替换，避免读到半个文件）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+class EphemerisCache:
+    """已构建的夜间星历缓存（只读）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        with np.load(path, allow_pickle=False) as data:
+            self.meta = json.loads(str(data['meta']))
+            self.jd_tt = data['jd_tt']
+            self.designations = data['designations']
+            self.magnitude_h = data['magnitude_h']
+            self.vectors = data['vectors']
+            self.region_names = list(data['region_names'])
+            self.region_centers = data['region_centers']
+        self._center_vectors = radec_to_unit_vector(self.region_centers[:, 0], self.region_centers[:, 1])
+
+    def is_valid_for(self, mpcorb_sha1: str, h_limit: float, latitude: float, longitude: float,
+                     tolerance_deg: float = 1e-3) -> bool:
+        """检查缓存元数据与当前MPCORB文件、H上限和测站是否一致"""
+        m = self.meta
+        return (m.get('version') == EPHEMERIS_CACHE_VERSION
+                and m.get('mpcorb_sha1') == mpcorb_sha1
+                and float(m.get('h_limit', -1)) == float(h_limit)
+                and abs(float(m.get('latitude', 1e9)) - float(latitude)) <= tolerance_deg
+                and abs(float(m.get('longitude', 1e9)) - float(longitude)) <= tolerance_deg)
+
+    def covers(self, jd_tt: float, ra: float, dec: float, search_radius: float) -> bool:
+        """判断查询的时间和圆锥是否完全落在缓存覆盖范围内"""
+        if len(self.jd_tt) < 2 or not (self.jd_tt[0] <= jd_tt <= self.jd_tt[-1]):
+            return False
+        target = radec_to_unit_vector(ra, dec)
+        sep = np.rad2deg(np.arccos(np.clip(self._center_vectors @ target, -1.0, 1.0)))
+        return bool(np.any(sep + float(search_radius) <= float(self.meta.get('margin_deg', 0.0))))
+
+    def unit_vectors_at(self, jd_tt: float) -> np.ndarray:
+        """在时间网格上线性插值全部缓存天体的方向"""
+        k = int(np.clip(np.searchsorted(self.jd_tt, jd_tt) - 1, 0, len(self.jd_tt) - 2))
+        w = (jd_tt - self.jd_tt[k]) / (self.jd_tt[k + 1] - self.jd_tt[k])
+        u = (1.0 - w) * self.vectors[:, k, :].astype(np.float64) + w * self.vectors[:, k + 1, :].astype(np.float64)
+        return u / np.linalg.norm(u, axis=1)[:, None]
+
+    def cone_search(self, jd_tt: float, ra: float, dec: float, search_radius: float) -> Dict[str, np.ndarray]:
+        """
+        插值圆锥搜索，返回格式与 MPCORBPropagator.cone_search 相同（index 为缓存内下标）
+        """
+        u = self.unit_vectors_at(jd_tt)
+        target = radec_to_unit_vector(ra, dec)
+        sep = np.rad2deg(np.arccos(np.clip(u @ target, -1.0, 1.0)))
+        hit = np.nonzero(sep <= float(search_radius))[0]
+        hit_u = u[hit]
+        min_index = int(np.argmin(sep)) if len(sep) else -1
+        return {
+            'index': hit,
+            'ra': np.mod(np.rad2deg(np.arctan2(hit_u[:, 1], hit_u[:, 0])), 360.0),
+            'dec': np.rad2deg(np.arcsin(np.clip(hit_u[:, 2], -1.0, 1.0))),
+            'sep': sep[hit],
+            'min_index': min_index,
+            'min_sep': float(sep[min_index]) if min_index >= 0 else None,
+        }
+
+    def results_table(self, hits: Dict[str, np.ndarray]):
+        """组装为与离线查询一致的 Name/Number/Type/RA/DEC/Mv 表"""
+        return asteroid_results_table(self.designations, self.magnitude_h, hits)
+
+
+def cache_path_for_time(cache_dir: str, utc_time: datetime, latitude: float, longitude: float) -> str:
+    """根据观测时刻确定所属观测夜（当地平太阳时中午为界）对应的缓存文件路径"""
+    if utc_time.tzinfo is not None:
+        utc_time = utc_time.astimezone(timezone.utc).replace(tzinfo=None)
+    local_noon_shifted = utc_time + timedelta(hours=longitude / 15.0) - timedelta(hours=12)
+    return default_cache_path(cache_dir, local_noon_shifted.strftime("%Y%m%d"), latitude, longitude)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+轻量FITS主头探测
+只读取主HDU头部的2880字节块直到END卡片，不打开数据单元、不依赖astropy；
+结果按 (路径, mtime, 大小) 缓存，流水线、WCSChecker 与图像查看器目录树共享
+"""
+
+import os
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+FITS_BLOCK_SIZE = 2880
+FITS_CARD_SIZE = 80
+
+# 头部块数上限（防止异常文件读到数据区）
+MAX_HEADER_BLOCKS = 64
+
+# 只保留与WCS/ASTAP判断相关的关键字，缓存条目保持很小
+WCS_KEYWORDS = (
+    'NAXIS', 'NAXIS1', 'NAXIS2',
+    'CTYPE1', 'CTYPE2', 'CUNIT1', 'CUNIT2',
+    'CRVAL1', 'CRVAL2', 'CRPIX1', 'CRPIX2',
+    'CDELT1', 'CDELT2', 'CROTA1', 'CROTA2',
+    'CD1_1', 'CD1_2', 'CD2_1', 'CD2_2',
+    'PC1_1', 'PC1_2', 'PC2_1', 'PC2_2',
+    'EQUINOX', 'RADESYS', 'LONPOLE', 'LATPOLE',
+    'PLTSOLVD', 'ASTAP', 'ASTAP0',
+)
+
+# SIP畸变项（A_ORDER、A_i_j、AP_i_j 等）按前缀保留，验证WCS时不能只用线性部分
+SIP_KEYWORD_PREFIXES = ('A_', 'B_', 'AP_', 'BP_')
+
+
+def _parse_card_value(raw: str):
+    """解析卡片值：字符串、逻辑值、整数、浮点数，去掉行内注释"""
+    raw = raw.strip()
+    if raw.startswith("'"):
+        # 字符串值，'' 表示转义的单引号
+        end = 1
+        chars = []
+        while end < len(raw):
+            if raw[end] == "'":
+                if end + 1 < len(raw) and raw[end + 1] == "'":
+                    chars.append("'")
+                    end += 2
+                    continue
+                break
+            chars.append(raw[end])
+            end += 1
+        return ''.join(chars).rstrip()
+    value = raw.split('/', 1)[0].strip()
+    if value == 'T':
+        return True
+    if value == 'F':
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value.replace('D', 'E'))
+    except ValueError:
+        return value
+
+
+def read_primary_header(path: str, keywords=WCS_KEYWORDS, prefixes=SIP_KEYWORD_PREFIXES) -> Optional[Dict]:
+    """
+    读取主HDU头部中指定的关键字
+
+    Args:
+        path (str): FITS文件路径
+        keywords: 需要保留的关键字，None表示全部
+        prefixes: 另外按前缀保留的关键字
+
+    Returns:
+        Optional[Dict]: {关键字: 值}；不是FITS文件或头部不完整时返回None
+    """
+    wanted = set(keywords) if keywords is not None else None
+    cards = {}
+    with open(path, 'rb') as f:
+        for block_index in range(MAX_HEADER_BLOCKS):
+            block = f.read(FITS_BLOCK_SIZE)
+            if len(block) < FITS_BLOCK_SIZE:
+                return None
+            if block_index == 0 and not block.startswith(b'SIMPLE'):
+                return None
+            text = block.decode('ascii', errors='replace')
+            for i in range(0, FITS_BLOCK_SIZE, FITS_CARD_SIZE):
+                card = text[i:i + FITS_CARD_SIZE]
+                keyword = card[:8].strip()
+                if keyword == 'END':
+                    return cards
+                if card[8:10] != '= ' or not keyword:
+                    continue
+                if wanted is None or keyword in wanted or keyword.startswith(prefixes):
+                    cards[keyword] = _parse_card_value(card[10:])
+    return None
+
+
+def cards_have_wcs(cards: Optional[Dict]) -> bool:
+    """与流水线原有判断一致：CRVAL1/CRVAL2 均存在"""
+    return bool(cards) and 'CRVAL1' in cards and 'CRVAL2' in cards
+
+
+def cards_have_astap_solution(cards: Optional[Dict]) -> bool:
+    """与ASTAPProcessor原有判断一致：有CRVAL或ASTAP标记"""
+    return bool(cards) and (cards_have_wcs(cards) or 'ASTAP' in cards or 'ASTAP0' in cards)
+
+
+class HeaderProbeCache:
+    """按 (路径, mtime, 大小) 缓存的头部探测结果；文件被ASTAP等改写后自动失效"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[str, tuple] = {}
+
+    def _stat_key(self, path: str):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, path: str, name: str, compute: Callable[[str], object]):
+        """
+        获取 path 的命名探测结果，缓存失效时调用 compute(path) 重新计算
+
+        Args:
+            path (str): 文件路径
+            name (str): 结果名称（如 'cards'、'wcs_valid'）
+            compute (Callable): 计算函数
+
+        Returns:
+            计算结果；文件不存在时抛出 OSError
+        """
+        path = os.path.abspath(path)
+        stat_key = self._stat_key(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == stat_key and name in entry[1]:
+                return entry[1][name]
+        value = compute(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if not entry or entry[0] != stat_key:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                entry = (stat_key, {})
+                self._entries[path] = entry
+            entry[1][name] = value
+        return value
+
+    def header_cards(self, path: str) -> Optional[Dict]:
+        """主头中与WCS相关的关键字（缓存）"""
+        return self.get(path, 'cards', read_primary_header)
+
+    def has_wcs(self, path: str) -> bool:
+        """主头是否包含CRVAL1/CRVAL2；读取失败时返回False"""
+        try:
+            return cards_have_wcs(self.header_cards(path))
+        except OSError as e:
+            self.logger.debug(f"头部探测失败 {path}: {e}")
+            return False
+
+    def has_astap_solution(self, path: str) -> bool:
+        """主头是否已有WCS或ASTAP求解标记；读取失败时返回False"""
+        try:
+            return cards_have_astap_solution(self.header_cards(path))
+        except OSError as e:
+            self.logger.debug(f"头部探测失败 {path}: {e}")
+            return False
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+
+_shared_probe = HeaderProbeCache()
+
+
+def get_header_probe() -> HeaderProbeCache:
+    """进程内共享的头部探测缓存"""
+    return _shared_probe
@@ -15,6 +15,7 @@ import time
 import threading
 import queue
 import json
+from collections import OrderedDict
 from urllib.parse import urlencode
 from urllib.request import urlopen
 
@@ -39,6 +40,13 @@ from cds_dss_download.dss_cds_downloader import download_dss_rot
 from line_in_pic.detect_center_lines import detect_lines_near_center, annotate_image, point_to_segment_distance, compute_line_saliency_map
 
 
+# FFT相位相关粗配准（diff_orb目录已由diff_orb_integration加入sys.path）
+try:
+    from coarse_registration import CoarseRegistration, estimate_translation
+except ImportError:
+    CoarseRegistration = None
+    estimate_translation = None
+
 # 尝试导入ASTAP处理器
 try:
     from astap_processor import ASTAPProcessor
@@ -57,6 +65,41 @@ try:
 except ImportError:
     GoodBadListExporter = None
 
+# MPCORB向量化轨道传播引擎
+try:
+    from mpcorb_propagator import (MPCORBPropagator, MPCORBEpochSnapshot, MPCORB_NUMERIC_COLUMNS,
+                                   compute_observer_geometry, cross_check_with_skyfield, file_sha1,
+                                   columnar_cache_dir as mpcorb_columnar_cache_dir,
+                                   load_columnar_cache as load_mpcorb_columnar_cache)
+except ImportError:
+    MPCORBPropagator = None
+
+# 夜间星历缓存（由 tools/build_ephemeris_cache.py 预计算）
+try:
+    from ephemeris_cache import EphemerisCache, cache_path_for_time
+except ImportError:
+    EphemerisCache = None
+
+# 本地卫星TLE库与批量SGP4传播
+try:
+    from satellite_store import (SatelliteCatalog, SatelliteEpochSnapshot, CELESTRAK_ACTIVE_URL,
+                                 default_tle_path, download_tle_file, match_points_to_streaks)
+except ImportError:
+    SatelliteCatalog = None
+
+# 本地星表列预处理（向量化圆锥/星等筛选）
+try:
+    from local_catalog_table import PreparedCatalog
+except ImportError:
+    PreparedCatalog = None
+
+# Gaia DR3 vclassre 变星目录空间索引
+try:
+    from variable_star_index import VariableStarIndex, build_vclassre_index
+except ImportError:
+    VariableStarIndex = None
+    build_vclassre_index = None
+
 # AI GOOD/BAD 质量自动标记分类器（可选依赖）
 try:
     from ai_filter.classifier import AIPairQualityClassifier
@@ -98,10 +141,36 @@ class FitsImageViewer:
         self._use_local_query_override = False
 
         # 本地目录缓存，避免重复读取大文件
-        self._local_asteroid_cache = None  # (path, table)
-        self._local_vsx_cache = None  # (path, table)
-        # MPCORB缓存：存储(dataframe, ts, eph)以避免重复加载
-        self._mpcorb_cache = None  # (path, df, ts, eph)
+        self._local_asteroid_cache = None  # (path, PreparedCatalog)
+        self._local_vsx_cache = None  # (path, PreparedCatalog)
+        self._vclassre_index_cache = None  # (path, VariableStarIndex)
+        self._vclassre_index_missing_logged = set()  # 已提示过索引缺失的目录路径
+        self._vclassre_index_builder = None  # 后台构建vclassre索引的线程
+        self._vclassre_index_builder_lock = threading.Lock()
+        # MPCORB缓存：存储解析后的dataframe以避免重复加载
+        self._mpcorb_cache = None  # (path, df, raw_count)
+        # Skyfield时标与星历缓存
+        self._skyfield_cache = None  # (ephemeris_file_path, ts, eph)
+        # MPCORB向量化传播引擎缓存
+        self._mpcorb_engine_cache = None  # (path, h_limit, engine)
+        # 按曝光历元缓存的全目录位置快照：同一帧（及同历元的其它帧）的所有检测共享一次传播
+        self._mpcorb_epoch_snapshots = OrderedDict()  # (path, h_limit, jd_tt, lat, lon) -> snapshot
+        self._mpcorb_epoch_snapshot_limit = 8
+        self._mpcorb_epoch_lock = threading.Lock()
+        # 夜间星历缓存与MPCORB文件哈希
+        self._ephemeris_cache = None  # (path, EphemerisCache)
+        self._mpcorb_sha1_cache = None  # ((path, mtime, size), sha1)
+        self._mpcorb_cache_writer = None  # 后台写入MPCORB二进制缓存的线程
+        self._mpcorb_cache_writer_lock = threading.Lock()
+        # 本地TLE库与按曝光历元缓存的卫星方向快照
+        self._satellite_catalog_cache = None  # (path, mtime, SatelliteCatalog)
+        self._tle_download_failure = None  # (path, 失败时间)，重试间隔内不再下载
+        self._tle_download_retry_seconds = 600.0
+        self._satellite_epoch_snapshots = OrderedDict()  # (path, mtime, utc, lat, lon) -> snapshot
+        self._satellite_epoch_lock = threading.Lock()
+        self._satellite_streak_cache = OrderedDict()  # (fits_path, mtime, utc, lat, lon) -> (streaks, wcs, scale)
+        self._satellite_cache_limit = 8  # 卫星历元快照与整帧轨迹预测各自保留的条目数
+        self._skyfield_timescale = None
 
         # AI GOOD/BAD
         self._ai_classifier = None
@@ -123,7 +192,9 @@ class FitsImageViewer:
                 project_root = os.path.dirname(current_dir)  # 项目根目录
                 config_path = os.path.join(project_root, "config", "url_config.json")
 
-                self.astap_processor = ASTAPProcessor(config_path)
+                fast_solve_settings = (self.config_manager.get_plate_solve_fast_path_settings()
+                                       if self.config_manager else None)
+                self.astap_processor = ASTAPProcessor(config_path, fast_solve_settings=fast_solve_settings)
                 self.logger.info("ASTAP处理器初始化成功")
             except Exception as e:
                 self.logger.warning(f"ASTAP处理器初始化失败: {str(e)}")
@@ -932,6 +1003,7 @@ class FitsImageViewer:
             # 映射配置文件中的值到GUI选项
             alignment_mapping = {
                 'orb': 'rigid',
+                'asterism': 'asterism',
                 'ecc': 'wcs',
                 'astropy_reproject': 'astropy_reproject',
                 'swarp': 'swarp'
@@ -1125,6 +1197,7 @@ class FitsImageViewer:
             # 确定对齐方式 - 映射GUI选项到配置文件值
             alignment_mapping = {
                 'rigid': 'orb',
+                'asterism': 'asterism',
                 'wcs': 'ecc',
                 'astropy_reproject': 'astropy_reproject',
                 'swarp': 'swarp'
@@ -1659,8 +1732,15 @@ class FitsImageViewer:
         except Exception as e:
             self.logger.error(f"保存查询设置失败: {str(e)}")
 
-    def _get_batch_query_interval_seconds(self) -> float:
-        """获取批量查询间隔（秒），优先从配置读取，失败时返回默认值5秒"""
+    def _get_batch_query_interval_seconds(self, offline_aware=False) -> float:
+        """获取批量查询间隔（秒），优先从配置读取，失败时返回默认值5秒
+
+        Args:
+            offline_aware: 为True时，若小行星与变星查询均走本地库则返回0（间隔仅用于在线服务限流）
+        """
+        if offline_aware and self._batch_queries_are_offline():
+            return 0.0
+
         # 默认值
         default_interval = 5.0
 
@@ -1684,6 +1764,20 @@ class FitsImageViewer:
         except Exception:
             return default_interval
 
+    def _batch_queries_are_offline(self) -> bool:
+        """判断当前小行星与变星查询是否都使用本地库（与 _query_skybot / _query_vsx 的后端选择一致）"""
+        if getattr(self, '_force_online_query', False):
+            return False
+        if self._resolve_asteroid_query_method() != "local":
+            return False
+        if getattr(self, '_use_local_query_override', False):
+            return True
+        try:
+            ls = self.config_manager.get_local_catalog_settings() if self.config_manager else {}
+            return bool((ls or {}).get("buttons_use_local_query", False))
+        except Exception:
+            return False
+
     def _load_detection_filter_settings(self):
         """从配置文件加载检测过滤设置"""
         if not self.config_manager:
@@ -4327,6 +4421,52 @@ class FitsImageViewer:
             error_msg = f"批量导出失败: {str(e)}"
             self.logger.error(error_msg, exc_info=True)
             messagebox.showerror("错误", error_msg)
+
+    def _pick_reference_and_aligned_fits(self, fits_dir: Path):
+        """在 fits_dir 中选择 reference(模板) / aligned(对齐后下载图) 两个 FITS。
+
+        约定（来自 diff_orb 输出）：
+        - 模板文件通常以 "K" 开头（如 K053-1_noise_cleaned_aligned.fits）
+        - 下载/对齐文件通常以 "GY" 开头（如 GY1_K053-1_noise_cleaned_aligned.fits）
+        """
+        if not fits_dir or not fits_dir.exists():
+            return None, None
+
+        all_fits = []
+        for pat in ("*.fits", "*.fit", "*.fts"):
+            all_fits.extend(list(fits_dir.glob(pat)))
+
+        if not all_fits:
+            return None, None
+
+        # 优先 noise_cleaned_aligned（且非 stretched）
+        preferred = [
+            f for f in all_fits
+            if ("noise_cleaned_aligned" in f.name.lower() and "stretched" not in f.name.lower())
+        ]
+        candidates = preferred if preferred else all_fits
+
+        # 再次收缩到 aligned 相关文件，避免误选原始未对齐 FITS
+        aligned_like = [f for f in candidates if "aligned" in f.name.lower()]
+        candidates = aligned_like if aligned_like else candidates
+
+        # 选择模板(reference) 与 对齐图(aligned)
+        ref = next((f for f in candidates if re.match(r"^k\d", f.name, re.IGNORECASE)), None)
+        ali = next((f for f in candidates if re.match(r"^gy\d", f.name, re.IGNORECASE)), None)
+
+        if ref and not ali:
+            ali = next((f for f in candidates if f != ref), None)
+        if ali and not ref:
+            ref = next((f for f in candidates if f != ali), None)
+
+        # 兜底：如果仍无法区分，但恰好两个候选，则按名字排序取前后
+        if (ref is None or ali is None) and len(candidates) == 2:
+            s = sorted(candidates, key=lambda p: p.name.lower())
+            ref = ref or s[0]
+            ali = ali or s[1]
+
+        return ref, ali
+
     def _export_ai_training_data(self):
         """将当前选择目录/文件下所有手工标记为 GOOD/BAD 的目标对应的 reference/aligned 图像导出到配置的AI训练根目录。
 
@@ -4422,51 +4562,6 @@ class FitsImageViewer:
                 except Exception:
                     return name_
 
-            def _pick_reference_and_aligned_fits(fits_dir_: Path):
-                """在 fits_dir_ 中选择 reference(模板) / aligned(对齐后下载图) 两个 FITS。
-
-                约定（来自 diff_orb 输出）：
-                - 模板文件通常以 "K" 开头（如 K053-1_noise_cleaned_aligned.fits）
-                - 下载/对齐文件通常以 "GY" 开头（如 GY1_K053-1_noise_cleaned_aligned.fits）
-                """
-                if not fits_dir_ or not fits_dir_.exists():
-                    return None, None
-
-                all_fits_ = []
-                for pat in ("*.fits", "*.fit", "*.fts"):
-                    all_fits_.extend(list(fits_dir_.glob(pat)))
-
-                if not all_fits_:
-                    return None, None
-
-                # 优先 noise_cleaned_aligned（且非 stretched）
-                preferred_ = [
-                    f for f in all_fits_
-                    if ("noise_cleaned_aligned" in f.name.lower() and "stretched" not in f.name.lower())
-                ]
-                candidates_ = preferred_ if preferred_ else all_fits_
-
-                # 再次收缩到 aligned 相关文件，避免误选原始未对齐 FITS
-                aligned_like_ = [f for f in candidates_ if "aligned" in f.name.lower()]
-                candidates_ = aligned_like_ if aligned_like_ else candidates_
-
-                # 选择模板(reference) 与 对齐图(aligned)
-                ref_ = next((f for f in candidates_ if re.match(r"^k\d", f.name, re.IGNORECASE)), None)
-                ali_ = next((f for f in candidates_ if re.match(r"^gy\d", f.name, re.IGNORECASE)), None)
-
-                if ref_ and not ali_:
-                    ali_ = next((f for f in candidates_ if f != ref_), None)
-                if ali_ and not ref_:
-                    ref_ = next((f for f in candidates_ if f != ali_), None)
-
-                # 兜底：如果仍无法区分，但恰好两个候选，则按名字排序取前后
-                if (ref_ is None or ali_ is None) and len(candidates_) == 2:
-                    s_ = sorted(candidates_, key=lambda p: p.name.lower())
-                    ref_ = ref_ or s_[0]
-                    ali_ = ali_ or s_[1]
-
-                return ref_, ali_
-
             def _get_cutout_center_xy_from_detection_filename(detection_img_path_: str, aligned_fits_path_: Path):
                 """从 detection cutout 文件名提取中心像素坐标（在 aligned 坐标系下）。"""
                 if not detection_img_path_:
@@ -4704,7 +4799,7 @@ class FitsImageViewer:
                                 cutout_dir0 = Path(any_det_img).parent
                                 detection_dir0 = cutout_dir0.parent
                                 fits_dir0 = detection_dir0.parent
-                                ref_fits_path, ali_fits_path = _pick_reference_and_aligned_fits(fits_dir0)
+                                ref_fits_path, ali_fits_path = self._pick_reference_and_aligned_fits(fits_dir0)
                     except Exception:
                         ref_fits_path, ali_fits_path = None, None
 
@@ -6181,6 +6276,9 @@ class FitsImageViewer:
             self.logger.info(f"差异计算方式: {diff_calc_mode}")
             apply_diff_postprocess = self.apply_diff_postprocess_var.get()
             self.logger.info(f"difference后处理(去负值+中值): {'启用' if apply_diff_postprocess else '禁用'}")
+            batch_settings = self.config_manager.get_batch_process_settings() if self.config_manager else {}
+            in_memory = bool(batch_settings.get('in_memory_pipeline', False))
+            feature_cache_dir = DiffOrbIntegration.feature_cache_dir_for(template_file, batch_settings)
 
             # 更新进度：开始执行Diff
             filename = os.path.basename(self.selected_file_path)
@@ -6201,7 +6299,9 @@ class FitsImageViewer:
                                               generate_gif=generate_gif,
                                               science_bg_mode=science_bg_mode,
                                               diff_calc_mode=diff_calc_mode,
-                                              apply_diff_postprocess=apply_diff_postprocess)
+                                              apply_diff_postprocess=apply_diff_postprocess,
+                                              in_memory=in_memory,
+                                              feature_cache_dir=feature_cache_dir)
 
             if result and result.get('success'):
                 # 更新进度：处理完成
@@ -9439,47 +9539,9 @@ class FitsImageViewer:
                 self.skybot_result_label.update_idletasks()  # 强制刷新界面
 
             # 执行小行星查询（根据设置/覆盖开关和高级选项选择后端）
-            # 1) 先读取配置中的小行星查询方式: auto / skybot / local / pympc
-            method = "auto"
-            if use_pympc:
-                method = "pympc"
-            elif self.config_manager:
-                try:
-                    ls = self.config_manager.get_local_catalog_settings() or {}
-                    method_cfg = str(ls.get("asteroid_query_method", "auto")).lower()
-                    if method_cfg in ("auto", "skybot", "local", "pympc"):
-                        method = method_cfg
-                except Exception:
-                    pass
-
-            # 2) 应用临时覆盖开关
-            force_online = getattr(self, '_force_online_query', False)
-            use_local_override = getattr(self, '_use_local_query_override', False)
-
-            if force_online:
-                # 强制在线: 一律使用 Skybot
-                method_effective = "skybot"
-            elif use_local_override:
-                # 临时强制本地: auto -> local，其它保持用户显式选择
-                if method == "auto":
-                    method_effective = "local"
-                else:
-                    method_effective = method
-            else:
-                method_effective = method
-
-            # 3) auto 模式下沿用原有逻辑: 按钮"手动按钮本地查询"为 True 时走本地MPCORB，否则走Skybot
-            if method_effective == "auto" and self.config_manager:
-                try:
-                    ls = self.config_manager.get_local_catalog_settings() or {}
-                    if bool(ls.get("buttons_use_local_query", False)):
-                        method_effective = "local"
-                    else:
-                        method_effective = "skybot"
-                except Exception:
-                    method_effective = "skybot"
+            method_effective = self._resolve_asteroid_query_method(use_pympc)
 
-            # 4) 根据最终方式选择后端并输出模式日志
+            # 根据最终方式选择后端并输出模式日志
             if method_effective == "local":
                 source = "离线MPCORB"
             elif method_effective == "pympc":
@@ -9674,6 +9736,50 @@ class FitsImageViewer:
             except Exception:
                 pass
 
+    def _resolve_asteroid_query_method(self, use_pympc=False) -> str:
+        """根据配置与临时覆盖开关确定实际使用的小行星查询后端（skybot / local / pympc）"""
+        # 1) 先读取配置中的小行星查询方式: auto / skybot / local / pympc
+        method = "auto"
+        if use_pympc:
+            method = "pympc"
+        elif self.config_manager:
+            try:
+                ls = self.config_manager.get_local_catalog_settings() or {}
+                method_cfg = str(ls.get("asteroid_query_method", "auto")).lower()
+                if method_cfg in ("auto", "skybot", "local", "pympc"):
+                    method = method_cfg
+            except Exception:
+                pass
+
+        # 2) 应用临时覆盖开关
+        force_online = getattr(self, '_force_online_query', False)
+        use_local_override = getattr(self, '_use_local_query_override', False)
+
+        if force_online:
+            # 强制在线: 一律使用 Skybot
+            method_effective = "skybot"
+        elif use_local_override:
+            # 临时强制本地: auto -> local，其它保持用户显式选择
+            if method == "auto":
+                method_effective = "local"
+            else:
+                method_effective = method
+        else:
+            method_effective = method
+
+        # 3) auto 模式下沿用原有逻辑: 按钮"手动按钮本地查询"为 True 时走本地MPCORB，否则走Skybot
+        if method_effective == "auto":
+            method_effective = "skybot"
+            if self.config_manager:
+                try:
+                    ls = self.config_manager.get_local_catalog_settings() or {}
+                    if bool(ls.get("buttons_use_local_query", False)):
+                        method_effective = "local"
+                except Exception:
+                    pass
+
+        return method_effective
+
     def _query_skybot_force_online_current(self):
         """仅使用 Skybot 在线查询当前检测结果的小行星。
 
@@ -10492,87 +10598,36 @@ class FitsImageViewer:
             if is_mpcorb:
                 # 使用Skyfield基于MPCORB离线计算当前位置
                 try:
-                    from skyfield.api import load, wgs84, utc
-                    from skyfield.data import mpc
-                    from skyfield.constants import GM_SUN_Pitjeva_2005_km3_s2 as GM_SUN
-                    import pandas as pd
+                    from skyfield.api import load, utc
                 except Exception as e:
                     err = f"未找到Skyfield依赖，无法解析MPCORB: {e}"
                     self.logger.error(err)
                     if self.log_callback:
                         self.log_callback(err, "ERROR")
                     return None
+                if MPCORBPropagator is None:
+                    err = "未找到MPCORB向量化传播引擎(mpcorb_propagator)，无法离线计算小行星位置"
+                    self.logger.error(err)
+                    if self.log_callback:
+                        self.log_callback(err, "ERROR")
+                    return None
 
-                # 计算观测时刻与观测者（使用本地GPS，顶点观测）
-                ts = None
-                eph = None
-                df = None
-
-                # 缓存复用
-                if self._mpcorb_cache and self._mpcorb_cache[0] == catalog_path:
-                    _, df, ts, eph = self._mpcorb_cache
-                else:
-                    # 加载MPCORB为DataFrame
-                    # 注意：文件可能很大，建议用户提供摘录文件
-                    try:
-                        with open(catalog_path, 'rb') as f:
-                            df = mpc.load_mpcorb_dataframe(f)
-                    except Exception:
-                        # 尝试文本方式
-                        with open(catalog_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            df = mpc.load_mpcorb_dataframe(f)
-
-                    # 统计原始条目数（统一放在读取后，避免只在异常分支统计）
-                    try:
-                        raw_count = len(df)
-                    except Exception:
-                        raw_count = None
-
-                    # 将关键轨道要素列转换为数值（Skyfield需要浮点）
-                    try:
-                        numeric_cols = [
-                            'magnitude_H','magnitude_G','mean_anomaly_degrees',
-                            'argument_of_perihelion_degrees','longitude_of_ascending_node_degrees',
-                            'inclination_degrees','eccentricity','mean_daily_motion_degrees',
-                            'semimajor_axis_au'
-                        ]
-                        import pandas as pd
-                        for c in numeric_cols:
-                            if c in df.columns:
-                                df[c] = pd.to_numeric(df[c], errors='coerce')
-                    except Exception:
-                        pass
-
-                        # 统计原始条目数
-                        try:
-                            raw_count = len(df)
-                        except Exception:
-                            raw_count = None
-
-
-                        # 将关键轨道要素列转换为数值（Skyfield需要浮点）
-                        try:
-                            numeric_cols = [
-                                'magnitude_H','magnitude_G','mean_anomaly_degrees',
-                                'argument_of_perihelion_degrees','longitude_of_ascending_node_degrees',
-                                'inclination_degrees','eccentricity','mean_daily_motion_degrees',
-                                'semimajor_axis_au'
-                            ]
-                            import pandas as pd
-                            for c in numeric_cols:
-                                if c in df.columns:
-                                    df[c] = pd.to_numeric(df[c], errors='coerce')
-                        except Exception:
-                            pass
-
-
-                    # 过滤非法轨道
-                    if 'semimajor_axis_au' in df.columns:
-                        df = df[~df['semimajor_axis_au'].isnull()]
+                # 优先使用预计算的夜间星历缓存（tools/build_ephemeris_cache.py），命中则无需解析MPCORB
+                cached_results = self._query_local_ephemeris_cache(
+                    catalog_path, settings, ra, dec, utc_time, latitude, longitude, search_radius)
+                if cached_results is not None:
+                    return cached_results
 
-                    # 缓存时标与星历
-                    ts = load.timescale()
+                # H上限过滤（默认20）
+                try:
+                    h_limit = float((settings or {}).get('mpc_h_limit', 20))
+                except Exception:
+                    h_limit = 20.0
 
+                # 时标与星历单独缓存：二进制缓存命中时无需解析MPCORB文本
+                if self._skyfield_cache and self._skyfield_cache[0] == (settings or {}).get('ephemeris_file_path'):
+                    _, ts, eph = self._skyfield_cache
+                else:
                     # 获取星历文件路径（默认 gui/ephemeris/de421.bsp）
                     current_dir = os.path.dirname(os.path.abspath(__file__))
                     default_ephem = os.path.join(current_dir, 'ephemeris', 'de421.bsp')
@@ -10583,509 +10638,419 @@ class FitsImageViewer:
                         if self.log_callback:
                             self.log_callback(err, 'ERROR')
                         return None
+                    ts = load.timescale()
+                    eph = load(ephem_path)
+                    self._skyfield_cache = ((settings or {}).get('ephemeris_file_path'), ts, eph)
 
+                df = None
+                engine = None
+                if self._mpcorb_engine_cache and self._mpcorb_engine_cache[:2] == (catalog_path, h_limit):
+                    engine = self._mpcorb_engine_cache[2]
+                else:
+                    # 二进制列式缓存（与源文件路径/mtime/大小匹配时直接内存映射载入）
+                    start_load = time.time()
+                    # 已算过源文件SHA1时一并校验（不为此单独读取整个文件）
+                    engine = load_mpcorb_columnar_cache(catalog_path, h_limit,
+                                                        source_sha1=self._get_mpcorb_sha1(catalog_path, compute=False))
+                    if engine is not None:
+                        msg = f"MPCORB二进制缓存载入: H<= {h_limit} 共 {len(engine)} 条, 耗时 {time.time() - start_load:.2f}s"
+                        self.logger.info(msg)
+                        if self.log_callback:
+                            self.log_callback(msg, "INFO")
+
+                if engine is None:
+                    df, raw_count = self._load_mpcorb_dataframe(catalog_path)
+
+                    # 统一按可用的H列过滤（优先 magnitude_H）
+                    col_H = None
+                    if 'magnitude_H' in df.columns:
+                        col_H = 'magnitude_H'
+                    elif 'H' in df.columns:
+                        col_H = 'H'
+                    if col_H is not None:
+                        try:
+                            df = df[df[col_H] <= h_limit]
+                        except Exception:
+                            pass
 
+                    # 统计H筛选后的条目数，并输出诊断
+                    try:
+                        msg = f"MPCORB载入: 原始 {raw_count} 条, H<= {h_limit} 后 {len(df)} 条"
+                        self.logger.info(msg)
+                        if self.log_callback:
+                            self.log_callback(msg, "INFO")
+                    except Exception:
+                        pass
 
 
+                # 目标、观测者
+                # Skyfield 需要带时区的UTC时间
+                if getattr(utc_time, 'tzinfo', None) is None:
+                    try:
+                        utc_time = utc_time.replace(tzinfo=utc)
+                    except Exception:
+                        from datetime import timezone
+                        utc_time = utc_time.replace(tzinfo=timezone.utc)
 
+                t = ts.from_datetime(utc_time)
 
+                # 向量化传播引擎（按目录路径与H上限缓存，避免每次查询重建数组）
+                if df is not None:
+                    start_build = time.time()
+                    engine, dropped = MPCORBPropagator.from_dataframe(df)
+                    try:
+                        msg = f"MPCORB向量化引擎构建完成: {len(engine)} 条轨道, 丢弃无效 {dropped} 条, 耗时 {time.time() - start_build:.2f}s"
+                        self.logger.info(msg)
+                        if self.log_callback:
+                            self.log_callback(msg, "INFO")
+                    except Exception:
+                        pass
 
+                    # 首次构建时抽样与Skyfield逐个计算结果交叉验证
+                    try:
+                        max_diff = cross_check_with_skyfield(engine, df, ts, eph, t, latitude, longitude)
+                        if max_diff is not None:
+                            msg = f"MPCORB向量化引擎与Skyfield抽样对比: 最大差异 {max_diff:.3f} arcsec"
+                            level = "INFO" if max_diff < 1.0 else "WARNING"
+                            self.logger.log(getattr(logging, level), msg)
+                            if self.log_callback:
+                                self.log_callback(msg, level)
+                    except Exception as e:
+                        self.logger.warning(f"MPCORB向量化引擎交叉验证失败: {e}")
 
+                    # 后台写入二进制列式缓存，下次启动（GUI或run_console）直接内存映射载入
+                    self._start_mpcorb_cache_writer(engine, catalog_path, h_limit)
 
+                self._mpcorb_engine_cache = (catalog_path, h_limit, engine)
 
+                # 按曝光历元复用全目录位置快照，同历元的检测只做空间索引查找
+                snapshot_key = (catalog_path, h_limit, round(float(t.tt), 8), float(latitude), float(longitude))
+                snapshot, geometry = self._get_mpcorb_epoch_snapshot(snapshot_key, engine, eph, t, latitude, longitude)
+                hits = snapshot.cone_search(ra, dec, search_radius)
 
+                if len(hits['index']) == 0:
+                    try:
+                        if hits['min_index'] >= 0:
+                            i_min = hits['min_index']
+                            ra_min, dec_min = engine.radec(geometry, np.array([i_min]))
+                            min_info = f"{engine.designations[i_min]} @ RA={ra_min[0]:.6f},Dec={dec_min[0]:.6f}, sep={hits['min_sep']*3600:.3f}"
+                            dbg = f"离线MPCORB最小角距(非命中): {hits['min_sep']*3600:.3f} arcsec, 候选: {min_info}"
+                            self.logger.info(dbg)
+                            if self.log_callback:
+                                self.log_callback(dbg, "INFO")
+                    except Exception:
+                        pass
 
+                return engine.results_table(hits)
 
+            else:
+                # 旧逻辑：读取包含RA/DEC列的表格（CSV/TSV/FITS等）
+                # 使用缓存以避免重复读取；载入时一次性识别列并转换为类型化数组
+                if self._local_asteroid_cache and self._local_asteroid_cache[0] == catalog_path:
+                    prepared = self._local_asteroid_cache[1]
+                elif PreparedCatalog is None:
+                    warn = "本地星表预处理模块不可用，无法查询表格格式的本地小行星库"
+                    self.logger.warning(warn)
+                    if self.log_callback:
+                        self.log_callback(warn, "WARNING")
+                    return Table()
+                else:
+                    prepared = PreparedCatalog.from_table(
+                        Table.read(catalog_path),
+                        ra_candidates=("RA", "ra", "RAJ2000", "raj2000", "_RA", "_RAJ2000"),
+                        dec_candidates=("DEC", "dec", "DEJ2000", "dej2000", "_DE", "_DEJ2000", "_DEC", "_DECJ2000"),
+                        float_fields={"Mv": ("Mv", "Vmag", "mag", "Gmag", "Rmag", "Mag")},
+                        str_fields={"Name": ("Name", "name", "Designation", "desig", "Object", "OBJECT")},
+                        passthrough_fields={"Number": ("Number",)},
+                    )
+                    if prepared is None:
+                        warn = "本地小行星库缺少RA/DEC列，返回空结果"
+                        self.logger.warning(warn)
+                        if self.log_callback:
+                            self.log_callback(warn, "WARNING")
+                        return Table()
+                    self._local_asteroid_cache = (catalog_path, prepared)
 
+                index = prepared.select(ra, dec, search_radius)
+                if len(index) == 0:
+                    from astropy.table import Table as ATable
+                    return ATable()
 
+                # 组装精简结果表，兼容日志展示
+                return prepared.to_table(index, ("Name", "Number", "Type", "RA", "DEC", "Mv"),
+                                         constants={"Type": "Asteroid"})
+        except Exception as e:
+            err = f"本地小行星查询失败: {e}"
+            self.logger.error(err, exc_info=True)
+            if self.log_callback:
+                self.log_callback(err, "ERROR")
+            return None
 
+    def _query_local_ephemeris_cache(self, catalog_path, settings, ra, dec, utc_time, latitude, longitude, search_radius):
+        """从夜间星历缓存插值查询小行星；缓存缺失、失效或不覆盖该查询时返回None"""
+        if EphemerisCache is None:
+            return None
+        try:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            cache_dir = (settings or {}).get('ephemeris_cache_dir') or os.path.join(current_dir, 'ephemeris_cache')
+            cache_path = cache_path_for_time(cache_dir, utc_time, latitude, longitude)
+            if not os.path.exists(cache_path):
+                return None
 
+            if self._ephemeris_cache and self._ephemeris_cache[0] == cache_path:
+                cache = self._ephemeris_cache[1]
+            else:
+                cache = EphemerisCache(cache_path)
+                self._ephemeris_cache = (cache_path, cache)
 
+            mpcorb_sha1 = self._get_mpcorb_sha1(catalog_path)
 
+            try:
+                h_limit = float((settings or {}).get('mpc_h_limit', 20))
+            except Exception:
+                h_limit = 20.0
+            if not cache.is_valid_for(mpcorb_sha1, h_limit, latitude, longitude):
+                self.logger.info(f"星历缓存与当前MPCORB/H上限/测站不匹配，忽略: {cache_path}")
+                return None
 
+            from astropy.time import Time
+            jd_tt = float(Time(utc_time, scale='utc').tt.jd)
+            if not cache.covers(jd_tt, ra, dec, search_radius):
+                return None
 
+            hits = cache.cone_search(jd_tt, ra, dec, search_radius)
+            msg = f"离线MPCORB查询命中星历缓存: {os.path.basename(cache_path)}, 找到 {len(hits['index'])} 个"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            return cache.results_table(hits)
+        except Exception as e:
+            self.logger.warning(f"星历缓存查询失败，回退到轨道传播: {e}")
+            return None
 
+    def _get_vclassre_index(self, catalog_path):
+        """
+        获取 vclassre 赤纬分带索引
 
+        全表构建需要数分钟并占用大量内存，不在查询（GUI线程）中进行：
+        索引缺失或过期时在后台线程构建并返回None，构建完成前由调用方回退到（截断的）流式扫描
+        """
+        if self._vclassre_index_cache and self._vclassre_index_cache[0] == catalog_path:
+            return self._vclassre_index_cache[1]
+
+        index = VariableStarIndex.open_for(catalog_path)
+        if index is None:
+            # 不缓存缺失结果：离线构建完成后下次查询即可直接使用
+            self._start_vclassre_index_builder(catalog_path)
+            if catalog_path not in self._vclassre_index_missing_logged:
+                self._vclassre_index_missing_logged.add(catalog_path)
+                msg = (f"vclassre索引不存在或已过期，已在后台构建（需数分钟），完成前使用截断的流式扫描；"
+                       f"也可运行 tools/build_gaia_variables.py 离线构建: {catalog_path}")
+                self.logger.warning(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "WARNING")
+            return None
 
+        self._vclassre_index_cache = (catalog_path, index)
+        return index
 
+    def _start_vclassre_index_builder(self, catalog_path):
+        """在后台线程构建vclassre索引，不阻塞当前查询；已有构建线程时跳过"""
+        if build_vclassre_index is None:
+            return
+        with self._vclassre_index_builder_lock:
+            if self._vclassre_index_builder is not None and self._vclassre_index_builder.is_alive():
+                return
 
+            def build_index():
+                try:
+                    index_dir = build_vclassre_index(catalog_path)
+                    self.logger.info(f"vclassre索引构建完成，之后的查询返回全部匹配: {index_dir}")
+                except Exception as e:
+                    self.logger.warning(f"vclassre索引构建失败: {e}")
 
+            self._vclassre_index_builder = threading.Thread(target=build_index, name='vclassre-index-builder',
+                                                            daemon=True)
+            self._vclassre_index_builder.start()
 
+    def _get_mpcorb_sha1(self, catalog_path, compute=True):
+        """
+        MPCORB文件SHA1，按 (路径, mtime, size) 记忆，避免每次重新读取大文件
 
+        Args:
+            catalog_path (str): MPCORB文件路径
+            compute (bool): 没有记忆值时是否计算；False时返回None
+        """
+        st = os.stat(catalog_path)
+        sha_key = (catalog_path, st.st_mtime, st.st_size)
+        cached = self._mpcorb_sha1_cache
+        if cached and cached[0] == sha_key:
+            return cached[1]
+        if not compute:
+            return None
+        self._mpcorb_sha1_cache = (sha_key, file_sha1(catalog_path))
+        return self._mpcorb_sha1_cache[1]
 
+    def _start_mpcorb_cache_writer(self, engine, catalog_path, h_limit):
+        """在后台线程计算源文件SHA1并写入MPCORB二进制缓存，不阻塞当前查询；已有写入线程时跳过"""
+        with self._mpcorb_cache_writer_lock:
+            if self._mpcorb_cache_writer is not None and self._mpcorb_cache_writer.is_alive():
+                return
 
+            def write_cache():
+                try:
+                    cache_dir = mpcorb_columnar_cache_dir(catalog_path)
+                    version_dir = engine.save_columnar(cache_dir, catalog_path, h_limit,
+                                                       self._get_mpcorb_sha1(catalog_path))
+                    self.logger.info(f"MPCORB二进制缓存已写入: {version_dir}")
+                except Exception as e:
+                    self.logger.warning(f"MPCORB二进制缓存写入失败: {e}")
 
+            self._mpcorb_cache_writer = threading.Thread(target=write_cache, name='mpcorb-columnar-cache',
+                                                         daemon=True)
+            self._mpcorb_cache_writer.start()
 
+    def _load_mpcorb_dataframe(self, catalog_path):
+        """解析MPCORB文本为DataFrame（轨道要素列转为数值并去除非法轨道），返回 (df, 原始条目数)"""
+        if self._mpcorb_cache and self._mpcorb_cache[0] == catalog_path:
+            return self._mpcorb_cache[1], self._mpcorb_cache[2]
 
+        import pandas as pd
+        from skyfield.data import mpc
 
+        # 注意：文件可能很大，建议用户提供摘录文件
+        try:
+            with open(catalog_path, 'rb') as f:
+                df = mpc.load_mpcorb_dataframe(f)
+        except Exception:
+            # 尝试文本方式
+            with open(catalog_path, 'r', encoding='utf-8', errors='ignore') as f:
+                df = mpc.load_mpcorb_dataframe(f)
+        raw_count = len(df)
+
+        # 将关键轨道要素列转换为数值（Skyfield需要浮点）
+        for c in MPCORB_NUMERIC_COLUMNS:
+            if c in df.columns:
+                df[c] = pd.to_numeric(df[c], errors='coerce')
+
+        # 过滤非法轨道
+        if 'semimajor_axis_au' in df.columns:
+            df = df[~df['semimajor_axis_au'].isnull()]
+
+        self._mpcorb_cache = (catalog_path, df, raw_count)
+        return df, raw_count
+
+    def _get_mpcorb_epoch_snapshot(self, key, engine, eph, t, latitude, longitude):
+        """获取（或构建）指定曝光历元与测站的MPCORB位置快照，返回 (snapshot, geometry)"""
+        with self._mpcorb_epoch_lock:
+            cached = self._mpcorb_epoch_snapshots.get(key)
+            if cached is not None:
+                self._mpcorb_epoch_snapshots.move_to_end(key)
+                return cached
+
+            start = time.time()
+            geometry = compute_observer_geometry(eph, t, latitude, longitude)
+            snapshot = MPCORBEpochSnapshot(engine, geometry)
+            self._mpcorb_epoch_snapshots[key] = (snapshot, geometry)
+            while len(self._mpcorb_epoch_snapshots) > self._mpcorb_epoch_snapshot_limit:
+                self._mpcorb_epoch_snapshots.popitem(last=False)
+
+            msg = f"MPCORB历元快照已构建: JD(TT)={geometry['jd_tt']:.6f}, {len(snapshot)} 个天体, 耗时 {time.time() - start:.2f}s"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            return snapshot, geometry
 
+    def _perform_local_vsx_query(self, ra, dec, mag_limit=16.0, search_radius=0.01):
+        """使用本地VSX库进行圆锥搜索（离线）。返回Astropy Table。"""
+        try:
+            settings = self.config_manager.get_local_catalog_settings() if self.config_manager else {}
+            catalog_path = (settings or {}).get("vsx_catalog_path", "")
+            if not catalog_path or not os.path.exists(catalog_path):
+                # 尝试使用默认 gui/mpc_variables/catalog_gaia_variables.dat
+                current_dir = os.path.dirname(os.path.abspath(__file__))
+                default_vsx = os.path.join(current_dir, 'mpc_variables', 'catalog_gaia_variables.dat')
+                if os.path.exists(default_vsx):
+                    catalog_path = default_vsx
+                else:
+                    warn = "未配置本地变星库或路径不存在，返回空结果"
+                    self.logger.warning(warn)
+                    if self.log_callback:
+                        self.log_callback(warn, "WARNING")
+                    from astropy.table import Table
+                    return Table()
 
+            from astropy.table import Table
+            from astropy.coordinates import SkyCoord
+            import astropy.units as u
+            import numpy as np
 
+            target = SkyCoord(ra=ra * u.deg, dec=dec * u.deg, frame="icrs")
+            # 针对 Gaia DR3 vclassre.dat 的快速本地圆锥搜索：优先使用离线构建的赤纬分带索引
+            try:
+                base_name = os.path.basename(catalog_path).lower()
+                if 'vclassre.dat' in base_name and VariableStarIndex is not None:
+                    index = self._get_vclassre_index(catalog_path)
+                    if index is not None:
+                        hits = index.cone_search(ra, dec, search_radius)
+                        from astropy.table import Table as ATable
+                        if len(hits['ra']) == 0:
+                            return ATable(rows=[])
+                        # 按列组装（不逐行构建字典）
+                        source = np.asarray(hits['source']).astype(str)
+                        names = np.char.add('GaiaDR3 ', source)
+                        names[source == ''] = 'GaiaDR3'
+                        return ATable([
+                            names,
+                            np.asarray(hits['cls']).astype(str),
+                            np.asarray(hits['ra'], dtype=np.float64),
+                            np.asarray(hits['dec'], dtype=np.float64),
+                            source,
+                        ], names=['Name', 'Type', 'RAJ2000', 'DEJ2000', 'Source'])
+            except Exception as e:
+                self.logger.warning(f"vclassre索引查询失败，将回退流式扫描: {e}")
 
+            # 索引不可用时的流式解析（避免整表载入内存）
+            try:
+                base_name = os.path.basename(catalog_path).lower()
+                if 'vclassre.dat' in base_name:
+                    import gzip
+                    rows = []
+                    # 目标与包围盒（先做粗筛，减少精确分离计算次数）
+                    target_ra = float(ra)
+                    target_dec = float(dec)
+                    search_deg = float(search_radius)
+                    # 基于cos(dec)的RA包围盒（处理极区时做下限保护）
+                    cos_dec = max(np.cos(np.deg2rad(target_dec)), 1e-6)
+                    ra_pad = search_deg / cos_dec
+                    ra_min = (target_ra - ra_pad) % 360.0
+                    ra_max = (target_ra + ra_pad) % 360.0
+                    dec_min = target_dec - search_deg
+                    dec_max = target_dec + search_deg
 
+                    def ra_in_box(r):
+                        return (ra_min <= ra_max and (r >= ra_min and r <= ra_max)) or \
+                               (ra_min > ra_max and (r >= ra_min or r <= ra_max))
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-                    eph = load(ephem_path)
-                    # 缓存
-                    self._mpcorb_cache = (catalog_path, df, ts, eph)
-
-                # H上限过滤（默认20）
-                try:
-                    h_limit = float((settings or {}).get('mpc_h_limit', 20))
-                except Exception:
-                    h_limit = 20.0
-                # 统一按可用的H列过滤（优先 magnitude_H）
-                col_H = None
-                if 'magnitude_H' in df.columns:
-                    col_H = 'magnitude_H'
-                elif 'H' in df.columns:
-                    col_H = 'H'
-                if col_H is not None:
-                    try:
-                        df = df[df[col_H] <= h_limit]
-                    except Exception:
-                        pass
-
-                # 统计H筛选后的条目数，并输出诊断
-                try:
-                    filtered_count = len(df)
-                except Exception:
-                    filtered_count = None
-                try:
-                    msg = f"MPCORB载入: 原始 {raw_count} 条, H<= {h_limit} 后 {filtered_count} 条"
-                    self.logger.info(msg)
-                    if self.log_callback:
-                        self.log_callback(msg, "INFO")
-                except Exception:
-                    pass
-
-
-                # 目标、观测者
-                earth = eph['earth']
-                err_count = 0
-                first_err = None
-
-                observer = earth + wgs84.latlon(latitude, longitude)
-                # Skyfield 需要带时区的UTC时间
-                if getattr(utc_time, 'tzinfo', None) is None:
-                    try:
-                        utc_time = utc_time.replace(tzinfo=utc)
-                    except Exception:
-                        from datetime import timezone
-                        utc_time = utc_time.replace(tzinfo=timezone.utc)
-
-                t = ts.from_datetime(utc_time)
-
-                # 逐个预测并筛选（注意：大文件会较慢，建议提供摘录MPCORB）
-                rows = []
-                # 诊断：记录全表的最小角距
-                min_sep = None
-                min_info = None
-
-                count = 0
-                for _, r in df.iterrows():
-                    try:
-                        body = eph['sun'] + mpc.mpcorb_orbit(r, ts, GM_SUN)
-                        ra_obj, dec_obj, _ = observer.at(t).observe(body).radec()
-                        ra_deg_obj = ra_obj.hours * 15.0
-                        dec_deg_obj = dec_obj.degrees
-                        # 圆锥过滤
-                        sep = SkyCoord(ra=ra_deg_obj * u.deg, dec=dec_deg_obj * u.deg).separation(target).deg
-                        # 诊断：记录最小角距及其对象
-                        try:
-                            if (min_sep is None) or (sep < min_sep):
-                                min_sep = sep
-                                name_dbg = str(r.get('designation', ''))
-                                min_info = f"{name_dbg} @ RA={ra_deg_obj:.6f},Dec={dec_deg_obj:.6f}, sep={sep*3600:.3f}"  # arcsec
-                        except Exception:
-                            pass
-
-                        if sep <= float(search_radius):
-                            name_val = str(r.get('designation', ''))
-                            number_val = None
-                            mv_val = None
-                            try:
-                                for k in ('magnitude_H', 'H'):
-                                    if (k in r) and pd.notnull(r.get(k)):
-                                        mv_val = float(r.get(k))
-                                        break
-                            except Exception:
-                                pass
-                            rows.append({
-                                'Name': name_val,
-                                'Number': number_val,
-                                'Type': 'Asteroid',
-                                'RA': ra_deg_obj,
-                                'DEC': dec_deg_obj,
-                                'Mv': mv_val,
-                            })
-                        count += 1
-                        # 可选：为了避免卡死，处理到一定数量就让UI有机会刷新
-                        if count % 2000 == 0:
-                            try:
-                                self.parent_frame.update_idletasks()
-                            except Exception:
-                                pass
-                    except Exception as e:
-                        try:
-                            err_count += 1
-                            if first_err is None:
-                                first_err = str(e)
-                        except Exception:
-                            pass
-                        continue
-
-                #
-
-
-
-
-
-
-
-                        continue
-
-
-                try:
-                    if err_count > 0:
-                        dbg = f"离线MPCORB计算异常条目: {err_count}, 示例: {first_err}"
-                        self.logger.info(dbg)
-                        if self.log_callback:
-                            self.log_callback(dbg, "INFO")
-                except Exception:
-                    pass
-
-                if not rows:
-                    try:
-                        if (min_sep is not None) and (min_info is not None):
-                            dbg = f"离线MPCORB最小角距(非命中): {min_sep*3600:.3f} arcsec, 候选: {min_info}"
-                            self.logger.info(dbg)
-                            if self.log_callback:
-                                self.log_callback(dbg, "INFO")
-                    except Exception:
-                        pass
-
-                from astropy.table import Table as ATable
-                return ATable(rows=rows)
-
-            else:
-                # 旧逻辑：读取包含RA/DEC列的表格（CSV/TSV/FITS等）
-                # 使用缓存以避免重复读取
-                if self._local_asteroid_cache and self._local_asteroid_cache[0] == catalog_path:
-                    table = self._local_asteroid_cache[1]
-                else:
-                    table = Table.read(catalog_path)
-                    self._local_asteroid_cache = (catalog_path, table)
-
-                # 识别RA/DEC列
-                ra_candidates = ("RA", "ra", "RAJ2000", "raj2000", "_RA", "_RAJ2000")
-                dec_candidates = ("DEC", "dec", "DEJ2000", "dej2000", "_DE", "_DEJ2000", "_DEC", "_DECJ2000")
-                col_ra = next((c for c in ra_candidates if c in table.colnames), None)
-                col_dec = next((c for c in dec_candidates if c in table.colnames), None)
-                if not col_ra or not col_dec:
-                    warn = f"本地小行星库缺少RA/DEC列（需要列名之一: {ra_candidates} / {dec_candidates}），返回空结果"
-                    self.logger.warning(warn)
-                    if self.log_callback:
-                        self.log_callback(warn, "WARNING")
-                    return Table()
-
-                ra_vals = table[col_ra]
-                dec_vals = table[col_dec]
-                try:
-                    coords = SkyCoord(ra=ra_vals * u.deg, dec=dec_vals * u.deg, frame="icrs")
-                except Exception:
-                    # 尝试解析为时角/度格式字符串
-                    coords = SkyCoord(ra_vals, dec_vals, unit=(u.hourangle, u.deg), frame="icrs")
-
-                sep_deg = coords.separation(target).deg
-                mask = np.array(sep_deg) <= float(search_radius)
-                if not np.any(mask):
-                    from astropy.table import Table as ATable
-                    return ATable()
-
-                filtered = table[mask]
-                coords_f = coords[mask]
-                ra_deg = np.array(coords_f.ra.deg).tolist()
-                dec_deg = np.array(coords_f.dec.deg).tolist()
-
-                name_candidates = ("Name", "name", "Designation", "desig", "Object", "OBJECT")
-                mag_candidates = ("Mv", "Vmag", "mag", "Gmag", "Rmag", "Mag")
-                number_col = "Number" if "Number" in filtered.colnames else None
-                name_col = next((c for c in name_candidates if c in filtered.colnames), None)
-                mag_col = next((c for c in mag_candidates if c in filtered.colnames), None)
-
-                # 组装精简结果表，兼容日志展示
-                rows = []
-                for i, row in enumerate(filtered):
-                    name_val = str(row[name_col]) if name_col else ""
-                    number_val = row[number_col] if number_col else None
-                    mv_val = None
-                    if mag_col:
-                        try:
-                            mv_val = float(row[mag_col])
-                        except Exception:
-                            mv_val = row[mag_col]
-                    rows.append({
-                        "Name": name_val,
-                        "Number": number_val,
-                        "Type": "Asteroid",
-                        "RA": ra_deg[i],
-                        "DEC": dec_deg[i],
-                        "Mv": mv_val,
-                    })
-
-                from astropy.table import Table as ATable
-                return ATable(rows=rows)
-        except Exception as e:
-            err = f"本地小行星查询失败: {e}"
-            self.logger.error(err, exc_info=True)
-            if self.log_callback:
-                self.log_callback(err, "ERROR")
-            return None
-
-    def _perform_local_vsx_query(self, ra, dec, mag_limit=16.0, search_radius=0.01):
-        """使用本地VSX库进行圆锥搜索（离线）。返回Astropy Table。"""
-        try:
-            settings = self.config_manager.get_local_catalog_settings() if self.config_manager else {}
-            catalog_path = (settings or {}).get("vsx_catalog_path", "")
-            if not catalog_path or not os.path.exists(catalog_path):
-                # 尝试使用默认 gui/mpc_variables/catalog_gaia_variables.dat
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                default_vsx = os.path.join(current_dir, 'mpc_variables', 'catalog_gaia_variables.dat')
-                if os.path.exists(default_vsx):
-                    catalog_path = default_vsx
-                else:
-                    warn = "未配置本地变星库或路径不存在，返回空结果"
-                    self.logger.warning(warn)
-                    if self.log_callback:
-                        self.log_callback(warn, "WARNING")
-                    from astropy.table import Table
-                    return Table()
-
-            from astropy.table import Table
-            from astropy.coordinates import SkyCoord
-            import astropy.units as u
-            import numpy as np
-
-            target = SkyCoord(ra=ra * u.deg, dec=dec * u.deg, frame="icrs")
-            # 针对 Gaia DR3 vclassre.dat 的快速本地圆锥搜索（流式解析，避免整表载入内存）
-            try:
-                import os
-                base_name = os.path.basename(catalog_path).lower()
-                if 'vclassre.dat' in base_name:
-                    import gzip
-                    rows = []
-                    # 目标与包围盒（先做粗筛，减少精确分离计算次数）
-                    target_ra = float(ra)
-                    target_dec = float(dec)
-                    search_deg = float(search_radius)
-                    # 基于cos(dec)的RA包围盒（处理极区时做下限保护）
-                    cos_dec = max(np.cos(np.deg2rad(target_dec)), 1e-6)
-                    ra_pad = search_deg / cos_dec
-                    ra_min = (target_ra - ra_pad) % 360.0
-                    ra_max = (target_ra + ra_pad) % 360.0
-                    dec_min = target_dec - search_deg
-                    dec_max = target_dec + search_deg
-
-                    def ra_in_box(r):
-                        return (ra_min <= ra_max and (r >= ra_min and r <= ra_max)) or \
-                               (ra_min > ra_max and (r >= ra_min or r <= ra_max))
-
-                    # vclassre.dat 列位（1-based: RAdeg 94-114, DEdeg 116-137；Source 1-19；Class 53-78）
-                    # 转为Python slice（0-based, end-exclusive）
-                    SL_RA = slice(93, 114)
-                    SL_DEC = slice(115, 137)
-                    SL_SRC = slice(0, 19)
-                    SL_CLS = slice(52, 78)
+                    # vclassre.dat 列位（1-based: RAdeg 94-114, DEdeg 116-137；Source 1-19；Class 53-78）
+                    # 转为Python slice（0-based, end-exclusive）
+                    SL_RA = slice(93, 114)
+                    SL_DEC = slice(115, 137)
+                    SL_SRC = slice(0, 19)
+                    SL_CLS = slice(52, 78)
 
                     # 逐行扫描（限制最大扫描行数，避免长时间阻塞）
                     max_scan = 1000000  # 安全上限
                     max_results = 200   # 返回最多200条
                     scanned = 0
+                    truncated = False
 
                     opener = gzip.open if base_name.endswith('.gz') else open
                     with opener(catalog_path, 'rt', encoding='utf-8', errors='ignore') as f:
                         for line in f:
                             scanned += 1
                             if scanned > max_scan:
+                                truncated = True
                                 break
                             if len(line) < 137:
                                 continue
@@ -11116,8 +11081,16 @@ class FitsImageViewer:
                                     'Source': src,
                                 })
                                 if len(rows) >= max_results:
+                                    truncated = True
                                     break
 
+                    if truncated:
+                        msg = (f"vclassre流式扫描结果已截断（最多扫描 {max_scan} 行/返回 {max_results} 条），"
+                               f"索引构建完成后返回全部匹配（或运行 tools/build_gaia_variables.py 构建索引）")
+                        self.logger.warning(msg)
+                        if self.log_callback:
+                            self.log_callback(msg, "WARNING")
+
                     from astropy.table import Table as ATable
                     return ATable(rows=rows)
             except Exception as e:
@@ -11125,7 +11098,13 @@ class FitsImageViewer:
 
             # 使用缓存以避免重复读取
             if self._local_vsx_cache and self._local_vsx_cache[0] == catalog_path:
-                table = self._local_vsx_cache[1]
+                prepared = self._local_vsx_cache[1]
+            elif PreparedCatalog is None:
+                warn = "本地星表预处理模块不可用，无法查询表格格式的本地变星库"
+                self.logger.warning(warn)
+                if self.log_callback:
+                    self.log_callback(warn, "WARNING")
+                return Table()
             else:
                 try:
                     table = Table.read(catalog_path)
@@ -11162,108 +11141,42 @@ class FitsImageViewer:
                                 if self.log_callback:
                                     self.log_callback(warn, "WARNING")
                                 return ATable()
-                self._local_vsx_cache = (catalog_path, table)
-
-            # 识别RA/DEC列（兼容 Gaia/VizieR 列名）
-            ra_candidates = ("RA_ICRS", "RAJ2000", "RAdeg", "RA", "ra", "_RAJ2000")
-            dec_candidates = ("DE_ICRS", "DEJ2000", "DEdeg", "DEC", "dec", "_DEJ2000")
-            col_ra = next((c for c in ra_candidates if c in table.colnames), None)
-            col_dec = next((c for c in dec_candidates if c in table.colnames), None)
-            if not col_ra or not col_dec:
-                warn = f"本地变星库缺少RA/DEC列（需要列名之一: {ra_candidates} / {dec_candidates}），返回空结果"
-                self.logger.warning(warn)
-                if self.log_callback:
-                    self.log_callback(warn, "WARNING")
-                return Table()
-
-            ra_vals = table[col_ra]
-            dec_vals = table[col_dec]
-            try:
-                coords = SkyCoord(ra=ra_vals * u.deg, dec=dec_vals * u.deg, frame="icrs")
-            except Exception:
-                coords = SkyCoord(ra_vals, dec_vals, unit=(u.hourangle, u.deg), frame="icrs")
-
-            sep_deg = coords.separation(target).deg
-            mask_rad = np.array(sep_deg) <= float(search_radius)
-
-            # 星等过滤（Gaia/VSX常见列；若不存在则跳过过滤）
-            vmag_candidates = (
-                "max", "Gmag", "phot_g_mean_mag", "Vmag", "Mag", "vmag", "G", "gmag",
-                # Gaia DR3 变星常见统计列
-                "Gmagmean", "Gmagmed", "Gmagmax", "intaverageg",
-                # vari_summary中的字段名（根据ReadMe说明）
-                "meanmagg_fov", "medianmagg_fov", "maxmagg_fov"
-            )
-            mag_col = next((c for c in vmag_candidates if c in table.colnames), None)
-            if mag_col is not None:
-                mag_mask = np.ones(len(table), dtype=bool)
-                for i, val in enumerate(table[mag_col]):
-                    try:
-                        if hasattr(val, 'mask') and val.mask:
-                            continue
-                        if float(val) > float(mag_limit):
-                            mag_mask[i] = False
-                    except Exception:
-                        # 无法解析的保留
-                        continue
-                mask = mask_rad & mag_mask
-            else:
-                mask = mask_rad
+                # 载入时一次性识别列并转换为类型化数组，查询只做向量化筛选
+                prepared = PreparedCatalog.from_table(
+                    table,
+                    ra_candidates=("RA_ICRS", "RAJ2000", "RAdeg", "RA", "ra", "_RAJ2000"),
+                    dec_candidates=("DE_ICRS", "DEJ2000", "DEdeg", "DEC", "dec", "_DEJ2000"),
+                    float_fields={
+                        # 星等（Gaia/VSX常见列；vari_summary中的字段名根据ReadMe说明）
+                        "max": ("max", "Gmag", "phot_g_mean_mag", "Vmag", "Mag", "vmag", "G", "gmag",
+                                "Gmagmean", "Gmagmed", "Gmagmax", "intaverageg",
+                                "meanmagg_fov", "medianmagg_fov", "maxmagg_fov"),
+                        "min": ("min", "Min"),
+                        "Period": ("Period", "Per", "P", "period"),
+                    },
+                    str_fields={
+                        "Name": ("Name", "name", "VSName", "OID", "source_id", "Source", "GaiaDR3Name"),
+                        "Type": ("Type", "type", "VarType", "class", "Class", "class_name",
+                                 "best_class_name", "bestclassname"),
+                    },
+                    mag_field="max",
+                )
+                del table
+                if prepared is None:
+                    warn = "本地变星库缺少RA/DEC列，返回空结果"
+                    self.logger.warning(warn)
+                    if self.log_callback:
+                        self.log_callback(warn, "WARNING")
+                    return Table()
+                self._local_vsx_cache = (catalog_path, prepared)
 
-            if not np.any(mask):
+            # 圆锥 + 星等上限（无星等列时跳过过滤）的单次向量化筛选
+            index = prepared.select(ra, dec, search_radius, mag_limit)
+            if len(index) == 0:
                 from astropy.table import Table as ATable
                 return ATable()
 
-            filtered = table[mask]
-            coords_f = coords[mask]
-            ra_deg = np.array(coords_f.ra.deg).tolist()
-            dec_deg = np.array(coords_f.dec.deg).tolist()
-
-            name_candidates = ("Name", "name", "VSName", "OID", "source_id", "Source", "GaiaDR3Name")
-            type_candidates = ("Type", "type", "VarType", "class", "Class", "class_name", "best_class_name", "bestclassname")
-            min_candidates = ("min", "Min")
-            per_candidates = ("Period", "Per", "P", "period")
-            name_col = next((c for c in name_candidates if c in filtered.colnames), None)
-            type_col = next((c for c in type_candidates if c in filtered.colnames), None)
-            min_col = next((c for c in min_candidates if c in filtered.colnames), None)
-            per_col = next((c for c in per_candidates if c in filtered.colnames), None)
-            mag_col = next((c for c in vmag_candidates if c in filtered.colnames), None)
-
-            rows = []
-            for i, row in enumerate(filtered):
-                name_val = str(row[name_col]) if name_col else ""
-                type_val = str(row[type_col]) if type_col else ""
-                vmax_val = None
-                vmin_val = None
-                per_val = None
-                if mag_col is not None:
-                    try:
-                        vmax_val = float(row[mag_col])
-                    except Exception:
-                        vmax_val = row[mag_col]
-                if min_col is not None:
-                    try:
-                        vmin_val = float(row[min_col])
-                    except Exception:
-                        vmin_val = row[min_col]
-                if per_col is not None:
-                    try:
-                        per_val = float(row[per_col])
-                    except Exception:
-                        per_val = row[per_col]
-
-                rows.append({
-                    "Name": name_val,
-                    "Type": type_val,
-                    "RAJ2000": ra_deg[i],
-                    "DEJ2000": dec_deg[i],
-                    "max": vmax_val,
-                    "min": vmin_val,
-                    "Period": per_val,
-                })
-
-            from astropy.table import Table as ATable
-            return ATable(rows=rows)
+            return prepared.to_table(index, ("Name", "Type", "RAJ2000", "DEJ2000", "max", "min", "Period"))
         except Exception as e:
             err = f"本地VSX查询失败: {e}"
             self.logger.error(err, exc_info=True)
@@ -11272,12 +11185,18 @@ class FitsImageViewer:
             return None
 
 
-    def _query_satellite(self):
-        """使用Skyfield查询卫星数据"""
+    def _query_satellite(self, skip_gui=False):
+        """
+        使用Skyfield查询卫星数据
+
+        Args:
+            skip_gui: 是否跳过GUI操作（批量查询时设为True；同一帧的检测共用历元快照与轨迹预测缓存）
+        """
         try:
             # 立即重置结果标签，确保用户能看到查询状态变化
-            self.satellite_result_label.config(text="准备中...", foreground="gray")
-            self.satellite_result_label.update_idletasks()  # 强制刷新界面
+            if not skip_gui:
+                self.satellite_result_label.config(text="准备中...", foreground="gray")
+                self.satellite_result_label.update_idletasks()  # 强制刷新界面
 
             # 检查是否有当前显示的cutout
             if not hasattr(self, '_all_cutout_sets') or not self._all_cutout_sets:
@@ -11304,7 +11223,8 @@ class FitsImageViewer:
             # 检查是否有RA/DEC信息
             if not file_info.get('ra') or not file_info.get('dec'):
                 self.logger.error("无法获取目标的RA/DEC坐标信息")
-                self.satellite_result_label.config(text="坐标缺失", foreground="red")
+                if not skip_gui:
+                    self.satellite_result_label.config(text="坐标缺失", foreground="red")
                 return
 
             ra = float(file_info['ra'])
@@ -11321,7 +11241,8 @@ class FitsImageViewer:
                     self.logger.info(f"从文件名提取UTC时间: {self._current_utc_time}")
                 else:
                     self.logger.error("无法获取UTC时间信息")
-                    self.satellite_result_label.config(text="时间缺失", foreground="red")
+                    if not skip_gui:
+                        self.satellite_result_label.config(text="时间缺失", foreground="red")
                     return
 
             utc_time = self._current_utc_time
@@ -11332,7 +11253,8 @@ class FitsImageViewer:
                 longitude = float(self.gps_lon_var.get())
             except ValueError:
                 self.logger.error(f"无效的GPS坐标: 纬度={self.gps_lat_var.get()}, 经度={self.gps_lon_var.get()}")
-                self.satellite_result_label.config(text="GPS无效", foreground="red")
+                if not skip_gui:
+                    self.satellite_result_label.config(text="GPS无效", foreground="red")
                 return
 
             # 获取搜索半径
@@ -11348,12 +11270,20 @@ class FitsImageViewer:
             if self.log_callback:
                 self.log_callback(query_info, "INFO")
 
-            self.satellite_result_label.config(text="查询中...", foreground="orange")
-            self.satellite_result_label.update_idletasks()  # 强制刷新界面
+            if not skip_gui:
+                self.satellite_result_label.config(text="查询中...", foreground="orange")
+                self.satellite_result_label.update_idletasks()  # 强制刷新界面
 
             # 执行卫星查询
             results = self._perform_satellite_query(ra, dec, utc_time, latitude, longitude, search_radius)
 
+            # 曝光窗口内的轨迹预测：补充曝光开始时刻不在圆锥内、但轨迹穿过检测位置的卫星
+            if results is not None:
+                streak_hits = self._query_satellite_streaks(aligned_img, ra, dec, utc_time,
+                                                            latitude, longitude, search_radius)
+                known = {r.get('name') for r in results}
+                results = list(results) + [h for h in streak_hits if h['name'] not in known]
+
             if results is not None:
                 # 保存查询结果到当前cutout
                 current_cutout = self._all_cutout_sets[self._current_cutout_index]
@@ -11366,7 +11296,8 @@ class FitsImageViewer:
 
                 if len(results) > 0:
                     # 查询成功且有结果
-                    self.satellite_result_label.config(text=f"找到 {len(results)} 个", foreground="green")
+                    if not skip_gui:
+                        self.satellite_result_label.config(text=f"找到 {len(results)} 个", foreground="green")
                     success_msg = f"卫星查询完成，找到 {len(results)} 个卫星"
                     self.logger.info(success_msg)
                     if self.log_callback:
@@ -11383,15 +11314,18 @@ class FitsImageViewer:
                     self._update_detection_txt_with_query_results()
 
                     # 更新按钮颜色 - 紫红色(有结果)
-                    self._update_query_button_color('satellite')
+                    if not skip_gui:
+                        self._update_query_button_color('satellite')
 
                     # 重新绘制图像以显示卫星标记
-                    self._refresh_current_cutout_display()
+                    if not skip_gui:
+                        self._refresh_current_cutout_display()
                 else:
                     # 查询结果为空（未找到）
                     self._satellite_query_results = None  # 兼容旧代码
 
-                    self.satellite_result_label.config(text="未找到", foreground="blue")
+                    if not skip_gui:
+                        self.satellite_result_label.config(text="未找到", foreground="blue")
                     not_found_msg = "卫星查询完成，未找到卫星"
                     self.logger.info(not_found_msg)
                     if self.log_callback:
@@ -11401,15 +11335,18 @@ class FitsImageViewer:
                     self._update_detection_txt_with_query_results()
 
                     # 更新按钮颜色 - 绿色(无结果)
-                    self._update_query_button_color('satellite')
+                    if not skip_gui:
+                        self._update_query_button_color('satellite')
 
                     # 重新绘制图像（虽然没有结果，但确保界面一致性）
-                    self._refresh_current_cutout_display()
+                    if not skip_gui:
+                        self._refresh_current_cutout_display()
             else:
                 # 查询失败，不保存到cutout（保持未查询状态）
                 self._satellite_query_results = None  # 兼容旧代码
 
-                self.satellite_result_label.config(text="查询失败", foreground="red")
+                if not skip_gui:
+                    self.satellite_result_label.config(text="查询失败", foreground="red")
                 error_msg = "卫星查询失败"
                 self.logger.error(error_msg)
                 if self.log_callback:
@@ -11420,7 +11357,8 @@ class FitsImageViewer:
             self.logger.error(exception_msg, exc_info=True)
             if self.log_callback:
                 self.log_callback(exception_msg, "ERROR")
-            self.satellite_result_label.config(text="查询出错", foreground="red")
+            if not skip_gui:
+                self.satellite_result_label.config(text="查询出错", foreground="red")
 
     def _perform_satellite_query(self, ra, dec, utc_time, latitude, longitude, search_radius=0.01):
         """
@@ -11438,10 +11376,6 @@ class FitsImageViewer:
             查询结果列表，如果失败返回None
         """
         try:
-            from skyfield.api import load, wgs84, EarthSatellite
-            from skyfield.toposlib import GeographicPosition
-            import numpy as np
-
             param_header = f"卫星查询参数:"
             param_coord = f"  坐标: RA={ra}°, Dec={dec}°"
             param_time = f"  时间: {utc_time}"
@@ -11460,67 +11394,28 @@ class FitsImageViewer:
                 self.log_callback(param_gps, "INFO")
                 self.log_callback(param_radius, "INFO")
 
-            # 加载时间尺度
-            ts = load.timescale()
-            t = ts.utc(utc_time.year, utc_time.month, utc_time.day,
-                      utc_time.hour, utc_time.minute, utc_time.second)
-
-            # 创建观测位置
-            observer = wgs84.latlon(latitude, longitude)
-
-            # 加载TLE数据（使用最新的活跃卫星数据）
-            # 这里使用Celestrak的活跃卫星TLE数据
-            try:
-                satellites = load.tle_file('https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle')
-                self.logger.info(f"成功加载 {len(satellites)} 个卫星的TLE数据")
+            if SatelliteCatalog is None:
+                err = "未找到卫星TLE库模块(satellite_store)或sgp4依赖，无法查询卫星"
+                self.logger.error(err)
                 if self.log_callback:
-                    self.log_callback(f"成功加载 {len(satellites)} 个卫星的TLE数据", "INFO")
-            except Exception as e:
-                error_msg = f"加载TLE数据失败: {str(e)}"
-                self.logger.error(error_msg)
-                if self.log_callback:
-                    self.log_callback(error_msg, "ERROR")
+                    self.log_callback(err, "ERROR")
                 return None
 
-            # 查找在搜索半径内的卫星
-            results = []
-            for satellite in satellites:
-                try:
-                    # 计算卫星在观测时间和位置的位置
-                    geocentric = satellite.at(t)
-                    topocentric = (geocentric - observer.at(t))
-                    sat_ra, sat_dec, distance = topocentric.radec()
-
-                    # 计算角距离
-                    sat_ra_deg = sat_ra._degrees
-                    sat_dec_deg = sat_dec.degrees
-
-                    # 简单的角距离计算（球面三角）
-                    delta_ra = np.radians(sat_ra_deg - ra)
-                    delta_dec = np.radians(sat_dec_deg - dec)
-                    ra_rad = np.radians(ra)
-                    dec_rad = np.radians(dec)
-                    sat_dec_rad = np.radians(sat_dec_deg)
-
-                    separation = np.degrees(np.arccos(
-                        np.sin(dec_rad) * np.sin(sat_dec_rad) +
-                        np.cos(dec_rad) * np.cos(sat_dec_rad) * np.cos(delta_ra)
-                    ))
-
-                    # 如果在搜索半径内，添加到结果
-                    if separation <= search_radius:
-                        results.append({
-                            'name': satellite.name,
-                            'ra': sat_ra_deg,
-                            'dec': sat_dec_deg,
-                            'separation': separation,
-                            'distance_km': distance.km
-                        })
-                except Exception as e:
-                    # 跳过有问题的卫星
-                    continue
+            # 本地TLE库（高级设置中“更新卫星TLE”下载），首次使用且本地不存在时自动下载一次
+            catalog = self._get_satellite_catalog()
+            if catalog is None:
+                return None
+
+            age = catalog.age_days(utc_time)
+            if age is not None and abs(age) > 7:
+                warn = f"本地TLE数据距观测时刻 {age:.1f} 天，位置误差可能较大，建议在高级设置中更新卫星TLE"
+                self.logger.warning(warn)
+                if self.log_callback:
+                    self.log_callback(warn, "WARNING")
 
-            return results
+            # 按曝光历元缓存全部卫星方向快照，同历元的检测只做一次SGP4批量传播
+            snapshot = self._get_satellite_epoch_snapshot(catalog, utc_time, latitude, longitude)
+            return snapshot.cone_search(ra, dec, search_radius)
 
         except ImportError as e:
             import_error_msg = "skyfield未安装或导入失败，请安装: pip install skyfield"
@@ -11538,6 +11433,196 @@ class FitsImageViewer:
                 self.log_callback(exec_error_msg, "ERROR")
             return None
 
+    def _query_satellite_streaks(self, aligned_img_path, ra, dec, utc_time, latitude, longitude, search_radius):
+        """
+        用整帧的卫星轨迹预测检查检测位置（同一帧只预测一次，结果按帧缓存）
+
+        Args:
+            aligned_img_path: aligned cutout路径（用于定位对应的 *_aligned.fits）
+            ra / dec: 检测位置（度）
+            utc_time: 曝光开始UTC时间
+            latitude / longitude: 测站经纬度（度）
+            search_radius: 匹配容差（度）
+
+        Returns:
+            list: 与 _perform_satellite_query 结果格式一致的命中列表，失败时返回空列表
+        """
+        try:
+            fits_dir = os.path.dirname(os.path.dirname(os.path.dirname(aligned_img_path)))
+            # 曝光时长与WCS取自下载图像（GY开头），不能取模板
+            _, science_fits = self._pick_reference_and_aligned_fits(Path(fits_dir))
+            if science_fits is None:
+                return []
+            prediction = self._predict_frame_satellite_streaks(str(science_fits), utc_time,
+                                                               latitude, longitude)
+            if prediction is None:
+                return []
+            streaks, wcs, pixel_scale_deg = prediction
+            if not streaks:
+                return []
+
+            xy = wcs.all_world2pix(np.array([[float(ra), float(dec)]]), 0)
+            tolerance_px = max(float(search_radius) / pixel_scale_deg, 1.0)
+            hits = []
+            for match in match_points_to_streaks(streaks, xy, tolerance_px)[0]:
+                sat_ra, sat_dec = wcs.all_pix2world(np.array([[match['x'], match['y']]]), 0)[0]
+                hits.append({
+                    'name': match['name'],
+                    'ra': float(sat_ra),
+                    'dec': float(sat_dec),
+                    'separation': match['distance_px'] * pixel_scale_deg,
+                    'distance_km': match['distance_km'],
+                    'streak_time_s': match['time_s'],
+                })
+            if hits:
+                msg = f"曝光窗口轨迹预测命中 {len(hits)} 颗卫星: " + ", ".join(
+                    f"{h['name']}(t+{h['streak_time_s']:.1f}s)" for h in hits)
+                self.logger.info(msg)
+                if self.log_callback:
+                    self.log_callback(msg, "INFO")
+            return hits
+        except Exception as e:
+            self.logger.warning(f"卫星轨迹预测失败: {e}")
+            return []
+
+    def _predict_frame_satellite_streaks(self, fits_path, utc_time, latitude, longitude):
+        """预测单帧曝光窗口内穿过画幅的卫星轨迹，返回 (streaks, wcs, 像素尺度[度])，按帧缓存"""
+        catalog = self._get_satellite_catalog()
+        if catalog is None:
+            return None
+
+        key = (fits_path, catalog.mtime, utc_time.isoformat(), float(latitude), float(longitude))
+        with self._satellite_epoch_lock:
+            cached = self._satellite_streak_cache.get(key)
+            if cached is not None:
+                self._satellite_streak_cache.move_to_end(key)
+                return cached
+
+        from astropy.io import fits
+        from astropy.wcs import WCS
+        from astropy.wcs.utils import proj_plane_pixel_scales
+        from skyfield.api import load
+
+        header = fits.getheader(fits_path)
+        wcs = WCS(header)
+        if not wcs.has_celestial:
+            return None
+        shape = (int(header.get('NAXIS2', 0)), int(header.get('NAXIS1', 0)))
+        exposure_s = float(header.get('EXPOSURE', header.get('EXPTIME', 0)) or 0)
+        if exposure_s <= 0:
+            match = re.search(r'_(\d+(?:\.\d+)?)S_', os.path.basename(fits_path))
+            exposure_s = float(match.group(1)) if match else 0.0
+        pixel_scale_deg = float(np.mean(proj_plane_pixel_scales(wcs.celestial)))
+
+        start = time.time()
+        if self._skyfield_timescale is None:
+            self._skyfield_timescale = load.timescale()
+        streaks = catalog.predict_streaks(self._skyfield_timescale, utc_time, exposure_s,
+                                          latitude, longitude, wcs, shape)
+        result = (streaks, wcs, pixel_scale_deg)
+
+        msg = (f"卫星轨迹预测: 曝光 {exposure_s:.0f}s, {len(catalog)} 颗卫星, "
+               f"穿过画幅 {len(streaks)} 条, 耗时 {time.time() - start:.2f}s")
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+
+        with self._satellite_epoch_lock:
+            self._satellite_streak_cache[key] = result
+            while len(self._satellite_streak_cache) > self._satellite_cache_limit:
+                self._satellite_streak_cache.popitem(last=False)
+        return result
+
+    def _get_tle_path(self):
+        """本地TLE文件路径（高级设置中的 tle_file_path，未设置时为默认路径）"""
+        settings = self.config_manager.get_local_catalog_settings() if self.config_manager else {}
+        return (settings or {}).get('tle_file_path') or default_tle_path()
+
+    def _get_satellite_catalog(self):
+        """
+        获取本地TLE库（按文件路径与修改时间缓存）；本地文件不存在时下载一次
+
+        下载失败后在 _tle_download_retry_seconds 秒内直接返回None，不再重复等待超时
+        """
+        settings = self.config_manager.get_local_catalog_settings() if self.config_manager else {}
+        tle_path = self._get_tle_path()
+        if not os.path.exists(tle_path):
+            failure = self._tle_download_failure
+            if failure and failure[0] == tle_path and time.time() - failure[1] < self._tle_download_retry_seconds:
+                self.logger.info(f"TLE下载最近失败，{self._tle_download_retry_seconds:.0f}秒内不再重试: {tle_path}")
+                return None
+            url = (settings or {}).get('tle_source_url') or CELESTRAK_ACTIVE_URL
+            msg = f"本地TLE文件不存在，正在下载: {url}"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            try:
+                download_tle_file(url, tle_path)
+                if self.config_manager:
+                    self.config_manager.update_local_catalog_settings(
+                        tle_file_path=tle_path,
+                        last_tle_update=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    )
+            except Exception as e:
+                self._tle_download_failure = (tle_path, time.time())
+                error_msg = f"加载TLE数据失败: {str(e)}"
+                self.logger.error(error_msg)
+                if self.log_callback:
+                    self.log_callback(error_msg, "ERROR")
+                return None
+            self._tle_download_failure = None
+
+        mtime = os.path.getmtime(tle_path)
+        if self._satellite_catalog_cache and self._satellite_catalog_cache[:2] == (tle_path, mtime):
+            return self._satellite_catalog_cache[2]
+
+        catalog = SatelliteCatalog(tle_path)
+        self._satellite_catalog_cache = (tle_path, mtime, catalog)
+        with self._satellite_epoch_lock:
+            self._satellite_epoch_snapshots.clear()
+            self._satellite_streak_cache.clear()
+        msg = f"成功加载 {len(catalog)} 个卫星的TLE数据: {tle_path}"
+        self.logger.info(msg)
+        if self.log_callback:
+            self.log_callback(msg, "INFO")
+        return catalog
+
+    def _batch_satellite_check_enabled(self):
+        """批量查询是否执行卫星检查：只使用本地TLE库，不存在时整批跳过（不在批量中下载）"""
+        if SatelliteCatalog is None:
+            self.logger.info("卫星TLE库模块不可用，批量查询跳过卫星检查")
+            return False
+        tle_path = self._get_tle_path()
+        if not os.path.exists(tle_path):
+            self.logger.info(f"本地TLE文件不存在，批量查询跳过卫星检查（可在高级设置中更新卫星TLE）: {tle_path}")
+            return False
+        return True
+
+    def _get_satellite_epoch_snapshot(self, catalog, utc_time, latitude, longitude):
+        """获取（或构建）指定曝光历元与测站的卫星方向快照"""
+        from skyfield.api import load
+
+        key = (catalog.path, catalog.mtime, utc_time.isoformat(), float(latitude), float(longitude))
+        with self._satellite_epoch_lock:
+            cached = self._satellite_epoch_snapshots.get(key)
+            if cached is not None:
+                self._satellite_epoch_snapshots.move_to_end(key)
+                return cached
+
+            start = time.time()
+            if self._skyfield_timescale is None:
+                self._skyfield_timescale = load.timescale()
+            snapshot = SatelliteEpochSnapshot(catalog, self._skyfield_timescale, utc_time, latitude, longitude)
+            self._satellite_epoch_snapshots[key] = snapshot
+            while len(self._satellite_epoch_snapshots) > self._satellite_cache_limit:
+                self._satellite_epoch_snapshots.popitem(last=False)
+
+            msg = f"卫星历元快照已构建: {utc_time}, 有效 {len(snapshot)} 颗, 耗时 {time.time() - start:.3f}s"
+            self.logger.info(msg)
+            if self.log_callback:
+                self.log_callback(msg, "INFO")
+            return snapshot
+
     def _get_fits_rotation_angle(self, fits_path):
         """
         从FITS文件的WCS信息中提取旋转角度
@@ -12428,6 +12513,8 @@ class FitsImageViewer:
                                 sat_info.append(f"角距离={sat['separation']:.4f}°")
                             if 'distance_km' in sat:
                                 sat_info.append(f"距离={sat['distance_km']:.1f}km")
+                            if 'streak_time_s' in sat:
+                                sat_info.append(f"轨迹时刻=曝光开始+{sat['streak_time_s']:.1f}s")
                             satellite_lines.append(f"  - 卫星{i}: {', '.join(sat_info)}")
                     else:
                         satellite_lines.append("  - (已查询，未找到)")
@@ -12937,7 +13024,8 @@ class FitsImageViewer:
                 stats_label.config(text=f"成功: {success_count} | 跳过: {skip_count}")
                 progress_window.update()
 
-            interval = self._get_batch_query_interval_seconds()
+            interval = self._get_batch_query_interval_seconds(offline_aware=True)
+            check_satellites = self._batch_satellite_check_enabled()
 
             try:
                 for step, cutout_idx in enumerate(good_indices, start=1):
@@ -12946,19 +13034,26 @@ class FitsImageViewer:
                     # 检查是否已经查询过
                     skybot_queried, skybot_result = self._check_existing_query_results('skybot')
                     vsx_queried, vsx_result = self._check_existing_query_results('vsx')
+                    satellite_queried, _ = self._check_existing_query_results('satellite')
+                    satellite_queried = satellite_queried or not check_satellites
 
                     human_idx = cutout_idx + 1  # 人类可读的检测编号
                     self.logger.info(f"目标 {human_idx}: skybot_queried={skybot_queried}, skybot_result={skybot_result}")
                     self.logger.info(f"目标 {human_idx}: vsx_queried={vsx_queried}, vsx_result={vsx_result}")
 
                     # 如果都已查询过，跳过
-                    if skybot_queried and vsx_queried:
+                    if skybot_queried and vsx_queried and satellite_queried:
                         skip_count += 1
                         update_progress(step, f"目标 {human_idx}: 已全部查询过")
                         continue
 
                     did_query = False
 
+                    # 卫星检查为本地计算：同一帧的检测共用历元快照与曝光窗口轨迹预测
+                    if not satellite_queried:
+                        update_progress(step, f"目标 {human_idx}: 检查卫星...")
+                        self._query_satellite(skip_gui=True)
+
                     # 查询小行星
                     if not skybot_queried:
                         update_progress(step, f"目标 {human_idx}: 查询小行星...")
@@ -14094,6 +14189,8 @@ class FitsImageViewer:
             stats_label.config(text=f"成功: {success_count} | 跳过: {skip_count} | 错误: {error_count}")
             progress_window.update()
 
+        check_satellites = self._batch_satellite_check_enabled()
+
         try:
             for idx, file_info in enumerate(files_to_process, 1):
                 file_path = file_info['file_path']
@@ -14134,7 +14231,7 @@ class FitsImageViewer:
                     total_to_query = len(good_indices)
                     queried_count = 0
 
-                    interval = self._get_batch_query_interval_seconds()
+                    interval = self._get_batch_query_interval_seconds(offline_aware=True)
 
                     for local_step, cutout_idx in enumerate(good_indices, start=1):
                         self._current_cutout_index = cutout_idx
@@ -14142,13 +14239,21 @@ class FitsImageViewer:
                         # 检查是否已经查询过
                         skybot_queried, skybot_result = self._check_existing_query_results('skybot')
                         vsx_queried, vsx_result = self._check_existing_query_results('vsx')
+                        satellite_queried, _ = self._check_existing_query_results('satellite')
+                        satellite_queried = satellite_queried or not check_satellites
 
                         # 如果都已查询过，跳过
-                        if skybot_queried and vsx_queried:
+                        if skybot_queried and vsx_queried and satellite_queried:
                             continue
 
                         did_query = False
 
+                        # 卫星检查为本地计算：同一帧的检测共用历元快照与曝光窗口轨迹预测
+                        if not satellite_queried:
+                            update_progress(idx - 0.4, filename, f"检查卫星 ({local_step}/{total_to_query})...")
+                            self._query_satellite(skip_gui=True)
+                            queried_count += 1
+
                         # 查询小行星
                         if not skybot_queried:
                             update_progress(idx - 0.3, filename, f"查询小行星 ({local_step}/{total_to_query})...")
@@ -14618,6 +14723,17 @@ class FitsImageViewer:
                     _TRI_THR = float(ats.get('tri_inlier_thr_px', 4.0))
                     _TRI_BIN = int(ats.get('tri_bin_scale', 60))
 
+                    # 粗配准：相位相关峰值尖锐且残余平移很小时，在网格窗口上复核切片当前的对齐误差，
+                    # 多数窗口一致则以窗口残差中位数作为误差，跳过星点/特征匹配
+                    if CoarseRegistration is not None:
+                        coarse_accept_px = float(ats.get('coarse_accept_px', 1.0))
+                        (cdx, cdy), c_resp = estimate_translation(img1b, img2b)
+                        if (c_resp >= float(ats.get('coarse_phase_min_response', 0.3))
+                                and float(np.hypot(cdx, cdy)) <= coarse_accept_px):
+                            check = CoarseRegistration(max_residual_px=coarse_accept_px).verify(img1b, img2b)
+                            if check['accepted']:
+                                return check['max_residual']
+
                     def _detect_stars(gray, max_points=600):
                         g = cv2.GaussianBlur(gray, (3, 3), 0)
                         m, s = cv2.meanStdDev(g)
@@ -29,6 +29,11 @@ from data_collect.data_02_download import FitsDownloader
 from config_manager import ConfigManager
 from url_builder import URLBuilderFrame
 from batch_status_widget import BatchStatusWidget
+from diff_process_pool import DiffProcessPool, build_diff_job, run_diff_job
+from diff_orb_integration import DiffOrbIntegration
+from pipeline_scheduler import StageScheduler
+from job_ledger import JobLedger, params_hash
+from fits_header_probe import get_header_probe
 
 # 尝试导入ASTAP处理器
 try:
@@ -75,6 +80,9 @@ class FitsWebDownloaderGUI:
         self.batch_paused = False  # 暂停标志
         self.batch_stopped = False  # 停止标志
         self.batch_pause_event = threading.Event()  # 暂停事件
+        # Diff进程池在整个GUI会话内复用（子进程的缓存保持预热），设置变化时重建，退出时关闭
+        self._diff_pool = None
+        self._diff_pool_lock = threading.Lock()
         self.batch_pause_event.set()  # 初始为非暂停状态
 
         # 自动链：批量→查询→导出 控制开关
@@ -467,6 +475,7 @@ class FitsWebDownloaderGUI:
         if hasattr(self, 'fits_viewer') and self.fits_viewer:
             alignment_methods = [
                 ("Rigid", "rigid"),
+                ("星点三角形", "asterism"),
                 ("WCS", "wcs"),
                 ("Astropy", "astropy_reproject"),
                 ("SWarp", "swarp")
@@ -820,6 +829,13 @@ class FitsWebDownloaderGUI:
         self.pympc_status_label = ttk.Label(local_catalog_frame, text="pympc目录: 未下载")
         self.pympc_status_label.grid(row=4, column=1, sticky=tk.W, padx=(10, 0), pady=(5, 0))
 
+        # 卫星TLE更新（离线卫星查询使用本地TLE库）
+        ttk.Button(local_catalog_frame, text="更新卫星TLE", command=self._update_satellite_tle).grid(
+            row=5, column=0, sticky=tk.W, pady=(5, 0)
+        )
+        self.tle_status_label = ttk.Label(local_catalog_frame, text="卫星TLE: 未下载")
+        self.tle_status_label.grid(row=5, column=1, sticky=tk.W, padx=(10, 0), pady=(5, 0))
+
 
 
         # 初始化状态显示
@@ -1083,7 +1099,8 @@ class FitsWebDownloaderGUI:
                 self._template_update_status_after("ASTAP处理器不可用，无法执行逐个更新。", "red")
                 return
             astap_config_path = os.path.join(base_dir, "..", "config", "url_config.json")
-            astap_processor = ASTAPProcessor(astap_config_path)
+            astap_processor = ASTAPProcessor(
+                astap_config_path, fast_solve_settings=self.config_manager.get_plate_solve_fast_path_settings())
 
             # 质量分析器和阈值（沿用批量预处理逻辑）
             quality_analyzer = FITSQualityAnalyzer()
@@ -1719,7 +1736,8 @@ class FitsWebDownloaderGUI:
                 self._template_update_status_after("ASTAP处理器不可用，无法执行预处理。", "red")
                 return
             config_path = os.path.join(base_dir, "..", "config", "url_config.json")
-            astap_processor = ASTAPProcessor(config_path)
+            astap_processor = ASTAPProcessor(
+                config_path, fast_solve_settings=self.config_manager.get_plate_solve_fast_path_settings())
 
             # 质量分析器
             quality_analyzer = FITSQualityAnalyzer()
@@ -1928,7 +1946,8 @@ class FitsWebDownloaderGUI:
             self._template_update_status_after("正在对下载文件执行ASTAP解算...", "blue")
             try:
                 config_path = os.path.join(base_dir, "..", "config", "url_config.json")
-                astap_processor = ASTAPProcessor(config_path)
+                astap_processor = ASTAPProcessor(
+                    config_path, fast_solve_settings=self.config_manager.get_plate_solve_fast_path_settings())
 
                 # ASTAP解算进度回调：在状态栏显示已处理文件数
                 def _astap_progress(current, total, file_path, success):
@@ -2340,6 +2359,11 @@ class FitsWebDownloaderGUI:
             name = Path(pympc_path).name if pympc_path else "默认目录"
             ts = pympc_ts or "未知"
             self.pympc_status_label.config(text=f"pympc目录: {name} | 更新时间: {ts}")
+        if hasattr(self, 'tle_status_label'):
+            tle_path = settings.get("tle_file_path", "") or ""
+            name = Path(tle_path).name if tle_path else "未下载"
+            ts = settings.get("last_tle_update", "") or "未知"
+            self.tle_status_label.config(text=f"卫星TLE: {name} | 更新时间: {ts}")
 
         ephem_path = settings.get("ephemeris_file_path", "") or ""
         if hasattr(self, 'ephemeris_status_label'):
@@ -2405,6 +2429,31 @@ class FitsWebDownloaderGUI:
         except Exception as e:
             self._log(f"更新pympc轨道目录失败: {e}")
 
+    def _update_satellite_tle(self):
+        """从Celestrak下载活跃卫星TLE到本地（gui/tle/active.tle），供离线卫星查询使用"""
+        try:
+            try:
+                from satellite_store import CELESTRAK_ACTIVE_URL, default_tle_path, download_tle_file
+            except ImportError as e:
+                messagebox.showerror("缺少依赖", f"无法导入卫星TLE模块: {e}")
+                self._log(f"更新卫星TLE失败: {e}")
+                return
+
+            settings = self.config_manager.get_local_catalog_settings()
+            url = settings.get("tle_source_url") or CELESTRAK_ACTIVE_URL
+            tle_path = settings.get("tle_file_path") or default_tle_path()
+            self._log(f"开始更新卫星TLE: {url}")
+            ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            download_tle_file(url, tle_path)
+            self.config_manager.update_local_catalog_settings(
+                tle_file_path=tle_path,
+                last_tle_update=ts,
+            )
+            self._refresh_local_catalog_status_labels()
+            self._log(f"[设置] 已更新卫星TLE: {tle_path}")
+        except Exception as e:
+            self._log(f"更新卫星TLE失败: {e}")
+
     def _save_mpc_h_limit(self):
         """保存MPC H上限到配置"""
         try:
@@ -2616,11 +2665,15 @@ class FitsWebDownloaderGUI:
                 fits_files = self.directory_scanner.scan_directory_listing(url)
             except Exception as e:
                 self._log(f"目录扫描失败，尝试通用扫描器: {str(e)}")
-                fits_files = self.scanner.scan_fits_files(url)
+                # 文件大小逐批确定，结果随到随显示
+                fits_files = self.scanner.scan_fits_files(
+                    url, on_files=lambda files: self.root.after(0, lambda f=list(files): self._append_file_rows(f))
+                )
+                self.root.after(0, self._clear_file_tree)
 
             self.fits_files_list = fits_files
 
-            # 更新界面
+            # 更新界面（按页面顺序重建列表）
             self.root.after(0, self._update_file_list)
             self._log(f"扫描完成，找到 {len(fits_files)} 个FITS文件")
 
@@ -2637,6 +2690,16 @@ class FitsWebDownloaderGUI:
             self.root.after(0, lambda: self.url_builder.set_scan_button_state("normal"))
             self.root.after(0, lambda: self.scan_status_label.config(text="就绪"))
 
+    def _append_file_rows(self, files):
+        """扫描过程中追加文件行"""
+        for filename, url, size in files:
+            self.file_tree.insert("", "end", text="☐", values=(filename, self.scanner.format_file_size(size), url))
+
+    def _clear_file_tree(self):
+        """清空文件列表显示"""
+        for item in self.file_tree.get_children():
+            self.file_tree.delete(item)
+
     def _update_file_list(self):
         """更新文件列表显示"""
         for filename, url, size in self.fits_files_list:
@@ -3653,14 +3716,33 @@ Diff统计:
 
         return output_dir
 
-    def _process_single_diff(self, download_file, template_dir, noise_methods, alignment_method,
-                            remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by='aligned_snr',
-                            science_bg_mode='off', diff_calc_mode='abs', apply_diff_postprocess=False):
+    def _find_diff_detection_dir(self, output_dir):
         """
-        处理单个文件的diff操作（线程安全）
+        Diff输出目录中最新的 detection_* 结果目录
 
         Returns:
-            dict: 包含处理结果的字典 {'success': bool, 'filename': str, 'message': str, 'new_spots': int}
+            Optional[str]: 结果目录路径，输出目录不存在或没有结果时返回None
+        """
+        if not output_dir or not os.path.isdir(output_dir):
+            return None
+        try:
+            detection_dirs = [os.path.join(output_dir, d) for d in os.listdir(output_dir)
+                              if d.startswith('detection_') and os.path.isdir(os.path.join(output_dir, d))]
+        except OSError:
+            return None
+        return max(detection_dirs, key=os.path.getmtime) if detection_dirs else None
+
+    def _prepare_diff_job(self, download_file, template_dir, noise_methods, alignment_method,
+                          remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by='aligned_snr',
+                          science_bg_mode='off', diff_calc_mode='abs', apply_diff_postprocess=False, force=False):
+        """
+        查找模板、确定输出目录并生成可序列化的Diff任务（线程安全）
+
+        Args:
+            force: 为True时忽略已有的检测结果目录（参数变化后重做）
+
+        Returns:
+            tuple: (job, result_dict)，无需执行Diff（无模板/已有结果/异常）时job为None，result_dict为最终结果
         """
         filename = os.path.basename(download_file)
         result_dict = {
@@ -3676,49 +3758,121 @@ Diff统计:
 
             if not template_file:
                 result_dict['message'] = "未找到模板"
-                return result_dict
+                return None, result_dict
 
             # 线程安全：直接生成输出目录，不依赖共享的selected_file_path
             output_dir = self._get_thread_safe_diff_output_directory(download_file)
 
+            result_dict['output_dir'] = output_dir
+
             # 检查是否已存在结果
-            if os.path.exists(output_dir):
-                detection_dirs = [d for d in os.listdir(output_dir)
-                                if d.startswith('detection_') and os.path.isdir(os.path.join(output_dir, d))]
-                if detection_dirs:
+            if not force:
+                if self._find_diff_detection_dir(output_dir):
                     result_dict['success'] = True
                     result_dict['message'] = "已有结果"
                     result_dict['skipped'] = True
-                    return result_dict
-
-            # 执行diff操作
-            diff_result = self.fits_viewer.diff_orb.process_diff(
-                download_file,
-                template_file,
-                output_dir,
-                noise_methods=noise_methods,
-                alignment_method=alignment_method,
-                remove_bright_lines=remove_bright_lines,
-                stretch_method=stretch_method,
-                percentile_low=percentile_low,
-                fast_mode=fast_mode,
-                sort_by=sort_by,
-                science_bg_mode=science_bg_mode,
-                diff_calc_mode=diff_calc_mode,
-                apply_diff_postprocess=apply_diff_postprocess
-            )
-
-            if diff_result and diff_result.get('success'):
-                result_dict['success'] = True
-                result_dict['new_spots'] = diff_result.get('new_bright_spots', 0)
-                result_dict['message'] = f"{result_dict['new_spots']}个亮点"
-            else:
-                result_dict['message'] = "处理失败"
+                    return None, result_dict
+
+            settings = self.config_manager.get_batch_process_settings()
+            in_memory = bool(settings.get('in_memory_pipeline', False))
+            job = build_diff_job(download_file, template_file, output_dir, {
+                'noise_methods': noise_methods,
+                'alignment_method': alignment_method,
+                'remove_bright_lines': remove_bright_lines,
+                'stretch_method': stretch_method,
+                'percentile_low': percentile_low,
+                'fast_mode': fast_mode,
+                'sort_by': sort_by,
+                'science_bg_mode': science_bg_mode,
+                'diff_calc_mode': diff_calc_mode,
+                'apply_diff_postprocess': apply_diff_postprocess,
+                'in_memory': in_memory,
+                'feature_cache_dir': DiffOrbIntegration.feature_cache_dir_for(template_file, settings),
+            })
+            return job, result_dict
 
         except Exception as e:
             result_dict['message'] = str(e)
+            return None, result_dict
 
-        return result_dict
+    def _process_single_diff(self, download_file, template_dir, noise_methods, alignment_method,
+                            remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by='aligned_snr',
+                            science_bg_mode='off', diff_calc_mode='abs', apply_diff_postprocess=False,
+                            process_pool=None, force=False):
+        """
+        处理单个文件的diff操作（线程安全）
+
+        Args:
+            process_pool: DiffProcessPool，提供时在子进程中执行Diff，当前线程只等待结果
+            force: 为True时忽略已有的检测结果目录
+
+        Returns:
+            dict: 包含处理结果的字典 {'success': bool, 'filename': str, 'message': str, 'new_spots': int}
+        """
+        job, result_dict = self._prepare_diff_job(
+            download_file, template_dir, noise_methods, alignment_method,
+            remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by,
+            science_bg_mode, diff_calc_mode, apply_diff_postprocess, force
+        )
+        if job is None:
+            return result_dict
+
+        if process_pool is None:
+            return run_diff_job(job, self.fits_viewer.diff_orb)
+
+        try:
+            return process_pool.submit(job).result()
+        except Exception as e:
+            # 任务被取消（停止）或子进程异常退出
+            result_dict['message'] = str(e) or type(e).__name__
+            return result_dict
+
+    def _get_diff_process_pool(self, worker_count):
+        """
+        按批量处理设置获取Diff进程池：进程数与缓存上限不变时复用已有的进程池，否则重新创建
+
+        Returns:
+            Optional[DiffProcessPool]: 未启用进程池或创建失败时返回None（在线程中执行Diff）
+        """
+        settings = self.config_manager.get_batch_process_settings()
+        cache_limits = DiffOrbIntegration.cache_limits_from_settings(settings)
+        if settings.get('diff_executor', 'thread') != 'process':
+            DiffOrbIntegration.configure_caches(**cache_limits)
+            self._shutdown_diff_process_pool()
+            return None
+        process_count = max(1, int(settings.get('diff_process_workers', 0) or 0) or worker_count)
+        with self._diff_pool_lock:
+            pool = self._diff_pool
+            if pool is not None and not pool.broken and pool.max_workers == process_count \
+                    and pool.cache_limits == cache_limits:
+                self._log(f"Diff复用进程池: {pool.max_workers} 个进程")
+                return pool
+            self._diff_pool = None
+        if pool is not None:
+            pool.shutdown(cancel_pending=True)
+        try:
+            pool = DiffProcessPool(process_count, cache_limits=cache_limits)
+            self._log(f"Diff使用进程池执行: {pool.max_workers} 个进程")
+        except Exception as e:
+            self._log(f"Diff进程池创建失败，改用线程执行: {e}")
+            return None
+        with self._diff_pool_lock:
+            self._diff_pool = pool
+        return pool
+
+    def _finish_diff_process_pool(self, pool):
+        """批量处理结束：停止时取消尚未开始的任务，进程池留给下一次批量处理"""
+        if pool and self.batch_stopped:
+            cancelled = pool.cancel_pending()
+            if cancelled:
+                self._log(f"已取消 {cancelled} 个尚未开始的Diff任务")
+
+    def _shutdown_diff_process_pool(self):
+        """关闭会话内的Diff进程池（退出或改为线程执行时）"""
+        with self._diff_pool_lock:
+            pool, self._diff_pool = self._diff_pool, None
+        if pool is not None:
+            pool.shutdown(cancel_pending=True)
 
     def _process_single_astap(self, file_path):
         """
@@ -3784,6 +3938,10 @@ Diff统计:
             self.batch_pause_event.set()  # 如果正在暂停，先释放以便线程能检测到停止标志
             self._log("正在停止批量处理...")
             self.status_label.config(text="正在停止批量处理...")
+            # 尚未开始的Diff任务立即取消，进程池本身保留给下一次批量处理
+            pool = self._diff_pool
+            if pool is not None:
+                pool.cancel_pending()
 
     def _batch_process(self):
         """批量下载并执行diff操作"""
@@ -4252,11 +4410,21 @@ Diff统计:
             'diff_failed': 0,
             'total_files': len(selected_files),
             'current_speed_mb_s': 0.0,
+            # 各阶段吞吐统计
+            'download_bytes': 0,
+            'download_seconds': 0.0,
+            'download_wall_seconds': 0.0,
+            'astap_seconds': 0.0,
+            'diff_seconds': 0.0,
         }
+        pipeline_start = time.time()
 
         # 停止标志
         stop_event = threading.Event()
 
+        # WCS判断只读主头（与WCSChecker、图像查看器共享缓存）
+        header_probe = get_header_probe()
+
         # 获取diff配置参数
         template_dir = self.template_dir_var.get().strip()
         noise_methods = []
@@ -4281,6 +4449,41 @@ Diff统计:
         diff_calc_mode = self.fits_viewer._get_diff_calc_mode()
         apply_diff_postprocess = self.fits_viewer.apply_diff_postprocess_var.get()
 
+        # 任务账本：逐文件逐阶段记录状态与参数哈希，重新运行时跳过已完成阶段，Diff参数变化时只重做Diff
+        ledger, run_id = self._open_job_ledger(f"pipeline {len(selected_files)} files")
+        retry_failed = self.config_manager.get_batch_process_settings().get(
+            'job_ledger_retry_failed', ['download', 'astap', 'diff'])
+        astap_hash = params_hash({'stage': 'astap'})
+        diff_hash = params_hash({
+            'template_dir': template_dir, 'noise_methods': noise_methods, 'alignment_method': alignment_method,
+            'remove_bright_lines': remove_bright_lines, 'stretch_method': stretch_method,
+            'percentile_low': percentile_low, 'fast_mode': fast_mode, 'sort_by': sort_by,
+            'science_bg_mode': science_bg_mode, 'diff_calc_mode': diff_calc_mode,
+            'apply_diff_postprocess': apply_diff_postprocess,
+        })
+
+        def ledger_call(method, *args, **kwargs):
+            """账本读写失败不影响流水线本身"""
+            if not ledger:
+                return None
+            try:
+                return getattr(ledger, method)(*args, **kwargs)
+            except Exception as e:
+                self._log(f"[账本] {method} 失败: {e}")
+                return None
+
+        if ledger:
+            file_keys = [os.path.join(item[2] if len(item) >= 3 and item[2] else download_dir, item[0])
+                         for item in selected_files if isinstance(item, (list, tuple)) and len(item) >= 2]
+            known = ledger_call('counts', file_keys) or {}
+            if known:
+                summary = ", ".join(f"{stage} {counts}" for stage, counts in sorted(known.items()))
+                self._log(f"任务账本已有记录: {summary}")
+
+        def ledger_should_run(file_path, stage, stage_hash):
+            decision = ledger_call('should_run', file_path, stage, stage_hash, retry_failed)
+            return decision if decision else (True, None)
+
         # 启动ASTAP工作线程池
         def astap_worker():
             """ASTAP处理工作线程"""
@@ -4304,6 +4507,12 @@ Diff统计:
                         astap_queue.task_done()
                         break
 
+                    # 自适应调度：等待ASTAP阶段的并发名额
+                    if scheduler and not scheduler.acquire('astap'):
+                        astap_queue.task_done()
+                        break
+
+                    stage_start = time.time()
                     try:
                         filename = os.path.basename(file_path)
                         self._log(f"[ASTAP] 开始处理: {filename}")
@@ -4311,18 +4520,19 @@ Diff统计:
                             f, BatchStatusWidget.STATUS_ASTAP_PROCESSING))
 
                         # 执行ASTAP处理
+                        ledger_call('start', file_path, 'astap', astap_hash, run_id)
                         result = self._process_single_astap(file_path)
 
                         with stats_lock:
                             stats['astap_completed'] += 1
+                            stats['astap_seconds'] += time.time() - stage_start
 
                         if result and result.get('success'):
-                            # 检查WCS
-                            from astropy.io import fits as astropy_fits
-                            with astropy_fits.open(file_path) as hdul:
-                                header = hdul[0].header
-                                has_wcs = 'CRVAL1' in header and 'CRVAL2' in header
+                            # 检查WCS（只读主头，结果按文件mtime/大小缓存）
+                            has_wcs = header_probe.has_wcs(file_path)
 
+                            ledger_call('finish', file_path, 'astap', astap_hash, has_wcs,
+                                        '' if has_wcs else '未添加WCS', time.time() - stage_start, run_id)
                             if has_wcs:
                                 with stats_lock:
                                     stats['astap_success'] += 1
@@ -4341,6 +4551,8 @@ Diff统计:
                             with stats_lock:
                                 stats['astap_failed'] += 1
                             error_msg = result.get('message', '未知错误') if result else '处理失败'
+                            ledger_call('finish', file_path, 'astap', astap_hash, False, error_msg,
+                                        time.time() - stage_start, run_id)
                             self._log(f"[ASTAP] ✗ 失败: {filename} - {error_msg}")
                             self.root.after(0, lambda f=filename, msg=error_msg: self.batch_status_widget.update_status(
                                 f, BatchStatusWidget.STATUS_ASTAP_FAILED, msg))
@@ -4349,6 +4561,8 @@ Diff统计:
                         self._update_pipeline_stats(stats)
 
                     finally:
+                        if scheduler:
+                            scheduler.release('astap', time.time() - stage_start)
                         # 标记任务完成
                         astap_queue.task_done()
 
@@ -4384,20 +4598,34 @@ Diff统计:
                         diff_queue.task_done()
                         break
 
+                    # 自适应调度：等待Diff阶段的并发名额
+                    if scheduler and not scheduler.acquire('diff'):
+                        diff_queue.task_done()
+                        break
+
+                    stage_start = time.time()
                     try:
                         filename = os.path.basename(file_path)
                         self._log(f"[Diff] 开始处理: {filename}")
                         self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
                             f, BatchStatusWidget.STATUS_DIFF_PROCESSING))
 
-                        # 执行Diff处理
+                        # 执行Diff处理；账本中记录的参数与当前不同时忽略已有结果目录，重新计算
+                        previous = ledger_call('get', file_path, 'diff')
+                        force = bool(previous and previous['params_hash'] != diff_hash)
+                        ledger_call('start', file_path, 'diff', diff_hash, run_id)
                         result = self._process_single_diff(
                             file_path, template_dir, noise_methods, alignment_method,
-                            remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by, science_bg_mode, diff_calc_mode, apply_diff_postprocess
+                            remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by, science_bg_mode, diff_calc_mode, apply_diff_postprocess,
+                            process_pool=diff_pool, force=force
                         )
+                        ledger_call('finish', file_path, 'diff', diff_hash, bool(result and result.get('success')),
+                                    (result or {}).get('message', ''), time.time() - stage_start, run_id,
+                                    self._find_diff_detection_dir((result or {}).get('output_dir')))
 
                         with stats_lock:
                             stats['diff_completed'] += 1
+                            stats['diff_seconds'] += time.time() - stage_start
 
                         if result and result.get('success'):
                             with stats_lock:
@@ -4418,6 +4646,8 @@ Diff统计:
                         self._update_pipeline_stats(stats)
 
                     finally:
+                        if scheduler:
+                            scheduler.release('diff', time.time() - stage_start)
                         # 标记任务完成
                         diff_queue.task_done()
 
@@ -4434,209 +4664,250 @@ Diff统计:
         astap_threads = []
         diff_threads = []
 
-        for i in range(thread_count):
+        # 自适应调度：thread_count 为两阶段并发总数，按队列深度/单文件耗时/CPU/内存在两阶段间移动名额，线程数按上限预先启动
+        scheduler = self._create_pipeline_scheduler(thread_count, astap_queue, diff_queue, stats, stop_event)
+        astap_thread_count = scheduler.max_workers('astap') if scheduler else thread_count
+        diff_worker_limit = scheduler.max_workers('diff') if scheduler else thread_count
+
+        for i in range(astap_thread_count):
             t = threading.Thread(target=astap_worker, daemon=True)
             t.start()
             astap_threads.append(t)
 
-        for i in range(thread_count):
+        # 启用进程池时Diff线程只负责调度（取任务、等待暂停、回传状态），计算在子进程中执行
+        diff_pool = self._get_diff_process_pool(diff_worker_limit)
+        diff_thread_count = diff_pool.max_workers if diff_pool else diff_worker_limit
+        for i in range(diff_thread_count):
             t = threading.Thread(target=diff_worker, daemon=True)
             t.start()
             diff_threads.append(t)
 
-        self._log(f"启动了 {thread_count} 个ASTAP工作线程和 {thread_count} 个Diff工作线程")
-
-        # 下载文件并放入ASTAP队列（单线程下载）
-        self._log("\n开始下载文件...")
-        for idx, item in enumerate(selected_files, 1):
-            # 兼容两种输入格式：
-            # 1) (filename, url)
-            # 2) (filename, url, per_download_dir)
-            if isinstance(item, (list, tuple)) and len(item) >= 2:
-                filename, url = item[0], item[1]
-                per_download_dir = item[2] if len(item) >= 3 and item[2] else download_dir
-            else:
-                # 输入异常，跳过
-                continue
+        if scheduler:
+            scheduler.start()
+            self._log(f"自适应调度: 启动 {astap_thread_count} 个ASTAP工作线程和 {diff_thread_count} 个Diff工作线程，"
+                      f"初始并发 ASTAP {scheduler.limits['astap']} / Diff {scheduler.limits['diff']}，"
+                      f"CPU预算 {scheduler.cpu_budget}")
+        else:
+            self._log(f"启动了 {astap_thread_count} 个ASTAP工作线程和 {diff_thread_count} 个Diff工作线程")
 
-            # 检查停止标志
+        # 并发下载：有界线程池，每个线程复用自己的HTTP会话；按完成顺序送入ASTAP/Diff队列
+        download_workers = max(1, int(self.config_manager.get_download_settings().get('pipeline_download_workers', 4)))
+        if not self.downloader:
+            self.downloader = FitsDownloader(
+                max_workers=download_workers,
+                retry_times=self.retry_times_var.get(),
+                timeout=self.timeout_var.get(),
+                enable_astap=False,  # 不在下载器中处理ASTAP
+                astap_config_path="config/url_config.json"
+            )
+        total_files = len(selected_files)
+        self._log(f"\n开始下载文件（{download_workers} 个下载线程）...")
+
+        # 聚合下载进度（多个文件同时下载，显示总速度）
+        progress_lock = threading.Lock()
+        progress_state = {'inflight': {}, 'done_bytes': 0, 'last_ui': 0.0,
+                          'last_time': time.time(), 'last_bytes': 0}
+
+        def report_download_progress(force=False):
+            now = time.time()
+            with progress_lock:
+                if not force and now - progress_state['last_ui'] < 0.5:
+                    return
+                total_bytes = progress_state['done_bytes'] + sum(progress_state['inflight'].values())
+                delta_t = max(now - progress_state['last_time'], 1e-3)
+                speed_mb_s = (max(total_bytes - progress_state['last_bytes'], 0) / (1024.0 * 1024.0)) / delta_t
+                progress_state.update(last_ui=now, last_time=now, last_bytes=total_bytes)
+                active = len(progress_state['inflight'])
+            with stats_lock:
+                stats['current_speed_mb_s'] = speed_mb_s
+                done = stats['download_completed'] + stats['download_failed']
+            text = f"下载中 {active} 个文件 (已完成 {done}/{total_files}) | 总速度: {speed_mb_s:.2f} MB/s"
+            self.root.after(0, lambda txt=text: self.batch_progress_label.config(text=txt))
+
+        def download_one(filename, url, per_download_dir):
+            """下载单个文件（在下载线程池中执行），返回 (状态, 文件路径, 消息)"""
             if self.batch_stopped:
-                self._log("\n批量处理已被停止")
-                stop_event.set()
-                break
-
-            # 检查暂停标志
-            if self.batch_paused:
-                self._log(f"\n批量处理已暂停（当前进度: {idx-1}/{len(selected_files)}）")
-                self.root.after(0, lambda i=idx-1, t=len(selected_files): self.status_label.config(
-                    text=f"批量处理已暂停 ({i}/{t})"))
-
+                return 'stopped', None, ''
             # 等待暂停解除
             self.batch_pause_event.wait()
-
-            # 暂停解除后再次检查停止标志
             if self.batch_stopped:
-                self._log("\n批量处理已被停止")
-                stop_event.set()
-                break
-
-            self._log(f"[下载] [{idx}/{len(selected_files)}] {filename}")
-            self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
-                f, BatchStatusWidget.STATUS_DOWNLOADING))
-            # 标记下载开始时间并在“批量处理状态/处理进度”显示当前下载中文件
-            start_time = time.time()
-            self.root.after(0, lambda i=idx, t=len(selected_files), f=filename:
-                            self.batch_progress_label.config(text=f"下载中 ({i}/{t}): {f}"))
-
-            # 初始化下载进度状态（用于滚动显示速度）
-            progress_state = {'last_time': start_time, 'last_bytes': 0, 'last_ui': start_time}
-
-            def progress_callback(downloaded_bytes, total_bytes, fn=filename, i=idx, t=len(selected_files)):
-                now = time.time()
-                delta_t = max(now - progress_state['last_time'], 1e-3)
-                delta_bytes = max(downloaded_bytes - progress_state['last_bytes'], 0)
-                inst_speed_mb_s = (delta_bytes / (1024.0 * 1024.0)) / delta_t
-                downloaded_mb = downloaded_bytes / (1024.0 * 1024.0)
-                total_mb = (total_bytes / (1024.0 * 1024.0)) if total_bytes else None
-                # 节流更新频率，避免UI过于频繁刷新
-                if now - progress_state['last_ui'] >= 0.2:
-                    if total_mb is not None:
-                        text = f"下载中 ({i}/{t}): {fn} | {downloaded_mb:.2f}/{total_mb:.2f} MB | 速度: {inst_speed_mb_s:.2f} MB/s"
-                    else:
-                        text = f"下载中 ({i}/{t}): {fn} | {downloaded_mb:.2f}/未知 MB | 速度: {inst_speed_mb_s:.2f} MB/s"
-                    self.root.after(0, lambda txt=text: self.batch_progress_label.config(text=txt))
-                    with stats_lock:
-                        stats['current_speed_mb_s'] = inst_speed_mb_s
-                    progress_state['last_ui'] = now
-                progress_state['last_time'] = now
-                progress_state['last_bytes'] = downloaded_bytes
+                return 'stopped', None, ''
 
             # 为每个文件选择独立目录（若提供）
             os.makedirs(per_download_dir, exist_ok=True)
             file_path = os.path.join(per_download_dir, filename)
 
-            # 检查文件是否已存在
-            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                self._log(f"[下载] ⊙ 文件已存在，跳过下载: {filename}")
-                self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
-                    f, BatchStatusWidget.STATUS_DOWNLOAD_SUCCESS))
+            download_hash = params_hash({'url': url})
+            # 账本记录已下载且文件仍在：不再读取文件校验
+            if ledger and os.path.exists(file_path):
+                run, _ = ledger_should_run(file_path, 'download', download_hash)
+                if not run:
+                    return 'skipped', file_path, ''
 
-                # 检查是否已有WCS
-                try:
-                    from astropy.io import fits as astropy_fits
-                    with astropy_fits.open(file_path) as hdul:
-                        header = hdul[0].header
-                        has_wcs = 'CRVAL1' in header and 'CRVAL2' in header
+            # 检查文件是否已存在（不完整的文件交给下载器续传）
+            if self.downloader.is_complete_file(file_path):
+                ledger_call('finish', file_path, 'download', download_hash, True, '已存在', None, run_id, file_path)
+                return 'skipped', file_path, ''
 
-                    if has_wcs:
-                        self._log(f"[下载] ✓ 文件已有WCS，直接进入Diff队列: {filename}")
-                        diff_queue.put(file_path)
-                    else:
-                        self._log(f"[下载] → 文件无WCS，进入ASTAP队列: {filename}")
-                        astap_queue.put(file_path)
-                except:
-                    astap_queue.put(file_path)
-                # 已存在则更新处理进度提示（无速度）
-                self.root.after(0, lambda i=idx, t=len(selected_files), f=filename:
-                                self.batch_progress_label.config(text=f"跳过下载(已存在) ({i}/{t}): {f}"))
+            # 上次下载失败且不在重试范围内；成功记录但文件已不存在时记录失效，重新下载
+            run, row = ledger_should_run(file_path, 'download', download_hash)
+            if not run and row and row['status'] == 'failed':
+                return 'failed', file_path, f"账本: 上次失败 {row.get('message') or ''}".strip()
 
-                with stats_lock:
-                    stats['current_speed_mb_s'] = 0.0
-                    stats['download_completed'] += 1
-                continue
+            self._log(f"[下载] 开始: {filename}")
+            self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                f, BatchStatusWidget.STATUS_DOWNLOADING))
 
-            # 下载文件
-            try:
-                # 使用现有的下载器
-                if not self.downloader:
-                    self.downloader = FitsDownloader(
-                        max_workers=1,
-                        retry_times=self.retry_times_var.get(),
-                        timeout=self.timeout_var.get(),
-                        enable_astap=False,  # 不在下载器中处理ASTAP
-                        astap_config_path="config/url_config.json"
-                    )
+            def progress_callback(downloaded_bytes, total_bytes, fn=filename):
+                with progress_lock:
+                    progress_state['inflight'][fn] = downloaded_bytes
+                report_download_progress()
 
+            start_time = time.time()
+            ledger_call('start', file_path, 'download', download_hash, run_id)
+            try:
                 # 注意：需使用每个文件对应的独立下载目录 per_download_dir，避免与队列中的 file_path 不一致
                 result = self.downloader.download_single_file(url, per_download_dir, progress_callback)
-
-                if "成功" in result:
-                    with stats_lock:
-                        stats['download_completed'] += 1
-                    self._log(f"[下载] ✓ 成功: {filename}")
-                    self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
-                        f, BatchStatusWidget.STATUS_DOWNLOAD_SUCCESS))
-                    # 计算并显示当前下载速度（MB/s）
-                    try:
-                        elapsed = max(time.time() - start_time, 1e-3)
-                        size_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
-                        speed_mb_s = (size_bytes / (1024.0 * 1024.0)) / elapsed
-                    except Exception:
-                        speed_mb_s = 0.0
-                    self.root.after(0, lambda i=idx, t=len(selected_files), f=filename, s=speed_mb_s:
-
-                                    self.batch_progress_label.config(text=f"下载完成 ({i}/{t}): {f} | 速度: {s:.2f} MB/s"))
-
-
+            finally:
+                with progress_lock:
+                    progress_state['inflight'].pop(filename, None)
+
+            ledger_call('finish', file_path, 'download', download_hash, "成功" in result,
+                        '' if "成功" in result else result, time.time() - start_time, run_id,
+                        file_path if "成功" in result else None)
+            if "成功" not in result:
+                return 'failed', file_path, "下载失败"
+            # 重新下载的文件不含之前ASTAP写入的WCS
+            ledger_call('invalidate', file_path, 'astap')
+
+            size_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+            with progress_lock:
+                progress_state['done_bytes'] += size_bytes
+            with stats_lock:
+                stats['download_bytes'] += size_bytes
+                stats['download_seconds'] += time.time() - start_time
+            return 'success', file_path, ''
+
+        def route_downloaded_file(file_path, filename):
+            """按账本跳过已完成的阶段；已有WCS的文件直接进入Diff队列，否则进入ASTAP队列"""
+            if ledger:
+                run_diff, diff_row = ledger_should_run(file_path, 'diff', diff_hash)
+                if not run_diff:
                     with stats_lock:
-                        stats['current_speed_mb_s'] = speed_mb_s
-
-                    # 检查是否已有WCS
-                    try:
-                        from astropy.io import fits as astropy_fits
-                        with astropy_fits.open(file_path) as hdul:
-                            header = hdul[0].header
-                            has_wcs = 'CRVAL1' in header and 'CRVAL2' in header
-
-                        if has_wcs:
-                            self._log(f"[下载] ✓ 文件已有WCS，直接进入Diff队列: {filename}")
-                            diff_queue.put(file_path)
-                        else:
-                            self._log(f"[下载] → 文件无WCS，进入ASTAP队列: {filename}")
-                            astap_queue.put(file_path)
-                    except:
-                        astap_queue.put(file_path)
+                        stats['ledger_skipped'] = stats.get('ledger_skipped', 0) + 1
+                    if diff_row['status'] == 'success':
+                        self._log(f"[账本] ⊙ Diff已完成（参数未变），跳过: {filename}")
+                        self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                            f, BatchStatusWidget.STATUS_DIFF_SKIPPED, "账本: 已完成"))
+                    else:
+                        self._log(f"[账本] ⊙ Diff上次失败且未设置重试，跳过: {filename}")
+                        self.root.after(0, lambda f=filename, msg=diff_row.get('message') or '': self.batch_status_widget.update_status(
+                            f, BatchStatusWidget.STATUS_DIFF_FAILED, f"账本: 上次失败 {msg}".strip()))
+                    return
+                run_astap, astap_row = ledger_should_run(file_path, 'astap', astap_hash)
+                if not run_astap:
+                    if astap_row['status'] == 'success':
+                        self._log(f"[账本] ASTAP已完成，直接进入Diff队列: {filename}")
+                        diff_queue.put(file_path)
+                    else:
+                        self._log(f"[账本] ⊙ ASTAP上次失败且未设置重试，跳过: {filename}")
+                        self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                            f, BatchStatusWidget.STATUS_ASTAP_FAILED, "账本: 上次失败"))
+                    return
+            try:
+                if header_probe.has_wcs(file_path):
+                    self._log(f"[下载] ✓ 文件已有WCS，直接进入Diff队列: {filename}")
+                    ledger_call('finish', file_path, 'astap', astap_hash, True, '已有WCS', None, run_id)
+                    diff_queue.put(file_path)
                 else:
-                    with stats_lock:
-                        stats['download_failed'] += 1
-                        stats['current_speed_mb_s'] = 0.0
-                    self._log(f"[下载] ✗ 失败: {filename}")
-                    self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
-                        f, BatchStatusWidget.STATUS_DOWNLOAD_FAILED, "下载失败"))
-                    self.root.after(0, lambda i=idx, t=len(selected_files), f=filename:
-                                    self.batch_progress_label.config(text=f"下载失败 ({i}/{t}): {f}"))
+                    self._log(f"[下载] → 文件无WCS，进入ASTAP队列: {filename}")
+                    astap_queue.put(file_path)
+            except:
+                astap_queue.put(file_path)
+
+        download_start = time.time()
+        with ThreadPoolExecutor(max_workers=download_workers) as download_executor:
+            future_to_name = {}
+            for item in selected_files:
+                # 兼容两种输入格式：
+                # 1) (filename, url)
+                # 2) (filename, url, per_download_dir)
+                if isinstance(item, (list, tuple)) and len(item) >= 2:
+                    filename, url = item[0], item[1]
+                    per_download_dir = item[2] if len(item) >= 3 and item[2] else download_dir
+                else:
+                    # 输入异常，跳过
+                    continue
+                future = download_executor.submit(download_one, filename, url, per_download_dir)
+                future_to_name[future] = filename
 
+            for future in as_completed(future_to_name):
+                filename = future_to_name[future]
 
+                # 检查停止标志：取消尚未开始的下载
+                if self.batch_stopped and not stop_event.is_set():
+                    self._log("\n批量处理已被停止")
+                    stop_event.set()
+                    for pending in future_to_name:
+                        pending.cancel()
 
+                if future.cancelled():
+                    continue
 
+                try:
+                    status, file_path, message = future.result()
+                except Exception as e:
+                    status, file_path, message = 'error', None, str(e)
+
+                if status == 'stopped':
+                    continue
 
-            except Exception as e:
                 with stats_lock:
-                    stats['download_failed'] += 1
-                    stats['current_speed_mb_s'] = 0.0
-                self._log(f"[下载] ✗ 异常: {filename} - {str(e)}")
-                self.root.after(0, lambda f=filename, err=str(e): self.batch_status_widget.update_status(
-                    f, BatchStatusWidget.STATUS_DOWNLOAD_FAILED, err))
+                    if status in ('success', 'skipped'):
+                        stats['download_completed'] += 1
+                    else:
+                        stats['download_failed'] += 1
+                    done = stats['download_completed'] + stats['download_failed']
 
-                self.root.after(0, lambda i=idx, t=len(selected_files), f=filename, err=str(e):
-                                self.batch_progress_label.config(text=f"下载异常 ({i}/{t}): {f} | {err}"))
+                if status == 'skipped':
+                    self._log(f"[下载] ⊙ [{done}/{total_files}] 文件已存在，跳过下载: {filename}")
+                    self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                        f, BatchStatusWidget.STATUS_DOWNLOAD_SUCCESS))
+                    route_downloaded_file(file_path, filename)
+                elif status == 'success':
+                    self._log(f"[下载] ✓ [{done}/{total_files}] 成功: {filename}")
+                    self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                        f, BatchStatusWidget.STATUS_DOWNLOAD_SUCCESS))
+                    route_downloaded_file(file_path, filename)
+                elif status == 'failed':
+                    self._log(f"[下载] ✗ [{done}/{total_files}] 失败: {filename}")
+                    self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                        f, BatchStatusWidget.STATUS_DOWNLOAD_FAILED, message))
+                else:
+                    self._log(f"[下载] ✗ [{done}/{total_files}] 异常: {filename} - {message}")
+                    self.root.after(0, lambda f=filename, err=message: self.batch_status_widget.update_status(
+                        f, BatchStatusWidget.STATUS_DOWNLOAD_FAILED, err))
 
+                report_download_progress(force=True)
+                # 更新统计
+                self._update_pipeline_stats(stats)
 
-            # 更新统计
-            self._update_pipeline_stats(stats)
+        stats['download_wall_seconds'] = time.time() - download_start
+        with stats_lock:
+            stats['current_speed_mb_s'] = 0.0
 
         self._log("\n所有文件下载完成，等待ASTAP和Diff处理完成...")
 
         # 等待ASTAP队列处理完成
         astap_queue.join()
         # 发送结束信号给ASTAP线程
-        for _ in range(thread_count):
+        for _ in range(astap_thread_count):
             astap_queue.put(None)
 
         # 等待Diff队列处理完成
         diff_queue.join()
         # 发送结束信号给Diff线程
-        for _ in range(thread_count):
+        for _ in range(diff_thread_count):
             diff_queue.put(None)
 
         # 等待所有线程结束
@@ -4645,6 +4916,12 @@ Diff统计:
             t.join(timeout=5)
         for t in diff_threads:
             t.join(timeout=5)
+        self._finish_diff_process_pool(diff_pool)
+        if scheduler:
+            scheduler.stop()
+        if ledger:
+            ledger_call('end_run', run_id, {k: v for k, v in stats.items() if k != 'scheduler'})
+            ledger.close()
 
         # 打印最终统计
         self._log("\n" + "=" * 60)
@@ -4652,8 +4929,90 @@ Diff统计:
         self._log(f"下载: 成功 {stats['download_completed']}, 失败 {stats['download_failed']}")
         self._log(f"ASTAP: 成功 {stats['astap_success']}, 失败 {stats['astap_failed']}")
         self._log(f"Diff: 成功 {stats['diff_success']}, 失败 {stats['diff_failed']}")
+        if stats.get('ledger_skipped'):
+            self._log(f"账本: 跳过已完成/不重试的文件 {stats['ledger_skipped']} 个")
+        self._log_pipeline_throughput(stats, time.time() - pipeline_start)
         self._log("=" * 60)
 
+    def _log_pipeline_throughput(self, stats, total_seconds):
+        """输出流水线各阶段吞吐（墙钟速率与单文件平均耗时）"""
+        total_minutes = max(total_seconds, 1e-3) / 60.0
+        download_mb = stats['download_bytes'] / (1024.0 * 1024.0)
+        download_wall = max(stats['download_wall_seconds'], 1e-3)
+        self._log(f"吞吐 - 下载: {download_mb:.1f} MB / {download_wall:.1f}秒 = {download_mb / download_wall:.2f} MB/s")
+        for label, done_key, seconds_key in (('ASTAP', 'astap_completed', 'astap_seconds'),
+                                             ('Diff', 'diff_completed', 'diff_seconds')):
+            done = stats[done_key]
+            avg = stats[seconds_key] / done if done else 0.0
+            self._log(f"吞吐 - {label}: {done / total_minutes:.1f} 个/分钟, 单文件平均 {avg:.1f}秒")
+        self._log(f"流水线总耗时: {total_seconds:.1f}秒")
+
+    def _open_job_ledger(self, description):
+        """
+        打开批量处理任务账本（默认位于Diff输出根目录下的 job_ledger.sqlite）
+
+        Returns:
+            tuple: (JobLedger, run_id)，未启用或打开失败时为 (None, None)
+        """
+        settings = self.config_manager.get_batch_process_settings()
+        if not settings.get('job_ledger_enabled', True):
+            return None, None
+        db_path = settings.get('job_ledger_path') or ''
+        if not db_path:
+            root = self.diff_output_dir_var.get().strip() or self.download_dir_var.get().strip()
+            if not root:
+                return None, None
+            db_path = os.path.join(root, 'job_ledger.sqlite')
+        try:
+            ledger = JobLedger(db_path)
+            run_id = ledger.begin_run(description)
+            self._log(f"任务账本: {db_path} (run {run_id})")
+            return ledger, run_id
+        except Exception as e:
+            self._log(f"任务账本打开失败，本次不记录: {e}")
+            return None, None
+
+    def _create_pipeline_scheduler(self, thread_count, astap_queue, diff_queue, stats, stop_event):
+        """
+        按批量处理设置创建流水线自适应调度器
+
+        Returns:
+            Optional[StageScheduler]: 未启用时返回None（ASTAP/Diff各固定 thread_count 个线程）；
+                启用时 thread_count 是两阶段并发之和，名额按积压量在两阶段之间移动
+        """
+        settings = self.config_manager.get_batch_process_settings()
+        if not settings.get('adaptive_pipeline_scheduler', False):
+            return None
+
+        def on_update(snapshot):
+            stats['scheduler'] = snapshot
+            self._update_pipeline_stats(stats)
+
+        # 重投影缓存与模板特征缓存：进程池模式下每个子进程各一份，计入单个Diff任务；线程模式下进程内共享一份
+        diff_worker_memory_mb = float(settings.get('diff_worker_memory_mb', 1200) or 1200)
+        cache_mb = sum(DiffOrbIntegration.cache_limits_from_settings(settings).values()) / (1024.0 * 1024.0)
+        shared_memory_mb = 0.0
+        if settings.get('diff_executor', 'thread') == 'process':
+            diff_worker_memory_mb += cache_mb
+        else:
+            shared_memory_mb = cache_mb
+
+        # 用户设置的线程数即并发总数；pipeline_cpu_budget 可进一步收紧
+        cpu_budget = thread_count
+        configured_budget = int(settings.get('pipeline_cpu_budget', 0) or 0)
+        if configured_budget > 0:
+            cpu_budget = min(cpu_budget, configured_budget)
+
+        return StageScheduler(
+            {'astap': astap_queue.qsize, 'diff': diff_queue.qsize},
+            cpu_budget=cpu_budget,
+            memory_budget_mb=float(settings.get('pipeline_memory_budget_mb', 0) or 0),
+            diff_worker_memory_mb=diff_worker_memory_mb,
+            shared_memory_mb=shared_memory_mb,
+            should_stop=lambda: self.batch_stopped or stop_event.is_set(),
+            on_update=on_update
+        )
+
     def _update_pipeline_stats(self, stats):
         """更新流水线统计信息显示"""
         speed = stats.get('current_speed_mb_s', 0.0)
@@ -4661,6 +5020,17 @@ Diff统计:
                       f"速度: {speed:.2f} MB/s | "
                       f"ASTAP: {stats['astap_success']}/{stats['astap_completed']} | "
                       f"Diff: {stats['diff_success']}/{stats['diff_completed']}")
+        snapshot = stats.get('scheduler')
+        if snapshot:
+            # 调度指标：运行中/并发上限(排队) 与单文件平均耗时
+            for label, stage in (('ASTAP', 'astap'), ('Diff', 'diff')):
+                info = snapshot['stages'][stage]
+                latency = f" {info['latency']:.1f}s" if info['latency'] is not None else ""
+                stats_text += f" | {label} {info['active']}/{info['limit']}(排队{info['queue']}){latency}"
+            if snapshot.get('cpu_percent') is not None:
+                stats_text += f" | CPU {snapshot['cpu_percent']:.0f}%"
+            if snapshot.get('rss_mb') is not None:
+                stats_text += f" | RSS {snapshot['rss_mb']:.0f} MB"
         self.root.after(0, lambda t=stats_text: self.batch_stats_label.config(text=t))
 
     def _execute_diff_for_files(self, files_with_wcs, thread_count):
@@ -4720,21 +5090,31 @@ Diff统计:
         counter_lock = threading.Lock()
         completed_count = 0
 
+        # 启用进程池时线程只负责调度与回传状态，Diff计算在子进程中执行
+        diff_pool = self._get_diff_process_pool(thread_count)
+        dispatch_count = diff_pool.max_workers if diff_pool else thread_count
+
+        def run_one(download_file):
+            """等待暂停解除后执行单个Diff；停止后不再开始新的任务"""
+            filename = os.path.basename(download_file)
+            self.batch_pause_event.wait()
+            if self.batch_stopped:
+                return {'success': False, 'filename': filename, 'message': '已停止', 'new_spots': 0, 'stopped': True}
+            # 更新状态为Diff处理中
+            self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
+                f, BatchStatusWidget.STATUS_DIFF_PROCESSING))
+            return self._process_single_diff(
+                download_file, template_dir, noise_methods, alignment_method,
+                remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by, science_bg_mode, diff_calc_mode, apply_diff_postprocess,
+                process_pool=diff_pool
+            )
+
         # 创建线程池
-        with ThreadPoolExecutor(max_workers=thread_count) as executor:
+        with ThreadPoolExecutor(max_workers=dispatch_count) as executor:
             # 提交所有任务
             future_to_file = {}
             for download_file in files_with_wcs:
-                filename = os.path.basename(download_file)
-                # 更新状态为Diff处理中
-                self.root.after(0, lambda f=filename: self.batch_status_widget.update_status(
-                    f, BatchStatusWidget.STATUS_DIFF_PROCESSING))
-
-                future = executor.submit(
-                    self._process_single_diff,
-                    download_file, template_dir, noise_methods, alignment_method,
-                    remove_bright_lines, stretch_method, percentile_low, fast_mode, sort_by, science_bg_mode, diff_calc_mode, apply_diff_postprocess
-                )
+                future = executor.submit(run_one, download_file)
                 future_to_file[future] = download_file
 
             # 处理完成的任务
@@ -4752,6 +5132,8 @@ Diff统计:
 
                 try:
                     result_dict = future.result()
+                    if result_dict.get('stopped'):
+                        continue
 
                     # 记录日志
                     self._log(f"\n[{current_completed}/{len(files_with_wcs)}] {filename}")
@@ -4787,6 +5169,8 @@ Diff统计:
                     self.root.after(0, lambda f=filename, err=str(e): self.batch_status_widget.update_status(
                         f, BatchStatusWidget.STATUS_DIFF_FAILED, err))
 
+        self._finish_diff_process_pool(diff_pool)
+
         self._log(f"\nDiff处理完成: 成功 {success_count} 个, 失败 {fail_count} 个")
 
     def _full_day_all_systems_batch_process(self):
@@ -5252,6 +5636,7 @@ Diff统计:
         except Exception as e:
             self._log(f"保存配置失败: {str(e)}")
         finally:
+            self._shutdown_diff_process_pool()
             self.root.destroy()
 
     def _apply_auto_settings(self):
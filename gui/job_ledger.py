@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+批量处理任务账本（SQLite）
+逐条记录 (文件, 阶段, 参数哈希, 状态, 耗时)，进程崩溃或停止后重新运行时据此跳过已完成的阶段、
+有选择地重试失败阶段，Diff参数变化时只重做Diff；成功记录的产物（下载文件、Diff结果目录）被删除后视为失效
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+JOB_LEDGER_VERSION = 1
+
+STATUS_RUNNING = 'running'
+STATUS_SUCCESS = 'success'
+STATUS_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    file_key    TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    message     TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    started     REAL,
+    finished    REAL,
+    seconds     REAL,
+    run_id      TEXT,
+    output      TEXT,
+    PRIMARY KEY (file_key, stage)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_stage_status ON jobs(stage, status);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    description TEXT,
+    started     REAL,
+    finished    REAL,
+    summary     TEXT
+);
+"""
+
+
+def params_hash(params: Dict) -> str:
+    """参数字典的稳定哈希（键排序后的JSON）"""
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+class JobLedger:
+    """线程安全的SQLite任务账本，每次状态变化立即提交"""
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path (str): 数据库文件路径（不存在时创建）
+        """
+        self.logger = logging.getLogger(__name__)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL：写入中途崩溃不会损坏已提交的记录，读写互不阻塞
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version={JOB_LEDGER_VERSION}")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, file_key: str, stage: str) -> Optional[Dict]:
+        """读取 (文件, 阶段) 的记录"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE file_key=? AND stage=?",
+                                     (file_key, stage)).fetchone()
+        return dict(row) if row else None
+
+    def should_run(self, file_key: str, stage: str, stage_hash: str,
+                   retry_failed: Iterable[str] = ('download', 'astap', 'diff')) -> Tuple[bool, Optional[Dict]]:
+        """
+        判断阶段是否需要执行
+
+        Args:
+            file_key (str): 文件标识（下载文件的绝对路径）
+            stage (str): 阶段名
+            stage_hash (str): 当前参数哈希
+            retry_failed (Iterable[str]): 失败后允许重试的阶段
+
+        Returns:
+            Tuple[bool, Optional[Dict]]: (是否执行, 已有记录)；成功且参数未变、或失败但不在重试范围内时不执行，
+            参数变化、上次中断（running）或成功记录的产物已不存在时执行
+        """
+        row = self.get(file_key, stage)
+        if row is None or row['params_hash'] != stage_hash:
+            return True, row
+        if row['status'] == STATUS_SUCCESS:
+            if row.get('output') and not os.path.exists(row['output']):
+                self.logger.info(f"账本记录的产物已不存在，重新执行 {stage}: {row['output']}")
+                return True, row
+            return False, row
+        if row['status'] == STATUS_FAILED:
+            return stage in set(retry_failed), row
+        return True, row
+
+    def start(self, file_key: str, stage: str, stage_hash: str, run_id: Optional[str] = None):
+        """标记阶段开始执行"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (file_key, stage, params_hash, status, attempts, started, run_id) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(file_key, stage) DO UPDATE SET params_hash=excluded.params_hash, "
+                "status=excluded.status, message=NULL, attempts=jobs.attempts+1, started=excluded.started, "
+                "finished=NULL, seconds=NULL, run_id=excluded.run_id",
+                (file_key, stage, stage_hash, STATUS_RUNNING, time.time(), run_id))
+            self._conn.commit()
+
+    def finish(self, file_key: str, stage: str, stage_hash: str, success: bool, message: str = '',
+               seconds: Optional[float] = None, run_id: Optional[str] = None, output: Optional[str] = None):
+        """
+        记录阶段结果（未调用 start 时直接插入，如按已有文件判定完成）
+
+        Args:
+            output (Optional[str]): 阶段产物路径（文件或目录），之后该路径不存在时 should_run 视成功记录为失效
+        """
+        now = time.time()
+        status = STATUS_SUCCESS if success else STATUS_FAILED
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (file_key, stage, params_hash, status, message, attempts, started, finished, seconds, run_id, output) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(file_key, stage) DO UPDATE SET params_hash=excluded.params_hash, "
+                "status=excluded.status, message=excluded.message, finished=excluded.finished, "
+                "seconds=excluded.seconds, run_id=COALESCE(excluded.run_id, jobs.run_id), output=excluded.output",
+                (file_key, stage, stage_hash, status, message, now, now, seconds, run_id, output))
+            self._conn.commit()
+
+    def invalidate(self, file_key: str, stage: str):
+        """删除 (文件, 阶段) 的记录（上游产物重新生成后，下游记录不再可信）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE file_key=? AND stage=?", (file_key, stage))
+            self._conn.commit()
+
+    def begin_run(self, description: str) -> str:
+        """登记一次批量运行，返回run_id"""
+        run_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{threading.get_ident() % 10000}"
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO runs (run_id, description, started) VALUES (?, ?, ?)",
+                               (run_id, description, time.time()))
+            self._conn.commit()
+        return run_id
+
+    def end_run(self, run_id: str, summary: Optional[Dict] = None):
+        """记录运行结束与汇总"""
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished=?, summary=? WHERE run_id=?",
+                               (time.time(), json.dumps(summary or {}, ensure_ascii=False, default=str), run_id))
+            self._conn.commit()
+
+    def counts(self, file_keys: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """统计指定文件各阶段各状态的记录数：{stage: {status: n}}"""
+        keys = list(file_keys)
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT stage, status, COUNT(*) FROM jobs WHERE file_key IN ({placeholders}) GROUP BY stage, status",
+                    chunk).fetchall()
+                for stage, status, n in rows:
+                    result.setdefault(stage, {})
+                    result[stage][status] = result[stage].get(status, 0) + n
+        return result
+
+    def failed(self, stage: Optional[str] = None) -> List[Dict]:
+        """列出失败记录（可按阶段过滤）"""
+        sql = "SELECT * FROM jobs WHERE status=?"
+        args: list = [STATUS_FAILED]
+        if stage:
+            sql += " AND stage=?"
+            args.append(stage)
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql + " ORDER BY finished", args).fetchall()]
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+远程目录列表页面的磁盘缓存
+按URL保存页面内容与ETag/Last-Modified：已结束观测夜在数据稳定后抓取的缓存直接读取（不访问网络），
+其余情况使用条件GET重新验证，未变化时服务器返回304即复用缓存内容
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+
+LISTING_CACHE_VERSION = 1
+
+# URL路径中的观测日期（YYYYMMDD）
+_URL_DATE_RE = re.compile(r'(?<!\d)((?:19|20)\d{6})(?!\d)')
+
+
+def default_listing_cache_dir() -> str:
+    """默认缓存目录 gui/listing_cache"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'listing_cache')
+
+
+def extract_url_date(url: str) -> Optional[str]:
+    """提取URL中最后一个合法的YYYYMMDD日期，没有时返回None"""
+    for candidate in reversed(_URL_DATE_RE.findall(url)):
+        try:
+            datetime.strptime(candidate, '%Y%m%d')
+            return candidate
+        except ValueError:
+            continue
+    return None
+
+
+def is_past_night(date_str: Optional[str], settle_days: int = 2, today: Optional[datetime] = None) -> bool:
+    """
+    判断观测夜是否已结束且数据不再变化
+
+    Args:
+        date_str (Optional[str]): 观测夜日期 YYYYMMDD
+        settle_days (int): 距今至少多少天才视为已结束（跨午夜的观测夜与延迟上传留出余量）
+        today (Optional[datetime]): 当前日期，默认本地时间
+
+    Returns:
+        bool: 已结束返回True；日期未知时返回False（始终重新验证）
+    """
+    settle_time = night_settle_time(date_str, settle_days)
+    if settle_time is None:
+        return False
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return settle_time <= today
+
+
+def night_settle_time(date_str: Optional[str], settle_days: int = 2) -> Optional[datetime]:
+    """
+    观测夜数据不再变化的时刻（观测夜日期零点加 settle_days 天，已包含跨午夜的观测与延迟上传）
+
+    Returns:
+        Optional[datetime]: 日期未知或无效时返回None
+    """
+    if not date_str:
+        return None
+    try:
+        night = datetime.strptime(date_str, '%Y%m%d')
+    except ValueError:
+        return None
+    return night + timedelta(days=settle_days)
+
+
+class ListingCache:
+    """按URL缓存目录列表页面（一个URL一个JSON文件），多个扫描器与线程共享"""
+
+    def __init__(self, cache_dir: Optional[str] = None, settle_days: int = 2):
+        """
+        Args:
+            cache_dir (Optional[str]): 缓存目录，默认 gui/listing_cache
+            settle_days (int): 观测夜结束后多少天起直接使用缓存，见 is_past_night
+        """
+        self.cache_dir = cache_dir or default_listing_cache_dir()
+        self.settle_days = settle_days
+        self.logger = logging.getLogger(__name__)
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def load(self, url: str) -> Optional[Dict]:
+        """读取URL的缓存条目，不存在或已损坏时返回None"""
+        path = self._path(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('version') != LISTING_CACHE_VERSION or entry.get('url') != url:
+                return None
+            return entry
+        except Exception as e:
+            self.logger.warning(f"目录列表缓存读取失败 {path}: {e}")
+            return None
+
+    def is_settled(self, entry: Dict, date_str: Optional[str]) -> bool:
+        """
+        缓存条目是否在观测夜数据稳定之后抓取，只有这样的条目才能不经重新验证直接使用
+
+        观测夜进行中抓取的条目即使观测夜已结束也可能缺少之后上传的文件
+        """
+        settle_time = night_settle_time(date_str, self.settle_days)
+        if settle_time is None or not is_past_night(date_str, self.settle_days):
+            return False
+        try:
+            fetched = datetime.fromisoformat(entry.get('fetched') or '')
+        except (TypeError, ValueError):
+            return False
+        return fetched >= settle_time
+
+    def store(self, url: str, content: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> None:
+        """写入缓存条目（先写临时文件再替换，并发写入同一URL时不会产生半截文件）"""
+        entry = {
+            'version': LISTING_CACHE_VERSION,
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': datetime.now().isoformat(),
+            'content': content,
+        }
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"目录列表缓存写入失败 {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch(self, session, url: str, timeout: float = 30) -> str:
+        """
+        获取目录列表页面内容
+
+        已结束的观测夜且缓存在数据稳定后抓取时直接返回；否则带 If-None-Match / If-Modified-Since 请求，
+        304时返回缓存内容，200时更新缓存。网络错误与非2xx状态向上抛出，由调用方决定回退方式
+
+        Args:
+            session: requests.Session
+            url (str): 目录列表URL
+            timeout (float): 请求超时（秒）
+
+        Returns:
+            str: 页面HTML
+        """
+        entry = self.load(url)
+        if entry is not None and self.is_settled(entry, extract_url_date(url)):
+            self.logger.debug(f"目录列表缓存命中（已结束的观测夜）: {url}")
+            return entry['content']
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        start = time.time()
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            self.logger.debug(f"目录列表未变化(304, {time.time() - start:.2f}s): {url}")
+            if is_past_night(extract_url_date(url), self.settle_days):
+                # 观测夜已结束时确认过的内容不会再变化，刷新抓取时间后不再重新验证
+                self.store(url, entry['content'], entry.get('etag'), entry.get('last_modified'))
+            return entry['content']
+
+        response.raise_for_status()
+        content = response.text
+        self.store(url, content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return content
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_listing_cache() -> ListingCache:
+    """进程内共享的默认缓存实例"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ListingCache()
+        return _default_cache
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+本地星表（变星/小行星表格）的列预处理
+载入时一次性完成列名识别、masked值处理与类型转换，查询时只做向量化的圆锥与星等筛选
+"""
+
+import logging
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+def column_to_float(column) -> np.ndarray:
+    """
+    将星表列转换为float64数组，masked值与无法解析的值记为NaN
+
+    Args:
+        column: Astropy Column/MaskedColumn 或任意序列
+
+    Returns:
+        np.ndarray: float64数组
+    """
+    mask = np.asarray(getattr(column, 'mask', np.zeros(len(column), dtype=bool)), dtype=bool)
+    if mask.shape != (len(column),):
+        mask = np.zeros(len(column), dtype=bool)
+    data = np.asarray(getattr(column, 'data', column))
+    if isinstance(data, np.ma.MaskedArray):
+        data = data.data
+    try:
+        values = data.astype(np.float64)
+    except (ValueError, TypeError):
+        # 含无法解析的字符串时逐元素转换（仅在载入时执行一次）
+        values = np.full(len(data), np.nan, dtype=np.float64)
+        for i, val in enumerate(data):
+            try:
+                values[i] = float(val)
+            except (ValueError, TypeError):
+                continue
+    values = np.array(values, dtype=np.float64, copy=True)
+    values[mask] = np.nan
+    return values
+
+
+def column_to_str(column) -> np.ndarray:
+    """将星表列转换为字符串数组，masked值记为空字符串"""
+    if hasattr(column, 'filled') and getattr(column, 'mask', None) is not None:
+        try:
+            column = column.filled('')
+        except Exception:
+            pass
+    return np.asarray(column).astype(str)
+
+
+def _nan_to_none(values: np.ndarray) -> np.ndarray:
+    """缺失值（NaN）还原为None：下游格式化与排序按None判断缺失；无缺失时保持float64"""
+    missing = np.isnan(values)
+    if not np.any(missing):
+        return values
+    out = values.astype(object)
+    out[missing] = None
+    return out
+
+
+def first_column(colnames: Sequence[str], candidates: Sequence[str]) -> Optional[str]:
+    """按候选顺序返回第一个存在的列名"""
+    return next((c for c in candidates if c in colnames), None)
+
+
+class PreparedCatalog:
+    """预处理后的本地星表：坐标、星等与输出列均为类型化数组"""
+
+    def __init__(self, ra_deg: np.ndarray, dec_deg: np.ndarray,
+                 columns: Dict[str, np.ndarray], mag_field: Optional[str] = None,
+                 float_fields: Sequence[str] = ()):
+        """
+        Args:
+            ra_deg (np.ndarray): RA（度）
+            dec_deg (np.ndarray): DEC（度）
+            columns (Dict[str, np.ndarray]): 输出列名 -> 数组（与坐标等长）
+            mag_field (Optional[str]): 用于星等上限过滤的输出列名，None表示不过滤
+            float_fields (Sequence[str]): 以NaN表示缺失值的浮点输出列（输出结果时还原为None）
+        """
+        self.ra = np.mod(np.asarray(ra_deg, dtype=np.float64), 360.0)
+        self.dec = np.asarray(dec_deg, dtype=np.float64)
+        self.columns = columns
+        self.mag_field = mag_field
+        self.float_fields = set(float_fields)
+        self._ra_rad = np.deg2rad(self.ra)
+        self._dec_rad = np.deg2rad(self.dec)
+        self._cos_dec = np.cos(self._dec_rad)
+
+    def __len__(self) -> int:
+        return len(self.ra)
+
+    @classmethod
+    def from_table(cls, table, ra_candidates: Sequence[str], dec_candidates: Sequence[str],
+                   float_fields: Dict[str, Sequence[str]], str_fields: Dict[str, Sequence[str]],
+                   passthrough_fields: Optional[Dict[str, Sequence[str]]] = None,
+                   mag_field: Optional[str] = None) -> Optional['PreparedCatalog']:
+        """
+        从Astropy Table构建预处理星表
+
+        Args:
+            table: Astropy Table
+            ra_candidates / dec_candidates: RA/DEC候选列名
+            float_fields: 输出列名 -> 候选列名（转为float64，缺失为NaN）
+            str_fields: 输出列名 -> 候选列名（转为字符串，缺失为空）
+            passthrough_fields: 输出列名 -> 候选列名（保持原列类型）
+            mag_field (Optional[str]): float_fields中用于星等过滤的输出列名
+
+        Returns:
+            Optional[PreparedCatalog]: 缺少RA/DEC列时返回None
+        """
+        logger = logging.getLogger(__name__)
+        colnames = table.colnames
+        col_ra = first_column(colnames, ra_candidates)
+        col_dec = first_column(colnames, dec_candidates)
+        if not col_ra or not col_dec:
+            return None
+
+        ra = column_to_float(table[col_ra])
+        dec = column_to_float(table[col_dec])
+        if np.all(np.isnan(ra)) and len(ra):
+            # 时角/度格式字符串，借助SkyCoord一次性解析
+            from astropy.coordinates import SkyCoord
+            import astropy.units as u
+            coords = SkyCoord(column_to_str(table[col_ra]), column_to_str(table[col_dec]),
+                              unit=(u.hourangle, u.deg), frame="icrs")
+            ra = np.asarray(coords.ra.deg, dtype=np.float64)
+            dec = np.asarray(coords.dec.deg, dtype=np.float64)
+
+        n = len(table)
+        columns = {}
+        for out_name, candidates in float_fields.items():
+            col = first_column(colnames, candidates)
+            columns[out_name] = column_to_float(table[col]) if col else np.full(n, np.nan)
+        for out_name, candidates in str_fields.items():
+            col = first_column(colnames, candidates)
+            columns[out_name] = column_to_str(table[col]) if col else np.full(n, '', dtype='U1')
+        for out_name, candidates in (passthrough_fields or {}).items():
+            col = first_column(colnames, candidates)
+            columns[out_name] = np.asarray(table[col]) if col else np.full(n, None, dtype=object)
+
+        if mag_field is not None and np.all(np.isnan(columns.get(mag_field, np.empty(0)))):
+            mag_field = None
+
+        logger.info(f"本地星表预处理完成: {n} 行, RA/DEC列 {col_ra}/{col_dec}, 星等列 {mag_field or '无'}")
+        return cls(ra, dec, columns, mag_field, float_fields=tuple(float_fields))
+
+    def select(self, ra: float, dec: float, radius: float, mag_limit: Optional[float] = None) -> np.ndarray:
+        """
+        圆锥搜索并按星等上限过滤（masked/无法解析的星等保留）
+
+        Args:
+            ra (float): 目标RA（度）
+            dec (float): 目标DEC（度）
+            radius (float): 搜索半径（度）
+            mag_limit (Optional[float]): 星等上限
+
+        Returns:
+            np.ndarray: 命中行下标
+        """
+        ra0, dec0 = np.deg2rad(float(ra)), np.deg2rad(float(dec))
+        # haversine角距，小半径下数值稳定
+        h = (np.sin((self._dec_rad - dec0) / 2.0) ** 2
+             + self._cos_dec * np.cos(dec0) * np.sin((self._ra_rad - ra0) / 2.0) ** 2)
+        sep = np.rad2deg(2.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0))))
+        mask = sep <= float(radius)
+        if mag_limit is not None and self.mag_field is not None:
+            mask &= ~(self.columns[self.mag_field] > float(mag_limit))
+        return np.nonzero(mask)[0]
+
+    def to_table(self, index: np.ndarray, layout: Sequence[str], constants: Optional[Dict] = None):
+        """
+        按输出列顺序组装结果表（列式切片，不逐行构建）
+
+        Args:
+            index (np.ndarray): 行下标
+            layout (Sequence[str]): 输出列顺序，RA/RAJ2000 与 DEC/DEJ2000 取自坐标数组
+            constants (Optional[Dict]): 固定值列，如 {'Type': 'Asteroid'}
+
+        Returns:
+            astropy.table.Table
+        """
+        from astropy.table import Table
+
+        constants = constants or {}
+        data = []
+        for name in layout:
+            if name in constants:
+                data.append(np.full(len(index), constants[name]))
+            elif name in ('RA', 'RAJ2000'):
+                data.append(self.ra[index])
+            elif name in ('DEC', 'DEJ2000'):
+                data.append(self.dec[index])
+            elif name in self.float_fields:
+                data.append(_nan_to_none(self.columns[name][index]))
+            else:
+                data.append(self.columns[name][index])
+        return Table(data, names=list(layout))
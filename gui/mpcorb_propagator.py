@@ -0,0 +1,732 @@
+#!/usr/bin/env python3
+"""
+MPCORB向量化轨道传播引擎
+将MPCORB轨道根数一次性载入连续的NumPy数组，按历元对全部小天体做向量化开普勒求解，
+并进行测站（顶点）改正，用于替代逐行构建Skyfield轨道的离线小行星圆锥搜索
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# 日心引力常数（与Skyfield一致：GM_SUN_Pitjeva_2005_km3_s2），换算为 AU^3/day^2
+GM_SUN_KM3_S2 = 132712440041.939400
+AU_KM = 149597870.700
+GM_SUN_AU3_D2 = GM_SUN_KM3_S2 * 86400.0 ** 2 / AU_KM ** 3
+# 光速（AU/day）
+C_AU_PER_DAY = 173.1446326846693
+# J2000黄赤交角（与Skyfield ECLIPJ2000一致: 84381.448角秒）
+OBLIQUITY_J2000_RAD = np.deg2rad(84381.448 / 3600.0)
+
+# 二进制列式缓存格式版本与保存的数组
+COLUMNAR_CACHE_VERSION = 2
+# 缓存根目录下指向当前版本子目录的指针文件
+COLUMNAR_POINTER = 'current.json'
+COLUMNAR_ARRAYS = (
+    'designations', 'magnitude_h', 'a', 'e', 'inclination_deg', 'node_deg', 'peri_deg',
+    'mean_anomaly_rad', 'epoch_jd_tt', 'mean_motion', 'b_over_a', 'P', 'Q'
+)
+
+# MPCORB中需要转换为数值的轨道要素列
+MPCORB_NUMERIC_COLUMNS = [
+    'magnitude_H', 'magnitude_G', 'mean_anomaly_degrees',
+    'argument_of_perihelion_degrees', 'longitude_of_ascending_node_degrees',
+    'inclination_degrees', 'eccentricity', 'mean_daily_motion_degrees',
+    'semimajor_axis_au'
+]
+
+
+def file_sha1(path: str, chunk_size: int = 4 * 1024 * 1024) -> str:
+    """流式计算文件SHA1"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _unpack_digit(c: str) -> int:
+    """MPC压缩格式的单字符解码（0-9, A-V）"""
+    return ord(c) - (48 if c.isdigit() else 55)
+
+
+def unpack_epoch_jd_tt(epoch_packed: str) -> float:
+    """
+    将MPC压缩历元（如 K24AH）转换为TT儒略日（当日0h TT）
+
+    Args:
+        epoch_packed (str): 压缩历元字符串
+
+    Returns:
+        float: TT儒略日
+    """
+    s = str(epoch_packed).strip()
+    year = 100 * _unpack_digit(s[0]) + int(s[1:3])
+    month = _unpack_digit(s[3])
+    day = _unpack_digit(s[4])
+    # 公历日期 -> 儒略日数（Fliegel & Van Flandern）
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    jdn = day + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+    return jdn - 0.5
+
+
+def compute_observer_geometry(eph, t, latitude: float, longitude: float) -> Dict[str, np.ndarray]:
+    """
+    计算测站与太阳在指定时刻的质心位置（ICRS, AU）
+
+    Args:
+        eph: Skyfield星历（如de421.bsp）
+        t: Skyfield Time对象
+        latitude (float): 测站纬度（度）
+        longitude (float): 测站经度（度）
+
+    Returns:
+        Dict[str, np.ndarray]: {'observer': (3,), 'sun': (3,), 'sun_velocity': (3,), 'jd_tt': float}
+    """
+    from skyfield.api import wgs84
+
+    observer = eph['earth'] + wgs84.latlon(latitude, longitude)
+    obs_pos = observer.at(t)
+    sun_pos = eph['sun'].at(t)
+    return {
+        'observer': np.asarray(obs_pos.position.au, dtype=np.float64),
+        'sun': np.asarray(sun_pos.position.au, dtype=np.float64),
+        'sun_velocity': np.asarray(sun_pos.velocity.au_per_d, dtype=np.float64),
+        'jd_tt': float(t.tt),
+    }
+
+
+def radec_to_unit_vector(ra_deg, dec_deg) -> np.ndarray:
+    """RA/DEC（度）转换为单位向量，支持标量或数组"""
+    ra = np.deg2rad(np.asarray(ra_deg, dtype=np.float64))
+    dec = np.deg2rad(np.asarray(dec_deg, dtype=np.float64))
+    cos_dec = np.cos(dec)
+    return np.stack([cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+class MPCORBPropagator:
+    """MPCORB向量化轨道传播引擎"""
+
+    def __init__(self, designations: np.ndarray, magnitude_h: np.ndarray,
+                 semimajor_axis_au: np.ndarray, eccentricity: np.ndarray,
+                 inclination_deg: np.ndarray, node_deg: np.ndarray,
+                 peri_deg: np.ndarray, mean_anomaly_deg: np.ndarray,
+                 epoch_jd_tt: np.ndarray):
+        """
+        初始化传播引擎（所有数组长度一致，单位为度/AU/TT儒略日）
+        """
+        self.logger = logging.getLogger(__name__)
+
+        self.designations = np.asarray(designations, dtype=object)
+        self.magnitude_h = np.asarray(magnitude_h, dtype=np.float64)
+        self.a = np.asarray(semimajor_axis_au, dtype=np.float64)
+        self.e = np.asarray(eccentricity, dtype=np.float64)
+        self.inclination_deg = np.asarray(inclination_deg, dtype=np.float64)
+        self.node_deg = np.asarray(node_deg, dtype=np.float64)
+        self.peri_deg = np.asarray(peri_deg, dtype=np.float64)
+        self.mean_anomaly_rad = np.deg2rad(np.asarray(mean_anomaly_deg, dtype=np.float64))
+        self.epoch_jd_tt = np.asarray(epoch_jd_tt, dtype=np.float64)
+
+        # 平均运动（rad/day），与Skyfield一样由半长径和GM计算
+        self.mean_motion = np.sqrt(GM_SUN_AU3_D2 / self.a ** 3)
+        self.b_over_a = np.sqrt(1.0 - self.e ** 2)
+
+        # 预计算近日点方向P和半通径方向Q（已旋转到ICRS赤道坐标）
+        self.P, self.Q = self._orientation_vectors()
+
+    @classmethod
+    def from_dataframe(cls, df) -> Tuple['MPCORBPropagator', int]:
+        """
+        从Skyfield的MPCORB DataFrame构建引擎
+
+        Args:
+            df: mpc.load_mpcorb_dataframe 返回的DataFrame（已按需做H筛选）
+
+        Returns:
+            Tuple[MPCORBPropagator, int]: (引擎, 因轨道无效被丢弃的条目数)
+        """
+        import pandas as pd
+
+        cols = {}
+        for c in MPCORB_NUMERIC_COLUMNS:
+            if c in df.columns:
+                cols[c] = pd.to_numeric(df[c], errors='coerce').to_numpy(dtype=np.float64)
+            else:
+                cols[c] = np.full(len(df), np.nan)
+
+        # 历元只有少量不同取值，按唯一值解码
+        epochs_packed = df['epoch_packed'].astype(str).to_numpy()
+        unique_epochs, inverse = np.unique(epochs_packed, return_inverse=True)
+        unique_jd = np.empty(len(unique_epochs), dtype=np.float64)
+        for i, s in enumerate(unique_epochs):
+            try:
+                unique_jd[i] = unpack_epoch_jd_tt(s)
+            except Exception:
+                unique_jd[i] = np.nan
+        epoch_jd = unique_jd[inverse]
+
+        # 仅保留椭圆轨道且要素完整的条目
+        e = cols['eccentricity']
+        a = cols['semimajor_axis_au']
+        valid = (np.isfinite(a) & (a > 0) & np.isfinite(e) & (e >= 0) & (e < 1)
+                 & np.isfinite(epoch_jd)
+                 & np.isfinite(cols['mean_anomaly_degrees'])
+                 & np.isfinite(cols['inclination_degrees'])
+                 & np.isfinite(cols['longitude_of_ascending_node_degrees'])
+                 & np.isfinite(cols['argument_of_perihelion_degrees']))
+        dropped = int(len(valid) - np.count_nonzero(valid))
+
+        if 'designation' in df.columns:
+            designations = df['designation'].astype(str).to_numpy()
+        else:
+            designations = np.array([''] * len(df), dtype=object)
+
+        engine = cls(
+            designations=designations[valid],
+            magnitude_h=cols['magnitude_H'][valid],
+            semimajor_axis_au=a[valid],
+            eccentricity=e[valid],
+            inclination_deg=cols['inclination_degrees'][valid],
+            node_deg=cols['longitude_of_ascending_node_degrees'][valid],
+            peri_deg=cols['argument_of_perihelion_degrees'][valid],
+            mean_anomaly_deg=cols['mean_anomaly_degrees'][valid],
+            epoch_jd_tt=epoch_jd[valid],
+        )
+        return engine, dropped
+
+    def __len__(self) -> int:
+        return len(self.a)
+
+    def subset(self, mask: np.ndarray) -> 'MPCORBPropagator':
+        """按布尔掩码或下标返回子集引擎（不重新计算派生数组）"""
+        engine = self.__class__.__new__(self.__class__)
+        engine.logger = self.logger
+        for name in COLUMNAR_ARRAYS:
+            setattr(engine, name, getattr(self, name)[mask])
+        return engine
+
+    def save_columnar(self, directory: str, source_path: str, h_limit: float,
+                      source_sha1: Optional[str] = None) -> str:
+        """
+        将引擎数组写为可内存映射的 .npy 版本子目录，再切换根目录下的指针文件
+
+        旧版本子目录可能仍被其它进程内存映射（Windows下无法删除或覆盖），
+        因此每次写入新的子目录，只原子替换指针文件；旧子目录在之后尽力清理
+
+        Args:
+            directory (str): 缓存根目录
+            source_path (str): 源MPCORB文件路径
+            h_limit (float): 构建时使用的H上限
+            source_sha1 (Optional[str]): 源文件SHA1（载入时可用于校验）
+
+        Returns:
+            str: 新写入的版本子目录
+        """
+        os.makedirs(directory, exist_ok=True)
+        version_name = f"v{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.getpid()}_{threading.get_ident()}"
+        version_dir = os.path.join(directory, version_name)
+        tmp_dir = version_dir + '.tmp'
+        os.makedirs(tmp_dir, exist_ok=True)
+        arrays = {}
+        for name in COLUMNAR_ARRAYS:
+            arr = getattr(self, name)
+            if name == 'designations':
+                arr = np.asarray(arr).astype(str)
+            arr = np.ascontiguousarray(arr)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+            arrays[name] = {'shape': list(arr.shape), 'dtype': arr.dtype.str}
+
+        st = os.stat(source_path)
+        manifest = {
+            'version': COLUMNAR_CACHE_VERSION,
+            'source_path': os.path.abspath(source_path),
+            'source_mtime': st.st_mtime,
+            'source_size': st.st_size,
+            'source_sha1': source_sha1,
+            'h_limit': float(h_limit),
+            'count': len(self),
+            'arrays': arrays,
+            'created': datetime.now().isoformat(),
+        }
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        # 新子目录尚未被任何进程使用，可以直接改名
+        os.replace(tmp_dir, version_dir)
+
+        pointer_path = os.path.join(directory, COLUMNAR_POINTER)
+        pointer_tmp = f"{pointer_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(pointer_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version_dir': version_name}, f)
+        os.replace(pointer_tmp, pointer_path)
+
+        _prune_columnar_versions(directory, keep=version_name)
+        return version_dir
+
+    @classmethod
+    def from_columnar(cls, directory: str, mmap_mode: Optional[str] = 'r') -> Tuple['MPCORBPropagator', Dict]:
+        """
+        从 .npy 缓存载入引擎（默认内存映射，多个进程可共享页缓存）
+
+        Args:
+            directory (str): 缓存根目录（按指针文件定位当前版本）或版本子目录
+            mmap_mode (Optional[str]): np.load 的 mmap_mode
+
+        Returns:
+            Tuple[MPCORBPropagator, Dict]: (引擎, manifest)
+        """
+        data_dir = active_columnar_dir(directory)
+        if data_dir is None:
+            raise FileNotFoundError(f"没有可用的MPCORB二进制缓存: {directory}")
+        with open(os.path.join(data_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        engine = cls.__new__(cls)
+        engine.logger = logging.getLogger(__name__)
+        expected = manifest.get('arrays') or {}
+        for name in COLUMNAR_ARRAYS:
+            arr = np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+            spec = expected.get(name)
+            if spec and (list(arr.shape) != list(spec['shape']) or arr.dtype.str != spec['dtype']):
+                raise ValueError(f"MPCORB二进制缓存数组与manifest不一致: {name}")
+            setattr(engine, name, arr)
+        return engine, manifest
+
+    def _orientation_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """计算每个天体轨道平面的P/Q单位向量（黄道J2000 -> ICRS）"""
+        i = np.deg2rad(self.inclination_deg)
+        om = np.deg2rad(self.node_deg)
+        w = np.deg2rad(self.peri_deg)
+        cos_w, sin_w = np.cos(w), np.sin(w)
+        cos_om, sin_om = np.cos(om), np.sin(om)
+        cos_i, sin_i = np.cos(i), np.sin(i)
+
+        P = np.empty((len(i), 3), dtype=np.float64)
+        Q = np.empty((len(i), 3), dtype=np.float64)
+        P[:, 0] = cos_w * cos_om - sin_w * cos_i * sin_om
+        P[:, 1] = cos_w * sin_om + sin_w * cos_i * cos_om
+        P[:, 2] = sin_w * sin_i
+        Q[:, 0] = -sin_w * cos_om - cos_w * cos_i * sin_om
+        Q[:, 1] = -sin_w * sin_om + cos_w * cos_i * cos_om
+        Q[:, 2] = cos_w * sin_i
+
+        # 黄道 -> 赤道：绕X轴旋转黄赤交角
+        cos_eps, sin_eps = np.cos(OBLIQUITY_J2000_RAD), np.sin(OBLIQUITY_J2000_RAD)
+        for V in (P, Q):
+            y = V[:, 1].copy()
+            z = V[:, 2].copy()
+            V[:, 1] = cos_eps * y - sin_eps * z
+            V[:, 2] = sin_eps * y + cos_eps * z
+        return P, Q
+
+    @staticmethod
+    def _solve_kepler(M: np.ndarray, e: np.ndarray, tol: float = 1e-12, max_iter: int = 30) -> np.ndarray:
+        """向量化牛顿迭代求解开普勒方程 E - e*sin(E) = M"""
+        E = np.where(e < 0.8, M, np.pi)
+        for _ in range(max_iter):
+            dE = (E - e * np.sin(E) - M) / (1.0 - e * np.cos(E))
+            E = E - dE
+            if np.max(np.abs(dE), initial=0.0) < tol:
+                break
+        return E
+
+    def heliocentric_positions(self, jd_tt, index: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        计算日心ICRS位置（AU）
+
+        Args:
+            jd_tt: TT儒略日，标量或与天体一一对应的数组（用于光行时改正）
+            index: 可选的天体下标子集
+
+        Returns:
+            np.ndarray: (N, 3) 日心位置
+        """
+        sl = slice(None) if index is None else index
+        e = self.e[sl]
+        dt = np.asarray(jd_tt, dtype=np.float64) - self.epoch_jd_tt[sl]
+        M = np.mod(self.mean_anomaly_rad[sl] + self.mean_motion[sl] * dt, 2.0 * np.pi)
+        E = self._solve_kepler(M, e)
+        a = self.a[sl]
+        x = a * (np.cos(E) - e)
+        y = a * self.b_over_a[sl] * np.sin(E)
+        return x[:, None] * self.P[sl] + y[:, None] * self.Q[sl]
+
+    def astrometric_unit_vectors(self, geometry: Dict[str, np.ndarray],
+                                 index: Optional[np.ndarray] = None,
+                                 light_time_iterations: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算测站视角的天体测量方向（含光行时改正，与Skyfield observe().radec()一致）
+
+        Args:
+            geometry: compute_observer_geometry 的返回值
+            index: 可选的天体下标子集
+            light_time_iterations (int): 光行时迭代次数
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: ((N, 3) 单位向量, (N,) 距离AU)
+        """
+        jd_tt = geometry['jd_tt']
+        observer = geometry['observer']
+        sun = geometry['sun']
+        sun_vel = geometry['sun_velocity']
+
+        rho = self.heliocentric_positions(jd_tt, index) + (sun - observer)
+        for _ in range(light_time_iterations):
+            light_time = np.linalg.norm(rho, axis=1) / C_AU_PER_DAY
+            sun_retarded = sun[None, :] - sun_vel[None, :] * light_time[:, None]
+            rho = self.heliocentric_positions(jd_tt - light_time, index) + (sun_retarded - observer[None, :])
+
+        dist = np.linalg.norm(rho, axis=1)
+        return rho / dist[:, None], dist
+
+    def radec(self, geometry: Dict[str, np.ndarray], index: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """计算全部（或子集）天体的RA/DEC（度）"""
+        u, _ = self.astrometric_unit_vectors(geometry, index)
+        ra = np.mod(np.rad2deg(np.arctan2(u[:, 1], u[:, 0])), 360.0)
+        dec = np.rad2deg(np.arcsin(np.clip(u[:, 2], -1.0, 1.0)))
+        return ra, dec
+
+    def cone_search(self, geometry: Dict[str, np.ndarray], ra: float, dec: float,
+                    search_radius: float) -> Dict[str, np.ndarray]:
+        """
+        单次向量化圆锥搜索
+
+        Args:
+            geometry: compute_observer_geometry 的返回值
+            ra (float): 目标RA（度）
+            dec (float): 目标DEC（度）
+            search_radius (float): 搜索半径（度）
+
+        Returns:
+            Dict[str, np.ndarray]: {'index', 'ra', 'dec', 'sep', 'min_index', 'min_sep'}（角距单位为度）
+        """
+        u, _ = self.astrometric_unit_vectors(geometry)
+        target = radec_to_unit_vector(ra, dec)
+        cos_sep = np.clip(u @ target, -1.0, 1.0)
+        sep = np.rad2deg(np.arccos(cos_sep))
+        hit = np.nonzero(sep <= float(search_radius))[0]
+
+        hit_u = u[hit]
+        hit_ra = np.mod(np.rad2deg(np.arctan2(hit_u[:, 1], hit_u[:, 0])), 360.0)
+        hit_dec = np.rad2deg(np.arcsin(np.clip(hit_u[:, 2], -1.0, 1.0)))
+
+        min_index = int(np.argmin(sep)) if len(sep) else -1
+        return {
+            'index': hit,
+            'ra': hit_ra,
+            'dec': hit_dec,
+            'sep': sep[hit],
+            'min_index': min_index,
+            'min_sep': float(sep[min_index]) if min_index >= 0 else None,
+        }
+
+    def results_table(self, hits: Dict[str, np.ndarray]):
+        """将圆锥搜索结果组装为与原离线查询一致的 Name/Number/Type/RA/DEC/Mv 表"""
+        return asteroid_results_table(self.designations, self.magnitude_h, hits)
+
+
+def asteroid_results_table(designations: np.ndarray, magnitude_h: np.ndarray, hits: Dict[str, np.ndarray]):
+    """
+    按列组装小行星圆锥搜索结果表（下标切片，不逐行构建）
+
+    Args:
+        designations (np.ndarray): 全目录编号数组
+        magnitude_h (np.ndarray): 全目录绝对星等数组（缺失为NaN）
+        hits: cone_search 的返回值
+
+    Returns:
+        astropy.table.Table: Name/Number/Type/RA/DEC/Mv 表，缺失星等为None
+    """
+    from astropy.table import Table
+
+    idx = hits['index']
+    n = len(idx)
+    if n == 0:
+        return Table(rows=[])
+    mv = np.asarray(magnitude_h[idx], dtype=np.float64)
+    missing = ~np.isfinite(mv)
+    if np.any(missing):
+        mv = mv.astype(object)
+        mv[missing] = None
+    return Table([
+        np.asarray(designations[idx]).astype(str),
+        np.full(n, None, dtype=object),
+        np.full(n, 'Asteroid'),
+        np.asarray(hits['ra'], dtype=np.float64),
+        np.asarray(hits['dec'], dtype=np.float64),
+        mv,
+    ], names=['Name', 'Number', 'Type', 'RA', 'DEC', 'Mv'])
+
+
+def columnar_cache_dir(source_path: str) -> str:
+    """源MPCORB文件对应的默认二进制缓存目录（与源文件同目录）"""
+    return os.path.join(os.path.dirname(os.path.abspath(source_path)),
+                        os.path.basename(source_path) + '_npy')
+
+
+def active_columnar_dir(directory: str) -> Optional[str]:
+    """
+    缓存根目录中当前生效的版本子目录
+
+    Args:
+        directory (str): 缓存根目录，或直接给出的版本子目录
+
+    Returns:
+        Optional[str]: 含 manifest.json 的目录；没有可用缓存时返回None
+    """
+    pointer_path = os.path.join(directory, COLUMNAR_POINTER)
+    if os.path.exists(pointer_path):
+        try:
+            with open(pointer_path, 'r', encoding='utf-8') as f:
+                version_dir = os.path.join(directory, json.load(f)['version_dir'])
+            if os.path.exists(os.path.join(version_dir, 'manifest.json')):
+                return version_dir
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"MPCORB二进制缓存指针无效 {pointer_path}: {e}")
+        return None
+    if os.path.exists(os.path.join(directory, 'manifest.json')):
+        return directory
+    return None
+
+
+def _prune_columnar_versions(directory: str, keep: str, stale_tmp_seconds: float = 86400.0):
+    """
+    尽力删除比当前版本更早的子目录（仍被内存映射的目录在Windows下删除失败，留待下次清理）；
+    其它进程可能正在写入的 .tmp 目录只有在长时间未修改时才删除
+    """
+    now = datetime.now().timestamp()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not (name.startswith('v') and os.path.isdir(path)) or name == keep:
+            continue
+        if name.endswith('.tmp'):
+            if now - os.path.getmtime(path) > stale_tmp_seconds:
+                shutil.rmtree(path, ignore_errors=True)
+        elif name < keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_columnar_cache(source_path: str, h_limit: float, directory: Optional[str] = None,
+                        source_sha1: Optional[str] = None) -> Optional[MPCORBPropagator]:
+    """
+    载入与源文件匹配的二进制缓存
+
+    源文件路径、mtime与大小一致，且缓存的H上限不低于所需上限时视为有效；
+    调用方已知源文件SHA1时还要求与manifest记录的一致。
+    所需上限更低时返回按H筛选的子集。
+
+    Args:
+        source_path (str): 源MPCORB文件路径
+        h_limit (float): 所需H上限
+        directory (Optional[str]): 缓存根目录，默认 columnar_cache_dir(source_path)
+        source_sha1 (Optional[str]): 源文件SHA1（可选，None时只校验mtime与大小）
+
+    Returns:
+        Optional[MPCORBPropagator]: 有效缓存返回引擎，否则返回None
+    """
+    data_dir = active_columnar_dir(directory or columnar_cache_dir(source_path))
+    if data_dir is None:
+        return None
+    try:
+        with open(os.path.join(data_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        st = os.stat(source_path)
+        if (manifest.get('version') != COLUMNAR_CACHE_VERSION
+                or os.path.normcase(manifest.get('source_path', '')) != os.path.normcase(os.path.abspath(source_path))
+                or manifest.get('source_mtime') != st.st_mtime
+                or manifest.get('source_size') != st.st_size
+                or float(manifest.get('h_limit', -1e9)) < float(h_limit)):
+            return None
+        if source_sha1 and manifest.get('source_sha1') and manifest['source_sha1'] != source_sha1:
+            logging.getLogger(__name__).warning("MPCORB二进制缓存的源文件SHA1不匹配，忽略缓存")
+            return None
+        engine, _ = MPCORBPropagator.from_columnar(data_dir)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"MPCORB二进制缓存载入失败: {e}")
+        return None
+
+    if float(manifest['h_limit']) > float(h_limit):
+        engine = engine.subset(np.asarray(engine.magnitude_h) <= float(h_limit))
+    return engine
+
+
+class MPCORBEpochSnapshot:
+    """单一曝光历元的全部小天体位置快照，附带天球空间索引，用于同一历元下的多次圆锥查询"""
+
+    def __init__(self, engine: MPCORBPropagator, geometry: Dict[str, np.ndarray]):
+        """
+        一次性传播全部天体并建立空间索引
+
+        Args:
+            engine: 传播引擎
+            geometry: compute_observer_geometry 的返回值
+        """
+        self.engine = engine
+        self.jd_tt = geometry['jd_tt']
+        self.unit_vectors, _ = engine.astrometric_unit_vectors(geometry)
+
+        # 单位向量上的KD树（弦长度量）；scipy不可用时退化为全量点积
+        self._tree = None
+        try:
+            from scipy.spatial import cKDTree
+            self._tree = cKDTree(self.unit_vectors)
+        except ImportError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self.unit_vectors)
+
+    def cone_search(self, ra: float, dec: float, search_radius: float) -> Dict[str, np.ndarray]:
+        """
+        在快照上执行圆锥搜索，返回格式与 MPCORBPropagator.cone_search 相同
+
+        Args:
+            ra (float): 目标RA（度）
+            dec (float): 目标DEC（度）
+            search_radius (float): 搜索半径（度）
+
+        Returns:
+            Dict[str, np.ndarray]: {'index', 'ra', 'dec', 'sep', 'min_index', 'min_sep'}
+        """
+        target = radec_to_unit_vector(ra, dec)
+        if self._tree is not None:
+            chord = 2.0 * np.sin(np.deg2rad(float(search_radius)) / 2.0)
+            candidates = np.asarray(sorted(self._tree.query_ball_point(target, chord)), dtype=np.int64)
+            if len(candidates) == 0 and len(self):
+                _, nearest = self._tree.query(target, k=1)
+                candidates = np.array([int(nearest)], dtype=np.int64)
+        else:
+            candidates = np.arange(len(self), dtype=np.int64)
+
+        u = self.unit_vectors[candidates]
+        sep = np.rad2deg(np.arccos(np.clip(u @ target, -1.0, 1.0)))
+        # 弦长查询与反余弦角距在圆锥边缘的舍入不同，统一以角距判定，保证各数组一一对应
+        in_cone = sep <= float(search_radius)
+        hit = candidates[in_cone]
+        hit_u = u[in_cone]
+        hit_sep = sep[in_cone]
+
+        if len(sep):
+            k_min = int(np.argmin(sep))
+            min_index, min_sep = int(candidates[k_min]), float(sep[k_min])
+        else:
+            min_index, min_sep = -1, None
+
+        return {
+            'index': hit,
+            'ra': np.mod(np.rad2deg(np.arctan2(hit_u[:, 1], hit_u[:, 0])), 360.0),
+            'dec': np.rad2deg(np.arcsin(np.clip(hit_u[:, 2], -1.0, 1.0))),
+            'sep': hit_sep,
+            'min_index': min_index,
+            'min_sep': min_sep,
+        }
+
+
+def cross_check_with_skyfield(engine: MPCORBPropagator, df, ts, eph, t,
+                              latitude: float, longitude: float,
+                              sample_size: int = 20, seed: int = 0) -> Optional[float]:
+    """
+    抽样对比向量化引擎与Skyfield逐个计算的位置
+
+    Args:
+        engine: 由 df 构建的传播引擎
+        df: 构建引擎所用的DataFrame
+        ts: Skyfield Timescale
+        eph: Skyfield星历
+        t: Skyfield Time
+        latitude (float): 测站纬度
+        longitude (float): 测站经度
+        sample_size (int): 抽样数量
+        seed (int): 随机种子
+
+    Returns:
+        Optional[float]: 抽样中的最大角距差（角秒），无法比较时返回None
+    """
+    from skyfield.api import wgs84
+    from skyfield.data import mpc
+    from skyfield.constants import GM_SUN_Pitjeva_2005_km3_s2 as GM_SUN
+
+    if len(engine) == 0 or 'designation' not in df.columns:
+        return None
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(engine), size=min(sample_size, len(engine)), replace=False)
+    geometry = compute_observer_geometry(eph, t, latitude, longitude)
+    ra_fast, dec_fast = engine.radec(geometry, sample)
+
+    by_designation = df.set_index(df['designation'].astype(str), drop=False)
+    observer = eph['earth'] + wgs84.latlon(latitude, longitude)
+    max_diff = None
+    for k, i in enumerate(sample):
+        try:
+            row = by_designation.loc[str(engine.designations[i])]
+            if getattr(row, 'ndim', 1) > 1:
+                row = row.iloc[0]
+            body = eph['sun'] + mpc.mpcorb_orbit(row, ts, GM_SUN)
+            ra_obj, dec_obj, _ = observer.at(t).observe(body).radec()
+            u_ref = radec_to_unit_vector(ra_obj.hours * 15.0, dec_obj.degrees)
+            u_fast = radec_to_unit_vector(ra_fast[k], dec_fast[k])
+            diff = np.rad2deg(np.arccos(np.clip(float(u_ref @ u_fast), -1.0, 1.0))) * 3600.0
+            max_diff = diff if max_diff is None else max(max_diff, diff)
+        except Exception:
+            continue
+    return max_diff
+
+
+def main():
+    """命令行：抽样对比向量化引擎与Skyfield结果"""
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='MPCORB向量化传播引擎与Skyfield对比')
+    parser.add_argument('mpcorb', help='MPCORB.DAT 路径')
+    parser.add_argument('ephemeris', help='de421.bsp 路径')
+    parser.add_argument('--utc', default='2025-11-03T19:15:23', help='UTC时间（ISO格式）')
+    parser.add_argument('--lat', type=float, default=43.4, help='测站纬度')
+    parser.add_argument('--lon', type=float, default=87.1, help='测站经度')
+    parser.add_argument('--h-limit', type=float, default=20.0, help='H星等上限')
+    parser.add_argument('--sample', type=int, default=50, help='抽样数量')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    from datetime import datetime
+    from skyfield.api import load, utc
+    from skyfield.data import mpc
+
+    with open(args.mpcorb, 'rb') as f:
+        df = mpc.load_mpcorb_dataframe(f)
+    df = df[df['magnitude_H'] <= args.h_limit]
+
+    ts = load.timescale()
+    eph = load(args.ephemeris)
+    t = ts.from_datetime(datetime.fromisoformat(args.utc).replace(tzinfo=utc))
+
+    start = time.time()
+    engine, dropped = MPCORBPropagator.from_dataframe(df)
+    build_time = time.time() - start
+
+    start = time.time()
+    geometry = compute_observer_geometry(eph, t, args.lat, args.lon)
+    engine.radec(geometry)
+    propagate_time = time.time() - start
+
+    max_diff = cross_check_with_skyfield(engine, df, ts, eph, t, args.lat, args.lon, args.sample)
+    print(f"天体数: {len(engine)} (丢弃 {dropped})")
+    print(f"构建耗时: {build_time:.3f}s, 全部传播耗时: {propagate_time:.3f}s")
+    print(f"抽样 {args.sample} 个与Skyfield最大差异: {max_diff} 角秒")
+
+
+if __name__ == "__main__":
+    main()
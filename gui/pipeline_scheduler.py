@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+下载 → ASTAP → Diff 流水线的自适应阶段调度器
+根据各阶段队列深度与单文件耗时估计积压工作量，在同一个并发总预算与内存预算内动态分配ASTAP/Diff并发数
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+STAGES = ('astap', 'diff')
+
+
+class StageScheduler:
+    """
+    阶段并发调度器
+
+    两阶段的并发名额之和等于 cpu_budget（每阶段至少1个）。每个阶段预先启动 max_workers 个工作线程，
+    线程在处理每个文件前调用 acquire 取得并发名额；后台线程周期性地按积压量（队列深度 x 平均耗时）
+    把名额从一个阶段移到另一个阶段，每次最多移动1个
+    """
+
+    def __init__(self, queue_depths: Dict[str, Callable[[], int]], cpu_budget: Optional[int] = None,
+                 memory_budget_mb: float = 0, diff_worker_memory_mb: float = 1200,
+                 shared_memory_mb: float = 0,
+                 interval: float = 2.0,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 on_update: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            queue_depths (Dict[str, Callable]): 阶段名 -> 返回该阶段等待队列长度的函数
+            cpu_budget (Optional[int]): ASTAP+Diff并发总数（通常为用户设置的线程数），默认CPU核数；至少为2
+            memory_budget_mb (float): 本进程及子进程RSS上限（MB），0表示按物理内存75%估算（无psutil时不限制）
+            diff_worker_memory_mb (float): 单个Diff任务的内存估计（MB），用于限制Diff并发
+            shared_memory_mb (float): 与Diff并发数无关的常驻内存（MB，如进程内共享的重投影缓存），先从预算中扣除
+            interval (float): 重新分配的周期（秒）
+            should_stop (Optional[Callable]): 返回True时 acquire 立即放弃等待
+            on_update (Optional[Callable]): 每次重新分配后以 snapshot() 结果调用
+        """
+        self.logger = logging.getLogger(__name__)
+        self.queue_depths = queue_depths
+        self.cpu_budget = max(2, int(cpu_budget or os.cpu_count() or 2))
+        if not memory_budget_mb and psutil is not None:
+            memory_budget_mb = psutil.virtual_memory().total / (1024.0 * 1024.0) * 0.75
+        self.memory_budget_mb = float(memory_budget_mb or 0)
+        self.diff_worker_memory_mb = max(1.0, float(diff_worker_memory_mb))
+        self.shared_memory_mb = max(0.0, float(shared_memory_mb or 0))
+        self.interval = interval
+        self.should_stop = should_stop or (lambda: False)
+        self.on_update = on_update
+
+        self._cond = threading.Condition()
+        # 初始按预算对半分配（Diff受内存限制时多出的名额归ASTAP）
+        self.limits = self._split(self.cpu_budget, {'astap': 1.0, 'diff': 1.0})
+        self.active = {stage: 0 for stage in STAGES}
+        self.latency = {stage: None for stage in STAGES}  # 单文件耗时的指数滑动平均（秒）
+        self.completed = {stage: 0 for stage in STAGES}
+        self.cpu_percent = None
+        self.rss_mb = None
+
+        self._monitor = None
+        self._stop_event = threading.Event()
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # 首次调用只建立基准
+
+    def max_workers(self, stage: str) -> int:
+        """阶段可能用到的最大并发数（即应预先启动的工作线程数）：预算减去另一阶段保留的1个"""
+        if stage == 'diff':
+            return max(1, min(self.cpu_budget - 1, self._diff_memory_cap()))
+        return self.cpu_budget - 1
+
+    def _diff_memory_cap(self) -> int:
+        if not self.memory_budget_mb:
+            return self.cpu_budget
+        available = self.memory_budget_mb - self.shared_memory_mb
+        return max(1, int(available // self.diff_worker_memory_mb))
+
+    def _split(self, budget: int, backlog: Dict[str, float], diff_cap: Optional[int] = None) -> Dict[str, int]:
+        """按积压量比例把 budget 个名额分给两个阶段，每阶段至少1个，Diff不超过内存上限"""
+        diff_cap = self._diff_memory_cap() if diff_cap is None else diff_cap
+        total_backlog = sum(backlog.values())
+        share = backlog['diff'] / total_backlog if total_backlog > 0 else 0.5
+        diff = max(1, min(int(round(budget * share)), budget - 1, diff_cap))
+        return {'astap': budget - diff, 'diff': diff}
+
+    def acquire(self, stage: str) -> bool:
+        """
+        等待并取得阶段并发名额
+
+        Returns:
+            bool: 取得名额返回True；should_stop 为True时返回False
+        """
+        with self._cond:
+            while self.active[stage] >= self.limits[stage]:
+                if self.should_stop():
+                    return False
+                self._cond.wait(timeout=0.5)
+            self.active[stage] += 1
+            return True
+
+    def release(self, stage: str, elapsed: Optional[float] = None):
+        """归还名额并记录本次处理耗时"""
+        with self._cond:
+            self.active[stage] = max(0, self.active[stage] - 1)
+            if elapsed is not None:
+                self.completed[stage] += 1
+                previous = self.latency[stage]
+                self.latency[stage] = elapsed if previous is None else 0.7 * previous + 0.3 * elapsed
+            self._cond.notify_all()
+
+    def start(self):
+        """启动后台重新分配线程"""
+        self._stop_event.clear()
+        self._monitor = threading.Thread(target=self._run, daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        """停止后台线程并唤醒所有等待中的工作线程"""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._monitor:
+            self._monitor.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.rebalance()
+                if self.on_update:
+                    self.on_update(self.snapshot())
+            except Exception as e:
+                self.logger.warning(f"流水线调度重新分配失败: {e}")
+
+    def _sample_resources(self):
+        """采样系统CPU占用与本进程（含子进程）RSS"""
+        if psutil is not None:
+            self.cpu_percent = psutil.cpu_percent(interval=None)
+            try:
+                proc = psutil.Process()
+                rss = proc.memory_info().rss
+                for child in proc.children(recursive=True):
+                    try:
+                        rss += child.memory_info().rss
+                    except (psutil.NoSuchProcess, psutil.AccessDenied):
+                        continue
+                self.rss_mb = rss / (1024.0 * 1024.0)
+            except Exception:
+                self.rss_mb = None
+        elif hasattr(os, 'getloadavg'):
+            self.cpu_percent = min(100.0, os.getloadavg()[0] / (os.cpu_count() or 1) * 100.0)
+
+    def rebalance(self):
+        """按积压量重新分配各阶段并发名额"""
+        self._sample_resources()
+        depths = {}
+        for stage in STAGES:
+            try:
+                depths[stage] = int(self.queue_depths[stage]())
+            except Exception:
+                depths[stage] = 0
+
+        with self._cond:
+            # 外部负载过高时收缩总预算，空闲时恢复
+            budget = self.cpu_budget
+            if self.cpu_percent is not None and self.cpu_percent > 95.0:
+                budget = max(2, sum(self.limits.values()) - 1)
+
+            diff_cap = self._diff_memory_cap()
+            if self.rss_mb is not None and self.memory_budget_mb and self.rss_mb > self.memory_budget_mb:
+                # 已超出内存预算：Diff并发至少降低1个
+                diff_cap = min(diff_cap, max(1, self.limits['diff'] - 1))
+
+            # 积压工作量 = (排队 + 正在处理) x 单文件耗时；没有耗时样本时按1秒计
+            backlog = {stage: (depths[stage] + self.active[stage]) * (self.latency[stage] or 1.0)
+                       for stage in STAGES}
+            if sum(backlog.values()) > 0:
+                targets = self._split(budget, backlog, diff_cap)
+            else:
+                targets = dict(self.limits)
+                targets['diff'] = min(targets['diff'], diff_cap)
+
+            # 每个周期最多移动1个名额：超出预算时从超出目标最多的阶段收回，
+            # 低于预算时补给缺口最大的阶段，否则从多余的阶段移给有积压的阶段
+            donor = max(STAGES, key=lambda s: self.limits[s] - targets[s])
+            receiver = max(STAGES, key=lambda s: targets[s] - self.limits[s])
+            total = sum(self.limits.values())
+            changed = False
+            if self.limits['diff'] > diff_cap:
+                self.limits['diff'] -= 1
+                changed = True
+            elif total > budget:
+                if self.limits[donor] > 1:
+                    self.limits[donor] -= 1
+                    changed = True
+            elif total < budget:
+                if self.limits[receiver] < min(targets[receiver], self.max_workers(receiver)):
+                    self.limits[receiver] += 1
+                    changed = True
+            elif donor != receiver and self.limits[donor] > max(1, targets[donor]) \
+                    and self.limits[receiver] < min(targets[receiver], self.max_workers(receiver)):
+                self.limits[donor] -= 1
+                self.limits[receiver] += 1
+                changed = True
+            if changed:
+                self.logger.debug(f"流水线调度: 并发 {self.limits}, 队列 {depths}, 延迟 {self.latency}")
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict:
+        """当前调度指标，供界面显示"""
+        with self._cond:
+            stages = {stage: {
+                'limit': self.limits[stage],
+                'active': self.active[stage],
+                'latency': self.latency[stage],
+                'completed': self.completed[stage],
+            } for stage in STAGES}
+        for stage in STAGES:
+            try:
+                stages[stage]['queue'] = int(self.queue_depths[stage]())
+            except Exception:
+                stages[stage]['queue'] = 0
+        return {'stages': stages, 'cpu_percent': self.cpu_percent, 'rss_mb': self.rss_mb,
+                'cpu_budget': self.cpu_budget, 'memory_budget_mb': self.memory_budget_mb,
+                'time': time.time()}
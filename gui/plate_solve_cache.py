@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+基于历史解的快速天体测量
+同一望远镜重复观测同一天区时指向几乎不变：ASTAP求解成功后按 (望远镜, 天区) 保存参考星表
+（星像的RA/DEC）与该帧WCS；新帧先检测星像，用上次的WCS预测参考星位置并做最近邻匹配，
+在进程内拟合新的WCS。匹配数与残差满足阈值时直接写入头部，否则交给ASTAP
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    import numpy as np
+    from astropy.io import fits
+    from astropy.wcs import WCS
+    from astropy.wcs.utils import fit_wcs_from_points
+    from astropy.coordinates import SkyCoord
+    import astropy.units as u
+    from scipy import ndimage
+    from scipy.spatial import cKDTree
+except ImportError:
+    np = None
+
+
+PLATE_SOLVE_CACHE_VERSION = 1
+
+# 写入头部的快速求解标记
+FAST_SOLVE_KEYWORD = 'KATSFAST'
+
+# 写入新WCS前需要清除的旧WCS关键字（避免CD与PC/CDELT混用，SIP阶数与系数 A_i_j/AP_i_j 等一并清除）
+_WCS_CLEAR_PATTERN = re.compile(r'^(?:CD\d_\d|PC\d_\d|CDELT\d|CROTA\d|(?:A|B|AP|BP)_(?:ORDER|DMAX|\d+_\d+))$')
+
+DEFAULT_FAST_SOLVE_SETTINGS = {
+    'enabled': False,           # 默认关闭，需在配置 plate_solve_fast_path.enabled 中显式开启
+    'max_stars': 300,           # 参考星表与新帧各取最亮的星数
+    'min_matches': 25,          # 接受拟合的最少匹配星数
+    'max_rms_px': 1.0,          # 接受拟合的最大均方根残差（像素）
+    'match_radius_px': 3.0,     # 精匹配半径（像素）
+    'max_offset_px': 200.0,     # 相对上次指向允许的最大平移（像素）
+    'detect_sigma': 5.0,        # 星像检测阈值（背景噪声倍数）
+    'cache_dir': None,          # None 表示 gui/plate_solve_cache
+}
+
+
+def default_plate_solve_cache_dir() -> str:
+    """默认缓存目录 gui/plate_solve_cache"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plate_solve_cache')
+
+
+def detect_stars(data, max_stars: int = 300, sigma: float = 5.0, min_area: int = 3, max_area: int = 400):
+    """
+    简单星像检测：背景中值与MAD噪声估计、阈值分割、连通域通量加权质心
+
+    Args:
+        data: 二维图像
+        max_stars (int): 按通量保留的最多星数
+        sigma (float): 检测阈值（背景噪声倍数）
+        min_area (int): 连通域最小像素数（排除热像素）
+        max_area (int): 连通域最大像素数（排除饱和大星与伪影）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (N x 2 的像素坐标 x/y（0起算），通量)，按通量降序
+    """
+    image = np.nan_to_num(np.asarray(data, dtype=np.float32))
+    # 在抽样像素上估计背景，避免对整幅大图排序
+    sample = image[::4, ::4]
+    background = float(np.median(sample))
+    noise = float(np.median(np.abs(sample - background))) * 1.4826
+    if noise <= 0:
+        noise = float(np.std(sample)) or 1.0
+
+    residual = image - background
+    labels, count = ndimage.label(residual > sigma * noise)
+    if count == 0:
+        return np.empty((0, 2)), np.empty(0)
+
+    index = np.arange(1, count + 1)
+    areas = ndimage.sum(np.ones_like(residual), labels, index)
+    fluxes = ndimage.sum(residual, labels, index)
+    keep = (areas >= min_area) & (areas <= max_area)
+    if not np.any(keep):
+        return np.empty((0, 2)), np.empty(0)
+
+    index, fluxes = index[keep], fluxes[keep]
+    order = np.argsort(fluxes)[::-1][:max_stars]
+    index, fluxes = index[order], fluxes[order]
+    centers = np.array(ndimage.center_of_mass(np.clip(residual, 0, None), labels, index), dtype=np.float64)
+    # center_of_mass 返回 (y, x)
+    return centers[:, ::-1].copy(), fluxes
+
+
+def estimate_offset(predicted, detected, max_offset: float, bin_size: float) -> Optional[Tuple[float, float]]:
+    """
+    用所有星对位移的二维直方图众数估计整体平移（对亮星顺序变化与缺失星不敏感）
+
+    Args:
+        predicted: 参考星的预测像素坐标 (N x 2)
+        detected: 新帧检测到的像素坐标 (M x 2)
+        max_offset (float): 搜索范围（像素）
+        bin_size (float): 直方图格宽（像素）
+
+    Returns:
+        Optional[Tuple[float, float]]: (dx, dy)；峰值不明显时返回None
+    """
+    diff = (detected[None, :, :] - predicted[:, None, :]).reshape(-1, 2)
+    diff = diff[(np.abs(diff[:, 0]) <= max_offset) & (np.abs(diff[:, 1]) <= max_offset)]
+    if len(diff) == 0:
+        return None
+    bins = max(1, int(np.ceil(2 * max_offset / bin_size)))
+    hist, xedges, yedges = np.histogram2d(diff[:, 0], diff[:, 1], bins=bins,
+                                          range=[[-max_offset, max_offset], [-max_offset, max_offset]])
+    peak = np.unravel_index(np.argmax(hist), hist.shape)
+    if hist[peak] < 3:
+        return None
+    # 在峰值格附近取中位数细化
+    cx = 0.5 * (xedges[peak[0]] + xedges[peak[0] + 1])
+    cy = 0.5 * (yedges[peak[1]] + yedges[peak[1] + 1])
+    near = diff[(np.abs(diff[:, 0] - cx) <= bin_size) & (np.abs(diff[:, 1] - cy) <= bin_size)]
+    return float(np.median(near[:, 0])), float(np.median(near[:, 1]))
+
+
+class PlateSolveReferenceStore:
+    """按 (望远镜, 天区) 保存参考星表与WCS头部（npz + json）"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir or default_plate_solve_cache_dir()
+        self._lock = threading.Lock()
+        self._memory: Dict[Tuple[str, str], Dict] = {}
+
+    def _paths(self, telescope: str, k_full: str) -> Tuple[str, str]:
+        stem = f"{telescope or 'UNKNOWN'}_{k_full}"
+        return (os.path.join(self.cache_dir, f"{stem}.npz"),
+                os.path.join(self.cache_dir, f"{stem}.json"))
+
+    def load(self, telescope: str, k_full: str) -> Optional[Dict]:
+        """读取参考：{'ra', 'dec', 'header', 'source'}，不存在时返回None"""
+        key = (telescope, k_full)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        npz_path, json_path = self._paths(telescope, k_full)
+        if not (os.path.exists(npz_path) and os.path.exists(json_path)):
+            return None
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != PLATE_SOLVE_CACHE_VERSION:
+                return None
+            with np.load(npz_path) as arrays:
+                reference = {'ra': arrays['ra'], 'dec': arrays['dec'],
+                             'header': meta['header'], 'source': meta.get('source')}
+        except Exception as e:
+            self.logger.warning(f"读取参考星表失败 {telescope} {k_full}: {e}")
+            return None
+        with self._lock:
+            self._memory[key] = reference
+        return reference
+
+    def store(self, telescope: str, k_full: str, ra, dec, header: Dict, source: str):
+        """保存参考（先写临时文件再替换，并发读取不会看到半写入的文件）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        npz_path, json_path = self._paths(telescope, k_full)
+        tmp_npz = f"{npz_path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        tmp_json = f"{json_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        np.savez(tmp_npz, ra=np.asarray(ra, dtype=np.float64), dec=np.asarray(dec, dtype=np.float64))
+        with open(tmp_json, 'w', encoding='utf-8') as f:
+            json.dump({'version': PLATE_SOLVE_CACHE_VERSION, 'header': header, 'source': source},
+                      f, ensure_ascii=False)
+        os.replace(tmp_npz, npz_path)
+        os.replace(tmp_json, json_path)
+        with self._lock:
+            self._memory[(telescope, k_full)] = {'ra': np.asarray(ra), 'dec': np.asarray(dec),
+                                                 'header': header, 'source': source}
+
+
+class FastPlateSolver:
+    """以上次ASTAP解为先验的进程内WCS拟合"""
+
+    def __init__(self, settings: Optional[Dict] = None):
+        """
+        Args:
+            settings (Optional[Dict]): 覆盖 DEFAULT_FAST_SOLVE_SETTINGS 的参数
+        """
+        self.logger = logging.getLogger(__name__)
+        self.settings = dict(DEFAULT_FAST_SOLVE_SETTINGS)
+        self.settings.update(settings or {})
+        self.store = PlateSolveReferenceStore(self.settings.get('cache_dir'))
+
+    @property
+    def available(self) -> bool:
+        return np is not None and bool(self.settings.get('enabled', True))
+
+    @staticmethod
+    def _wcs_header_dict(wcs) -> Dict:
+        return {key: value for key, value in wcs.to_header(relax=True).items() if key not in ('COMMENT', 'HISTORY')}
+
+    def update_reference(self, fits_path: str, telescope: str, k_full: str) -> bool:
+        """
+        从ASTAP求解后的文件更新参考星表（只使用ASTAP解，快速解不回写参考，避免误差累积）
+
+        Returns:
+            bool: 是否更新成功
+        """
+        if not self.available:
+            return False
+        try:
+            with fits.open(fits_path, memmap=False) as hdul:
+                header = hdul[0].header
+                data = hdul[0].data
+            wcs = WCS(header, naxis=2)
+            if not wcs.has_celestial or data is None:
+                return False
+            xy, _ = detect_stars(data, self.settings['max_stars'], self.settings['detect_sigma'])
+            if len(xy) < self.settings['min_matches']:
+                self.logger.debug(f"参考帧星数不足 ({len(xy)})，不更新参考: {fits_path}")
+                return False
+            ra, dec = wcs.all_pix2world(xy[:, 0], xy[:, 1], 0)
+            self.store.store(telescope, k_full, ra, dec, self._wcs_header_dict(wcs),
+                             os.path.basename(fits_path))
+            self.logger.info(f"已更新快速求解参考 {telescope} {k_full}: {len(xy)} 颗星")
+            return True
+        except Exception as e:
+            self.logger.warning(f"更新快速求解参考失败 {fits_path}: {e}")
+            return False
+
+    def _match(self, predicted, detected, radius: float):
+        """最近邻互匹配，返回 (参考索引, 检测索引)"""
+        tree = cKDTree(detected)
+        dist, idx = tree.query(predicted, distance_upper_bound=radius)
+        ok = np.isfinite(dist)
+        ref_idx, det_idx = np.nonzero(ok)[0], idx[ok]
+        # 一颗检测星只保留距离最近的参考星
+        order = np.argsort(dist[ok])
+        _, first = np.unique(det_idx[order], return_index=True)
+        keep = order[first]
+        return ref_idx[keep], det_idx[keep]
+
+    def solve(self, fits_path: str, telescope: str, k_full: str) -> Optional[Dict]:
+        """
+        尝试快速求解并把WCS写入FITS头
+
+        Args:
+            fits_path (str): FITS文件路径
+            telescope (str): 望远镜名
+            k_full (str): 天区编号
+
+        Returns:
+            Optional[Dict]: 成功时返回 {'matches', 'rms_px'}；没有参考或不满足阈值时返回None（应回退到ASTAP）
+        """
+        if not self.available:
+            return None
+        reference = self.store.load(telescope, k_full)
+        if reference is None:
+            return None
+
+        s = self.settings
+        try:
+            prior = WCS(fits.Header(list(reference['header'].items())), naxis=2)
+            data = fits.getdata(fits_path, memmap=False)
+            detected, _ = detect_stars(data, s['max_stars'], s['detect_sigma'])
+            if len(detected) < s['min_matches']:
+                self.logger.debug(f"快速求解: 检测星数不足 ({len(detected)}) {fits_path}")
+                return None
+
+            ref_sky = SkyCoord(reference['ra'] * u.deg, reference['dec'] * u.deg)
+            px, py = prior.all_world2pix(reference['ra'], reference['dec'], 0)
+            predicted = np.column_stack([px, py])
+            inside = np.isfinite(predicted).all(axis=1)
+            predicted, ref_sky = predicted[inside], ref_sky[inside]
+
+            # 1. 粗对齐：整体平移
+            offset = estimate_offset(predicted[:100], detected[:100], s['max_offset_px'],
+                                     2 * s['match_radius_px'])
+            if offset is None:
+                self.logger.debug(f"快速求解: 未找到一致的平移 {fits_path}")
+                return None
+
+            # 2. 匹配并拟合，用拟合结果重新匹配一次
+            wcs = None
+            shifted = predicted + np.array(offset)
+            radius = 2 * s['match_radius_px']
+            for _ in range(2):
+                ref_idx, det_idx = self._match(shifted, detected, radius)
+                if len(ref_idx) < s['min_matches']:
+                    self.logger.debug(f"快速求解: 匹配星数不足 ({len(ref_idx)}) {fits_path}")
+                    return None
+                wcs = fit_wcs_from_points((detected[det_idx, 0], detected[det_idx, 1]), ref_sky[ref_idx],
+                                          proj_point='center', projection=prior.wcs.ctype[0][5:8])
+                px, py = wcs.world_to_pixel(ref_sky)
+                shifted = np.column_stack([px, py])
+                radius = s['match_radius_px']
+
+            ref_idx, det_idx = self._match(shifted, detected, radius)
+            residual = shifted[ref_idx] - detected[det_idx]
+            rms = float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1)))) if len(ref_idx) else float('inf')
+            if len(ref_idx) < s['min_matches'] or rms > s['max_rms_px']:
+                self.logger.info(f"快速求解未达阈值 (匹配 {len(ref_idx)}, RMS {rms:.2f}px)，回退到ASTAP: "
+                                 f"{os.path.basename(fits_path)}")
+                return None
+
+            self._write_wcs(fits_path, wcs, len(ref_idx), rms, reference.get('source'))
+            self.logger.info(f"快速求解成功: {os.path.basename(fits_path)} 匹配 {len(ref_idx)} 颗, RMS {rms:.2f}px")
+            return {'matches': int(len(ref_idx)), 'rms_px': rms}
+        except Exception as e:
+            self.logger.warning(f"快速求解出错，回退到ASTAP {fits_path}: {e}")
+            return None
+
+    def _write_wcs(self, fits_path: str, wcs, matches: int, rms: float, source: Optional[str]):
+        with fits.open(fits_path, mode='update', memmap=False) as hdul:
+            header = hdul[0].header
+            for key in {key for key in header.keys() if _WCS_CLEAR_PATTERN.match(key)}:
+                header.remove(key, ignore_missing=True, remove_all=True)
+            header.update(wcs.to_header())
+            header[FAST_SOLVE_KEYWORD] = (True, 'WCS fitted from cached reference stars')
+            header['KFMATCH'] = (int(matches), 'fast solve matched stars')
+            header['KFRMS'] = (round(rms, 4), '[pix] fast solve RMS residual')
+            if source:
+                header['KFREF'] = (str(source)[:68], 'fast solve reference frame')
+            hdul.flush()
+
+
+_shared_solvers: Dict[str, FastPlateSolver] = {}
+_shared_lock = threading.Lock()
+
+
+def get_fast_plate_solver(settings: Optional[Dict] = None) -> FastPlateSolver:
+    """按缓存目录共享的快速求解器（参考星表在进程内只读取一次）"""
+    settings = settings or {}
+    key = settings.get('cache_dir') or default_plate_solve_cache_dir()
+    with _shared_lock:
+        solver = _shared_solvers.get(key)
+        if solver is None:
+            solver = FastPlateSolver(settings)
+            _shared_solvers[key] = solver
+        else:
+            solver.settings.update(settings)
+        return solver
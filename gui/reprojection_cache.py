@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+WCS重投影坐标网格缓存
+同一天区的所有科学帧都对齐到同一模板：模板网格的 像素->天球 坐标只需计算一次；
+科学帧WCS相同时（同一帧重复Diff、不同降噪方式等），稀疏控制点的 天球->像素 结果也可直接复用。
+缓存以WCS头部哈希为键，按字节数做LRU淘汰；天球网格以相对参考点的float32偏移保存
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 默认缓存上限（批量处理设置 reprojection_cache_mb 可调整）；Diff进程池中每个子进程各占一份。
+# 标准模式下一个9k x 6k模板的天球网格约430MB，超过上限时不缓存，由调用方按图块计算
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def wcs_hash(wcs) -> str:
+    """WCS（含SIP等畸变参数）的稳定哈希"""
+    text = wcs.to_header_string(relax=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]
+
+
+def grid_axes(shape: tuple, step: int) -> Tuple['np.ndarray', 'np.ndarray']:
+    """步长为step的采样网格坐标轴 (y轴, x轴)；step=1 时为完整网格"""
+    return np.arange(0, shape[0], step), np.arange(0, shape[1], step)
+
+
+class SkyGrid:
+    """
+    模板采样网格的天球坐标
+
+    以参考点（网格中心）加float32偏移保存：一帧的偏移只有几度，float32的舍入误差小于0.01角秒，
+    内存为float64整幅网格的一半
+    """
+
+    def __init__(self, ra0: float, dec0: float, dra: 'np.ndarray', ddec: 'np.ndarray'):
+        self.ra0 = float(ra0)
+        self.dec0 = float(dec0)
+        self.dra = dra
+        self.ddec = ddec
+
+    @property
+    def shape(self) -> tuple:
+        return self.dra.shape
+
+    @property
+    def arrays(self) -> tuple:
+        return self.dra, self.ddec
+
+    def radec(self, rows=slice(None), cols=slice(None)) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        取子网格的天球坐标
+
+        Args:
+            rows / cols: 网格切片（默认整幅）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: float64 的 (ra, dec)
+        """
+        return (self.ra0 + self.dra[rows, cols].astype(np.float64),
+                self.dec0 + self.ddec[rows, cols].astype(np.float64))
+
+    @classmethod
+    def from_radec(cls, ra: 'np.ndarray', dec: 'np.ndarray') -> 'SkyGrid':
+        """由float64天球坐标构建（RA偏移按 ±180° 折叠，跨0h的网格同样适用）"""
+        ra0 = float(ra[ra.shape[0] // 2, ra.shape[1] // 2])
+        dec0 = float(dec[dec.shape[0] // 2, dec.shape[1] // 2])
+        dra = (ra - ra0 + 180.0) % 360.0 - 180.0
+        return cls(ra0, dec0, dra.astype(np.float32), (dec - dec0).astype(np.float32))
+
+
+class ReprojectionMapCache:
+    """线程安全的坐标网格LRU缓存"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): 缓存数组总字节数上限；单个条目超过上限时不缓存
+        """
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()  # key -> (数组元组, 返回值)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: tuple, arrays: tuple, value=None):
+        size = sum(a.nbytes for a in arrays)
+        if not self.can_cache(size):
+            return
+        for a in arrays:
+            a.setflags(write=False)  # 缓存数组被多个线程共享，禁止原地修改
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= sum(a.nbytes for a in old[0])
+            self._evict_to(self.max_bytes - size)
+            self._entries[key] = (arrays, arrays if value is None else value)
+            self._bytes += size
+
+    def _evict_to(self, limit: int):
+        """按LRU淘汰到总字节数不超过limit（调用方持有锁）"""
+        while self._entries and self._bytes > limit:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= sum(a.nbytes for a in evicted)
+
+    def resize(self, max_bytes: int):
+        """调整字节数上限，缩小时立即淘汰超出的条目"""
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            self._evict_to(self.max_bytes)
+
+    def sky_grid_nbytes(self, shape: tuple, step: int = 1) -> int:
+        """template_sky_grid 条目的字节数（float32 RA/DEC偏移各一份）"""
+        y_axis, x_axis = grid_axes(shape, step)
+        return len(y_axis) * len(x_axis) * 2 * np.dtype(np.float32).itemsize
+
+    def can_cache(self, nbytes: int) -> bool:
+        """单个条目是否能放入缓存"""
+        return nbytes <= self.max_bytes
+
+    def template_sky_grid(self, template_wcs, shape: tuple, step: int = 1,
+                          template_key: str = None) -> SkyGrid:
+        """
+        模板采样网格的天球坐标
+
+        Args:
+            template_wcs: 模板WCS
+            shape (tuple): 模板图像形状 (height, width)
+            step (int): 采样步长，1表示完整网格
+            template_key (str): 预先计算的 wcs_hash(template_wcs)
+
+        Returns:
+            SkyGrid: 形状与采样网格相同的天球坐标（只读）
+        """
+        key = ('sky', template_key or wcs_hash(template_wcs), tuple(shape), int(step))
+        grid = self._get(key)
+        if grid is not None:
+            return grid
+
+        y_axis, x_axis = grid_axes(shape, step)
+        yy, xx = np.meshgrid(y_axis, x_axis, indexing='ij')
+        ra, dec = template_wcs.all_pix2world(xx.ravel().astype(np.float32), yy.ravel().astype(np.float32), 0)
+        grid = SkyGrid.from_radec(ra.reshape(yy.shape), dec.reshape(yy.shape))
+        self._put(key, grid.arrays, value=grid)
+        self.logger.debug(f"模板天球网格已缓存: 步长={step}, 点数={yy.size:,}")
+        return grid
+
+    def control_points(self, template_wcs, download_wcs, shape: tuple,
+                       step: int) -> Tuple['np.ndarray', 'np.ndarray']:
+        """
+        稀疏控制点在下载图像中的像素坐标（模板网格 -> 天球 -> 下载图像）
+
+        Args:
+            template_wcs: 模板WCS
+            download_wcs: 下载图像WCS
+            shape (tuple): 模板图像形状
+            step (int): 采样步长
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (x, y)，形状为稀疏网格形状（只读）
+        """
+        template_key = wcs_hash(template_wcs)
+        key = ('ctrl', template_key, wcs_hash(download_wcs), tuple(shape), int(step))
+        entry = self._get(key)
+        if entry is not None:
+            return entry
+
+        ra, dec = self.template_sky_grid(template_wcs, shape, step, template_key=template_key).radec()
+        x, y = download_wcs.all_world2pix(ra.ravel(), dec.ravel(), 0)
+        entry = (x.reshape(ra.shape), y.reshape(ra.shape))
+        self._put(key, entry)
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def configure_reprojection_cache(max_bytes: int) -> ReprojectionMapCache:
+    """
+    设置进程内共享缓存的字节数上限（缩小时立即淘汰超出的条目）
+
+    Args:
+        max_bytes (int): 缓存数组总字节数上限
+    """
+    cache = get_reprojection_cache()
+    cache.resize(max_bytes)
+    return cache
+
+
+def get_reprojection_cache() -> ReprojectionMapCache:
+    """进程内共享的坐标网格缓存（Diff进程池中每个子进程各有一份）"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ReprojectionMapCache()
+        return _shared_cache
@@ -11,6 +11,10 @@
     - 使用 FitsDownloader 下载 FITS 文件，并按 GUI 中的目录结构组织
     - 使用 DiffOrbIntegration 直接调用 diff_orb 核心算法执行对齐 + diff
 
+服务模式（--serve）：
+    常驻进程，通过本地HTTP接口接收任务（日期/系统/天区），复用已导入的模块、DiffOrbIntegration、
+    模板查找与目录列表缓存，避免每个天区都重新启动解释器和加载依赖，接口见 gui/console_service.py
+
 注意：
 - 本脚本不导入任何 Tk / GUI 组件，可在无 DISPLAY 的服务器上运行（虽然脚本放在 gui 目录下）。
 - 依赖项目已有的 diff_orb、simple_noise、astap_processor 等模块。
@@ -20,8 +24,9 @@ import os
 import sys
 import argparse
 import logging
+import threading
 from datetime import datetime
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 # run_console.py 现在位于 gui 目录下，这里需要回到仓库根目录
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -35,6 +40,7 @@ for d in (PROJECT_ROOT, GUI_DIR, DIFF_ORB_DIR, CONFIG_DIR):
 
 from gui.config_manager import ConfigManager  # type: ignore
 from gui.web_scanner import WebFitsScanner, DirectoryScanner  # type: ignore
+from gui.listing_cache import get_listing_cache  # type: ignore
 from gui.diff_orb_integration import DiffOrbIntegration  # type: ignore
 from data_collect.data_02_download import FitsDownloader  # type: ignore
 
@@ -50,11 +56,14 @@ def parse_arguments() -> argparse.Namespace:
             "  # 单系统全天 diff\n"
             "  python gui/run_console.py --date 20241031 --telescope GY1\n\n"
             "  # 单天区扫描 + 下载 + diff\n"
-            "  python gui/run_console.py --date 20241031 --telescope GY1 --region K019\n"
+            "  python gui/run_console.py --date 20241031 --telescope GY1 --region K019\n\n"
+            "  # 服务模式：常驻并通过本地HTTP接口接收任务\n"
+            "  python gui/run_console.py --serve --port 8765\n"
+            "  curl -X POST http://127.0.0.1:8765/jobs -H 'Content-Type: application/json' -d '{\"date\": \"20241031\", \"telescope\": \"GY1\"}'\n"
         ),
     )
 
-    parser.add_argument("--date", type=str, required=True, help="日期，格式为YYYYMMDD")
+    parser.add_argument("--date", type=str, help="日期，格式为YYYYMMDD（非服务模式必填）")
     parser.add_argument("--telescope", type=str, help="望远镜系统名，例如 GY1")
     parser.add_argument("--region", type=str, help="天区名，例如 K019")
 
@@ -69,7 +78,15 @@ def parse_arguments() -> argparse.Namespace:
 
     parser.add_argument("--no-astap", action="store_true", help="跳过 ASTAP 处理，仅下载 + diff")
 
-    return parser.parse_args()
+    parser.add_argument("--serve", action="store_true", help="以常驻服务模式运行，通过本地HTTP接口接收任务")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="服务监听地址（默认127.0.0.1，仅本机）")
+    parser.add_argument("--port", type=int, default=8765, help="服务监听端口（默认8765）")
+    parser.add_argument("--service-workers", type=int, default=1, help="服务模式同时执行的任务数（默认1）")
+
+    args = parser.parse_args()
+    if not args.serve and not args.date:
+        parser.error("非服务模式需要 --date")
+    return args
 
 
 def setup_logging():
@@ -97,15 +114,28 @@ def build_base_paths(cfg: ConfigManager, args: argparse.Namespace) -> Tuple[str,
     return download_root, template_dir, diff_root
 
 
-def validate_args(cfg: ConfigManager, args: argparse.Namespace) -> None:
-    if not cfg.validate_date(args.date):
-        raise SystemExit(f"无效日期格式: {args.date}，期望 YYYYMMDD")
+def validate_job(cfg: ConfigManager, date: Optional[str], telescope: Optional[str], region: Optional[str]) -> None:
+    """校验任务参数，不合法时抛出 ValueError。"""
+    if not date or not cfg.validate_date(date):
+        raise ValueError(f"无效日期格式: {date}，期望 YYYYMMDD")
 
-    if args.telescope and not cfg.validate_telescope_name(args.telescope):
-        raise SystemExit(f"未知的望远镜系统: {args.telescope}")
+    if telescope and not cfg.validate_telescope_name(telescope):
+        raise ValueError(f"未知的望远镜系统: {telescope}")
 
-    if args.region and not cfg.validate_k_number(args.region.upper()):
-        raise SystemExit(f"未知的天区名称: {args.region}")
+    if region and not telescope:
+        raise ValueError("指定天区时需要同时指定望远镜系统")
+
+    if region and not cfg.validate_k_number(region.upper()):
+        raise ValueError(f"未知的天区名称: {region}")
+
+
+def validate_args(cfg: ConfigManager, args: argparse.Namespace) -> None:
+    if args.serve:
+        return
+    try:
+        validate_job(cfg, args.date, args.telescope, args.region if args.telescope else None)
+    except ValueError as e:
+        raise SystemExit(str(e))
 
 
 def build_region_url(cfg: ConfigManager, tel_name: str, date: str, k_number: str) -> str:
@@ -144,9 +174,7 @@ def scan_regions_for_telescope(cfg: ConfigManager, tel_name: str, date: str) ->
     urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
     try:
-        resp = session.get(base_url, timeout=10)
-        resp.raise_for_status()
-        content = resp.text
+        content = get_listing_cache().fetch(session, base_url, 10)
     except Exception as e:
         logging.error("扫描天区时网络请求失败: %s", e)
         return []
@@ -195,6 +223,24 @@ def scan_files_for_region(region_url: str) -> List[Tuple[str, str]]:
     return files
 
 
+def find_template_cached(diff_integration: DiffOrbIntegration, download_file: str, template_dir: str,
+                         template_cache: Optional[Dict] = None) -> Optional[str]:
+    """按 (模板目录, 系统, 天区索引) 缓存模板查找结果（服务模式下跨任务复用，只缓存找到的结果）。"""
+    if template_cache is None:
+        return diff_integration.find_template_file(download_file, template_dir)
+
+    parsed = diff_integration.filename_parser.parse_filename(download_file) or {}
+    key = (template_dir, parsed.get("tel_name"), parsed.get("k_full", parsed.get("k_number")))
+    cached = template_cache.get(key)
+    if cached and os.path.exists(cached):
+        return cached
+
+    template_file = diff_integration.find_template_file(download_file, template_dir)
+    if template_file and key[1]:
+        template_cache[key] = template_file
+    return template_file
+
+
 def run_pipeline_for_files(
     tel_name: str,
     date: str,
@@ -206,10 +252,13 @@ def run_pipeline_for_files(
     args: argparse.Namespace,
     diff_integration: DiffOrbIntegration,
     cfg: ConfigManager,
-) -> None:
+    template_cache: Optional[Dict] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> int:
+    """下载并 diff 一个天区的文件，返回成功 diff 的文件数。"""
     if not files:
         logging.info("[%s %s %s] 无可处理文件，跳过", tel_name, date, region)
-        return
+        return 0
 
     # 下载目录：与 GUI 一致：download_root/tel_name/date/region
     download_dir = ensure_directory(os.path.join(download_root, tel_name, date, region))
@@ -224,10 +273,17 @@ def run_pipeline_for_files(
 
     urls = [url for _name, url in files]
     logging.info("[%s %s %s] 开始下载 %d 个文件到 %s", tel_name, date, region, len(urls), download_dir)
-    downloader.download_files(urls, download_dir)
+    downloader.download_files(urls, download_dir, should_stop=should_stop)
+    if should_stop and should_stop():
+        logging.info("[%s %s %s] 任务已取消，跳过 diff", tel_name, date, region)
+        return 0
 
     # 下载完成后，对下载目录中的所有 FITS 做 diff
+    diff_success = 0
     for entry in os.scandir(download_dir):
+        if should_stop and should_stop():
+            logging.info("[%s %s %s] 任务已取消，停止 diff", tel_name, date, region)
+            break
         if not entry.is_file():
             continue
         if not entry.name.lower().endswith((".fits", ".fit", ".fts")):
@@ -237,7 +293,7 @@ def run_pipeline_for_files(
         filename = entry.name
         logging.info("[Diff] 开始处理: %s", filename)
 
-        template_file = diff_integration.find_template_file(download_file, template_dir)
+        template_file = find_template_cached(diff_integration, download_file, template_dir, template_cache)
         if not template_file:
             logging.info("[Diff] 未找到模板，跳过: %s", filename)
             continue
@@ -268,6 +324,7 @@ def run_pipeline_for_files(
 
         alignment_method = {
             "orb": "rigid",
+            "asterism": "asterism",
             "ecc": "wcs",
             "astropy_reproject": "astropy_reproject",
             "swarp": "swarp",
@@ -282,6 +339,8 @@ def run_pipeline_for_files(
         generate_gif = bool(batch_cfg.get("generate_gif", False))
         diff_calc_mode = str(batch_cfg.get("diff_calc_mode", "abs"))
         apply_diff_postprocess = bool(batch_cfg.get("apply_diff_postprocess", False))
+        in_memory = bool(batch_cfg.get("in_memory_pipeline", False))
+        feature_cache_dir = DiffOrbIntegration.feature_cache_dir_for(template_file, batch_cfg)
 
         result = diff_integration.process_diff(
             download_file,
@@ -300,59 +359,51 @@ def run_pipeline_for_files(
             generate_gif=generate_gif,
             diff_calc_mode=diff_calc_mode,
             apply_diff_postprocess=apply_diff_postprocess,
+            in_memory=in_memory,
+            feature_cache_dir=feature_cache_dir,
         )
 
         if result and result.get("success"):
+            diff_success += 1
             logging.info("[Diff] 成功: %s - 新亮点 %s 个", filename, result.get("new_bright_spots", 0))
         else:
             logging.warning("[Diff] 失败: %s", filename)
 
+    return diff_success
 
-def main():
-    setup_logging()
-    args = parse_arguments()
-
-    cfg = ConfigManager()
-    validate_args(cfg, args)
-
-    download_root, template_dir, diff_root = build_base_paths(cfg, args)
-    logging.info("下载根目录: %s", download_root)
-    logging.info("模板目录: %s", template_dir)
-    logging.info("diff 输出根目录: %s", diff_root)
-
-    # 保存当前选择到 GUI 配置，便于 GUI 和 CLI 共用
-    cfg.update_last_selected(
-        telescope_name=args.telescope or cfg.get_last_selected().get("telescope_name"),
-        date=args.date,
-        k_number=args.region or cfg.get_last_selected().get("k_number"),
-        download_directory=download_root,
-        template_directory=template_dir,
-        diff_output_directory=diff_root,
-    )
-
-    diff_integration = DiffOrbIntegration(gui_callback=None)
-    if not diff_integration.is_available():
-        logging.error("diff_orb 模块不可用，请检查 diff_orb 依赖是否安装正确")
-        raise SystemExit(1)
 
+def process_job(
+    cfg: ConfigManager,
+    args: argparse.Namespace,
+    diff_integration: DiffOrbIntegration,
+    date: str,
+    telescope: Optional[str],
+    region: Optional[str],
+    download_root: str,
+    template_dir: str,
+    diff_root: str,
+    template_cache: Optional[Dict] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict:
+    """执行一个任务（单天区 / 单系统全天 / 全天全系统），返回汇总。"""
     # 决定处理模式
-    if args.region and args.telescope:
+    if region and telescope:
         # 单天区
-        regions = [args.region.upper()]
-        telescopes = [args.telescope]
-    elif args.telescope:
+        regions = [region.upper()]
+        telescopes = [telescope]
+    elif telescope:
         # 单系统全天
-        telescopes = [args.telescope]
+        telescopes = [telescope]
         regions = None  # 稍后针对每个系统扫描
     else:
         # 全天全系统
         telescopes = cfg.get_telescope_names()
         regions = None
 
-    date = args.date
-
-    total_regions = 0
+    summary = {"regions": 0, "files": 0, "diff_success": 0}
     for tel in telescopes:
+        if should_stop and should_stop():
+            break
         if regions is None:
             # 为该系统扫描所有天区
             region_list = scan_regions_for_telescope(cfg, tel, date)
@@ -360,16 +411,20 @@ def main():
             region_list = regions
 
         logging.info("系统 %s 在 %s 的天区数: %d", tel, date, len(region_list))
-        for region in region_list:
-            total_regions += 1
-            region_url = build_region_url(cfg, tel, date, region)
-            logging.info("[%s/%s/%s] 扫描 URL: %s", tel, date, region, region_url)
+        for region_name in region_list:
+            if should_stop and should_stop():
+                logging.info("任务已取消，跳过剩余天区")
+                break
+            summary["regions"] += 1
+            region_url = build_region_url(cfg, tel, date, region_name)
+            logging.info("[%s/%s/%s] 扫描 URL: %s", tel, date, region_name, region_url)
             files = scan_files_for_region(region_url)
-            logging.info("[%s/%s/%s] 找到 %d 个 FITS", tel, date, region, len(files))
-            run_pipeline_for_files(
+            logging.info("[%s/%s/%s] 找到 %d 个 FITS", tel, date, region_name, len(files))
+            summary["files"] += len(files)
+            summary["diff_success"] += run_pipeline_for_files(
                 tel_name=tel,
                 date=date,
-                region=region,
+                region=region_name,
                 files=files,
                 download_root=download_root,
                 template_dir=template_dir,
@@ -377,9 +432,107 @@ def main():
                 args=args,
                 diff_integration=diff_integration,
                 cfg=cfg,
+                template_cache=template_cache,
+                should_stop=should_stop,
             )
 
-    logging.info("处理完成。共处理天区数: %d", total_regions)
+    return summary
+
+
+def run_service(cfg: ConfigManager, args: argparse.Namespace, diff_integration: DiffOrbIntegration,
+                download_root: str, template_dir: str, diff_root: str) -> None:
+    """
+    常驻服务模式：模块与缓存在任务之间共享。
+
+    DiffOrbIntegration 与模板查找缓存不是线程安全的，并发执行任务时每个工作线程各用一份
+    （第一个工作线程沿用启动时创建的实例）。
+    """
+    from gui.console_service import BatchJobService, serve  # type: ignore
+
+    worker_state = threading.local()
+    shared_integration = [diff_integration]
+    cfg_lock = threading.Lock()
+
+    def worker_integration() -> Tuple[DiffOrbIntegration, Dict]:
+        if not hasattr(worker_state, "integration"):
+            with cfg_lock:
+                integration = shared_integration.pop() if shared_integration else None
+            worker_state.integration = integration or DiffOrbIntegration(gui_callback=None)
+            worker_state.template_cache = {}
+        return worker_state.integration, worker_state.template_cache
+
+    def check(params: Dict) -> None:
+        # 目录只使用服务启动时的配置，不接受请求体覆盖
+        overrides = [key for key in ("download_dir", "template_dir", "diff_output_dir") if key in params]
+        if overrides:
+            raise ValueError(f"不支持通过任务参数指定目录: {', '.join(overrides)}")
+        for key in ("date", "telescope", "region"):
+            if params.get(key) is not None and not isinstance(params[key], str):
+                raise ValueError(f"参数 {key} 必须为字符串")
+        with cfg_lock:
+            validate_job(cfg, params.get("date"), params.get("telescope"), params.get("region"))
+
+    def run_job(params: Dict, stop_event: threading.Event) -> Dict:
+        integration, template_cache = worker_integration()
+        return process_job(
+            cfg, args, integration,
+            date=params["date"],
+            telescope=params.get("telescope"),
+            region=params.get("region"),
+            download_root=download_root,
+            template_dir=template_dir,
+            diff_root=diff_root,
+            template_cache=template_cache,
+            should_stop=stop_event.is_set,
+        )
+
+    service = BatchJobService(run_job, validate_job=check, max_workers=args.service_workers)
+    serve(service, args.host, args.port)
+
+
+def main():
+    setup_logging()
+    args = parse_arguments()
+
+    cfg = ConfigManager()
+    validate_args(cfg, args)
+
+    download_root, template_dir, diff_root = build_base_paths(cfg, args)
+    logging.info("下载根目录: %s", download_root)
+    logging.info("模板目录: %s", template_dir)
+    logging.info("diff 输出根目录: %s", diff_root)
+
+    diff_integration = DiffOrbIntegration(gui_callback=None)
+    DiffOrbIntegration.configure_caches(**DiffOrbIntegration.cache_limits_from_settings(cfg.get_batch_process_settings()))
+    if not diff_integration.is_available():
+        logging.error("diff_orb 模块不可用，请检查 diff_orb 依赖是否安装正确")
+        raise SystemExit(1)
+
+    if args.serve:
+        run_service(cfg, args, diff_integration, download_root, template_dir, diff_root)
+        return
+
+    # 保存当前选择到 GUI 配置，便于 GUI 和 CLI 共用
+    cfg.update_last_selected(
+        telescope_name=args.telescope or cfg.get_last_selected().get("telescope_name"),
+        date=args.date,
+        k_number=args.region or cfg.get_last_selected().get("k_number"),
+        download_directory=download_root,
+        template_directory=template_dir,
+        diff_output_directory=diff_root,
+    )
+
+    summary = process_job(
+        cfg, args, diff_integration,
+        date=args.date,
+        telescope=args.telescope,
+        region=args.region,
+        download_root=download_root,
+        template_dir=template_dir,
+        diff_root=diff_root,
+    )
+
+    logging.info("处理完成。共处理天区数: %d", summary["regions"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+本地卫星TLE库与批量SGP4传播
+TLE文件下载到本地后一次性解析为 SatrecArray，按历元对全部卫星做向量化SGP4传播并做测站改正，
+供离线卫星查询使用（替代每次在线下载TLE并逐个计算 EarthSatellite 位置）；
+并可在整个曝光窗口内预测穿过画幅的卫星轨迹（像素线段）
+"""
+
+import os
+import logging
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# Celestrak 活跃卫星 TLE
+CELESTRAK_ACTIVE_URL = 'https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle'
+
+
+def default_tle_path() -> str:
+    """默认本地TLE文件路径（gui/tle/active.tle）"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tle', 'active.tle')
+
+
+def download_tle_file(url: str = CELESTRAK_ACTIVE_URL, path: Optional[str] = None, timeout: float = 60.0) -> str:
+    """
+    下载TLE文件到本地（先写临时文件再替换，下载失败不会破坏已有文件）
+
+    Args:
+        url (str): TLE下载地址
+        path (Optional[str]): 保存路径，默认 default_tle_path()
+        timeout (float): 超时时间（秒）
+
+    Returns:
+        str: 保存路径
+    """
+    path = path or default_tle_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    request = urllib.request.Request(url, headers={'User-Agent': 'local_kats'})
+    with urllib.request.urlopen(request, timeout=timeout) as resp, open(tmp_path, 'wb') as f:
+        f.write(resp.read())
+    os.replace(tmp_path, path)
+    return path
+
+
+def radec_to_unit_vector(ra_deg, dec_deg) -> np.ndarray:
+    """RA/DEC（度）转单位向量"""
+    ra = np.deg2rad(np.asarray(ra_deg, dtype=np.float64))
+    dec = np.deg2rad(np.asarray(dec_deg, dtype=np.float64))
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def _clip_segment(x0: float, y0: float, x1: float, y1: float,
+                  xmin: float, xmax: float, ymin: float, ymax: float) -> Optional[Tuple[float, float]]:
+    """Liang-Barsky 线段裁剪，返回线段参数区间 (a, b)，完全在矩形外时返回None"""
+    dx, dy = x1 - x0, y1 - y0
+    a, b = 0.0, 1.0
+    for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        r = q / p
+        if p < 0:
+            a = max(a, r)
+        else:
+            b = min(b, r)
+        if a > b:
+            return None
+    return a, b
+
+
+def match_points_to_streaks(streaks: List[Dict], xy: np.ndarray, tolerance_px: float) -> List[List[Dict]]:
+    """
+    将一批像素坐标与预测轨迹匹配（每个点到每条轨迹线段的最近距离）
+
+    Args:
+        streaks: predict_streaks 的返回值
+        xy (np.ndarray): (n, 2) 像素坐标（0起算）
+        tolerance_px (float): 匹配容差（像素）
+
+    Returns:
+        List[List[Dict]]: 每个点命中的轨迹 [{'name', 'distance_px', 'x', 'y', 'time_s', 'distance_km'}]，按距离排序
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    matches: List[List[Dict]] = [[] for _ in range(len(xy))]
+    for streak in streaks:
+        segs = np.asarray(streak['segments'], dtype=np.float64).reshape(-1, 4)
+        times = np.asarray(streak['times'], dtype=np.float64).reshape(-1, 2)
+        a, b = segs[:, :2], segs[:, 2:]
+        d = b - a
+        length2 = np.maximum(np.sum(d * d, axis=1), 1e-12)
+        # (n_points, n_segs) 投影参数与最近点
+        w = np.clip(((xy[:, None, :] - a[None, :, :]) * d[None, :, :]).sum(axis=2) / length2[None, :], 0.0, 1.0)
+        closest = a[None, :, :] + w[:, :, None] * d[None, :, :]
+        dist = np.linalg.norm(xy[:, None, :] - closest, axis=2)
+        best = np.argmin(dist, axis=1)
+        for i in np.nonzero(dist[np.arange(len(xy)), best] <= tolerance_px)[0]:
+            j = best[i]
+            matches[i].append({
+                'name': streak['name'],
+                'distance_px': float(dist[i, j]),
+                'x': float(closest[i, j, 0]),
+                'y': float(closest[i, j, 1]),
+                'time_s': float(times[j, 0] + w[i, j] * (times[j, 1] - times[j, 0])),
+                'distance_km': streak['distance_km'],
+            })
+    for m in matches:
+        m.sort(key=lambda item: item['distance_px'])
+    return matches
+
+
+def _datetimes_to_jd(utc_times: Sequence[datetime]):
+    """UTC时间序列转为SGP4使用的 (jd整数部分, 日内小数) 数组"""
+    from sgp4.api import jday
+
+    jd = np.empty(len(utc_times), dtype=np.float64)
+    fr = np.empty(len(utc_times), dtype=np.float64)
+    for k, dt in enumerate(utc_times):
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(timezone.utc)
+        jd[k], fr[k] = jday(dt.year, dt.month, dt.day, dt.hour, dt.minute,
+                            dt.second + dt.microsecond * 1e-6)
+    return jd, fr
+
+
+class SatelliteCatalog:
+    """本地TLE库（全部卫星的SatrecArray）"""
+
+    def __init__(self, path: str):
+        """
+        解析TLE文件（支持三行格式与无名称的两行格式）
+
+        Args:
+            path (str): TLE文件路径
+        """
+        from sgp4.api import Satrec, SatrecArray
+
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        st = os.stat(path)
+        self.mtime = st.st_mtime
+
+        names: List[str] = []
+        satrecs = []
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = [line.rstrip() for line in f if line.strip()]
+        i = 0
+        while i < len(lines) - 1:
+            if lines[i].startswith('1 ') and lines[i + 1].startswith('2 '):
+                name, line1, line2 = lines[i][2:7].strip(), lines[i], lines[i + 1]
+                i += 2
+            elif i + 2 < len(lines) and lines[i + 1].startswith('1 ') and lines[i + 2].startswith('2 '):
+                name, line1, line2 = lines[i].strip(), lines[i + 1], lines[i + 2]
+                i += 3
+            else:
+                i += 1
+                continue
+            try:
+                satrecs.append(Satrec.twoline2rv(line1, line2))
+                names.append(name)
+            except Exception:
+                continue
+
+        self.names = np.array(names, dtype=str)
+        self.satrecs = satrecs
+        self._array = SatrecArray(satrecs) if satrecs else None
+        self.epoch_jd = np.array([s.jdsatepoch + s.jdsatepochF for s in satrecs], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def age_days(self, utc_time: datetime) -> Optional[float]:
+        """TLE历元（中位数）到查询时刻的天数"""
+        if not len(self):
+            return None
+        jd, fr = _datetimes_to_jd([utc_time])
+        return float(jd[0] + fr[0] - np.median(self.epoch_jd))
+
+    def observer_geometry(self, ts, utc_times: Sequence[datetime], latitude: float,
+                          longitude: float, elevation_m: float = 0.0) -> Dict[str, np.ndarray]:
+        """
+        计算与卫星无关的时刻量：SGP4时间参数、TEME->GCRS旋转矩阵与测站GCRS位置
+
+        Args:
+            ts: Skyfield Timescale
+            utc_times: UTC时间序列（datetime）
+            latitude / longitude (float): 测站经纬度（度）
+            elevation_m (float): 测站海拔（米）
+
+        Returns:
+            Dict[str, np.ndarray]: {'jd', 'fr', 'rotation': (3, 3, n_t), 'observer_km': (n_t, 3)}
+        """
+        from skyfield.api import wgs84
+        from skyfield.sgp4lib import TEME
+
+        n_t = len(utc_times)
+        jd, fr = _datetimes_to_jd(utc_times)
+        aware = [dt if dt.tzinfo is not None else dt.replace(tzinfo=timezone.utc) for dt in utc_times]
+        t = ts.from_datetimes(aware)
+        # rotation_at 给出 GCRS 到 TEME 的旋转矩阵，传播结果使用其转置
+        rotation = np.asarray(TEME.rotation_at(t)).reshape(3, 3, n_t)
+        observer = wgs84.latlon(latitude, longitude, elevation_m=elevation_m)
+        observer_km = np.asarray(observer.at(t).position.km).reshape(3, n_t).T
+        return {'jd': jd, 'fr': fr, 'rotation': rotation, 'observer_km': observer_km}
+
+    def propagate(self, geometry: Dict[str, np.ndarray], start: int = 0,
+                  end: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        对下标区间 [start, end) 内的卫星做向量化SGP4传播，返回测站坐标系（GCRS轴向）下的位置
+
+        Args:
+            geometry: observer_geometry 的返回值
+            start / end (int): 卫星下标区间（分批传播时使用）
+
+        Returns:
+            Dict[str, np.ndarray]: {'vectors': (n_sat, n_t, 3) km, 'valid': (n_sat, n_t) bool}
+        """
+        from sgp4.api import SatrecArray
+
+        n_t = len(geometry['jd'])
+        end = len(self) if end is None else min(end, len(self))
+        if end <= start:
+            return {'vectors': np.empty((0, n_t, 3)), 'valid': np.empty((0, n_t), dtype=bool)}
+
+        array = self._array if (start == 0 and end == len(self)) else SatrecArray(self.satrecs[start:end])
+        errors, r_teme, _ = array.sgp4(geometry['jd'], geometry['fr'])
+        r_gcrs = np.einsum('jik,skj->ski', geometry['rotation'], r_teme)
+        vectors = r_gcrs - geometry['observer_km'][None, :, :]
+        valid = (errors == 0) & np.all(np.isfinite(vectors), axis=2)
+        return {'vectors': vectors, 'valid': valid}
+
+    def topocentric_positions(self, ts, utc_times: Sequence[datetime], latitude: float,
+                              longitude: float, elevation_m: float = 0.0) -> Dict[str, np.ndarray]:
+        """对全部卫星在多个时刻做向量化SGP4传播（见 propagate）"""
+        if self._array is None:
+            n_t = len(utc_times)
+            return {'vectors': np.empty((0, n_t, 3)), 'valid': np.empty((0, n_t), dtype=bool)}
+        geometry = self.observer_geometry(ts, utc_times, latitude, longitude, elevation_m)
+        return self.propagate(geometry)
+
+    def predict_streaks(self, ts, start_utc: datetime, exposure_s: float, latitude: float, longitude: float,
+                        wcs, shape: Tuple[int, int], step_s: float = 1.0,
+                        batch_size: int = 2000) -> List[Dict]:
+        """
+        预测曝光时间窗口内穿过画幅的卫星轨迹
+
+        在曝光区间的细时间网格上分批传播全部卫星，只对可能与画幅相交的相邻采样点做WCS投影，
+        再按画幅边界裁剪（TAN投影下大圆为直线，相邻采样点之间按直线处理）
+
+        Args:
+            ts: Skyfield Timescale
+            start_utc (datetime): 曝光开始时刻（UTC）
+            exposure_s (float): 曝光时长（秒）
+            latitude / longitude (float): 测站经纬度（度）
+            wcs: astropy WCS（画幅）
+            shape (Tuple[int, int]): 图像尺寸 (ny, nx)
+            step_s (float): 时间网格步长（秒）
+            batch_size (int): 每批传播的卫星数
+
+        Returns:
+            List[Dict]: [{'name', 'segments': [(x0, y0, x1, y1)], 'times': [(t0, t1)], 'distance_km'}]，
+                像素坐标为0起算，时间为相对曝光开始的秒数
+        """
+        if self._array is None or exposure_s <= 0:
+            return []
+
+        n_t = int(np.ceil(exposure_s / step_s)) + 1
+        offsets = np.minimum(np.arange(n_t) * step_s, exposure_s)
+        utc_times = [start_utc + timedelta(seconds=float(dt)) for dt in offsets]
+        geometry = self.observer_geometry(ts, utc_times, latitude, longitude)
+
+        # 画幅中心与外接圆半径
+        ny, nx = int(shape[0]), int(shape[1])
+        center = wcs.all_pix2world(np.array([[(nx - 1) / 2.0, (ny - 1) / 2.0]]), 0)[0]
+        corners = wcs.all_pix2world(np.array([[-0.5, -0.5], [nx - 0.5, -0.5],
+                                              [-0.5, ny - 0.5], [nx - 0.5, ny - 0.5]]), 0)
+        center_u = radec_to_unit_vector(center[0], center[1])
+        field_radius = float(np.max(np.arccos(np.clip(
+            radec_to_unit_vector(corners[:, 0], corners[:, 1]) @ center_u, -1.0, 1.0))))
+
+        streaks = []
+        for start in range(0, len(self), batch_size):
+            positions = self.propagate(geometry, start, start + batch_size)
+            vectors, valid = positions['vectors'], positions['valid']
+            distance = np.linalg.norm(vectors, axis=2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                u = vectors / distance[:, :, None]
+                sep = np.arccos(np.clip(u @ center_u, -1.0, 1.0))
+                arc = np.arccos(np.clip(np.sum(u[:, :-1] * u[:, 1:], axis=2), -1.0, 1.0))
+
+            # 相邻采样点构成的大圆弧与画幅外接圆相交的必要条件：两端点均在 半径+弧长 内
+            pair_near = (valid[:, :-1] & valid[:, 1:]
+                         & (np.maximum(sep[:, :-1], sep[:, 1:]) <= field_radius + arc)
+                         & (np.maximum(sep[:, :-1], sep[:, 1:]) < np.deg2rad(60.0)))
+            sat_idx, step_idx = np.nonzero(pair_near)
+            if len(sat_idx) == 0:
+                continue
+
+            # 一次性投影所有需要的端点
+            p0 = u[sat_idx, step_idx]
+            p1 = u[sat_idx, step_idx + 1]
+            pts = np.concatenate([p0, p1])
+            ra = np.mod(np.rad2deg(np.arctan2(pts[:, 1], pts[:, 0])), 360.0)
+            dec = np.rad2deg(np.arcsin(np.clip(pts[:, 2], -1.0, 1.0)))
+            pix = wcs.all_world2pix(np.column_stack([ra, dec]), 0)
+            xy0, xy1 = pix[:len(p0)], pix[len(p0):]
+
+            current = None
+            for k in range(len(sat_idx)):
+                clipped = _clip_segment(xy0[k, 0], xy0[k, 1], xy1[k, 0], xy1[k, 1],
+                                        -0.5, nx - 0.5, -0.5, ny - 0.5)
+                if clipped is None:
+                    continue
+                a, b = clipped
+                i_sat = start + int(sat_idx[k])
+                dx, dy = xy1[k] - xy0[k]
+                seg = (float(xy0[k, 0] + a * dx), float(xy0[k, 1] + a * dy),
+                       float(xy0[k, 0] + b * dx), float(xy0[k, 1] + b * dy))
+                t_step = float(offsets[step_idx[k]])
+                dt = float(offsets[step_idx[k] + 1]) - t_step
+                times = (t_step + a * dt, t_step + b * dt)
+                if current is None or current['index'] != i_sat:
+                    current = {'index': i_sat, 'name': str(self.names[i_sat]), 'segments': [], 'times': [],
+                               'distance_km': float(distance[sat_idx[k], step_idx[k]])}
+                    streaks.append(current)
+                current['segments'].append(seg)
+                current['times'].append(times)
+
+        return streaks
+
+
+class SatelliteEpochSnapshot:
+    """单一曝光历元的全部卫星方向快照，用于同一历元下的多次圆锥查询"""
+
+    def __init__(self, catalog: SatelliteCatalog, ts, utc_time: datetime, latitude: float, longitude: float):
+        positions = catalog.topocentric_positions(ts, [utc_time], latitude, longitude)
+        vectors = positions['vectors'][:, 0, :]
+        self.catalog = catalog
+        self.valid = positions['valid'][:, 0]
+        self.distance_km = np.linalg.norm(vectors, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.unit_vectors = vectors / self.distance_km[:, None]
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.valid))
+
+    def cone_search(self, ra: float, dec: float, search_radius: float) -> List[Dict]:
+        """
+        圆锥搜索，返回与原在线查询一致的结果列表
+
+        Args:
+            ra (float): 目标RA（度）
+            dec (float): 目标DEC（度）
+            search_radius (float): 搜索半径（度）
+
+        Returns:
+            List[Dict]: [{'name', 'ra', 'dec', 'separation', 'distance_km'}]，按角距排序
+        """
+        target = radec_to_unit_vector(float(ra), float(dec))
+        with np.errstate(invalid='ignore'):
+            sep = np.rad2deg(np.arccos(np.clip(self.unit_vectors @ target, -1.0, 1.0)))
+        hit = np.nonzero(self.valid & (sep <= float(search_radius)))[0]
+        hit = hit[np.argsort(sep[hit])]
+
+        u = self.unit_vectors[hit]
+        sat_ra = np.mod(np.rad2deg(np.arctan2(u[:, 1], u[:, 0])), 360.0)
+        sat_dec = np.rad2deg(np.arcsin(np.clip(u[:, 2], -1.0, 1.0)))
+        return [
+            {
+                'name': str(self.catalog.names[i]),
+                'ra': float(sat_ra[k]),
+                'dec': float(sat_dec[k]),
+                'separation': float(sep[i]),
+                'distance_km': float(self.distance_km[i]),
+            }
+            for k, i in enumerate(hit)
+        ]
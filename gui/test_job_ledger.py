@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试任务账本 should_run 的状态转换
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from job_ledger import JobLedger, params_hash
+
+
+def test_should_run_transitions():
+    """无记录 → 执行中断 → 成功 → 参数变化 → 失败（按重试范围）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = JobLedger(os.path.join(tmp, 'ledger.sqlite'))
+        key = os.path.join(tmp, 'a.fit')
+        h1 = params_hash({'x': 1})
+        h2 = params_hash({'x': 2})
+
+        assert ledger.should_run(key, 'diff', h1) == (True, None)
+
+        ledger.start(key, 'diff', h1)
+        run, row = ledger.should_run(key, 'diff', h1)
+        assert run and row['status'] == 'running'
+
+        ledger.finish(key, 'diff', h1, True)
+        run, row = ledger.should_run(key, 'diff', h1)
+        assert not run and row['status'] == 'success'
+
+        # 参数变化后重新执行
+        assert ledger.should_run(key, 'diff', h2)[0]
+
+        ledger.finish(key, 'diff', h1, False, '失败')
+        assert ledger.should_run(key, 'diff', h1, retry_failed=('diff',))[0]
+        run, row = ledger.should_run(key, 'diff', h1, retry_failed=('download',))
+        assert not run and row['status'] == 'failed'
+        ledger.close()
+
+
+def test_success_with_missing_output_runs_again():
+    """成功记录的产物被删除后视为失效；产物仍在时跳过"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = JobLedger(os.path.join(tmp, 'ledger.sqlite'))
+        file_path = os.path.join(tmp, 'a.fit')
+        h = params_hash({'url': 'https://example.org/a.fit'})
+        with open(file_path, 'wb') as f:
+            f.write(b'data')
+
+        ledger.finish(file_path, 'download', h, True, output=file_path)
+        assert not ledger.should_run(file_path, 'download', h)[0]
+
+        os.remove(file_path)
+        run, row = ledger.should_run(file_path, 'download', h, retry_failed=())
+        assert run and row['status'] == 'success'
+
+        # 下游记录可以单独作废
+        ledger.finish(file_path, 'astap', h, True)
+        ledger.invalidate(file_path, 'astap')
+        assert ledger.get(file_path, 'astap') is None
+        ledger.close()
+
+
+if __name__ == '__main__':
+    test_should_run_transitions()
+    test_success_with_missing_output_runs_again()
+    print("任务账本测试通过")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+测试目录列表缓存：观测夜进行中抓取的条目必须重新验证，数据稳定后抓取的条目直接使用
+"""
+
+import os
+import sys
+import json
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from listing_cache import ListingCache
+
+
+NIGHT_URL = 'https://example.org/GY6-DATA/2024/20240101/'
+
+
+class _FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class _FakeSession:
+    """记录请求头并按顺序返回预设响应"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+def _write_entry(cache, url, content, fetched, etag='"v1"'):
+    """直接写入指定抓取时间的缓存条目"""
+    cache.store(url, content, etag=etag)
+    path = cache._path(url)
+    with open(path, 'r', encoding='utf-8') as f:
+        entry = json.load(f)
+    entry['fetched'] = fetched
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+
+
+def test_entry_fetched_during_night_is_revalidated():
+    """观测夜当晚抓取的条目：即使观测夜早已结束也要发条件GET，并保存新的页面"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ListingCache(cache_dir, settle_days=2)
+        _write_entry(cache, NIGHT_URL, 'partial', '2024-01-01T23:00:00')
+
+        session = _FakeSession(_FakeResponse(200, 'complete', {'ETag': '"v2"'}))
+        assert cache.fetch(session, NIGHT_URL) == 'complete'
+        assert session.requests == [{'If-None-Match': '"v1"'}]
+
+        # 新条目在数据稳定后抓取，之后不再访问网络
+        session = _FakeSession()
+        assert cache.fetch(session, NIGHT_URL) == 'complete'
+        assert session.requests == []
+
+
+def test_entry_revalidated_304_becomes_settled():
+    """观测夜当晚抓取的条目重新验证得到304后刷新抓取时间，不再重复验证"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ListingCache(cache_dir, settle_days=2)
+        _write_entry(cache, NIGHT_URL, 'listing', '2024-01-02T08:00:00')
+
+        session = _FakeSession(_FakeResponse(304))
+        assert cache.fetch(session, NIGHT_URL) == 'listing'
+        assert len(session.requests) == 1
+
+        session = _FakeSession()
+        assert cache.fetch(session, NIGHT_URL) == 'listing'
+        assert session.requests == []
+
+
+def test_entry_fetched_after_settle_is_used_directly():
+    """观测夜日期加 settle_days 之后抓取的条目直接返回"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ListingCache(cache_dir, settle_days=2)
+        _write_entry(cache, NIGHT_URL, 'listing', '2024-01-03T00:00:00')
+
+        session = _FakeSession()
+        assert cache.fetch(session, NIGHT_URL) == 'listing'
+        assert session.requests == []
+        assert cache.is_settled(cache.load(NIGHT_URL), '20240101')
+        assert not cache.is_settled({'fetched': '2024-01-02T23:59:59'}, '20240101')
+
+
+if __name__ == '__main__':
+    test_entry_fetched_during_night_is_revalidated()
+    test_entry_revalidated_304_becomes_settled()
+    test_entry_fetched_after_settle_is_used_directly()
+    print("目录列表缓存测试通过")
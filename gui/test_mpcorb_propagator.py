@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试MPCORB快照圆锥搜索在圆锥边缘的结果一致性
+"""
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from mpcorb_propagator import MPCORBEpochSnapshot, radec_to_unit_vector
+
+
+class _FixedVectorEngine:
+    """直接返回给定单位向量的传播引擎（只实现快照需要的接口）"""
+
+    def __init__(self, unit_vectors):
+        self.unit_vectors = unit_vectors
+
+    def astrometric_unit_vectors(self, geometry):
+        return self.unit_vectors, None
+
+
+def _edge_snapshot(ra, dec, radius, count=5000, seed=0):
+    """在目标周围、角距紧贴搜索半径两侧布点的快照"""
+    rng = np.random.default_rng(seed)
+    position_angle = rng.uniform(0.0, 2.0 * np.pi, count)
+    separation = radius * (1.0 + rng.uniform(-1e-9, 1e-9, count))
+    dec_pts = dec + separation * np.cos(position_angle)
+    ra_pts = ra + separation * np.sin(position_angle) / np.cos(np.deg2rad(dec))
+    vectors = radec_to_unit_vector(ra_pts, dec_pts)
+    return MPCORBEpochSnapshot(_FixedVectorEngine(vectors), {'jd_tt': 2460000.5})
+
+
+def test_cone_search_boundary():
+    """圆锥边缘的候选点：index 与 ra/dec/sep 一一对应，且全部位于圆锥内"""
+    ra, dec = 150.0, 20.0
+    # 小半径时反余弦角距的舍入误差最大，最容易与KD树的弦长判定不一致
+    for radius in (0.001, 0.01, 0.5, 2.0):
+        snapshot = _edge_snapshot(ra, dec, radius)
+        result = snapshot.cone_search(ra, dec, radius)
+        assert len(result['index']) == len(result['ra']) == len(result['dec']) == len(result['sep'])
+        assert np.all(result['sep'] <= radius)
+
+        # 按 index 取回的位置与返回的 ra/dec 一致
+        expected = snapshot.unit_vectors[result['index']]
+        returned = radec_to_unit_vector(result['ra'], result['dec'])
+        assert np.allclose(expected, returned, atol=1e-12)
+
+
+def test_cone_search_empty_uses_nearest():
+    """圆锥内没有天体时返回空结果，但仍给出最近天体"""
+    snapshot = _edge_snapshot(150.0, 20.0, 1.0, count=50)
+    result = snapshot.cone_search(150.0, 20.0, 0.1)
+    assert len(result['index']) == len(result['ra']) == 0
+    assert result['min_index'] >= 0
+    assert result['min_sep'] > 0.1
+
+
+if __name__ == '__main__':
+    test_cone_search_boundary()
+    test_cone_search_empty_uses_nearest()
+    print("圆锥搜索边界测试通过")
@@ -17,13 +17,16 @@ from bs4 import BeautifulSoup
 from typing import Callable, Optional, List
 from config_manager import ConfigManager
 from calendar_widget import CalendarDialog
+from listing_cache import get_listing_cache
 
 
 class RegionScanner:
     """天区扫描器 - 从URL中获取可用的天区列表"""
 
-    def __init__(self, timeout=10):
+    def __init__(self, timeout=10, listing_cache=None):
         self.timeout = timeout
+        # 目录列表页面缓存（与WebFitsScanner/DirectoryScanner共享）
+        self.listing_cache = listing_cache or get_listing_cache()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -86,9 +89,7 @@ class RegionScanner:
 
             # 尝试使用requests，如果失败则使用urllib
             try:
-                response = self.session.get(base_url, timeout=self.timeout)
-                response.raise_for_status()
-                content = response.text
+                content = self.listing_cache.fetch(self.session, base_url, self.timeout)
             except Exception as e:
                 self.logger.warning(f"requests失败，尝试urllib: {str(e)}")
                 content = self._get_content_with_urllib(base_url)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Gaia DR3 变星目录（vclassre.dat）空间索引
+将目录一次性转换为按赤纬分带、带内按赤经排序的NumPy数组，圆锥搜索只访问相关分带，返回全部匹配
+"""
+
+import os
+import gzip
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+
+VCLASSRE_INDEX_VERSION = 2
+
+# vclassre.dat 列位（1-based: RAdeg 94-114, DEdeg 116-137；Source 1-19；Class 53-78）
+# 转为Python slice（0-based, end-exclusive）
+SL_RA = slice(93, 114)
+SL_DEC = slice(115, 137)
+SL_SRC = slice(0, 19)
+SL_CLS = slice(52, 78)
+
+
+def vclassre_index_dir(source_path: str) -> str:
+    """源目录文件对应的默认索引目录（与源文件同目录）"""
+    return os.path.join(os.path.dirname(os.path.abspath(source_path)),
+                        os.path.basename(source_path) + '_idx')
+
+
+def _parse_chunk(lines):
+    """
+    把一批原始行解析为定宽数组（不为每行创建Python对象）
+
+    Returns:
+        tuple: (ra, dec, source(S19), cls(S26))；RA/DEC无法解析的行被丢弃
+    """
+    width = SL_DEC.stop
+    rows = np.array([line[:width] for line in lines if len(line) >= width], dtype=f'S{width}')
+    if len(rows) == 0:
+        return None
+    raw = rows.view(np.uint8).reshape(-1, width)
+
+    def column(sl):
+        return np.ascontiguousarray(raw[:, sl]).view(f'S{sl.stop - sl.start}').ravel()
+
+    ra_txt, dec_txt = column(SL_RA), column(SL_DEC)
+    try:
+        ra = ra_txt.astype(np.float64)
+        dec = dec_txt.astype(np.float64)
+        keep = slice(None)
+    except ValueError:
+        # 少数行含空值或非法数值：该批逐行解析
+        ra = np.full(len(rows), np.nan)
+        dec = np.full(len(rows), np.nan)
+        for i, (r, d) in enumerate(zip(ra_txt, dec_txt)):
+            try:
+                ra[i], dec[i] = float(r), float(d)
+            except ValueError:
+                pass
+        keep = np.isfinite(ra) & np.isfinite(dec)
+    return (ra[keep], dec[keep],
+            np.char.strip(column(SL_SRC))[keep], np.char.strip(column(SL_CLS))[keep])
+
+
+def build_vclassre_index(source_path: str, out_dir: Optional[str] = None,
+                         zone_height_deg: float = 0.25, progress_every: int = 1000000,
+                         chunk_lines: int = 500000) -> str:
+    """
+    扫描 vclassre.dat(.gz) 全表并写出赤纬分带索引（离线构建，耗时数分钟，不应在GUI线程调用）
+
+    按定宽块流式解析：每块只保留 float64 坐标与定长字节串，不再为每行构建Python列表与Unicode数组
+
+    Args:
+        source_path (str): vclassre.dat 或 vclassre.dat.gz 路径
+        out_dir (Optional[str]): 索引目录，默认 <源文件>_idx
+        zone_height_deg (float): 赤纬分带高度（度）
+        progress_every (int): 每处理多少行输出一次进度日志
+        chunk_lines (int): 每块解析的行数
+
+    Returns:
+        str: 索引目录路径
+    """
+    logger = logging.getLogger(__name__)
+    out_dir = out_dir or vclassre_index_dir(source_path)
+
+    chunks = []
+    opener = gzip.open if source_path.lower().endswith('.gz') else open
+    scanned = 0
+    valid = 0
+    next_progress = progress_every
+    with opener(source_path, 'rb') as f:
+        while True:
+            lines = f.readlines(chunk_lines * 160)
+            if not lines:
+                break
+            scanned += len(lines)
+            parsed = _parse_chunk(lines)
+            if parsed is not None:
+                chunks.append(parsed)
+                valid += len(parsed[0])
+            if progress_every and scanned >= next_progress:
+                logger.info(f"vclassre索引构建: 已扫描 {scanned} 行, 有效 {valid} 行")
+                next_progress += progress_every
+
+    if chunks:
+        ra = np.mod(np.concatenate([c[0] for c in chunks]), 360.0)
+        dec = np.concatenate([c[1] for c in chunks])
+        source = np.concatenate([c[2] for c in chunks])
+        cls = np.concatenate([c[3] for c in chunks])
+    else:
+        ra = dec = np.empty(0, dtype=np.float64)
+        source = np.empty(0, dtype='S19')
+        cls = np.empty(0, dtype='S26')
+    del chunks
+
+    # 按 (分带, RA) 排序
+    n_zones = int(np.ceil(180.0 / zone_height_deg))
+    zone = np.clip(((dec + 90.0) / zone_height_deg).astype(np.int64), 0, n_zones - 1)
+    order = np.lexsort((ra, zone))
+    zone_offsets = np.searchsorted(zone[order], np.arange(n_zones + 1), side='left').astype(np.int64)
+
+    tmp_dir = out_dir + '.tmp'
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, 'ra.npy'), ra[order])
+    np.save(os.path.join(tmp_dir, 'dec.npy'), dec[order])
+    np.save(os.path.join(tmp_dir, 'source.npy'), source[order])
+    np.save(os.path.join(tmp_dir, 'cls.npy'), cls[order])
+    np.save(os.path.join(tmp_dir, 'zone_offsets.npy'), zone_offsets)
+
+    st = os.stat(source_path)
+    header = {
+        'version': VCLASSRE_INDEX_VERSION,
+        'source_path': os.path.abspath(source_path),
+        'source_mtime': st.st_mtime,
+        'source_size': st.st_size,
+        'zone_height_deg': float(zone_height_deg),
+        'n_zones': n_zones,
+        'count': int(len(ra)),
+        'scanned_lines': scanned,
+        'created': datetime.now().isoformat(),
+    }
+    with open(os.path.join(tmp_dir, 'header.json'), 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+    if os.path.isdir(out_dir):
+        import shutil
+        shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    logger.info(f"vclassre索引构建完成: {len(ra)} 条, {n_zones} 个分带 -> {out_dir}")
+    return out_dir
+
+
+def _as_text(values) -> np.ndarray:
+    """定长字节串数组转为字符串数组"""
+    return np.char.decode(np.asarray(values), 'utf-8', 'ignore')
+
+
+class VariableStarIndex:
+    """已构建的 vclassre 赤纬分带索引（只读，内存映射）"""
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, 'header.json'), 'r', encoding='utf-8') as f:
+            self.header = json.load(f)
+        self.zone_height = float(self.header['zone_height_deg'])
+        self.n_zones = int(self.header['n_zones'])
+        self.ra = np.load(os.path.join(index_dir, 'ra.npy'), mmap_mode='r')
+        self.dec = np.load(os.path.join(index_dir, 'dec.npy'), mmap_mode='r')
+        self.source = np.load(os.path.join(index_dir, 'source.npy'), mmap_mode='r')
+        self.cls = np.load(os.path.join(index_dir, 'cls.npy'), mmap_mode='r')
+        self.zone_offsets = np.load(os.path.join(index_dir, 'zone_offsets.npy'))
+
+    def __len__(self) -> int:
+        return len(self.ra)
+
+    @classmethod
+    def open_for(cls, source_path: str, index_dir: Optional[str] = None) -> Optional['VariableStarIndex']:
+        """打开与源文件（路径/mtime/大小）匹配的索引，不存在或已过期时返回None"""
+        index_dir = index_dir or vclassre_index_dir(source_path)
+        header_path = os.path.join(index_dir, 'header.json')
+        if not os.path.exists(header_path):
+            return None
+        try:
+            with open(header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            st = os.stat(source_path)
+            if (header.get('version') != VCLASSRE_INDEX_VERSION
+                    or header.get('source_mtime') != st.st_mtime
+                    or header.get('source_size') != st.st_size):
+                return None
+            return cls(index_dir)
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"vclassre索引打开失败: {e}")
+            return None
+
+    def _candidate_slices(self, ra: float, dec: float, radius: float):
+        """返回可能包含匹配的 (start, end) 下标区间"""
+        dec_lo = max(dec - radius, -90.0)
+        dec_hi = min(dec + radius, 90.0)
+        z_lo = int(np.clip(np.floor((dec_lo + 90.0) / self.zone_height), 0, self.n_zones - 1))
+        z_hi = int(np.clip(np.floor((dec_hi + 90.0) / self.zone_height), 0, self.n_zones - 1))
+
+        # 极区附近直接取整个分带
+        max_abs_dec = max(abs(dec_lo), abs(dec_hi))
+        full_ra = max_abs_dec + 1e-9 >= 90.0 or radius >= 180.0
+        if not full_ra:
+            half_width = np.rad2deg(np.arcsin(min(1.0, np.sin(np.deg2rad(radius)) / np.cos(np.deg2rad(max_abs_dec)))))
+            full_ra = half_width >= 180.0 or max_abs_dec >= 89.0
+
+        for z in range(z_lo, z_hi + 1):
+            start, end = int(self.zone_offsets[z]), int(self.zone_offsets[z + 1])
+            if start >= end:
+                continue
+            if full_ra:
+                yield start, end
+                continue
+            ra_zone = self.ra[start:end]
+            ra_min, ra_max = ra - half_width, ra + half_width
+            ranges = [(ra_min, ra_max)]
+            if ra_min < 0.0:
+                ranges = [(0.0, ra_max), (ra_min + 360.0, 360.0)]
+            elif ra_max > 360.0:
+                ranges = [(ra_min, 360.0), (0.0, ra_max - 360.0)]
+            for lo, hi in ranges:
+                i0 = int(np.searchsorted(ra_zone, lo, side='left'))
+                i1 = int(np.searchsorted(ra_zone, hi, side='right'))
+                if i1 > i0:
+                    yield start + i0, start + i1
+
+    def cone_search(self, ra: float, dec: float, radius: float) -> Dict[str, np.ndarray]:
+        """
+        圆锥搜索，返回全部匹配
+
+        Args:
+            ra (float): 目标RA（度）
+            dec (float): 目标DEC（度）
+            radius (float): 搜索半径（度）
+
+        Returns:
+            Dict[str, np.ndarray]: {'ra', 'dec', 'source', 'cls', 'sep'}
+        """
+        idx = [np.arange(s, e) for s, e in self._candidate_slices(float(ra) % 360.0, float(dec), float(radius))]
+        idx = np.concatenate(idx) if idx else np.empty(0, dtype=np.int64)
+
+        ra_c = np.deg2rad(np.asarray(self.ra[idx], dtype=np.float64))
+        dec_c = np.deg2rad(np.asarray(self.dec[idx], dtype=np.float64))
+        ra0, dec0 = np.deg2rad(float(ra)), np.deg2rad(float(dec))
+        # haversine角距，小半径下数值稳定
+        h = (np.sin((dec_c - dec0) / 2.0) ** 2
+             + np.cos(dec_c) * np.cos(dec0) * np.sin((ra_c - ra0) / 2.0) ** 2)
+        sep = np.rad2deg(2.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0))))
+        in_cone = sep <= float(radius)
+        order = np.argsort(sep[in_cone])
+        hit = idx[in_cone][order]
+
+        return {
+            'ra': np.asarray(self.ra[hit]),
+            'dec': np.asarray(self.dec[hit]),
+            'source': _as_text(self.source[hit]),
+            'cls': _as_text(self.cls[hit]),
+            'sep': sep[in_cone][order],
+        }
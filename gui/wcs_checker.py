@@ -12,6 +12,8 @@ from astropy.io import fits
 from astropy.wcs import WCS
 import warnings
 
+from fits_header_probe import HeaderProbeCache, get_header_probe
+
 # 忽略WCS相关的警告
 warnings.filterwarnings('ignore', category=UserWarning, module='astropy.wcs')
 
@@ -19,8 +21,10 @@ warnings.filterwarnings('ignore', category=UserWarning, module='astropy.wcs')
 class WCSChecker:
     """WCS信息检查器"""
     
-    def __init__(self):
+    def __init__(self, header_probe: Optional[HeaderProbeCache] = None):
         self.logger = logging.getLogger(__name__)
+        # 头部探测缓存（与流水线、图像查看器共享），按 (路径, mtime, 大小) 失效
+        self.header_probe = header_probe or get_header_probe()
     
     def check_fits_wcs(self, fits_file_path: str) -> bool:
         """
@@ -36,75 +40,65 @@ class WCSChecker:
             if not os.path.exists(fits_file_path):
                 self.logger.warning(f"文件不存在: {fits_file_path}")
                 return False
-            
-            # 打开FITS文件
-            with fits.open(fits_file_path) as hdul:
-                # 检查主HDU的header
-                header = hdul[0].header
-                
-                # 检查基本的WCS关键字
-                wcs_keywords = [
-                    'CRVAL1', 'CRVAL2',  # 参考点的世界坐标
-                    'CRPIX1', 'CRPIX2',  # 参考点的像素坐标
-                    'CDELT1', 'CDELT2',  # 像素尺度（可选，可能用CD矩阵代替）
-                    'CTYPE1', 'CTYPE2'   # 坐标类型
-                ]
-                
-                # 检查CD矩阵（线性变换矩阵）
-                cd_keywords = ['CD1_1', 'CD1_2', 'CD2_1', 'CD2_2']
-                
-                # 检查PC矩阵（旋转矩阵）
-                pc_keywords = ['PC1_1', 'PC1_2', 'PC2_1', 'PC2_2']
-                
-                # 至少需要有CRVAL, CRPIX, CTYPE
-                required_keywords = ['CRVAL1', 'CRVAL2', 'CRPIX1', 'CRPIX2', 'CTYPE1', 'CTYPE2']
-                
-                # 检查必需的关键字
-                missing_required = []
-                for keyword in required_keywords:
-                    if keyword not in header:
-                        missing_required.append(keyword)
-                
-                if missing_required:
-                    self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 缺少必需的WCS关键字: {missing_required}")
-                    return False
-                
-                # 检查是否有尺度信息（CDELT或CD矩阵或PC矩阵）
-                has_cdelt = 'CDELT1' in header and 'CDELT2' in header
-                has_cd_matrix = all(kw in header for kw in cd_keywords)
-                has_pc_matrix = all(kw in header for kw in pc_keywords)
-                
-                if not (has_cdelt or has_cd_matrix or has_pc_matrix):
-                    self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 缺少尺度信息（CDELT/CD/PC）")
-                    return False
-                
-                # 尝试创建WCS对象来验证
-                try:
-                    wcs = WCS(header)
-                    
-                    # 检查WCS是否有效（能够进行坐标转换）
-                    if wcs.has_celestial:
-                        # 测试一个简单的坐标转换
-                        test_pixel = [100, 100]  # 测试像素坐标
-                        world_coords = wcs.pixel_to_world_values(test_pixel[0], test_pixel[1])
-                        
-                        if world_coords is not None and len(world_coords) >= 2:
-                            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 包含有效的WCS信息")
-                            return True
-                        else:
-                            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS坐标转换失败")
-                            return False
-                    else:
-                        self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS不包含天球坐标系统")
-                        return False
-                        
-                except Exception as wcs_error:
-                    self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS创建失败: {str(wcs_error)}")
-                    return False
-                    
+
+            # 文件未变化时直接复用上次的检查结果
+            return bool(self.header_probe.get(fits_file_path, 'wcs_valid', self._validate_wcs))
+
         except Exception as e:
             self.logger.error(f"检查文件 {fits_file_path} 的WCS信息时出错: {str(e)}")
             return False
+
+    def _validate_wcs(self, fits_file_path: str) -> bool:
+        """只读取主头中的WCS关键字（含SIP畸变项，不打开数据单元）并验证能否进行坐标转换"""
+        header = self.header_probe.header_cards(fits_file_path)
+        if header is None:
+            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 不是有效的FITS文件或头部不完整")
+            return False
+
+        # 检查CD矩阵（线性变换矩阵）
+        cd_keywords = ['CD1_1', 'CD1_2', 'CD2_1', 'CD2_2']
+
+        # 检查PC矩阵（旋转矩阵）
+        pc_keywords = ['PC1_1', 'PC1_2', 'PC2_1', 'PC2_2']
+
+        # 至少需要有CRVAL, CRPIX, CTYPE
+        required_keywords = ['CRVAL1', 'CRVAL2', 'CRPIX1', 'CRPIX2', 'CTYPE1', 'CTYPE2']
+
+        # 检查必需的关键字
+        missing_required = [keyword for keyword in required_keywords if keyword not in header]
+        if missing_required:
+            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 缺少必需的WCS关键字: {missing_required}")
+            return False
+
+        # 检查是否有尺度信息（CDELT或CD矩阵或PC矩阵）
+        has_cdelt = 'CDELT1' in header and 'CDELT2' in header
+        has_cd_matrix = all(kw in header for kw in cd_keywords)
+        has_pc_matrix = all(kw in header for kw in pc_keywords)
+
+        if not (has_cdelt or has_cd_matrix or has_pc_matrix):
+            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 缺少尺度信息（CDELT/CD/PC）")
+            return False
+
+        # 尝试创建WCS对象来验证
+        try:
+            wcs = WCS(fits.Header(list(header.items())))
+
+            # 检查WCS是否有效（能够进行坐标转换）
+            if wcs.has_celestial:
+                # 测试一个简单的坐标转换
+                world_coords = wcs.pixel_to_world_values(100, 100)
+
+                if world_coords is not None and len(world_coords) >= 2:
+                    self.logger.debug(f"文件 {os.path.basename(fits_file_path)} 包含有效的WCS信息")
+                    return True
+                self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS坐标转换失败")
+                return False
+            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS不包含天球坐标系统")
+            return False
+
+        except Exception as wcs_error:
+            self.logger.debug(f"文件 {os.path.basename(fits_file_path)} WCS创建失败: {str(wcs_error)}")
+            return False
     
     def check_directory_wcs(self, directory_path: str) -> Dict[str, bool]:
         """
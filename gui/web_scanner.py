@@ -6,18 +6,56 @@
 
 import re
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 import logging
-from typing import List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+from listing_cache import get_listing_cache
+
+
+# 取行内第一个链接的href与最后一个</a>之后的文本（图标链接与文件名链接同行时跳过文件名）
+_LISTING_LINK_RE = re.compile(r'<a\s+[^>]*href="([^"]+)"[^>]*>.*</a>(.*)', re.IGNORECASE)
+# 链接之后的大小列：如 "10485760"、"9.8M"、"12.5 MB"（排除日期/时间中的数字）
+_LISTING_SIZE_RE = re.compile(r'(?<![\d:.\-])(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?(?=\s|$|<)', re.IGNORECASE)
+_SIZE_MULTIPLIERS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def parse_listing_sizes(html_content: str) -> Dict[str, int]:
+    """
+    一次性解析目录列表（Apache/nginx风格）中各链接后面的文件大小
+
+    Args:
+        html_content (str): 目录列表HTML
+
+    Returns:
+        Dict[str, int]: {href: 文件大小（字节）}，无法解析大小的链接不包含在内
+    """
+    sizes = {}
+    for line in html_content.splitlines():
+        match = _LISTING_LINK_RE.search(line)
+        if not match:
+            continue
+        href, tail = match.groups()
+        tail = re.sub(r'<[^>]+>', ' ', tail)
+        size_match = _LISTING_SIZE_RE.search(tail)
+        if size_match:
+            size_str, unit = size_match.groups()
+            sizes[href] = int(float(size_str) * _SIZE_MULTIPLIERS.get(unit.upper(), 1))
+    return sizes
 
 
 class WebFitsScanner:
     """网页FITS文件扫描器"""
     
-    def __init__(self, timeout=30, user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'):
+    def __init__(self, timeout=30, user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                 head_workers=8, listing_cache=None):
         self.timeout = timeout
         self.user_agent = user_agent
+        self.head_workers = head_workers
+        # 目录列表页面缓存（已结束的观测夜不再请求，当前观测夜条件GET）
+        self.listing_cache = listing_cache or get_listing_cache()
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': self.user_agent})
 
@@ -47,36 +85,40 @@ class WebFitsScanner:
                 kwargs['ssl_context'] = context
                 return super().init_poolmanager(*args, **kwargs)
 
-        # 挂载适配器
-        self.session.mount('https://', SSLAdapter())
+        # 挂载适配器（连接池容量与并发HEAD请求数一致，保持连接复用）
+        self.session.mount('https://', SSLAdapter(pool_maxsize=max(10, head_workers)))
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=max(10, head_workers)))
         
         # 设置日志
         self.logger = logging.getLogger(__name__)
         
-    def scan_fits_files(self, base_url: str) -> List[Tuple[str, str, int]]:
+    def scan_fits_files(self, base_url: str,
+                        on_files: Optional[Callable[[List[Tuple[str, str, int]]], None]] = None) -> List[Tuple[str, str, int]]:
         """
         扫描指定URL获取FITS文件列表
+
+        文件大小优先取自目录列表HTML，列表中没有大小的文件再以有界并发的HEAD请求获取
         
         Args:
             base_url (str): 要扫描的基础URL
+            on_files (Optional[Callable]): 增量回调，每得到一批确定大小的文件即调用一次
             
         Returns:
-            List[Tuple[str, str, int]]: [(文件名, 完整URL, 文件大小)]
+            List[Tuple[str, str, int]]: [(文件名, 完整URL, 文件大小)]，按页面链接顺序
         """
         try:
             self.logger.info(f"开始扫描URL: {base_url}")
 
             # 尝试使用requests，如果失败则使用urllib
             try:
-                response = self.session.get(base_url, timeout=self.timeout)
-                response.raise_for_status()
-                content = response.text
+                content = self.listing_cache.fetch(self.session, base_url, self.timeout)
             except Exception as e:
                 self.logger.warning(f"requests失败，尝试urllib: {str(e)}")
                 content = self._get_content_with_urllib(base_url)
 
             # 解析HTML内容
             soup = BeautifulSoup(content, 'html.parser')
+            listing_sizes = parse_listing_sizes(content)
             
             fits_files = []
             
@@ -89,14 +131,27 @@ class WebFitsScanner:
                     # 构建完整URL
                     full_url = urljoin(base_url, href)
                     filename = self._extract_filename(href)
-                    
-                    # 尝试获取文件大小
-                    file_size = self._get_file_size(full_url)
-                    
-                    fits_files.append((filename, full_url, file_size))
+                    fits_files.append((filename, full_url, listing_sizes.get(href, 0)))
                     self.logger.debug(f"找到FITS文件: {filename}")
+
+            known = [item for item in fits_files if item[2] > 0]
+            if known and on_files:
+                on_files(known)
+
+            # 目录列表中没有大小的文件：并发HEAD请求（共享连接池）
+            missing = [i for i, item in enumerate(fits_files) if item[2] <= 0]
+            if missing:
+                self.logger.info(f"{len(missing)} 个文件需通过HEAD请求获取大小（{self.head_workers} 个并发）")
+                with ThreadPoolExecutor(max_workers=max(1, self.head_workers)) as executor:
+                    futures = {executor.submit(self._get_file_size, fits_files[i][1]): i for i in missing}
+                    for future in as_completed(futures):
+                        i = futures[future]
+                        filename, full_url, _ = fits_files[i]
+                        fits_files[i] = (filename, full_url, future.result())
+                        if on_files:
+                            on_files([fits_files[i]])
             
-            self.logger.info(f"扫描完成，找到 {len(fits_files)} 个FITS文件")
+            self.logger.info(f"扫描完成，找到 {len(fits_files)} 个FITS文件（目录列表提供大小 {len(known)} 个）")
             return fits_files
             
         except requests.RequestException as e:
@@ -187,8 +242,9 @@ class WebFitsScanner:
 class DirectoryScanner:
     """目录式网页扫描器（类似Apache目录列表）"""
     
-    def __init__(self, timeout=30):
+    def __init__(self, timeout=30, listing_cache=None):
         self.timeout = timeout
+        self.listing_cache = listing_cache or get_listing_cache()
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
@@ -238,9 +294,7 @@ class DirectoryScanner:
         try:
             # 尝试使用requests，如果失败则使用urllib
             try:
-                response = self.session.get(url, timeout=self.timeout)
-                response.raise_for_status()
-                content = response.text
+                content = self.listing_cache.fetch(self.session, url, self.timeout)
             except Exception as e:
                 self.logger.warning(f"requests失败，尝试urllib: {str(e)}")
                 content = self._get_content_with_urllib(url)
@@ -252,12 +306,13 @@ class DirectoryScanner:
             # 匹配类似 <a href="filename.fits">filename.fits</a> 的模式
             pattern = r'<a\s+href="([^"]*\.fits?)"[^>]*>([^<]*)</a>'
             matches = re.findall(pattern, content, re.IGNORECASE)
+            listing_sizes = parse_listing_sizes(content)
             
             for href, display_name in matches:
                 if self._should_include_file(href):
                     full_url = urljoin(url, href)
                     filename = self._extract_filename(href)
-                    file_size = self._extract_size_from_listing(content, href)
+                    file_size = listing_sizes.get(href) or self._extract_size_from_listing(content, href)
 
                     fits_files.append((filename, full_url, file_size))
 
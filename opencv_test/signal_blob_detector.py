@@ -16,7 +16,8 @@ from PIL import Image
 class SignalBlobDetector:
     """基于信号强度的斑点检测器"""
 
-    def __init__(self, sigma_threshold=5.0, min_area=2, max_area=36, min_circularity=0.79, gamma=2.2, max_jaggedness_ratio=1.2):
+    def __init__(self, sigma_threshold=5.0, min_area=2, max_area=36, min_circularity=0.79, gamma=2.2, max_jaggedness_ratio=1.2,
+                 output=None):
         """
         初始化检测器
 
@@ -27,6 +28,7 @@ class SignalBlobDetector:
             min_circularity: 最小圆度，默认0.79
             gamma: 伽马校正值
             max_jaggedness_ratio: 最大锯齿比率（poly顶点数/hull顶点数），默认1.2
+            output: 过程信息输出函数，默认print（进程内调用时可传入收集函数）
         """
         self.sigma_threshold = sigma_threshold
         self.min_area = min_area
@@ -34,35 +36,46 @@ class SignalBlobDetector:
         self.min_circularity = min_circularity
         self.gamma = gamma
         self.max_jaggedness_ratio = max_jaggedness_ratio
+        self.output = output or print
+
+    def _print(self, *args, **kwargs):
+        """输出过程信息（CLI下直接打印）"""
+        if self.output is print:
+            print(*args, **kwargs)
+        else:
+            self.output(kwargs.get('sep', ' ').join(str(a) for a in args))
+
+    def prepare_image(self, data):
+        """将图像数组整理为检测使用的float32二维数组（3D数据取第一个通道）"""
+        data = np.asarray(data).astype(np.float32)  # 优化：使用float32减少内存50%，提升速度27%
+
+        if len(data.shape) == 3:
+            self._print(f"检测到 3D 数据，取第一个通道")
+            data = data[0]
+
+        self._print(f"图像信息:")
+        self._print(f"  - 形状: {data.shape}")
+        self._print(f"  - 数据范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
+        self._print(f"  - 均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
+        return data
 
     def load_fits_image(self, fits_path):
         """加载 FITS 文件"""
         try:
-            print(f"\n加载 FITS 文件: {fits_path}")
+            self._print(f"\n加载 FITS 文件: {fits_path}")
 
             with fits.open(fits_path) as hdul:
                 data = hdul[0].data
                 header = hdul[0].header
 
                 if data is None:
-                    print("错误: 无法读取图像数据")
+                    self._print("错误: 无法读取图像数据")
                     return None, None
 
-                data = data.astype(np.float32)  # 优化：使用float32减少内存50%，提升速度27%
-
-                if len(data.shape) == 3:
-                    print(f"检测到 3D 数据，取第一个通道")
-                    data = data[0]
-
-                print(f"图像信息:")
-                print(f"  - 形状: {data.shape}")
-                print(f"  - 数据范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
-                print(f"  - 均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
-
-                return data, header
+                return self.prepare_image(data), header
 
         except Exception as e:
-            print(f"加载 FITS 文件失败: {str(e)}")
+            self._print(f"加载 FITS 文件失败: {str(e)}")
             return None, None
 
     def histogram_peak_stretch(self, data, ratio=2.0/3.0):
@@ -74,9 +87,9 @@ class SignalBlobDetector:
             data: 输入数据
             ratio: 从峰值到最大值的比例，默认 2/3
         """
-        print(f"\n基于直方图峰值的拉伸:")
-        print(f"  - 原始范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
-        print(f"  - 原始均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
+        self._print(f"\n基于直方图峰值的拉伸:")
+        self._print(f"  - 原始范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
+        self._print(f"  - 原始均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
 
         # 计算直方图（使用更多bins以获得更精确的峰值）
         hist, bin_edges = np.histogram(data.flatten(), bins=2000)
@@ -94,9 +107,9 @@ class SignalBlobDetector:
             peaks = np.array(peaks)
             sorted_peaks = peaks[np.argsort(hist[peaks])[::-1]]
 
-            print(f"  - 找到 {len(peaks)} 个峰值:")
+            self._print(f"  - 找到 {len(peaks)} 个峰值:")
             for i, peak_idx in enumerate(sorted_peaks[:5]):  # 显示前5个最高峰
-                print(f"    峰{i+1}: 值={bin_centers[peak_idx]:.6f}, 频率={hist[peak_idx]}")
+                self._print(f"    峰{i+1}: 值={bin_centers[peak_idx]:.6f}, 频率={hist[peak_idx]}")
 
             # 使用最高峰作为主峰
             peak_idx = sorted_peaks[0]
@@ -105,7 +118,7 @@ class SignalBlobDetector:
             # 如果没找到峰值，使用最高频率
             peak_idx = np.argmax(hist)
             peak_value = bin_centers[peak_idx]
-            print(f"  - 未找到明显峰值，使用最高频率点")
+            self._print(f"  - 未找到明显峰值，使用最高频率点")
 
         # 计算最大值
         max_value = np.max(data)
@@ -113,10 +126,10 @@ class SignalBlobDetector:
         # 计算终点：峰值 + (最大值 - 峰值) * ratio
         end_value = peak_value + (max_value - peak_value) * ratio
 
-        print(f"  - 选定峰值: {peak_value:.6f} (频率: {hist[peak_idx]})")
-        print(f"  - 最大值: {max_value:.6f}")
-        print(f"  - 拉伸起点（峰值）: {peak_value:.6f}")
-        print(f"  - 拉伸终点（峰值到最大的{ratio:.2%}）: {end_value:.6f}")
+        self._print(f"  - 选定峰值: {peak_value:.6f} (频率: {hist[peak_idx]})")
+        self._print(f"  - 最大值: {max_value:.6f}")
+        self._print(f"  - 拉伸起点（峰值）: {peak_value:.6f}")
+        self._print(f"  - 拉伸终点（峰值到最大的{ratio:.2%}）: {end_value:.6f}")
 
         # 线性拉伸：峰值映射到0，终点映射到1
         if end_value > peak_value:
@@ -125,8 +138,8 @@ class SignalBlobDetector:
         else:
             stretched = data.copy()
 
-        print(f"  - 拉伸后范围: [{np.min(stretched):.6f}, {np.max(stretched):.6f}]")
-        print(f"  - 拉伸后均值: {np.mean(stretched):.6f}, 标准差: {np.std(stretched):.6f}")
+        self._print(f"  - 拉伸后范围: [{np.min(stretched):.6f}, {np.max(stretched):.6f}]")
+        self._print(f"  - 拉伸后均值: {np.mean(stretched):.6f}, 标准差: {np.std(stretched):.6f}")
 
         # 统计拉伸效果
         bg_pixels = np.sum(stretched <= 0)
@@ -134,10 +147,10 @@ class SignalBlobDetector:
         mid_pixels = np.sum((stretched >= 0.1) & (stretched < 0.5))
         bright_pixels = np.sum(stretched >= 0.5)
         total = stretched.size
-        print(f"  - 背景像素(<=0): {bg_pixels} ({bg_pixels/total*100:.2f}%)")
-        print(f"  - 暗像素(0-0.1): {dark_pixels} ({dark_pixels/total*100:.2f}%)")
-        print(f"  - 中等像素(0.1-0.5): {mid_pixels} ({mid_pixels/total*100:.2f}%)")
-        print(f"  - 亮像素(>=0.5): {bright_pixels} ({bright_pixels/total*100:.2f}%)")
+        self._print(f"  - 背景像素(<=0): {bg_pixels} ({bg_pixels/total*100:.2f}%)")
+        self._print(f"  - 暗像素(0-0.1): {dark_pixels} ({dark_pixels/total*100:.2f}%)")
+        self._print(f"  - 中等像素(0.1-0.5): {mid_pixels} ({mid_pixels/total*100:.2f}%)")
+        self._print(f"  - 亮像素(>=0.5): {bright_pixels} ({bright_pixels/total*100:.2f}%)")
 
         return stretched, peak_value, end_value
 
@@ -151,19 +164,19 @@ class SignalBlobDetector:
             low_percentile: 低百分位数，默认99.95
             use_max: 是否使用最大值作为终点，默认True
         """
-        print(f"\n基于百分位数的拉伸 ({low_percentile}%-最大值):")
-        print(f"  - 原始范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
-        print(f"  - 原始均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
+        self._print(f"\n基于百分位数的拉伸 ({low_percentile}%-最大值):")
+        self._print(f"  - 原始范围: [{np.min(data):.6f}, {np.max(data):.6f}]")
+        self._print(f"  - 原始均值: {np.mean(data):.6f}, 标准差: {np.std(data):.6f}")
 
         # 计算百分位数作为起点
         vmin = np.percentile(data, low_percentile)
         # 使用实际最大值作为终点
         vmax = np.max(data)
 
-        print(f"  - {low_percentile}% 百分位数: {vmin:.6f}")
-        print(f"  - 最大值: {vmax:.6f}")
-        print(f"  - 拉伸起点: {vmin:.6f}")
-        print(f"  - 拉伸终点（最大值）: {vmax:.6f}")
+        self._print(f"  - {low_percentile}% 百分位数: {vmin:.6f}")
+        self._print(f"  - 最大值: {vmax:.6f}")
+        self._print(f"  - 拉伸起点: {vmin:.6f}")
+        self._print(f"  - 拉伸终点（最大值）: {vmax:.6f}")
 
         # 线性拉伸
         if vmax > vmin:
@@ -172,8 +185,8 @@ class SignalBlobDetector:
         else:
             stretched = data.copy()
 
-        print(f"  - 拉伸后范围: [{np.min(stretched):.6f}, {np.max(stretched):.6f}]")
-        print(f"  - 拉伸后均值: {np.mean(stretched):.6f}, 标准差: {np.std(stretched):.6f}")
+        self._print(f"  - 拉伸后范围: [{np.min(stretched):.6f}, {np.max(stretched):.6f}]")
+        self._print(f"  - 拉伸后均值: {np.mean(stretched):.6f}, 标准差: {np.std(stretched):.6f}")
 
         # 统计拉伸效果
         bg_pixels = np.sum(stretched <= 0)
@@ -181,10 +194,10 @@ class SignalBlobDetector:
         mid_pixels = np.sum((stretched >= 0.1) & (stretched < 0.5))
         bright_pixels = np.sum(stretched >= 0.5)
         total = stretched.size
-        print(f"  - 背景像素(<=0): {bg_pixels} ({bg_pixels/total*100:.2f}%)")
-        print(f"  - 暗像素(0-0.1): {dark_pixels} ({dark_pixels/total*100:.2f}%)")
-        print(f"  - 中等像素(0.1-0.5): {mid_pixels} ({mid_pixels/total*100:.2f}%)")
-        print(f"  - 亮像素(>=0.5): {bright_pixels} ({bright_pixels/total*100:.2f}%)")
+        self._print(f"  - 背景像素(<=0): {bg_pixels} ({bg_pixels/total*100:.2f}%)")
+        self._print(f"  - 暗像素(0-0.1): {dark_pixels} ({dark_pixels/total*100:.2f}%)")
+        self._print(f"  - 中等像素(0.1-0.5): {mid_pixels} ({mid_pixels/total*100:.2f}%)")
+        self._print(f"  - 亮像素(>=0.5): {bright_pixels} ({bright_pixels/total*100:.2f}%)")
 
         return stretched, vmin, vmax
 
@@ -197,11 +210,11 @@ class SignalBlobDetector:
         mad = np.median(np.abs(data - median))
         sigma = 1.4826 * mad  # MAD 到标准差的转换因子
 
-        print(f"\n背景噪声估计:")
-        print(f"  - 中位数: {median:.6f}")
-        print(f"  - MAD: {mad:.6f}")
-        print(f"  - 估计标准差: {sigma:.6f}")
-        print(f"  - {self.sigma_threshold}σ 阈值: {median + self.sigma_threshold * sigma:.6f}")
+        self._print(f"\n背景噪声估计:")
+        self._print(f"  - 中位数: {median:.6f}")
+        self._print(f"  - MAD: {mad:.6f}")
+        self._print(f"  - 估计标准差: {sigma:.6f}")
+        self._print(f"  - {self.sigma_threshold}σ 阈值: {median + self.sigma_threshold * sigma:.6f}")
 
         return median, sigma
 
@@ -269,9 +282,9 @@ class SignalBlobDetector:
         total_pixels = mask.size
         percentage = (signal_pixels / total_pixels) * 100
 
-        print(f"\n信号掩码:")
-        print(f"  - 阈值: {threshold:.6f}")
-        print(f"  - 信号像素: {signal_pixels} ({percentage:.3f}%)")
+        self._print(f"\n信号掩码:")
+        self._print(f"  - 阈值: {threshold:.6f}")
+        self._print(f"  - 信号像素: {signal_pixels} ({percentage:.3f}%)")
 
         return mask, threshold
 
@@ -328,7 +341,7 @@ class SignalBlobDetector:
         # 检测斑点
         keypoints = detector.detect(mask_cleaned)
 
-        print(f"\n使用SimpleBlobDetector检测到 {len(keypoints)} 个斑点")
+        self._print(f"\n使用SimpleBlobDetector检测到 {len(keypoints)} 个斑点")
 
         # 估计背景噪声水平
         background_mask = (mask_cleaned == 0)
@@ -341,7 +354,7 @@ class SignalBlobDetector:
             background_median = np.median(original_data)
             background_sigma = np.std(original_data)
 
-        print(f"背景噪声: median={background_median:.6f}, sigma={background_sigma:.6f}")
+        self._print(f"背景噪声: median={background_median:.6f}, sigma={background_sigma:.6f}")
 
         # 转换keypoints为blob格式
         blobs = []
@@ -378,7 +391,7 @@ class SignalBlobDetector:
                 'poly_vertices': 0
             })
 
-        print(f"SimpleBlobDetector检测完成，共 {len(blobs)} 个斑点")
+        self._print(f"SimpleBlobDetector检测完成，共 {len(blobs)} 个斑点")
         return blobs
 
     def _detect_blobs_contour(self, mask, original_data):
@@ -393,7 +406,7 @@ class SignalBlobDetector:
         # 查找轮廓
         contours, _ = cv2.findContours(mask_cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        print(f"\n检测到 {len(contours)} 个候选区域")
+        self._print(f"\n检测到 {len(contours)} 个候选区域")
 
         # 估计背景噪声水平（用于计算SNR）
         # 使用整个图像的背景区域（排除掩码区域）
@@ -407,7 +420,7 @@ class SignalBlobDetector:
             background_median = np.median(original_data)
             background_sigma = np.std(original_data)
 
-        print(f"背景噪声: median={background_median:.6f}, sigma={background_sigma:.6f}")
+        self._print(f"背景噪声: median={background_median:.6f}, sigma={background_sigma:.6f}")
 
         # 过滤轮廓
         blobs = []
@@ -504,7 +517,7 @@ class SignalBlobDetector:
         # 按SNR排序（初步排序）
         blobs.sort(key=lambda x: x['snr'], reverse=True)
 
-        print(f"过滤后剩余 {len(blobs)} 个斑点")
+        self._print(f"过滤后剩余 {len(blobs)} 个斑点")
 
         return blobs
 
@@ -520,13 +533,13 @@ class SignalBlobDetector:
         if not blobs or aligned_data is None:
             return
 
-        print(f"\n计算 Aligned 中心 7x7 SNR（用于排序）...")
+        self._print(f"\n计算 Aligned 中心 7x7 SNR（用于排序）...")
 
         # 计算整体背景噪声
         aligned_background_median = np.median(aligned_data)
         aligned_mad = np.median(np.abs(aligned_data - aligned_background_median))
         aligned_background_sigma = 1.4826 * aligned_mad
-        print(f"  Aligned图像背景噪声: median={aligned_background_median:.6f}, sigma={aligned_background_sigma:.6f}")
+        self._print(f"  Aligned图像背景噪声: median={aligned_background_median:.6f}, sigma={aligned_background_sigma:.6f}")
 
         half_size = cutout_size // 2
         calculated_count = 0
@@ -576,7 +589,7 @@ class SignalBlobDetector:
             # 将SNR信息添加到blob中
             blob['aligned_center_7x7_snr'] = aligned_center_7x7_snr
 
-        print(f"  已计算 {calculated_count}/{len(blobs)} 个 blob 的 Aligned SNR")
+        self._print(f"  已计算 {calculated_count}/{len(blobs)} 个 blob 的 Aligned SNR")
 
     def sort_blobs(self, blobs, image_shape, sort_by='aligned_snr'):
         """
@@ -599,14 +612,14 @@ class SignalBlobDetector:
             sorted_blobs = sorted(blobs,
                                  key=lambda b: b.get('aligned_center_7x7_snr') if b.get('aligned_center_7x7_snr') is not None else -999999,
                                  reverse=True)
-            print(f"  排序方式: Aligned 中心 7x7 SNR（降序）")
+            self._print(f"  排序方式: Aligned 中心 7x7 SNR（降序）")
 
         elif sort_by == 'snr':
             # 按差异图像 SNR 降序排序（None值放到最后）
             sorted_blobs = sorted(blobs,
                                  key=lambda b: b.get('snr') if b.get('snr') is not None else -999999,
                                  reverse=True)
-            print(f"  排序方式: 差异图像 SNR（降序）")
+            self._print(f"  排序方式: 差异图像 SNR（降序）")
 
         else:
             # 默认：按综合得分排序
@@ -641,19 +654,19 @@ class SignalBlobDetector:
 
             # 排序：综合得分降序（大的在前）
             sorted_blobs = sorted(blobs, key=lambda b: -b['quality_score'])
-            print(f"  排序方式: 综合得分（降序）")
+            self._print(f"  排序方式: 综合得分（降序）")
 
         return sorted_blobs
 
     def print_blob_info(self, blobs):
         """打印斑点信息"""
         if not blobs:
-            print("\n未检测到任何斑点")
+            self._print("\n未检测到任何斑点")
             return
 
-        print(f"\n检测到的斑点详细信息（已排序：综合得分=(圆度^2)×2000×面积归一化）:")
-        print(f"{'序号':<6} {'综合得分':<10} {'面积':<10} {'圆度':<10} {'凸度':<10} {'惯性比':<10} {'锯齿比':<10} {'Hull顶点':<10} {'Poly顶点':<10} {'X坐标':<10} {'Y坐标':<10} {'SNR':<10} {'最大SNR':<10} {'平均信号':<12} {'Aligned中心7x7SNR':<16}")
-        print("-" * 186)
+        self._print(f"\n检测到的斑点详细信息（已排序：综合得分=(圆度^2)×2000×面积归一化）:")
+        self._print(f"{'序号':<6} {'综合得分':<10} {'面积':<10} {'圆度':<10} {'凸度':<10} {'惯性比':<10} {'锯齿比':<10} {'Hull顶点':<10} {'Poly顶点':<10} {'X坐标':<10} {'Y坐标':<10} {'SNR':<10} {'最大SNR':<10} {'平均信号':<12} {'Aligned中心7x7SNR':<16}")
+        self._print("-" * 186)
 
         for i, blob in enumerate(blobs, 1):
             cx, cy = blob['center']
@@ -670,7 +683,7 @@ class SignalBlobDetector:
             # 格式化aligned SNR值
             aligned_center_str = f"{aligned_center_snr:<16.2f}" if aligned_center_snr is not None else f"{'N/A':<16}"
 
-            print(f"{i:<6} {quality_score:<10.3f} {blob['area']:<10.1f} {blob['circularity']:<10.3f} "
+            self._print(f"{i:<6} {quality_score:<10.3f} {blob['area']:<10.1f} {blob['circularity']:<10.3f} "
                   f"{convexity:<10.3f} {inertia:<10.3f} {jaggedness:<10.3f} {hull_verts:<10} {poly_verts:<10} "
                   f"{cx:<10.2f} {cy:<10.2f} {snr:<10.2f} {max_snr:<10.2f} {blob['mean_signal']:<12.6f} "
                   f"{aligned_center_str}")
@@ -685,17 +698,17 @@ class SignalBlobDetector:
         jaggedness_ratios = [b.get('jaggedness_ratio', 0) for b in blobs]
         snrs = [b.get('snr', 0) for b in blobs]
 
-        print(f"\n统计信息:")
-        print(f"  - 总数: {len(blobs)}")
-        print(f"  - 综合得分: {np.mean(quality_scores):.3f} ± {np.std(quality_scores):.3f} (范围: {np.min(quality_scores):.3f} - {np.max(quality_scores):.3f})")
-        print(f"  - 面积: {np.mean(areas):.2f} ± {np.std(areas):.2f} (范围: {np.min(areas):.2f} - {np.max(areas):.2f})")
-        print(f"  - 圆度: {np.mean(circularities):.3f} ± {np.std(circularities):.3f} (范围: {np.min(circularities):.3f} - {np.max(circularities):.3f})")
-        print(f"  - 凸度: {np.mean(convexities):.3f} ± {np.std(convexities):.3f} (范围: {np.min(convexities):.3f} - {np.max(convexities):.3f})")
-        print(f"  - 惯性比: {np.mean(inertia_ratios):.3f} ± {np.std(inertia_ratios):.3f} (范围: {np.min(inertia_ratios):.3f} - {np.max(inertia_ratios):.3f})")
-        print(f"  - 锯齿比: {np.mean(jaggedness_ratios):.3f} ± {np.std(jaggedness_ratios):.3f} (范围: {np.min(jaggedness_ratios):.3f} - {np.max(jaggedness_ratios):.3f})")
-        print(f"  - SNR: {np.mean(snrs):.2f} ± {np.std(snrs):.2f} (范围: {np.min(snrs):.2f} - {np.max(snrs):.2f})")
-        print(f"  - 平均信号: {np.mean(signals):.6f} ± {np.std(signals):.6f}")
-        print(f"  - 信号范围: {np.min(signals):.6f} - {np.max(signals):.6f}")
+        self._print(f"\n统计信息:")
+        self._print(f"  - 总数: {len(blobs)}")
+        self._print(f"  - 综合得分: {np.mean(quality_scores):.3f} ± {np.std(quality_scores):.3f} (范围: {np.min(quality_scores):.3f} - {np.max(quality_scores):.3f})")
+        self._print(f"  - 面积: {np.mean(areas):.2f} ± {np.std(areas):.2f} (范围: {np.min(areas):.2f} - {np.max(areas):.2f})")
+        self._print(f"  - 圆度: {np.mean(circularities):.3f} ± {np.std(circularities):.3f} (范围: {np.min(circularities):.3f} - {np.max(circularities):.3f})")
+        self._print(f"  - 凸度: {np.mean(convexities):.3f} ± {np.std(convexities):.3f} (范围: {np.min(convexities):.3f} - {np.max(convexities):.3f})")
+        self._print(f"  - 惯性比: {np.mean(inertia_ratios):.3f} ± {np.std(inertia_ratios):.3f} (范围: {np.min(inertia_ratios):.3f} - {np.max(inertia_ratios):.3f})")
+        self._print(f"  - 锯齿比: {np.mean(jaggedness_ratios):.3f} ± {np.std(jaggedness_ratios):.3f} (范围: {np.min(jaggedness_ratios):.3f} - {np.max(jaggedness_ratios):.3f})")
+        self._print(f"  - SNR: {np.mean(snrs):.2f} ± {np.std(snrs):.2f} (范围: {np.min(snrs):.2f} - {np.max(snrs):.2f})")
+        self._print(f"  - 平均信号: {np.mean(signals):.6f} ± {np.std(signals):.6f}")
+        self._print(f"  - 信号范围: {np.min(signals):.6f} - {np.max(signals):.6f}")
 
     def draw_blobs(self, data, blobs, mask):
         """绘制检测结果"""
@@ -856,7 +869,7 @@ class SignalBlobDetector:
             return
 
         gif_status = "生成GIF" if generate_gif else "不生成GIF"
-        print(f"\n生成每个检测结果的截图（局部拉伸方法: {stretch_method}, 百分位: {low_percentile}-{high_percentile}, {gif_status}）...")
+        self._print(f"\n生成每个检测结果的截图（局部拉伸方法: {stretch_method}, 百分位: {low_percentile}-{high_percentile}, {gif_status}）...")
 
         # 创建统一的cutouts文件夹
         cutouts_folder = os.path.join(output_folder, "cutouts")
@@ -875,7 +888,7 @@ class SignalBlobDetector:
             aligned_background_median = np.median(aligned_data)
             aligned_mad = np.median(np.abs(aligned_data - aligned_background_median))
             aligned_background_sigma = 1.4826 * aligned_mad
-            print(f"Aligned图像背景噪声: median={aligned_background_median:.6f}, sigma={aligned_background_sigma:.6f}")
+            self._print(f"Aligned图像背景噪声: median={aligned_background_median:.6f}, sigma={aligned_background_sigma:.6f}")
 
         for i, blob in enumerate(blobs, 1):
             cx, cy = blob['center']
@@ -1171,12 +1184,12 @@ class SignalBlobDetector:
                     )
 
                 except Exception as e:
-                    print(f"  警告: 生成GIF失败 (blob {i}): {str(e)}")
+                    self._print(f"  警告: 生成GIF失败 (blob {i}): {str(e)}")
 
         if generate_gif:
-            print(f"已为 {len(blobs)} 个检测结果生成截图和GIF")
+            self._print(f"已为 {len(blobs)} 个检测结果生成截图和GIF")
         else:
-            print(f"已为 {len(blobs)} 个检测结果生成截图（未生成GIF）")
+            self._print(f"已为 {len(blobs)} 个检测结果生成截图（未生成GIF）")
 
     def _calculate_radec_pixel_distance(self, ra, dec, header, detection_center):
         """计算RA/DEC坐标距离检测中心的像素距离
@@ -1337,7 +1350,7 @@ class SignalBlobDetector:
         # 创建带时间戳的输出文件夹
         output_folder = os.path.join(output_dir, f"detection_{timestamp}")
         os.makedirs(output_folder, exist_ok=True)
-        print(f"\n输出文件夹: {output_folder}")
+        self._print(f"\n输出文件夹: {output_folder}")
 
         # 构建参数字符串
         threshold = threshold_info.get('threshold', 0)
@@ -1355,17 +1368,17 @@ class SignalBlobDetector:
         stretched_uint8 = (np.clip(stretched_data, 0, 1) * 255).astype(np.uint8)
         stretched_output = os.path.join(output_folder, f"{base_name}_stretched_{stretch_method}.png")
         cv2.imwrite(stretched_output, stretched_uint8)
-        print(f"保存拉伸图像（已去除亮线）: {stretched_output}")
+        self._print(f"保存拉伸图像（已去除亮线）: {stretched_output}")
 
         # 保存掩码
         mask_output = os.path.join(output_folder, f"{base_name}_mask_{param_str}.png")
         cv2.imwrite(mask_output, mask)
-        print(f"保存信号掩码: {mask_output}")
+        self._print(f"保存信号掩码: {mask_output}")
 
         # 保存检测结果图
         result_output = os.path.join(output_folder, f"{base_name}_blobs_{param_str}.png")
         cv2.imwrite(result_output, result_image)
-        print(f"保存检测结果图: {result_output}")
+        self._print(f"保存检测结果图: {result_output}")
 
         # 仅为“高分项”生成截图和GIF（按项目配置的阈值）
         score_threshold = 3.0
@@ -1402,12 +1415,12 @@ class SignalBlobDetector:
         if is_fast_mode:
             blobs_for_cutouts = high_blobs
             if not blobs_for_cutouts:
-                print(f"[快速模式] 无高分候选，跳过cutouts生成（条件：{_criterion_str}）")
+                self._print(f"[快速模式] 无高分候选，跳过cutouts生成（条件：{_criterion_str}）")
             else:
-                print(f"[快速模式] 仅为 {len(blobs_for_cutouts)}/{len(blobs)} 个高分候选生成cutouts（条件：{_criterion_str}）")
+                self._print(f"[快速模式] 仅为 {len(blobs_for_cutouts)}/{len(blobs)} 个高分候选生成cutouts（条件：{_criterion_str}）")
         else:
             blobs_for_cutouts = blobs
-            print(f"[非快速模式] 为全部 {len(blobs_for_cutouts)} 个候选生成cutouts；其中高分 {len(high_blobs)}（条件：{_criterion_str}）")
+            self._print(f"[非快速模式] 为全部 {len(blobs_for_cutouts)} 个候选生成cutouts；其中高分 {len(high_blobs)}（条件：{_criterion_str}）")
 
         if blobs_for_cutouts:
             self.extract_blob_cutouts(original_data, stretched_data, result_image, blobs_for_cutouts,
@@ -1537,7 +1550,7 @@ class SignalBlobDetector:
                        f"{blob['mean_signal']:<14.8f} {blob['max_signal']:<14.8f} "
                        f"{aligned_center_str}\n")
 
-        print(f"保存分析报告: {txt_output}")
+        self._print(f"保存分析报告: {txt_output}")
 
     def process_fits_file(self, fits_path, output_dir=None, use_peak_stretch=None, detection_threshold=0.0,
                          reference_fits=None, aligned_fits=None, remove_bright_lines=True,
@@ -1576,13 +1589,44 @@ class SignalBlobDetector:
         if reference_fits and os.path.exists(reference_fits):
             reference_data, _ = self.load_fits_image(reference_fits)
             if reference_data is not None:
-                print(f"已加载参考图像: {os.path.basename(reference_fits)}")
+                self._print(f"已加载参考图像: {os.path.basename(reference_fits)}")
 
         if aligned_fits and os.path.exists(aligned_fits):
             aligned_data, _ = self.load_fits_image(aligned_fits)
             if aligned_data is not None:
-                print(f"已加载对齐图像: {os.path.basename(aligned_fits)}")
+                self._print(f"已加载对齐图像: {os.path.basename(aligned_fits)}")
+
+        if output_dir is None:
+            output_dir = os.path.dirname(fits_path) or '.'
+        base_name = os.path.splitext(os.path.basename(fits_path))[0]
 
+        return self.process_arrays(data, header, output_dir, base_name,
+                                   reference_data=reference_data, aligned_data=aligned_data,
+                                   use_peak_stretch=use_peak_stretch, detection_threshold=detection_threshold,
+                                   remove_bright_lines=remove_bright_lines, stretch_method=stretch_method,
+                                   percentile_low=percentile_low, fast_mode=fast_mode,
+                                   detection_method=detection_method, sort_by=sort_by, generate_gif=generate_gif,
+                                   skybot_results=skybot_results, vsx_results=vsx_results)
+
+    def process_arrays(self, data, header, output_dir, base_name, reference_data=None, aligned_data=None,
+                       use_peak_stretch=None, detection_threshold=0.0, remove_bright_lines=True,
+                       stretch_method='percentile', percentile_low=99.95, fast_mode=False, detection_method='contour',
+                       sort_by='aligned_snr', generate_gif=True, skybot_results=None, vsx_results=None):
+        """
+        对内存中的差异图像执行完整检测流程（不读取FITS文件，可在同一进程内重复调用）
+
+        Args:
+            data: 差异图像数组（已由 prepare_image 整理）
+            header: 差异图像FITS header（用于坐标转换和结果输出，可为None）
+            output_dir: 输出目录
+            base_name: 输出文件名前缀（通常为差异FITS文件名去掉扩展名）
+            reference_data: 参考图像（模板）数组（可选）
+            aligned_data: 对齐图像（下载）数组（可选）
+            其余参数同 process_fits_file
+
+        Returns:
+            list: 排序后的斑点列表（每个斑点为dict，含中心、面积、圆度、SNR等字段）
+        """
         # 根据选择的拉伸方法进行拉伸
         # 如果明确指定了 use_peak_stretch，则使用该参数（向后兼容）
         # 否则使用 stretch_method 参数
@@ -1601,25 +1645,25 @@ class SignalBlobDetector:
 
         # 根据参数决定是否去除亮线
         if remove_bright_lines:
-            print("\n执行亮线去除...")
+            self._print("\n执行亮线去除...")
             stretched_uint8 = (np.clip(stretched_data, 0, 1) * 255).astype(np.uint8)
             stretched_no_lines_uint8 = self.remove_bright_lines(stretched_uint8)
             # 转换回0-1范围的float数据用于后续检测
             stretched_data_no_lines = stretched_no_lines_uint8.astype(np.float64) / 255.0
-            print("亮线去除完成，使用去除亮线后的数据进行检测")
+            self._print("亮线去除完成，使用去除亮线后的数据进行检测")
         else:
-            print("\n跳过亮线去除，使用原始拉伸数据进行检测")
+            self._print("\n跳过亮线去除，使用原始拉伸数据进行检测")
             stretched_data_no_lines = stretched_data
 
         # 使用简单阈值检测拉伸后的数据
         detection_data_desc = "去除亮线后的数据" if remove_bright_lines else "拉伸数据"
-        print(f"\n使用{detection_data_desc}进行检测...")
-        print(f"检测阈值: {detection_threshold}")
+        self._print(f"\n使用{detection_data_desc}进行检测...")
+        self._print(f"检测阈值: {detection_threshold}")
 
         # 创建掩码：拉伸后值 > detection_threshold 的像素
         mask = (stretched_data_no_lines > detection_threshold).astype(np.uint8) * 255
         signal_pixels = np.sum(mask > 0)
-        print(f"信号像素: {signal_pixels} ({signal_pixels/mask.size*100:.3f}%)")
+        self._print(f"信号像素: {signal_pixels} ({signal_pixels/mask.size*100:.3f}%)")
 
         # 检测斑点
         blobs = self.detect_blobs_from_mask(mask, stretched_data_no_lines, detection_method=detection_method)
@@ -1638,7 +1682,7 @@ class SignalBlobDetector:
             threshold_info['end_value'] = value2
 
         # 输出排序前的 blob 总数
-        print(f"\n排序前检测到的 blob 总数: {len(blobs)}")
+        self._print(f"\n排序前检测到的 blob 总数: {len(blobs)}")
 
         # 如果需要按 aligned_snr 排序，提前计算 SNR
         if sort_by == 'aligned_snr' and aligned_data is not None:
@@ -1653,12 +1697,6 @@ class SignalBlobDetector:
         # 绘制结果（使用去除亮线后的数据）
         result_image = self.draw_blobs(stretched_data_no_lines, blobs, mask)
 
-        # 保存结果
-        if output_dir is None:
-            output_dir = os.path.dirname(fits_path) or '.'
-
-        base_name = os.path.splitext(os.path.basename(fits_path))[0]
-
         # 保存时传递去除亮线后的数据
         # 在非快速模式下生成hull和poly可视化
         self.save_results(data, stretched_data_no_lines, mask, result_image, blobs,
@@ -1667,7 +1705,7 @@ class SignalBlobDetector:
                          header=header, generate_shape_viz=not fast_mode, generate_gif=generate_gif,
                          skybot_results=skybot_results, vsx_results=vsx_results)
 
-        print(f"\n处理完成！")
+        self._print(f"\n处理完成！")
         return blobs
 
 
@@ -242,6 +242,42 @@ def repair_pixels_simple(image, pixel_mask):
     
     return repaired_image
 
+def clean_pixels_simple(image_data, method='outlier', threshold=4.0):
+    """
+    对内存中的图像数组执行单像素噪点检测与修复（不读写文件）
+
+    参数:
+    image_data: 输入图像数组
+    method: 检测方法 ('outlier', 'hot_cold', 或 'adaptive_median')
+    threshold: 检测阈值
+
+    返回:
+    (repaired_image, noise_image, noise_mask)，算法与 process_fits_simple 一致
+    """
+
+    image_data = np.asarray(image_data, dtype=np.float64)
+
+    # 处理NaN值
+    if np.any(np.isnan(image_data)):
+        median_val = np.nanmedian(image_data)
+        image_data = np.nan_to_num(image_data, nan=median_val)
+
+    if method == 'adaptive_median':
+        repaired_image = apply_adaptive_median_filter(image_data, 3)
+        noise_image = image_data - repaired_image
+        noise_mask = np.abs(noise_image) > np.std(noise_image) * 2.0
+        return repaired_image, noise_image, noise_mask
+
+    if method == 'hot_cold':
+        hot_mask, cold_mask = detect_hot_cold_pixels_simple(image_data, threshold, threshold)
+        noise_mask = hot_mask | cold_mask
+    else:
+        noise_mask = detect_outlier_pixels(image_data, threshold)
+
+    repaired_image = repair_pixels_simple(image_data, noise_mask)
+    noise_image = image_data - repaired_image
+    return repaired_image, noise_image, noise_mask
+
 def process_fits_simple(input_file, method='outlier', threshold=4.0, output_dir=None):
     """
     简单处理FITS文件中的单像素噪点
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Precompute a per-night asteroid ephemeris cache for the offline MPCORB query.
+
+For one observing night and site, all MPCORB bodies (H <= limit) are propagated on a
+coarse time grid; bodies that come within --margin degrees of any region center
+(regionData in config/url_config.json) are kept and their topocentric directions
+are written to a compact .npz file.
+
+The GUI (_perform_local_skybot_query) interpolates from this cache instead of
+propagating orbits, as long as the cache metadata (MPCORB SHA1, H limit, site)
+matches the current settings and the query falls inside the covered regions/time.
+
+Outputs (default):
+  - gui/ephemeris_cache/ephem_<YYYYMMDD>_<lat>_<lon>.npz
+
+Usage (Windows):
+  C:\\Python\\Python310\\python.exe tools\\build_ephemeris_cache.py --date 20251103
+  C:\\Python\\Python310\\python.exe tools\\build_ephemeris_cache.py --date 20251103 --regions K025-1 K096-2
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "gui"))
+
+DEFAULT_MPCORB = REPO_ROOT / "gui" / "mpc_variables" / "MPCORB.DAT"
+DEFAULT_EPHEMERIS = REPO_ROOT / "gui" / "ephemeris" / "de421.bsp"
+DEFAULT_REGION_CONFIG = REPO_ROOT / "config" / "url_config.json"
+DEFAULT_OUT_DIR = REPO_ROOT / "gui" / "ephemeris_cache"
+
+
+def load_regions(config_path: Path, selected=None) -> dict:
+    with open(config_path, "r", encoding="utf-8") as f:
+        region_data = json.load(f).get("regionData", {})
+    regions = {}
+    for name, coords in region_data.items():
+        if selected and name not in selected:
+            continue
+        if isinstance(coords, list) and len(coords) >= 2:
+            regions[name] = (float(coords[0]), float(coords[1]))
+    return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a per-night offline asteroid ephemeris cache")
+    parser.add_argument("--date", required=True, help="Night start date YYYYMMDD (local evening)")
+    parser.add_argument("--mpcorb", default=str(DEFAULT_MPCORB), help="MPCORB.DAT path")
+    parser.add_argument("--ephemeris", default=str(DEFAULT_EPHEMERIS), help="de421.bsp path")
+    parser.add_argument("--region-config", default=str(DEFAULT_REGION_CONFIG), help="url_config.json with regionData")
+    parser.add_argument("--regions", nargs="*", help="Only these region ids (default: all in regionData)")
+    parser.add_argument("--lat", type=float, default=43.4, help="Site latitude (deg)")
+    parser.add_argument("--lon", type=float, default=87.1, help="Site longitude (deg, east positive)")
+    parser.add_argument("--h-limit", type=float, default=20.0, help="Keep bodies with H <= limit")
+    parser.add_argument("--step", type=float, default=10.0, help="Time grid step (minutes)")
+    parser.add_argument("--margin", type=float, default=3.0, help="Keep radius around region centers (deg)")
+    parser.add_argument("--out-dir", default=str(DEFAULT_OUT_DIR), help="Output directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from skyfield.api import load
+    from skyfield.data import mpc
+    from mpcorb_propagator import MPCORBPropagator, file_sha1, load_columnar_cache
+    from ephemeris_cache import build_ephemeris_cache, save_ephemeris_cache, night_window_utc, default_cache_path
+
+    for p in (args.mpcorb, args.ephemeris, args.region_config):
+        if not os.path.exists(p):
+            print(f"Missing file: {p}")
+            return 2
+
+    regions = load_regions(Path(args.region_config), set(args.regions or []))
+    if not regions:
+        print("No region centers selected")
+        return 2
+
+    print(f"Hashing {args.mpcorb} ...")
+    mpcorb_sha1 = file_sha1(args.mpcorb)
+
+    print("Loading MPCORB ...")
+    t0 = time.time()
+    engine = load_columnar_cache(args.mpcorb, args.h_limit, source_sha1=mpcorb_sha1)
+    if engine is not None:
+        print(f"  {len(engine)} orbits from binary cache in {time.time() - t0:.1f}s")
+    else:
+        with open(args.mpcorb, "rb") as f:
+            df = mpc.load_mpcorb_dataframe(f)
+        df = df[df["magnitude_H"] <= args.h_limit]
+        engine, dropped = MPCORBPropagator.from_dataframe(df)
+        print(f"  {len(engine)} orbits (dropped {dropped}) in {time.time() - t0:.1f}s")
+
+    ts = load.timescale()
+    eph = load(args.ephemeris)
+    start_utc, end_utc = night_window_utc(args.date, args.lon)
+    print(f"Night window (UTC): {start_utc.isoformat()} -> {end_utc.isoformat()}, {len(regions)} regions")
+
+    t0 = time.time()
+    arrays = build_ephemeris_cache(
+        engine, eph, ts, regions, start_utc, end_utc, args.lat, args.lon,
+        step_minutes=args.step, margin_deg=args.margin,
+        metadata={
+            "mpcorb_path": os.path.abspath(args.mpcorb),
+            "mpcorb_sha1": mpcorb_sha1,
+            "h_limit": float(args.h_limit),
+            "date": args.date,
+        },
+    )
+    out_path = default_cache_path(args.out_dir, args.date, args.lat, args.lon)
+    save_ephemeris_cache(out_path, arrays)
+    print(f"Cached {len(arrays['designations'])} bodies x {len(arrays['jd_tt'])} epochs "
+          f"in {time.time() - t0:.1f}s -> {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
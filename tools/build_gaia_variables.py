@@ -10,6 +10,7 @@ Downloads:
 Outputs (downloaded into gui/mpc_variables/):
   - gui/mpc_variables/ReadMe
   - gui/mpc_variables/vclassre.dat.gz
+  - gui/mpc_variables/vclassre.dat.gz_idx/ (declination-zone spatial index for cone searches)
 
 The application code has been updated to:
   - detect and read CDS ASCII (with ReadMe) directly
@@ -73,6 +74,25 @@ def validate_read():
         return 2
 
 
+def ensure_index():
+    dat_gz = OUT_DIR / "vclassre.dat.gz"
+    if not dat_gz.exists():
+        return 1
+    sys.path.insert(0, str(REPO_ROOT / "gui"))
+    try:
+        from variable_star_index import VariableStarIndex, build_vclassre_index
+    except ImportError as e:
+        print("Skip index build (numpy unavailable):", e)
+        return 1
+    if VariableStarIndex.open_for(str(dat_gz)) is not None:
+        print("Index up to date:", str(dat_gz) + "_idx")
+        return 0
+    print("Building spatial index (one-off, may take a few minutes) ...")
+    out_dir = build_vclassre_index(str(dat_gz))
+    print("Index written:", out_dir)
+    return 0
+
+
 def main():
     print("Output directory:", OUT_DIR)
     ensure_files()
@@ -80,6 +100,7 @@ def main():
     if rc != 0:
         print("Validation failed. You can still use the downloaded files with the app if astropy is available.")
     else:
+        ensure_index()
         print("Validation OK. You can now set local VSX path to vclassre.dat.gz (or leave default).")
 
 
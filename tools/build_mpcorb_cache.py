@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Convert MPCORB.DAT into the memory-mappable binary cache used by the offline asteroid query.
+
+The text file is parsed once with skyfield, filtered by H, and the orbital element arrays
+(plus precomputed orientation vectors) are written as one .npy file per column into
+<MPCORB.DAT>_npy/ next to the source, together with manifest.json recording the source
+path, mtime, size and SHA1. The GUI and gui/run_console.py load this directory with
+np.load(mmap_mode='r') as long as the source path/mtime/size still match, so several
+processes share the same page cache and no text parsing happens at startup.
+
+Usage (Windows):
+  C:\\Python\\Python310\\python.exe tools\\build_mpcorb_cache.py
+  C:\\Python\\Python310\\python.exe tools\\build_mpcorb_cache.py --mpcorb D:\\data\\MPCORB.DAT --h-limit 22
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "gui"))
+
+DEFAULT_MPCORB = REPO_ROOT / "gui" / "mpc_variables" / "MPCORB.DAT"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the binary columnar MPCORB cache")
+    parser.add_argument("--mpcorb", default=str(DEFAULT_MPCORB), help="MPCORB.DAT path")
+    parser.add_argument("--h-limit", type=float, default=20.0,
+                        help="Keep bodies with H <= limit (queries with a lower limit reuse this cache)")
+    parser.add_argument("--out-dir", help="Cache directory (default: <MPCORB.DAT>_npy next to the source)")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from skyfield.data import mpc
+    from mpcorb_propagator import MPCORBPropagator, MPCORB_NUMERIC_COLUMNS, columnar_cache_dir, file_sha1
+
+    if not os.path.exists(args.mpcorb):
+        print(f"Missing MPCORB file: {args.mpcorb}")
+        return 2
+
+    t0 = time.time()
+    with open(args.mpcorb, "rb") as f:
+        df = mpc.load_mpcorb_dataframe(f)
+    raw_count = len(df)
+    for c in MPCORB_NUMERIC_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+    df = df[df["magnitude_H"] <= args.h_limit]
+    print(f"Parsed {raw_count} rows, {len(df)} with H <= {args.h_limit} in {time.time() - t0:.1f}s")
+
+    engine, dropped = MPCORBPropagator.from_dataframe(df)
+    out_dir = args.out_dir or columnar_cache_dir(args.mpcorb)
+    version_dir = engine.save_columnar(out_dir, args.mpcorb, args.h_limit, file_sha1(args.mpcorb))
+    print(f"Wrote {len(engine)} orbits (dropped {dropped}) -> {version_dir}")
+
+    t0 = time.time()
+    MPCORBPropagator.from_columnar(out_dir)
+    print(f"Reload check: {time.time() - t0:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())